@@ -21,6 +21,7 @@ import diskcache
 import errno
 import getpass
 import glob
+import itertools
 import json
 import mimetypes
 import os
@@ -28,16 +29,22 @@ import re
 import requests
 import shutil
 import six
+import sys
 import tempfile
+import time
 
 from contextlib import contextmanager
 from requests_toolbelt import MultipartEncoder
+from .sync import INDEX_NAME, SyncIndex, sha512
+from .transfer import TransferPool
 
 __version__ = '2.3.0'
 __license__ = 'Apache 2.0'
 
 DEFAULT_PAGE_LIMIT = 50  # Number of results to fetch per request
 REQ_BUFFER_SIZE = 65536  # Chunk size when iterating a download body
+TRANSFER_RETRIES = 3  # Number of times a failed transfer request is retried
+RETRY_DELAY = 1  # Seconds to wait before the first retry, increasing with each retry
 
 _safeNameRegex = re.compile(r'^[/\\]+')
 
@@ -52,6 +59,19 @@ def _compareDicts(x, y):
     return len(x) == len(y) == len(set(x.items()) & set(y.items()))
 
 
+def _retryable(exc):
+    """
+    Whether a failed transfer request should be retried: it failed to reach the
+    server or to complete, or the server had an error.
+
+    :param exc: The exception raised by the request.
+    """
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code >= 500
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout,
+                            requests.exceptions.ChunkedEncodingError))
+
+
 def _safeMakedirs(path):
     """
     Wraps os.makedirs in such a way that it will not raise exceptions if the
@@ -160,6 +180,8 @@ class GirderClient(object):
 
     # The current maximum chunk size for uploading file chunks
     MAX_CHUNK_SIZE = 1024 * 1024 * 64
+    # The size of the parts of files that are uploaded in parallel
+    PART_SIZE = 1024 * 1024 * 16
 
     DEFAULT_API_ROOT = 'api/v1'
     DEFAULT_HOST = 'localhost'
@@ -191,7 +213,8 @@ class GirderClient(object):
             return "https"
 
     def __init__(self, host=None, port=None, apiRoot=None, scheme=None, apiUrl=None,
-                 cacheSettings=None, progressReporterCls=None):
+                 cacheSettings=None, progressReporterCls=None, parallel=1,
+                 retries=TRANSFER_RETRIES):
         """
         Construct a new GirderClient object, given a host name and port number,
         as well as a username and password which will be used in all requests
@@ -219,6 +242,14 @@ class GirderClient(object):
             a class attribute `reportProgress` set to True (It can conveniently be
             initialized using `sys.stdout.isatty()`).
             This defaults to :class:`_NoopProgressReporter`.
+        :param parallel: The number of files, and of parts of large uploads, to
+            transfer at once when uploading or downloading hierarchies. See
+            :py:meth:`transfers`.
+        :type parallel: int
+        :param retries: The number of times a failed request that transfers
+            file contents is retried. Uploads and downloads resume where they
+            stopped.
+        :type retries: int
         """
         self.host = None
         self.scheme = None
@@ -259,6 +290,9 @@ class GirderClient(object):
 
         self.progressReporterCls = progressReporterCls
         self._session = None
+        self.parallel = parallel
+        self.retries = retries
+        self._transfers = None
 
     @contextmanager
     def session(self, session=None):
@@ -292,6 +326,76 @@ class GirderClient(object):
         self._session.close()
         self._session = None
 
+    @contextmanager
+    def transfers(self, parallel=None, label='', length=0):
+        """
+        Run the file uploads and downloads started by this client within this
+        context on a :class:`girder_client.transfer.TransferPool`, so that up to
+        `parallel` files are transferred at once. Files larger than
+        :py:attr:`MAX_CHUNK_SIZE` are uploaded as numbered parts that are also
+        sent `parallel` at a time, if the assetstore allows it. The progress of
+        the transfers is reported together. Errors are raised when the context
+        exits, at the latest.
+
+        The methods that upload or download hierarchies, like :py:meth:`upload`
+        and :py:meth:`downloadResource`, open this context themselves when the
+        `parallel` value of the client is above 1.
+
+        .. code-block:: python
+
+            with gc.transfers(parallel=8):
+                for itemId in itemIds:
+                    gc.downloadItem(itemId, dest)
+
+        :param parallel: The number of files to transfer at once. Defaults to
+            the `parallel` value of the client. Nothing is run in parallel if
+            this is 1, or if a transfer context is already open.
+        :type parallel: int
+        :param label: The label of the progress of the whole transfer.
+        :type label: str
+        :param length: The total number of bytes to transfer, or 0 if unknown.
+        :type length: int
+        :returns: The transfer pool, or None if transfers are not parallel.
+        """
+        parallel = parallel or self.parallel
+        if self._transfers is not None or parallel <= 1:
+            yield self._transfers
+            return
+
+        # Fetch the cached server version before the threads need it
+        self.getServerVersion()
+        pool = TransferPool(self, parallel, label=label, length=length)
+        self._transfers = pool
+        try:
+            with pool:
+                yield pool
+        finally:
+            self._transfers = None
+
+    def _transfer(self, func, *args, **kwargs):
+        """
+        Run a file transfer on the open transfer pool, or right away if there
+        is none.
+        """
+        if self._transfers is None:
+            return func(*args, **kwargs)
+        return self._transfers.submit(func, *args, **kwargs)
+
+    def _waitTransfers(self):
+        """
+        Wait for the file transfers started so far to finish.
+        """
+        if self._transfers is not None:
+            self._transfers.wait()
+
+    def _progressReporter(self, label, length):
+        """
+        Return the progress reporter for the transfer of one file.
+        """
+        if self._transfers is not None:
+            return self._transfers.reporter()
+        return self.progressReporterCls(label=label, length=length)
+
     def authenticate(self, username=None, password=None, interactive=False, apiKey=None):
         """
         Authenticate to Girder, storing the token that comes back to be used in
@@ -888,7 +992,7 @@ class GirderClient(object):
             }
             if reference:
                 params['reference'] = reference
-            obj = self.put(path, params)
+            obj = self._createUpload('PUT', path, params, filesize)
             if '_id' not in obj:
                 raise Exception(
                     'After creating an upload token for replacing file '
@@ -908,7 +1012,7 @@ class GirderClient(object):
             }
             if reference:
                 params['reference'] = reference
-            obj = self.post('file', params)
+            obj = self._createUpload('POST', 'file', params, filesize)
             if '_id' not in obj:
                 raise Exception(
                     'After creating an upload token for a new file, expected '
@@ -951,11 +1055,11 @@ class GirderClient(object):
             chunk = stream.read(size)
             if isinstance(chunk, six.text_type):
                 chunk = chunk.encode('utf8')
-            with self.progressReporterCls(label=filename, length=size) as reporter:
+            with self._progressReporter(filename, size) as reporter:
                 return self.post(
                     'file', params, data=_ProgressBytesIO(chunk, reporter=reporter))
 
-        obj = self.post('file', params)
+        obj = self._createUpload('POST', 'file', params, size)
 
         if '_id' not in obj:
             raise Exception(
@@ -1001,6 +1105,36 @@ class GirderClient(object):
             return self.uploadStreamToFolder(folderId, f, filename, filesize, reference, mimeType,
                                              progressCallback)
 
+    def _createUpload(self, method, path, params, size):
+        """
+        Create an upload. If a transfer pool is open and the file is larger
+        than :py:attr:`MAX_CHUNK_SIZE`, the upload is created so that its
+        contents are sent as numbered parts, unless the assetstore does not
+        allow that.
+
+        :param method: 'POST' to upload a new file, or 'PUT' to replace the
+            contents of a file.
+        :param path: The path of the request that creates the upload.
+        :param params: The parameters of the request.
+        :type params: dict
+        :param size: The length of the file.
+        :type size: int
+        """
+        request = getattr(self, method.lower())
+        pool = self._transfers
+        if pool is not None and pool.partsSupported and size > self.MAX_CHUNK_SIZE:
+            try:
+                return request(path, dict(params, partSize=self.PART_SIZE))
+            except HttpError as e:
+                try:
+                    field = json.loads(e.responseText).get('field')
+                except ValueError:
+                    field = None
+                if e.status != 400 or field != 'partSize':
+                    raise
+                pool.partsSupported = False
+        return request(path, params)
+
     def _uploadContents(self, uploadObj, stream, size, progressCallback=None):
         """
         Uploads contents of a file.
@@ -1018,10 +1152,15 @@ class GirderClient(object):
             to the callable which is a dict of information about progress.
         :type progressCallback: callable
         """
+        if uploadObj.get('partSize'):
+            return self._uploadParts(uploadObj, stream, size, progressCallback)
+
         offset = 0
         uploadId = uploadObj['_id']
+        # Prior to version 2.2 the server only supported multipart uploads
+        multipart = self.getServerVersion() < ['2', '2']
 
-        with self.progressReporterCls(label=uploadObj.get('name', ''), length=size) as reporter:
+        with self._progressReporter(uploadObj.get('name', ''), size) as reporter:
 
             while True:
                 chunk = stream.read(min(self.MAX_CHUNK_SIZE, (size - offset)))
@@ -1032,24 +1171,7 @@ class GirderClient(object):
                 if isinstance(chunk, six.text_type):
                     chunk = chunk.encode('utf8')
 
-                if self.getServerVersion() >= ['2', '2']:
-                    uploadObj = self.post(
-                        'file/chunk?offset=%d&uploadId=%s' % (offset, uploadId),
-                        data=_ProgressBytesIO(chunk, reporter=reporter))
-                else:
-                    # Prior to version 2.2 the server only supported multipart uploads
-                    parameters = {
-                        'offset': offset,
-                        'uploadId': uploadId
-                    }
-
-                    m = _ProgressMultiPartEncoder(
-                        reporter=reporter,
-                        fields={'chunk': ('chunk', chunk, 'application/octet-stream')},
-                    )
-
-                    uploadObj = self.post('file/chunk', parameters=parameters,
-                                          data=m, headers={'Content-Type': m.content_type})
+                uploadObj = self._uploadChunk(uploadId, offset, chunk, reporter, multipart)
 
                 if '_id' not in uploadObj:
                     raise Exception(
@@ -1072,6 +1194,133 @@ class GirderClient(object):
 
         return uploadObj
 
+    def _uploadChunk(self, uploadId, offset, chunk, reporter, multipart=False):
+        """
+        Upload one chunk of a file. If the request fails, it is retried,
+        resuming from the offset the server reports for the upload.
+
+        :param uploadId: The ID of the upload.
+        :param offset: The offset of the chunk in the file.
+        :type offset: int
+        :param chunk: The data of the chunk.
+        :type chunk: bytes
+        :param reporter: The progress reporter of the file.
+        :param multipart: Whether to send the chunk as multipart form data.
+        :type multipart: bool
+        :returns: The upload, or the file if this was the last chunk.
+        """
+        start, data = offset, chunk
+        for attempt in range(self.retries + 1):
+            try:
+                if not multipart:
+                    return self.post(
+                        'file/chunk?offset=%d&uploadId=%s' % (offset, uploadId),
+                        data=_ProgressBytesIO(data, reporter=reporter))
+
+                parameters = {
+                    'offset': offset,
+                    'uploadId': uploadId
+                }
+
+                m = _ProgressMultiPartEncoder(
+                    reporter=reporter,
+                    fields={'chunk': ('chunk', data, 'application/octet-stream')},
+                )
+
+                return self.post('file/chunk', parameters=parameters,
+                                 data=m, headers={'Content-Type': m.content_type})
+            except requests.RequestException as e:
+                if attempt == self.retries or not _retryable(e):
+                    raise
+                excInfo = sys.exc_info()
+                time.sleep(RETRY_DELAY * (attempt + 1))
+                offset = self.get('file/offset', parameters={'uploadId': uploadId})['offset']
+                if offset == start + len(chunk):
+                    # The chunk was stored, but the response was lost
+                    return {'_id': uploadId, 'received': offset}
+                if not start <= offset < start + len(chunk):
+                    six.reraise(*excInfo)
+                data = chunk[offset - start:]
+
+    def _uploadParts(self, uploadObj, stream, size, progressCallback=None):
+        """
+        Uploads the contents of a file that was created with a part size, as
+        numbered parts that are sent in parallel on the open transfer pool.
+
+        :param uploadObj: The upload object, which has a part size.
+        :type uploadObj: dict
+        :param stream: Readable stream object.
+        :type stream: file-like
+        :param size: The length of the file.
+        :type size: int
+        :param progressCallback: If passed, will be called after each part
+            with progress information.
+        :type progressCallback: callable
+        """
+        pool = self._transfers
+        partSize = uploadObj['partSize']
+        uploadId = uploadObj['_id']
+        results = []
+        offset = 0
+
+        with self._progressReporter(uploadObj.get('name', ''), size) as reporter:
+            for partNumber in range(max(1, -(-size // partSize))):
+                data = stream.read(min(partSize, size - offset))
+                if isinstance(data, six.text_type):
+                    data = data.encode('utf8')
+                if not data:
+                    break
+                if pool is not None:
+                    results.append(pool.submitPart(
+                        self._uploadPart, uploadId, partNumber, data, reporter))
+                else:
+                    results.append(self._uploadPart(uploadId, partNumber, data, reporter))
+                offset += len(data)
+            if pool is not None:
+                results = pool.wait(results)
+
+        current = 0
+        for obj in results:
+            current = min(current + partSize, size)
+            if obj.get('_modelType') == 'file':
+                uploadObj = obj
+            if callable(progressCallback):
+                progressCallback({
+                    'current': current,
+                    'total': size
+                })
+
+        if offset != size:
+            self.delete('file/upload/' + uploadId)
+            raise IncorrectUploadLengthError(
+                'Expected upload to be %d bytes, but received %d.' % (size, offset),
+                upload=uploadObj)
+
+        return uploadObj
+
+    def _uploadPart(self, uploadId, partNumber, data, reporter):
+        """
+        Upload one numbered part of a file. Parts may be sent more than once,
+        so a failed request is simply retried.
+
+        :param uploadId: The ID of the upload.
+        :param partNumber: The zero-based index of the part.
+        :type partNumber: int
+        :param data: The data of the part.
+        :type data: bytes
+        :param reporter: The progress reporter of the file.
+        :returns: The upload, or the file if this part completed the upload.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return self.post(
+                    'file/part?uploadId=%s&partNumber=%d' % (uploadId, partNumber),
+                    data=_ProgressBytesIO(data, reporter=reporter))
+            except requests.RequestException as e:
+                if attempt == self.retries or not _retryable(e):
+                    raise
+                time.sleep(RETRY_DELAY * (attempt + 1))
+
     def uploadFile(self, parentId, stream, name, size, parentType='item',
                    progressCallback=None, reference=None, mimeType=None):
         """
@@ -1109,7 +1358,7 @@ class GirderClient(object):
         }
         if reference is not None:
             params['reference'] = reference
-        obj = self.post('file', params)
+        obj = self._createUpload('POST', 'file', params, size)
         if '_id' not in obj:
             raise Exception(
                 'After creating an upload token for a new file, expected '
@@ -1138,7 +1387,7 @@ class GirderClient(object):
         if reference:
             params['reference'] = reference
 
-        obj = self.put(path, params)
+        obj = self._createUpload('PUT', path, params, size)
         if '_id' not in obj:
             raise Exception(
                 'After creating an upload token for replacing file '
@@ -1224,13 +1473,29 @@ class GirderClient(object):
         req = self._requestFunc('get')(url, stream=True, headers={'Girder-Token': self.token})
         if not req.ok:
             raise HttpError(req.status_code, req.text, url, 'GET', response=req)
+        length = int(req.headers.get('content-length', 0))
         with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            with self.progressReporterCls(
-                    label=progressFileName,
-                    length=int(req.headers.get('content-length', 0))) as reporter:
-                for chunk in req.iter_content(chunk_size=REQ_BUFFER_SIZE):
-                    reporter.update(len(chunk))
-                    tmp.write(chunk)
+            with self._progressReporter(progressFileName, length) as reporter:
+                for attempt in range(self.retries + 1):
+                    try:
+                        for chunk in req.iter_content(chunk_size=REQ_BUFFER_SIZE):
+                            reporter.update(len(chunk))
+                            tmp.write(chunk)
+                        if tmp.tell() >= length:
+                            break
+                        # The connection was closed before the end of the file
+                        raise requests.ConnectionError(
+                            'Received %d of %d bytes.' % (tmp.tell(), length))
+                    except requests.RequestException as e:
+                        if attempt == self.retries or not _retryable(e):
+                            raise
+                    time.sleep(RETRY_DELAY * (attempt + 1))
+                    # Resume the download where it stopped
+                    req = self._requestFunc('get')(
+                        url, stream=True, params={'offset': tmp.tell()},
+                        headers={'Girder-Token': self.token})
+                    if not req.ok:
+                        raise HttpError(req.status_code, req.text, url, 'GET', response=req)
 
         # save file in cache
         if self.cache is not None:
@@ -1248,6 +1513,17 @@ class GirderClient(object):
             # delete the temp file
             os.remove(tmp.name)
 
+    def _downloadTransfers(self, resourceType, resourceId):
+        """
+        Open the transfer context for downloading a resource, see
+        :py:meth:`transfers`. Its progress is reported against the size of the
+        resource.
+        """
+        length = 0
+        if self._transfers is None and self.parallel > 1:
+            length = self.getResource(resourceType, resourceId).get('size', 0)
+        return self.transfers(label='Downloading', length=length)
+
     def downloadItem(self, itemId, dest, name=None):
         """
         Download an item from Girder into a local folder. Each file in the
@@ -1261,43 +1537,48 @@ class GirderClient(object):
         :param name: If the item name is known in advance, you may pass it here
             which will save a lookup to the server.
         """
-        if name is None:
-            item = self.get('item/' + itemId)
-            name = item['name']
+        with self._downloadTransfers('item', itemId):
+            if name is None:
+                item = self.get('item/' + itemId)
+                name = item['name']
 
-        offset = 0
-        first = True
-        while True:
-            files = self.get('item/%s/files' % itemId, parameters={
-                'limit': DEFAULT_PAGE_LIMIT,
-                'offset': offset
-            })
+            offset = 0
+            first = True
+            while True:
+                files = self.get('item/%s/files' % itemId, parameters={
+                    'limit': DEFAULT_PAGE_LIMIT,
+                    'offset': offset
+                })
 
-            if first:
-                if len(files) == 1 and files[0]['name'] == name:
-                    self.downloadFile(
-                        files[0]['_id'],
-                        os.path.join(dest, self.transformFilename(name)),
-                        created=files[0]['created'])
+                if first:
+                    if len(files) == 1 and files[0]['name'] == name:
+                        self._transfer(
+                            self.downloadFile,
+                            files[0]['_id'],
+                            os.path.join(dest, self.transformFilename(name)),
+                            created=files[0]['created'])
+                        break
+                    else:
+                        dest = os.path.join(dest, self.transformFilename(name))
+                        _safeMakedirs(dest)
+
+                for file in files:
+                    self._transfer(
+                        self.downloadFile,
+                        file['_id'],
+                        os.path.join(dest, self.transformFilename(file['name'])),
+                        created=file['created'])
+
+                first = False
+                offset += len(files)
+                if len(files) < DEFAULT_PAGE_LIMIT:
                     break
-                else:
-                    dest = os.path.join(dest, self.transformFilename(name))
-                    _safeMakedirs(dest)
-
-            for file in files:
-                self.downloadFile(
-                    file['_id'],
-                    os.path.join(dest, self.transformFilename(file['name'])),
-                    created=file['created'])
-
-            first = False
-            offset += len(files)
-            if len(files) < DEFAULT_PAGE_LIMIT:
-                break
 
     def downloadFolderRecursive(self, folderId, dest, sync=False):
         """
-        Download a folder recursively from Girder into a local directory.
+        Download a folder recursively from Girder into a local directory. If
+        the `parallel` value of the client is above 1, several files are
+        downloaded at once, see :py:meth:`transfers`.
 
         :param folderId: Id of the Girder folder or resource path to download.
         :type folderId: ObjectId or Unix-style path to the resource in Girder.
@@ -1309,48 +1590,51 @@ class GirderClient(object):
         """
         offset = 0
         folderId = self._checkResourcePath(folderId)
-        while True:
-            folders = self.get('folder', parameters={
-                'limit': DEFAULT_PAGE_LIMIT,
-                'offset': offset,
-                'parentType': 'folder',
-                'parentId': folderId
-            })
+        with self._downloadTransfers('folder', folderId):
+            while True:
+                folders = self.get('folder', parameters={
+                    'limit': DEFAULT_PAGE_LIMIT,
+                    'offset': offset,
+                    'parentType': 'folder',
+                    'parentId': folderId
+                })
 
-            for folder in folders:
-                local = os.path.join(dest, self.transformFilename(folder['name']))
-                _safeMakedirs(local)
+                for folder in folders:
+                    local = os.path.join(dest, self.transformFilename(folder['name']))
+                    _safeMakedirs(local)
 
-                self.downloadFolderRecursive(folder['_id'], local, sync=sync)
+                    self.downloadFolderRecursive(folder['_id'], local, sync=sync)
 
-            offset += len(folders)
-            if len(folders) < DEFAULT_PAGE_LIMIT:
-                break
+                offset += len(folders)
+                if len(folders) < DEFAULT_PAGE_LIMIT:
+                    break
 
-        offset = 0
+            offset = 0
 
-        while True:
-            items = self.get('item', parameters={
-                'folderId': folderId,
-                'limit': DEFAULT_PAGE_LIMIT,
-                'offset': offset
-            })
+            while True:
+                items = self.get('item', parameters={
+                    'folderId': folderId,
+                    'limit': DEFAULT_PAGE_LIMIT,
+                    'offset': offset
+                })
 
-            for item in items:
-                _id = item['_id']
-                self.incomingMetadata[_id] = item
-                if (sync and _id in self.localMetadata and
-                        _compareDicts(item, self.localMetadata[_id])):
-                    continue
-                self.downloadItem(item['_id'], dest, name=item['name'])
+                for item in items:
+                    _id = item['_id']
+                    self.incomingMetadata[_id] = item
+                    if (sync and _id in self.localMetadata and
+                            _compareDicts(item, self.localMetadata[_id])):
+                        continue
+                    self._transfer(self.downloadItem, item['_id'], dest, name=item['name'])
 
-            offset += len(items)
-            if len(items) < DEFAULT_PAGE_LIMIT:
-                break
+                offset += len(items)
+                if len(items) < DEFAULT_PAGE_LIMIT:
+                    break
 
     def downloadResource(self, resourceId, dest, resourceType='folder', sync=False):
         """
         Download a collection, user, or folder recursively from Girder into a local directory.
+        If the `parallel` value of the client is above 1, several files are
+        downloaded at once, see :py:meth:`transfers`.
 
         :param resourceId: ID or path of the resource to download.
         :type resourceId: ObjectId or Unix-style path to the resource in Girder.
@@ -1369,23 +1653,24 @@ class GirderClient(object):
         elif resourceType in ('collection', 'user'):
             offset = 0
             resourceId = self._checkResourcePath(resourceId)
-            while True:
-                folders = self.get('folder', parameters={
-                    'limit': DEFAULT_PAGE_LIMIT,
-                    'offset': offset,
-                    'parentType': resourceType,
-                    'parentId': resourceId
-                })
+            with self._downloadTransfers(resourceType, resourceId):
+                while True:
+                    folders = self.get('folder', parameters={
+                        'limit': DEFAULT_PAGE_LIMIT,
+                        'offset': offset,
+                        'parentType': resourceType,
+                        'parentId': resourceId
+                    })
 
-                for folder in folders:
-                    local = os.path.join(dest, self.transformFilename(folder['name']))
-                    _safeMakedirs(local)
+                    for folder in folders:
+                        local = os.path.join(dest, self.transformFilename(folder['name']))
+                        _safeMakedirs(local)
 
-                    self.downloadFolderRecursive(folder['_id'], local, sync=sync)
+                        self.downloadFolderRecursive(folder['_id'], local, sync=sync)
 
-                offset += len(folders)
-                if len(folders) < DEFAULT_PAGE_LIMIT:
-                    break
+                    offset += len(folders)
+                    if len(folders) < DEFAULT_PAGE_LIMIT:
+                        break
         else:
             raise Exception('Invalid resource type: %s' % resourceType)
 
@@ -1411,6 +1696,239 @@ class GirderClient(object):
         except (IOError, OSError):
             print('Local metadata does not exists. Falling back to download.')
 
+    def getFolderManifest(self, folderId):
+        """
+        Iterate over the records of every folder, item, and file below a folder
+        that can be read, as the server streams them. Folders are listed
+        before their contents and items directly before their files. Each
+        record has its ``type``, ``_id``, ``name``, ``updated`` time, and
+        ``path`` relative to the folder. Folders also have their ``parentId``,
+        items their ``folderId`` and ``size``, and files their ``itemId``,
+        ``size``, and ``sha512``, which is None if the server does not know it.
+
+        :param folderId: The ID of the folder.
+        :type folderId: str
+        :returns: A generator of dicts.
+        """
+        url = '%sfolder/%s/manifest' % (self.urlBase, folderId)
+        req = self._requestFunc('get')(url, stream=True, headers={'Girder-Token': self.token})
+        if not req.ok:
+            raise HttpError(req.status_code, req.text, url, 'GET', response=req)
+        for line in req.iter_lines():
+            if line:
+                yield json.loads(line.decode('utf8'))
+
+    def syncFolder(self, folderId, dest, download=True, upload=True):
+        """
+        Synchronize a Girder folder with a local directory, transferring only
+        the files that changed on either side since they were last
+        synchronized. The folder is listed with a single request, see
+        :py:meth:`getFolderManifest`, and the state of each file after it was
+        synchronized is kept in a SQLite database in `dest`, see
+        :class:`girder_client.sync.SyncIndex`. Files are laid out as by
+        :py:meth:`downloadFolderRecursive`. If the `parallel` value of the
+        client is above 1, several files are transferred at once, see
+        :py:meth:`transfers`.
+
+        A file is downloaded if it is missing locally or only changed on the
+        server, and its contents are uploaded if it only changed locally. New
+        local files are uploaded, creating folders for new directories. A file
+        that changed on both sides is left alone and reported. Deletions are
+        not synchronized, but a file that was deleted on the server is not
+        uploaded again. A local file that was never synchronized but has the
+        size and hash of the file on the server is just recorded as current.
+        Otherwise, including when the server does not know the hash of the
+        file, it is transferred when synchronizing in one direction, and left
+        alone and reported when synchronizing in both.
+
+        :param folderId: ID or path of the Girder folder.
+        :type folderId: ObjectId or Unix-style path to the resource in Girder.
+        :param dest: The local directory, which is created if needed.
+        :type dest: str
+        :param download: Whether to download the files that changed on the
+            server.
+        :type download: bool
+        :param upload: Whether to upload the files that changed locally.
+        :type upload: bool
+        """
+        folderId = self._checkResourcePath(folderId)
+        _safeMakedirs(dest)
+        remote, folders, itemDirs = self._syncManifest(folderId)
+        localFolders = {path: _id for _id, path in six.iteritems(folders)}
+
+        with SyncIndex(os.path.join(dest, INDEX_NAME)) as index:
+            with self.transfers(label='Synchronizing'):
+                if download:
+                    for path in itertools.chain(folders.values(), itemDirs):
+                        _safeMakedirs(os.path.join(dest, path))
+
+                for path, file in six.iteritems(remote):
+                    localPath = os.path.join(dest, path)
+                    action = self._syncAction(
+                        index.get(path), file, localPath, download, upload)
+                    if action == 'record':
+                        stat = os.stat(localPath)
+                        index.set(path, file, stat.st_mtime, stat.st_size)
+                    elif action == 'download' and download:
+                        self._transfer(self._syncDownload, index, path, localPath, file)
+                    elif action == 'upload' and upload:
+                        self._transfer(self._syncUpload, index, path, localPath, file['_id'])
+                    elif action == 'conflict':
+                        print('File %s differs locally and on the server, skipping' % localPath)
+
+                indexed = index.paths()
+                local = set()
+                for root, dirs, files in os.walk(dest):
+                    relRoot = os.path.relpath(root, dest)
+                    relRoot = '' if relRoot == os.curdir else relRoot
+                    if relRoot in itemDirs:
+                        # The files of an item have no subdirectories
+                        dirs[:] = []
+                    for name in files:
+                        path = os.path.join(relRoot, name)
+                        local.add(path)
+                        # Skip the index and the metadata of downloadFolderRecursive
+                        ignored = not relRoot and name.startswith((INDEX_NAME, '.girder_metadata'))
+                        if not upload or ignored or path in remote or path in indexed:
+                            continue
+                        if relRoot in itemDirs:
+                            parentId, parentType = itemDirs[relRoot], 'item'
+                        else:
+                            parentId = self._syncFolderId(relRoot, localFolders)
+                            parentType = 'folder'
+                        self._transfer(
+                            self._syncUpload, index, path, os.path.join(root, name), None,
+                            parentId, parentType)
+
+                # Forget the files that were deleted on both sides
+                for path in indexed - local - set(remote):
+                    index.remove(path)
+
+    def _syncManifest(self, folderId):
+        """
+        Lay out the files of a folder manifest as :py:meth:`downloadItem` would.
+
+        :returns: A dict mapping the local path of each file to its record, a
+            dict mapping the ID of each folder to its local path, and a dict
+            mapping the local path of each item that is stored as a directory
+            to its ID. The paths are relative to the synchronized directory.
+        """
+        remote = {}
+        folders = {folderId: ''}
+        itemDirs = {}
+        item, files = None, []
+        for record in itertools.chain(self.getFolderManifest(folderId), [None]):
+            if record is not None and record['type'] == 'file':
+                files.append(record)
+                continue
+            if item is not None:
+                path = os.path.join(folders[item['folderId']], self.transformFilename(item['name']))
+                if len(files) == 1 and files[0]['name'] == item['name']:
+                    remote[path] = files[0]
+                else:
+                    itemDirs[path] = item['_id']
+                    for file in files:
+                        remote[os.path.join(path, self.transformFilename(file['name']))] = file
+            item, files = None, []
+            if record is None:
+                break
+            if record['type'] == 'folder':
+                folders[record['_id']] = os.path.join(
+                    folders[record['parentId']], self.transformFilename(record['name']))
+            else:
+                item = record
+        return remote, folders, itemDirs
+
+    def _syncAction(self, entry, file, localPath, download, upload):
+        """
+        Decide how to synchronize a file of the manifest with its local copy.
+
+        :param entry: The state of the file recorded in the index, or None.
+        :param file: The record of the file in the manifest.
+        :param localPath: The path of the local copy.
+        :param download: Whether files that changed on the server are
+            downloaded.
+        :param upload: Whether files that changed locally are uploaded.
+        :returns: 'download', 'upload', 'record' if the copies already match
+            but were not recorded, 'conflict', or None if nothing changed.
+        """
+        if not os.path.isfile(localPath):
+            return 'download'
+        stat = os.stat(localPath)
+        if entry is None or entry['fileId'] != file['_id']:
+            # The local file may already be a copy that was never recorded.
+            # Without a hash from the server there is no telling. Otherwise
+            # there is no knowing which side changed, so when synchronizing
+            # both ways neither copy is overwritten.
+            if (file['sha512'] is not None and stat.st_size == file['size'] and
+                    file['sha512'] == sha512(localPath)):
+                return 'record'
+            if download and upload:
+                return 'conflict'
+            return 'download' if download else 'upload'
+
+        localChanged = (stat.st_mtime, stat.st_size) != (entry['mtime'], entry['localSize'])
+        if file['sha512'] and entry['sha512']:
+            remoteChanged = file['sha512'] != entry['sha512']
+        else:
+            remoteChanged = (file['size'], file['updated']) != (entry['size'], entry['updated'])
+        if localChanged and remoteChanged:
+            return 'conflict'
+        if remoteChanged:
+            return 'download'
+        if localChanged:
+            return 'upload'
+
+    def _syncDownload(self, index, path, localPath, file):
+        """
+        Download a file of the manifest and record it in the index.
+        """
+        # The update time changes with the contents, so it can key the cache
+        self.downloadFile(file['_id'], localPath, created=file['updated'])
+        stat = os.stat(localPath)
+        index.set(path, file, stat.st_mtime, stat.st_size)
+
+    def _syncUpload(self, index, path, localPath, fileId, parentId=None, parentType=None):
+        """
+        Upload a local file and record it in the index, either replacing the
+        contents of the file with the given ID, or as a new file in the given
+        item or folder.
+        """
+        stat = os.stat(localPath)
+        digest = sha512(localPath)
+        with open(localPath, 'rb') as fh:
+            if fileId is not None:
+                self.uploadFileContents(fileId, fh, stat.st_size)
+            else:
+                fileId = self.uploadFile(
+                    parentId, fh, os.path.basename(localPath), stat.st_size,
+                    parentType=parentType)['_id']
+        # Fetch the file as stored rather than as returned by the upload
+        file = self.getFile(fileId)
+        file = {
+            '_id': file['_id'],
+            'size': file['size'],
+            'updated': max(file['created'], file.get('updated', file['created'])),
+            'sha512': digest
+        }
+        index.set(path, file, stat.st_mtime, stat.st_size)
+
+    def _syncFolderId(self, path, localFolders):
+        """
+        Return the ID of the Girder folder of a local directory, creating
+        the folders of the directory and its parents as needed.
+
+        :param path: The path of the directory, relative to the synchronized
+            directory.
+        :param localFolders: A dict mapping local paths to folder IDs, which is
+            updated with the created folders.
+        """
+        if path not in localFolders:
+            parent, name = os.path.split(path)
+            localFolders[path] = self.loadOrCreateFolder(
+                name, self._syncFolderId(parent, localFolders), 'folder')['_id']
+        return localFolders[path]
+
     def inheritAccessControlRecursive(self, ancestorFolderId, access=None, public=None):
         """
         Take the access control and public value of a folder and recursively
@@ -1539,21 +2057,28 @@ class GirderClient(object):
         if not self.progressReporterCls.reportProgress:
             print('Uploading Item from %s' % localFile)
         if not dryRun:
-            # If we are reusing existing items or have upload callbacks, then
-            # we need to know the item as part of the process.  If this is a
-            # zero-length file, we create an item.  Otherwise, we can just
-            # upload to the parent folder and never learn about the created
-            # item.
-            if reuseExisting or len(self._itemUploadCallbacks) or os.path.getsize(filePath) == 0:
-                currentItem = self.loadOrCreateItem(
-                    os.path.basename(localFile), parentFolderId, reuseExisting)
-                self.uploadFileToItem(
-                    currentItem['_id'], filePath, filename=localFile, reference=reference)
-                for callback in self._itemUploadCallbacks:
-                    callback(currentItem, filePath)
-            else:
-                self.uploadFileToFolder(
-                    parentFolderId, filePath, filename=localFile, reference=reference)
+            self._transfer(
+                self._uploadItemFile, localFile, parentFolderId, filePath, reuseExisting,
+                reference)
+
+    def _uploadItemFile(self, localFile, parentFolderId, filePath, reuseExisting=False,
+                        reference=None):
+        """Upload a file as an item, see :py:meth:`_uploadAsItem`."""
+        # If we are reusing existing items or have upload callbacks, then
+        # we need to know the item as part of the process.  If this is a
+        # zero-length file, we create an item.  Otherwise, we can just
+        # upload to the parent folder and never learn about the created
+        # item.
+        if reuseExisting or len(self._itemUploadCallbacks) or os.path.getsize(filePath) == 0:
+            currentItem = self.loadOrCreateItem(
+                os.path.basename(localFile), parentFolderId, reuseExisting)
+            self.uploadFileToItem(
+                currentItem['_id'], filePath, filename=localFile, reference=reference)
+            for callback in self._itemUploadCallbacks:
+                callback(currentItem, filePath)
+        else:
+            self.uploadFileToFolder(
+                parentFolderId, filePath, filename=localFile, reference=reference)
 
     def _uploadFolderAsItem(self, localFolder, parentFolderId, reuseExisting=False, blacklist=None,
                             dryRun=False, reference=None):
@@ -1585,9 +2110,10 @@ class GirderClient(object):
             print('Adding file %s, (%d of %d) to Item' % (currentFile, ind + 1, filecount))
 
             if not dryRun:
-                self.uploadFileToItem(item['_id'], filepath, filename=currentFile)
+                self._transfer(self.uploadFileToItem, item['_id'], filepath, filename=currentFile)
 
-        if not dryRun:
+        if not dryRun and self._itemUploadCallbacks:
+            self._waitTransfers()
             for callback in self._itemUploadCallbacks:
                 callback(item, localFolder)
 
@@ -1649,7 +2175,8 @@ class GirderClient(object):
                         entry, folder['_id'], fullEntry, reuseExisting, dryRun=dryRun,
                         reference=reference)
 
-            if not dryRun:
+            if not dryRun and self._folderUploadCallbacks:
+                self._waitTransfers()
                 for callback in self._folderUploadCallbacks:
                     callback(folder, localFolder)
 
@@ -1659,7 +2186,9 @@ class GirderClient(object):
         Upload a pattern of files.
 
         This will recursively walk down every tree in the file pattern to
-        create a hierarchy on the server under the parentId.
+        create a hierarchy on the server under the parentId. If the `parallel`
+        value of the client is above 1, several files are uploaded at once,
+        see :py:meth:`transfers`.
 
         :param filePattern: a glob pattern for files that will be uploaded,
             recursively copying any file folder structures.  If this is a list
@@ -1685,31 +2214,53 @@ class GirderClient(object):
         blacklist = blacklist or []
         empty = True
         parentId = self._checkResourcePath(parentId)
-        for pattern in filePatternList:
-            for currentFile in glob.iglob(pattern):
-                empty = False
-                currentFile = os.path.normpath(currentFile)
-                filename = os.path.basename(currentFile)
-                if filename in blacklist:
-                    if dryRun:
-                        print('Ignoring file %s as it is blacklisted' % filename)
-                    continue
-                if os.path.isfile(currentFile):
-                    if parentType != 'folder':
-                        raise Exception(
-                            'Attempting to upload an item under a %s. Items can only be added to '
-                            'folders.' % parentType)
+        length = 0
+        if not dryRun and self._transfers is None and self.parallel > 1:
+            length = sum(self._localSize(path, blacklist)
+                         for pattern in filePatternList for path in glob.iglob(pattern))
+        with self.transfers(parallel=1 if dryRun else None, label='Uploading', length=length):
+            for pattern in filePatternList:
+                for currentFile in glob.iglob(pattern):
+                    empty = False
+                    currentFile = os.path.normpath(currentFile)
+                    filename = os.path.basename(currentFile)
+                    if filename in blacklist:
+                        if dryRun:
+                            print('Ignoring file %s as it is blacklisted' % filename)
+                        continue
+                    if os.path.isfile(currentFile):
+                        if parentType != 'folder':
+                            raise Exception(
+                                'Attempting to upload an item under a %s. Items can only be '
+                                'added to folders.' % parentType)
+                        else:
+                            self._uploadAsItem(
+                                os.path.basename(currentFile), parentId, currentFile,
+                                reuseExisting, dryRun=dryRun, reference=reference)
                     else:
-                        self._uploadAsItem(
-                            os.path.basename(currentFile), parentId, currentFile, reuseExisting,
-                            dryRun=dryRun, reference=reference)
-                else:
-                    self._uploadFolderRecursive(
-                        currentFile, parentId, parentType, leafFoldersAsItems, reuseExisting,
-                        blacklist=blacklist, dryRun=dryRun, reference=reference)
+                        self._uploadFolderRecursive(
+                            currentFile, parentId, parentType, leafFoldersAsItems, reuseExisting,
+                            blacklist=blacklist, dryRun=dryRun, reference=reference)
         if empty:
             print('No matching files: ' + repr(filePattern))
 
+    def _localSize(self, path, blacklist):
+        """
+        Return the total size of the files that :py:meth:`upload` would upload
+        from a local path. This is only used to report progress.
+        """
+        path = os.path.normpath(path)
+        if os.path.basename(path) in blacklist:
+            return 0
+        if os.path.isfile(path):
+            return os.path.getsize(path)
+        size = 0
+        for entry in os.listdir(path):
+            fullEntry = os.path.join(path, entry)
+            if entry not in blacklist and not os.path.islink(fullEntry):
+                size += self._localSize(fullEntry, blacklist)
+        return size
+
     def _checkResourcePath(self, objId):
         if isinstance(objId, six.string_types) and objId.startswith('/'):
             obj = self.resourceLookup(objId, test=True)
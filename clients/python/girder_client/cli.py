@@ -216,6 +216,9 @@ def _CommonParameters(path_exists=False, path_writable=True,
                 nargs=1 if not multiple_local else -1,
                 required=multiple_local
             ),
+            click.option('--parallel', default=1, show_default=True, type=click.IntRange(1),
+                         help='number of files, and of parts of large files, to transfer at '
+                              'once'),
         ]
         for decorator in reversed(decorators):
             func = decorator(func)
@@ -234,7 +237,8 @@ _short_help = 'Download files from Girder'
     _short_help, _common_help.replace('LOCAL_FOLDER', 'LOCAL_FOLDER (default: ".")')))
 @_CommonParameters(additional_parent_types=['collection', 'user', 'item'], path_default='.')
 @click.pass_obj
-def _download(gc, parent_type, parent_id, local_folder):
+def _download(gc, parent_type, parent_id, local_folder, parallel):
+    gc.parallel = parallel
     if parent_type == 'auto':
         parent_type = _lookup_parent_type(gc, parent_id)
     if parent_type == 'item':
@@ -248,13 +252,16 @@ _short_help = 'Synchronize local folder with remote Girder folder'
 
 @main.command('localsync', short_help=_short_help, help='%s\n\n%s' % (_short_help, _common_help))
 @_CommonParameters(additional_parent_types=[])
+@click.option('--direction', default='download', show_default=True,
+              type=click.Choice(['download', 'upload', 'both']),
+              help='transfer the files that changed remotely, locally, or on either side')
 @click.pass_obj
-def _localsync(gc, parent_type, parent_id, local_folder):
+def _localsync(gc, parent_type, parent_id, local_folder, direction, parallel):
     if parent_type != 'folder':
         raise Exception('localsync command only accepts parent-type of folder')
-    gc.loadLocalMetadata(local_folder)
-    gc.downloadFolderRecursive(parent_id, local_folder, sync=True)
-    gc.saveLocalMetadata(local_folder)
+    gc.parallel = parallel
+    gc.syncFolder(parent_id, local_folder, download=direction in ('download', 'both'),
+                  upload=direction in ('upload', 'both'))
 
 
 _short_help = 'Upload files to Girder'
@@ -277,7 +284,8 @@ _short_help = 'Upload files to Girder'
               help='optional reference to send along with the upload')
 @click.pass_obj
 def _upload(gc, parent_type, parent_id, local_folder,
-            leaf_folders_as_items, reuse, blacklist, dry_run, reference):
+            leaf_folders_as_items, reuse, blacklist, dry_run, reference, parallel):
+    gc.parallel = parallel
     if parent_type == 'auto':
         parent_type = _lookup_parent_type(gc, parent_id)
     gc.upload(
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+import hashlib
+import sqlite3
+import threading
+
+# Name of the index database within a synchronized directory
+INDEX_NAME = '.girder_sync.db'
+# Number of changes to the index between commits, so that an interrupted
+# synchronization does not need to start over
+_COMMIT_INTERVAL = 1000
+_HASH_BUFFER_SIZE = 65536
+
+
+def sha512(path):
+    """
+    Return the hex digest of the SHA-512 hash of a local file, as the server
+    records it.
+
+    :param path: The path of the file.
+    :type path: str
+    """
+    digest = hashlib.sha512()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(_HASH_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SyncIndex(object):
+    """
+    Records the state of each file of a local copy of a Girder folder as of
+    the last time it was synchronized, in a SQLite database: the ID, size,
+    update time, and SHA-512 hash of the file on the server, and the
+    modification time and size of the local file. Comparing these with the
+    folder manifest and the local files tells which side of each file
+    changed since then.
+
+    This is normally used through :py:meth:`GirderClient.syncFolder`. The
+    index may be updated from several transfer threads at once.
+    """
+    def __init__(self, path):
+        """
+        :param path: The path of the database file, which is created if needed.
+        :type path: str
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._changes = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, fileId TEXT, size INTEGER, updated TEXT, '
+            'sha512 TEXT, mtime REAL, localSize INTEGER)')
+        self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        """
+        Commit the pending changes and close the database.
+        """
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def get(self, path):
+        """
+        Get the recorded state of a file.
+
+        :param path: The path of the file, relative to the synchronized
+            directory.
+        :type path: str
+        :returns: The recorded state as a dict, or None if the file has not
+            been synchronized.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT * FROM files WHERE path = ?', (path, )).fetchone()
+        return dict(row) if row is not None else None
+
+    def paths(self):
+        """
+        Return the set of paths of all synchronized files.
+        """
+        with self._lock:
+            return {row[0] for row in self._db.execute('SELECT path FROM files')}
+
+    def set(self, path, file, mtime, localSize):
+        """
+        Record the state of a file once both copies match.
+
+        :param path: The path of the file, relative to the synchronized
+            directory.
+        :type path: str
+        :param file: The ``_id``, ``size``, ``updated``, and ``sha512`` of the
+            file on the server.
+        :type file: dict
+        :param mtime: The modification time of the local file.
+        :type mtime: float
+        :param localSize: The size of the local file.
+        :type localSize: int
+        """
+        self._change(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (path, file['_id'], file['size'], file['updated'], file.get('sha512'),
+             mtime, localSize))
+
+    def remove(self, path):
+        """
+        Forget the state of a file.
+
+        :param path: The path of the file, relative to the synchronized
+            directory.
+        :type path: str
+        """
+        self._change('DELETE FROM files WHERE path = ?', (path, ))
+
+    def _change(self, statement, values):
+        with self._lock:
+            self._db.execute(statement, values)
+            self._changes += 1
+            if self._changes % _COMMIT_INTERVAL == 0:
+                self._db.commit()
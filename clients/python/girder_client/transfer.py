@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+import multiprocessing.pool
+import requests
+import threading
+
+from requests.adapters import HTTPAdapter
+
+# Seconds between checks for interrupts while waiting for a transfer
+_WAIT_INTERVAL = 1
+
+
+def _get(result):
+    """
+    Return the value of an asynchronous result, raising its exception if it
+    failed. Waits in short intervals so that the wait can be interrupted.
+    """
+    while not result.ready():
+        result.wait(_WAIT_INTERVAL)
+    return result.get()
+
+
+class _SharedProgressReporter(object):
+    """
+    Progress reporter of a single file transfer that adds its progress to the
+    reporter of the whole transfer pool.
+    """
+    def __init__(self, pool):
+        self.pool = pool
+
+    def update(self, chunkSize):
+        self.pool.updateProgress(chunkSize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        pass
+
+
+class TransferPool(object):
+    """
+    Runs the file uploads and downloads of a
+    :class:`girder_client.GirderClient` concurrently. Whole files are
+    transferred on one pool of threads, and the numbered parts of large uploads
+    on another, so that a file waiting for its parts never keeps the parts from
+    running. Unless the client already uses a session, the requests share one
+    whose HTTP connection pool is sized to the threads, so that connections
+    are kept alive between requests. The progress of all of the transfers is
+    reported together.
+
+    This is normally used through :py:meth:`GirderClient.transfers`.
+    """
+    def __init__(self, client, parallel, label='', length=0):
+        """
+        :param client: The client whose transfers to run.
+        :type client: girder_client.GirderClient
+        :param parallel: The number of files, and of parts of large files, to
+            transfer at once.
+        :type parallel: int
+        :param label: The label of the progress of the whole transfer.
+        :type label: str
+        :param length: The total number of bytes to transfer, or 0 if unknown.
+        :type length: int
+        """
+        self.client = client
+        self.parallel = parallel
+        self.label = label
+        self.length = length
+        # Cleared when the server refuses uploads in parts
+        self.partsSupported = True
+
+        self._lock = threading.Lock()
+        self._pending = []
+        # Bounds the number of parts that have been read but not yet sent
+        self._partSlots = threading.BoundedSemaphore(parallel)
+        self._files = None
+        self._parts = None
+        self._session = None
+        self._reporter = None
+
+    def __enter__(self):
+        self._files = multiprocessing.pool.ThreadPool(self.parallel)
+        self._parts = multiprocessing.pool.ThreadPool(self.parallel)
+        if self.client._session is None:
+            self._session = requests.Session()
+            for prefix in ('http://', 'https://'):
+                self._session.mount(prefix, HTTPAdapter(pool_maxsize=self.parallel * 2))
+            self.client._session = self._session
+        self._reporter = self.client.progressReporterCls(label=self.label, length=self.length)
+        self._reporter.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        try:
+            if exc_type is None:
+                self.wait()
+        except Exception:
+            exc_type = True
+            raise
+        finally:
+            for pool in (self._files, self._parts):
+                if exc_type is None:
+                    pool.close()
+                else:
+                    pool.terminate()
+                pool.join()
+            self._reporter.__exit__(None, None, None)
+            if self._session is not None:
+                self.client._session = None
+                self._session.close()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Run the transfer of a file on the pool. Its result is waited for by
+        :py:meth:`wait` or when the pool is closed.
+
+        :param func: The function that transfers the file.
+        :returns: The asynchronous result of the function.
+        """
+        result = self._files.apply_async(func, args, kwargs)
+        with self._lock:
+            self._pending.append(result)
+        return result
+
+    def submitPart(self, func, *args):
+        """
+        Run the transfer of a part of a file on the pool. This blocks while
+        as many parts as there are threads are waiting to be sent, so that
+        parts are not read much faster than they are sent.
+
+        :param func: The function that transfers the part.
+        :returns: The asynchronous result of the function, which the caller
+            must wait for.
+        """
+        self._partSlots.acquire()
+
+        def run():
+            try:
+                return func(*args)
+            finally:
+                self._partSlots.release()
+
+        return self._parts.apply_async(run)
+
+    def wait(self, results=None):
+        """
+        Wait for transfers to finish. If any of them failed, the first error
+        is raised.
+
+        :param results: The asynchronous results to wait for, or None to wait
+            for every file transfer submitted so far, including those submitted
+            while waiting.
+        :returns: The values of ``results``, if it was passed.
+        """
+        if results is not None:
+            return [_get(result) for result in results]
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                result = self._pending.pop(0)
+            _get(result)
+
+    def reporter(self):
+        """
+        Return a progress reporter for the transfer of one file.
+        """
+        return _SharedProgressReporter(self)
+
+    def updateProgress(self, chunkSize):
+        with self._lock:
+            self._reporter.update(chunkSize)
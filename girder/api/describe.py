@@ -18,24 +18,29 @@
 ###############################################################################
 
 import bson.json_util
+import collections
 import dateutil.parser
+import hashlib
 try:
     from inspect import signature, Parameter
 except ImportError:
     from funcsigs import signature, Parameter
+import json
 import jsonschema
 import os
 import six
 import cherrypy
+import threading
+import zlib
 
 from girder import constants, events, logprint
 from girder.api.rest import getCurrentUser, RestException, getBodyJson
 from girder.constants import CoreEventHandler, SettingKey
-from girder.utility import config, toBool
+from girder.utility import config, toBool, JsonEncoder
 from girder.utility.model_importer import ModelImporter
 from girder.utility.webroot import WebrootBase
 from . import docs, access
-from .rest import Resource, getApiUrl, getUrlParts
+from .rest import Resource, getApiUrl, getUrlParts, setRawResponse, setResponseHeader
 
 """
 Whenever we add new return values or new options we should increment the
@@ -469,13 +474,79 @@ class ApiDocs(WebrootBase):
                 SettingKey.BRAND_NAME)})
 
 
+# Number of hosts and base paths whose serialized API description is kept. The
+# host and base path may come from the Referer header of any client, so the
+# cache must be bounded.
+SERIALIZED_CACHE_SIZE = 8
+
+
 class Describe(Resource):
     def __init__(self):
         super(Describe, self).__init__()
         self.route('GET', (), self.listResources, nodoc=True)
+        # Serialized documents by host and base path, for one docs revision,
+        # from the least to the most recently used
+        self._cache = collections.OrderedDict()
+        self._cacheRevision = None
+        self._cacheLock = threading.Lock()
 
     @access.public
     def listResources(self, params):
+        urlParts = getUrlParts(getApiUrl(preferReferer=True))
+        host = urlParts.netloc
+        basePath = urlParts.path
+
+        for accept in cherrypy.request.headers.elements('Accept'):
+            if accept.value == 'application/json':
+                break
+            elif accept.value == 'text/html':  # pragma: no cover
+                # Let the HTML rendering of regular responses handle it
+                return self._describe(host, basePath)
+
+        body, gzipped, etag = self._getSerialized(host, basePath)
+        setRawResponse()
+        setResponseHeader('Content-Type', 'application/json')
+        setResponseHeader('ETag', etag)
+        setResponseHeader('Vary', 'Accept, Accept-Encoding, Referer')
+
+        ifNoneMatch = cherrypy.request.headers.get('If-None-Match', '')
+        if etag in [tag.strip() for tag in ifNoneMatch.split(',')] or ifNoneMatch == '*':
+            cherrypy.response.status = 304
+            return b''
+        if any(encoding.value == 'gzip' for encoding in
+               cherrypy.request.headers.elements('Accept-Encoding')):
+            setResponseHeader('Content-Encoding', 'gzip')
+            return gzipped
+        return body
+
+    def _getSerialized(self, host, basePath):
+        """
+        Return the JSON serialization of the API description, its gzipped
+        version, and its entity tag. These are kept for the most recently used
+        hosts and base paths until routes or models are added or removed.
+        """
+        key = (host, basePath)
+        with self._cacheLock:
+            if self._cacheRevision != docs.getRevision():
+                self._cache.clear()
+                self._cacheRevision = docs.getRevision()
+            if key in self._cache:
+                # Mark it as the most recently used
+                self._cache[key] = self._cache.pop(key)
+                return self._cache[key]
+
+            body = json.dumps(
+                self._describe(host, basePath), sort_keys=True, allow_nan=False,
+                cls=JsonEncoder).encode('utf8')
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            gzipped = compressor.compress(body) + compressor.flush()
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            self._cache[key] = (body, gzipped, etag)
+            while len(self._cache) > SERIALIZED_CACHE_SIZE:
+                self._cache.popitem(last=False)
+            return self._cache[key]
+
+    def _describe(self, host, basePath):
         # Paths Object
         paths = {}
 
@@ -505,11 +576,6 @@ class Describe(Resource):
 
                 paths[route] = pathItem
 
-        apiUrl = getApiUrl(preferReferer=True)
-        urlParts = getUrlParts(apiUrl)
-        host = urlParts.netloc
-        basePath = urlParts.path
-
         return {
             'swagger': SWAGGER_VERSION,
             'info': {
@@ -27,6 +27,21 @@ models = collections.defaultdict(dict)
 # e.g. routes[resource][path][method]
 routes = collections.defaultdict(
     functools.partial(collections.defaultdict, dict))
+# Incremented whenever routes or models are added or removed, so that
+# serialized copies of the documentation know when they are stale
+_revision = 0
+
+
+def getRevision():
+    """
+    Return a number that changes whenever the documentation changes.
+    """
+    return _revision
+
+
+def _changed():
+    global _revision
+    _revision += 1
 
 
 def _toRoutePath(resource, route):
@@ -83,6 +98,7 @@ def addRouteDocs(resource, route, method, info, handler):
     # Add the operation to the given route
     if method not in routes[resource][path]:
         routes[resource][path][method] = operation
+        _changed()
 
 
 def removeRouteDocs(resource, route, method, info, handler):
@@ -110,6 +126,7 @@ def removeRouteDocs(resource, route, method, info, handler):
 
     if method in routes[resource][path]:
         del routes[resource][path][method]
+        _changed()
         # Clean up any empty route paths
         if not routes[resource][path]:
             del routes[resource][path]
@@ -156,3 +173,4 @@ def addModel(name, model, resources=None, silent=False):
                 'WARNING: adding swagger models without specifying resources '
                 'to bind to is discouraged (%s).' % name)
         models[None][name] = model
+    _changed()
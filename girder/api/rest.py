@@ -31,7 +31,8 @@ import unicodedata
 from . import docs
 from girder import events, logger, logprint
 from girder.constants import SettingKey, TokenScope, SortDir
-from girder.models.model_base import AccessException, GirderException, ValidationException
+from girder.models.model_base import AccessException, GirderException, ValidationException, \
+    identityMapScope
 from girder.utility import toBool, config, JsonEncoder, optionalArgumentDecorator
 from girder.utility.model_importer import ModelImporter
 from six.moves import range, urllib
@@ -199,8 +200,7 @@ def getCurrentToken(allowCookie=False):
     if not tokenStr:
         return None
 
-    return ModelImporter.model('token').load(tokenStr, force=True,
-                                             objectId=False)
+    return ModelImporter.model('token').loadForAuth(tokenStr)
 
 
 @_cacheAuthUser
@@ -238,7 +238,7 @@ def getCurrentUser(returnToken=False):
         except AccessException:
             return retVal(None, token)
 
-        user = ModelImporter.model('user').load(token['userId'], force=True)
+        user = ModelImporter.model('token').getAuthUser(token)
         return retVal(user, token)
 
 
@@ -602,13 +602,18 @@ def endpoint(fun):
 
     If you want a streamed response, simply return a generator function
     from the inner method.
+
+    Documents loaded while the inner method runs are memoized for the rest of
+    the call; see :py:func:`girder.models.model_base.identityMapScope`. The
+    memoization does not extend into streamed responses.
     """
     @six.wraps(fun)
     def endpointDecorator(self, *args, **kwargs):
         _setCommonCORSHeaders()
         cherrypy.lib.caching.expires(0)
         try:
-            val = fun(self, args, kwargs)
+            with identityMapScope():
+                val = fun(self, args, kwargs)
 
             # If this is a partial response, we set the status appropriately
             if 'Content-Range' in cherrypy.response.headers:
@@ -143,11 +143,14 @@ class Assetstore(Resource):
         .param('fileExcludeRegex', 'If set, only filenames that do not match this regular '
                'expression will be imported. If a file matches both the include and exclude regex, '
                'it will be excluded.', required=False)
+        .param('incremental', 'Whether to skip files that were imported before and have not '
+               'changed since. This is currently only supported for filesystem assetstores.',
+               dataType='boolean', required=False, default=False)
         .errorResponse()
         .errorResponse('You are not an administrator.', 403)
     )
     def importData(self, assetstore, importPath, destinationId, destinationType, progress,
-                   leafFoldersAsItems, fileIncludeRegex, fileExcludeRegex):
+                   leafFoldersAsItems, fileIncludeRegex, fileExcludeRegex, incremental):
         user = self.getCurrentUser()
         parent = self.model(destinationType).load(
             destinationId, user=user, level=AccessType.ADMIN, exc=True)
@@ -158,6 +161,7 @@ class Assetstore(Resource):
                     'fileIncludeRegex': fileIncludeRegex,
                     'fileExcludeRegex': fileExcludeRegex,
                     'importPath': importPath,
+                    'incremental': incremental
                 }, progress=ctx, user=user, leafFoldersAsItems=leafFoldersAsItems)
 
     @access.admin
@@ -122,8 +122,8 @@ class Collection(Resource):
 
         def stream():
             zip = ziputil.ZipGenerator(collection['name'])
-            for (path, file) in self.model('collection').fileList(
-                    collection, user=self.getCurrentUser(), subpath=False, mimeFilter=mimeFilter):
+            for (path, file) in ziputil.readAhead(self.model('collection').fileList(
+                    collection, user=self.getCurrentUser(), subpath=False, mimeFilter=mimeFilter)):
                 for data in zip.addFile(file, path):
                     yield data
             yield zip.footer()
@@ -196,9 +196,23 @@ class Collection(Resource):
     @autoDescribeRoute(
         Description('Delete a collection by ID.')
         .modelParam('id', model='collection', level=AccessType.ADMIN)
+        .param('progress', 'Whether to record progress on this task.',
+               required=False, dataType='boolean', default=False)
+        .param('background', 'Whether to return right away and delete the collection in the '
+               'background.', required=False, dataType='boolean', default=False)
         .errorResponse('ID was invalid.')
         .errorResponse('Admin permission denied on the collection.', 403)
     )
-    def deleteCollection(self, collection):
-        self.model('collection').remove(collection)
+    def deleteCollection(self, collection, progress, background):
+        if background:
+            self.model('folder').removeInBackground(
+                collection, modelName='collection', user=self.getCurrentUser(),
+                progress=progress)
+            return {'message': 'Deleting collection %s in the background.' % collection['name']}
+        with ProgressContext(progress, user=self.getCurrentUser(),
+                             title='Deleting collection %s' % collection['name'],
+                             message='Calculating size...') as ctx:
+            if progress:
+                ctx.update(total=self.model('collection').subtreeCount(collection))
+            self.model('collection').remove(collection, progress=ctx)
         return {'message': 'Deleted collection %s.' % collection['name']}
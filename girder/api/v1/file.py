@@ -48,6 +48,7 @@ class File(Resource):
         self.route('POST', (), self.initUpload)
         self.route('POST', ('chunk',), self.readChunk)
         self.route('POST', ('completion',), self.finalizeUpload)
+        self.route('POST', ('part',), self.readPart)
         self.route('POST', (':id', 'copy'), self.copy)
         self.route('PUT', (':id',), self.updateFile)
         self.route('PUT', (':id', 'contents'), self.updateFileContents)
@@ -86,12 +87,16 @@ class File(Resource):
                required=False)
         .param('assetstoreId', 'Direct the upload to a specific assetstore (admin-only).',
                required=False)
+        .param('partSize', 'If set, the file will be sent with POST /file/part '
+               'as numbered parts of this many bytes (except for the last '
+               'part), which may be sent in any order and concurrently.',
+               dataType='integer', required=False)
         .errorResponse()
         .errorResponse('Write access was denied on the parent folder.', 403)
         .errorResponse('Failed to create upload.', 500)
     )
     def initUpload(self, parentType, parentId, name, size, mimeType, linkUrl, reference,
-                   assetstoreId):
+                   assetstoreId, partSize):
         """
         Before any bytes of the actual file are sent, a request should be made
         to initialize the upload. This creates the temporary record of the
@@ -117,7 +122,8 @@ class File(Resource):
                 assetstore = self.model('assetstore').load(assetstoreId)
 
             chunk = None
-            if size > 0 and cherrypy.request.headers.get('Content-Length'):
+            if (size > 0 and partSize is None and
+                    cherrypy.request.headers.get('Content-Length')):
                 ct = cherrypy.request.body.content_type.value
                 if (ct not in cherrypy.request.body.processors and
                         ct.split('/', 1)[0] not in cherrypy.request.body.processors):
@@ -133,7 +139,8 @@ class File(Resource):
                 # version upgrade.
                 upload = self.model('upload').createUpload(
                     user=user, name=name, parentType=parentType, parent=parent, size=size,
-                    mimeType=mimeType, reference=reference, assetstore=assetstore)
+                    mimeType=mimeType, reference=reference, assetstore=assetstore,
+                    partSize=partSize)
             except OSError as exc:
                 if exc.errno == errno.EACCES:
                     raise GirderException(
@@ -193,7 +200,9 @@ class File(Resource):
         """
         offset = self.model('upload').requestOffset(upload)
 
-        if isinstance(offset, six.integer_types):
+        if upload.get('partSize'):
+            return {'offset': offset, 'parts': sorted(upload['parts'])}
+        elif isinstance(offset, six.integer_types):
             upload['received'] = offset
             self.model('upload').save(upload)
             return {'offset': offset}
@@ -260,6 +269,39 @@ class File(Resource):
                 raise Exception('Failed to store upload.')
             raise
 
+    @access.user(scope=TokenScope.DATA_WRITE)
+    @autoDescribeRoute(
+        Description('Upload a numbered part of a file.')
+        .notes('This may only be used for uploads that were started with a '
+               'partSize. Part N holds the bytes of the file starting at N '
+               'times the part size. Parts may be sent in any order, '
+               'concurrently, and sent again if a request fails. The data for '
+               'the part should be sent as the body of the request. The '
+               'request that sends the last missing part returns the file.')
+        .modelParam('uploadId', paramType='query')
+        .param('partNumber', 'Zero-based index of the part.', dataType='integer',
+               paramType='query')
+        .errorResponse(('ID was invalid.',
+                        'Invalid part number.',
+                        'The part was not the expected size.'))
+        .errorResponse('You are not the user who initiated the upload.', 403)
+        .errorResponse('Failed to store upload.', 500)
+    )
+    def readPart(self, upload, partNumber):
+        user = self.getCurrentUser()
+
+        if upload['userId'] != user['_id']:
+            raise AccessException('You did not initiate this upload.')
+
+        try:
+            return self.model('upload').handlePart(
+                upload, partNumber, RequestBodyStream(cherrypy.request.body),
+                filter=True, user=user)
+        except IOError as exc:
+            if exc.errno == errno.EACCES:
+                raise Exception('Failed to store upload.')
+            raise
+
     @access.cookie
     @access.public(scope=TokenScope.DATA_READ)
     @autoDescribeRoute(
@@ -372,10 +414,13 @@ class File(Resource):
                required=False)
         .param('assetstoreId', 'Direct the upload to a specific assetstore (admin-only).',
                required=False)
+        .param('partSize', 'If set, the new contents will be sent with POST '
+               '/file/part as numbered parts of this many bytes.',
+               dataType='integer', required=False)
         .notes('After calling this, send the chunks just like you would with a '
                'normal file upload.')
     )
-    def updateFileContents(self, file, size, reference, assetstoreId):
+    def updateFileContents(self, file, size, reference, assetstoreId, partSize):
         user = self.getCurrentUser()
 
         assetstore = None
@@ -385,7 +430,8 @@ class File(Resource):
             assetstore = self.model('assetstore').load(assetstoreId)
         # Create a new upload record into the existing file
         upload = self.model('upload').createUploadToFile(
-            file=file, user=user, size=size, reference=reference, assetstore=assetstore)
+            file=file, user=user, size=size, reference=reference, assetstore=assetstore,
+            partSize=partSize)
 
         if upload['size'] > 0:
             return upload
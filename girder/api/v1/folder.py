@@ -17,11 +17,13 @@
 #  limitations under the License.
 ###############################################################################
 
+import json
+
 from ..describe import Description, autoDescribeRoute
 from ..rest import Resource, RestException, filtermodel, setResponseHeader, setContentDisposition
 from girder.api import access
 from girder.constants import AccessType, TokenScope
-from girder.utility import ziputil
+from girder.utility import JsonEncoder, ziputil
 from girder.utility.progress import ProgressContext
 
 
@@ -38,6 +40,7 @@ class Folder(Resource):
         self.route('GET', (':id', 'details'), self.getFolderDetails)
         self.route('GET', (':id', 'access'), self.getFolderAccess)
         self.route('GET', (':id', 'download'), self.downloadFolder)
+        self.route('GET', (':id', 'manifest'), self.getFolderManifest)
         self.route('GET', (':id', 'rootpath'), self.rootpath)
         self.route('POST', (), self.createFolder)
         self.route('PUT', (':id',), self.updateFolder)
@@ -132,13 +135,38 @@ class Folder(Resource):
 
         def stream():
             zip = ziputil.ZipGenerator(folder['name'])
-            for (path, file) in self.model('folder').fileList(
-                    folder, user=user, subpath=False, mimeFilter=mimeFilter):
+            for (path, file) in ziputil.readAhead(self.model('folder').fileList(
+                    folder, user=user, subpath=False, mimeFilter=mimeFilter)):
                 for data in zip.addFile(file, path):
                     yield data
             yield zip.footer()
         return stream
 
+    @access.cookie
+    @access.public(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('List the contents of a folder for synchronizing it.')
+        .notes('Every folder, item, and file below this folder that can be read is '
+               'streamed as one JSON object per line. Folders are listed before '
+               'their contents and items directly before their files. Each record '
+               'has its type, ID, name, update time, and path relative to this '
+               'folder. Items and files also have their size, and files their '
+               'SHA-512 hash when it is known.')
+        .modelParam('id', model='folder', level=AccessType.READ)
+        .produces('application/x-ndjson')
+        .errorResponse('ID was invalid.')
+        .errorResponse('Read access was denied for the folder.', 403)
+    )
+    def getFolderManifest(self, folder):
+        setResponseHeader('Content-Type', 'application/x-ndjson')
+        user = self.getCurrentUser()
+
+        def stream():
+            for record in self.model('folder').manifest(folder, user=user):
+                yield (json.dumps(record, sort_keys=True, allow_nan=False,
+                                  cls=JsonEncoder) + '\n').encode('utf8')
+        return stream
+
     @access.user(scope=TokenScope.DATA_WRITE)
     @filtermodel(model='folder')
     @autoDescribeRoute(
@@ -271,10 +299,16 @@ class Folder(Resource):
         .modelParam('id', model='folder', level=AccessType.ADMIN)
         .param('progress', 'Whether to record progress on this task.',
                required=False, dataType='boolean', default=False)
+        .param('background', 'Whether to return right away and delete the folder in the '
+               'background.', required=False, dataType='boolean', default=False)
         .errorResponse('ID was invalid.')
         .errorResponse('Admin access was denied for the folder.', 403)
     )
-    def deleteFolder(self, folder, progress):
+    def deleteFolder(self, folder, progress, background):
+        if background:
+            self.model('folder').removeInBackground(
+                folder, user=self.getCurrentUser(), progress=progress)
+            return {'message': 'Deleting folder %s in the background.' % folder['name']}
         with ProgressContext(progress, user=self.getCurrentUser(),
                              title='Deleting folder %s' % folder['name'],
                              message='Calculating folder size...') as ctx:
@@ -353,10 +387,16 @@ class Folder(Resource):
         .modelParam('id', 'The ID of the folder to clean.', model='folder', level=AccessType.WRITE)
         .param('progress', 'Whether to record progress on this task.',
                required=False, dataType='boolean', default=False)
+        .param('background', 'Whether to return right away and delete the contents in the '
+               'background.', required=False, dataType='boolean', default=False)
         .errorResponse('ID was invalid.')
         .errorResponse('Write access was denied on the folder.', 403)
     )
-    def deleteContents(self, folder, progress):
+    def deleteContents(self, folder, progress, background):
+        if background:
+            self.model('folder').removeInBackground(
+                folder, contentsOnly=True, user=self.getCurrentUser(), progress=progress)
+            return {'message': 'Cleaning folder %s in the background.' % folder['name']}
         with ProgressContext(progress, user=self.getCurrentUser(),
                              title='Clearing folder %s' % folder['name'],
                              message='Calculating folder size...') as ctx:
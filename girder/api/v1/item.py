@@ -205,7 +205,8 @@ class Item(Resource):
 
         def stream():
             zip = ziputil.ZipGenerator(item['name'])
-            for (path, file) in self.model('item').fileList(item, subpath=False):
+            for (path, file) in ziputil.readAhead(
+                    self.model('item').fileList(item, subpath=False)):
                 for data in zip.addFile(file, path):
                     yield data
             yield zip.footer()
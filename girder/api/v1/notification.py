@@ -29,10 +29,11 @@ from girder.api import access
 
 # If no timeout param is passed to stream, we default to this value
 DEFAULT_STREAM_TIMEOUT = 300
-# When new events are seen, we will poll at the minimum interval
-MIN_POLL_INTERVAL = 0.5
-# The interval increases when no new events are seen, capping at this value
+# If notifications can't be pushed to the stream, it polls at this interval
 MAX_POLL_INTERVAL = 2
+# Otherwise, the stream wakes at least this often to check if the server is
+# shutting down
+MAX_WAIT_INTERVAL = 10
 
 
 def sseMessage(event):
@@ -59,9 +60,9 @@ class Notification(Resource):
         .notes('This uses long-polling to keep the connection open for '
                'several minutes at a time (or longer) and should be requested '
                'with an EventSource object or other SSE-capable client. '
-               '<p>Notifications are returned within a few seconds of when '
-               'they occur.  When no notification occurs for the timeout '
-               'duration, the stream is closed. '
+               '<p>Notifications are returned as soon as they occur.  When no '
+               'notification occurs for the timeout duration, the stream is '
+               'closed. '
                '<p>This connection can stay open indefinitely long.')
         .param('timeout', 'The duration without a notification before the stream is closed.',
                dataType='integer', required=False, default=DEFAULT_STREAM_TIMEOUT)
@@ -83,18 +84,24 @@ class Notification(Resource):
         def streamGen():
             lastUpdate = since
             start = time.time()
-            wait = MIN_POLL_INTERVAL
-            while cherrypy.engine.state == cherrypy.engine.states.STARTED:
-                wait = min(wait + MIN_POLL_INTERVAL, MAX_POLL_INTERVAL)
-                for event in self.model('notification').get(
-                        user, lastUpdate, token=token):
-                    if lastUpdate is None or event['updated'] > lastUpdate:
-                        lastUpdate = event['updated']
-                    wait = MIN_POLL_INTERVAL
-                    start = time.time()
-                    yield sseMessage(event)
-                if time.time() - start > timeout:
-                    break
+            # Rather than polling, only query when woken by a new notification
+            subscription = self.model('notification').subscribe(user, token)
+            try:
+                while cherrypy.engine.state == cherrypy.engine.states.STARTED:
+                    subscription.clear()
+                    for event in self.model('notification').get(
+                            user, lastUpdate, token=token):
+                        if lastUpdate is None or event['updated'] > lastUpdate:
+                            lastUpdate = event['updated']
+                        start = time.time()
+                        yield sseMessage(event)
+                    remaining = timeout - (time.time() - start)
+                    if remaining < 0:
+                        break
 
-                time.sleep(wait)
+                    subscription.wait(min(
+                        remaining,
+                        MAX_WAIT_INTERVAL if subscription.active else MAX_POLL_INTERVAL))
+            finally:
+                self.model('notification').unsubscribe(subscription)
         return streamGen
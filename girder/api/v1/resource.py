@@ -200,16 +200,20 @@ class Resource(BaseResource):
         setResponseHeader('Content-Type', 'application/zip')
         setContentDisposition('Resources.zip')
 
-        def stream():
-            zip = ziputil.ZipGenerator()
+        def fileList():
             for kind in resources:
                 model = self.model(kind)
                 for id in resources[kind]:
                     doc = model.load(id=id, user=user, level=AccessType.READ)
                     for (path, file) in model.fileList(
                             doc=doc, user=user, includeMetadata=includeMetadata, subpath=True):
-                        for data in zip.addFile(file, path):
-                            yield data
+                        yield (path, file)
+
+        def stream():
+            zip = ziputil.ZipGenerator()
+            for (path, file) in ziputil.readAhead(fileList()):
+                for data in zip.addFile(file, path):
+                    yield data
             yield zip.footer()
         return stream
 
@@ -378,11 +378,13 @@ class System(Resource):
         title = 'Running system consistency check'
         with ProgressContext(progress, user=user, title=title) as pc:
             results = {}
-            pc.update(title='Checking for orphaned records (Step 1 of 3)')
+            pc.update(title='Checking for orphaned records (Step 1 of 4)')
             results['orphansRemoved'] = self._pruneOrphans(pc)
-            pc.update(title='Checking for incorrect base parents (Step 2 of 3)')
+            pc.update(title='Checking for incorrect ancestor paths (Step 2 of 4)')
+            results['ancestorsFixed'] = self.model('folder').migrateAncestors(pc)
+            pc.update(title='Checking for incorrect base parents (Step 3 of 4)')
             results['baseParentsFixed'] = self._fixBaseParents(pc)
-            pc.update(title='Checking for incorrect sizes (Step 3 of 3)')
+            pc.update(title='Checking for incorrect sizes (Step 4 of 4)')
             results['sizesChanged'] = self._recalculateSizes(pc)
             return results
         # TODO:
@@ -557,6 +559,10 @@ class System(Resource):
         return count
 
     def _recalculateSizes(self, progress):
+        folderModel = self.model('folder')
+        if folderModel._ancestorsComplete():
+            return folderModel.updateAllSizes(progress)
+
         fixes = 0
         models = ['collection', 'user']
         steps = sum(self.model(model).find().count() for model in models)
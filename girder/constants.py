@@ -341,6 +341,9 @@ class CoreEventHandler(object):
     # For adding a group's creator into its ACL at creation time.
     GROUP_CREATOR_ACCESS = 'core.grantCreatorAccess'
 
+    # For deleting folders and collections requested with removeInBackground.
+    REMOVE_IN_BACKGROUND = 'core.removeInBackground'
+
     # For creating the default Public and Private folders at user creation time.
     USER_DEFAULT_FOLDERS = 'core.addDefaultFolders'
 
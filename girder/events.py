@@ -41,10 +41,12 @@ function to be called when the task is finished. That callback function will
 receive the Event object as its only argument.
 """
 
+import collections
 import contextlib
 import girder
+import six
 import threading
-
+import time
 
 from girder.utility import config
 from six.moves import queue
@@ -116,7 +118,7 @@ class ForegroundEventsDaemon(object):
     config file chooses to disable using the background thread for the daemon.
     It executes all bound handlers in the current thread, and provides
     no-op start() and stop() implementations to remain compatible with the
-    API of AsyncEventsThread.
+    API of AsyncEventsDaemon.
     """
     def start(self):
         pass
@@ -129,19 +131,30 @@ class ForegroundEventsDaemon(object):
         if callable(callback):
             callback(event)
 
+    def getStats(self):
+        return {'workers': 0}
+
 
 class AsyncEventsThread(threading.Thread):
     """
     This class is used to execute the pipeline for events asynchronously.
     This should not be invoked directly by callers; instead, they should use
     girder.events.daemon.trigger().
+
+    :param pool: The daemon that owns this thread, or None to create a
+        standalone daemon with a single worker, which is this thread.
+    :type pool: AsyncEventsDaemon or None
     """
-    def __init__(self):
+    def __init__(self, pool=None):
         threading.Thread.__init__(self)
 
         self.daemon = True
         self.terminate = False
-        self.eventQueue = queue.Queue()
+        if pool is None:
+            pool = AsyncEventsDaemon(workers=0)
+            pool._threads.append(self)
+        self.pool = pool
+        self.eventQueue = pool.eventQueue
 
     def run(self):
         """
@@ -152,14 +165,12 @@ class AsyncEventsThread(threading.Thread):
         girder.logprint.info('Started asynchronous event manager thread.')
 
         while not self.terminate:
-            eventName, info, callback = self.eventQueue.get(block=True)
             try:
-                event = trigger(eventName, info, async=True, daemon=True)
-                if callable(callback):
-                    callback(event)
-            except Exception:
-                # Must continue the event loop even if handler failed
-                girder.logger.exception('In handler for event "%s":' % eventName)
+                item = self.eventQueue.get(block=True, timeout=self.pool.pollInterval)
+            except queue.Empty:
+                continue
+            while item is not None:
+                item = self.pool._process(item)
 
         girder.logprint.info('Stopped asynchronous event manager thread.')
 
@@ -173,7 +184,7 @@ class AsyncEventsThread(threading.Thread):
             all bound event handlers. It takes one argument, which is the
             event object itself.
         """
-        self.eventQueue.put((eventName, info, callback))
+        self.pool.trigger(eventName, info, callback)
 
     def stop(self):
         """
@@ -183,6 +194,146 @@ class AsyncEventsThread(threading.Thread):
         self.terminate = True
 
 
+class AsyncEventsDaemon(object):
+    """
+    A pool of threads that execute events triggered via
+    ``girder.events.daemon.trigger()``. Events are handled in the order they
+    are triggered, but with more than one worker, handlers for different
+    events run concurrently.
+
+    :param workers: The number of worker threads.
+    :type workers: int
+    :param maxQueueSize: The maximum number of events waiting to be handled,
+        or 0 for no limit. When the queue is full, ``trigger()`` blocks until
+        there is room, which slows down producers that outpace the workers.
+    :type maxQueueSize: int
+    :param concurrency: Optional mapping of event names to the maximum
+        number of workers that may handle that event at once. Events beyond the
+        limit wait without occupying a worker.
+    :type concurrency: dict or None
+    """
+    pollInterval = 1.0
+
+    def __init__(self, workers=1, maxQueueSize=0, concurrency=None):
+        self.workers = workers
+        self.concurrency = dict(concurrency or {})
+        self.eventQueue = queue.Queue(maxsize=maxQueueSize)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._running = collections.defaultdict(int)
+        self._deferred = collections.defaultdict(collections.deque)
+        self._stats = {}
+
+    def start(self):
+        """
+        Start the worker threads. Calling this while the workers are already
+        running has no effect.
+        """
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._threads = [AsyncEventsThread(self) for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Gracefully stops the worker threads. Each will finish the event it is
+        currently processing before stopping.
+        """
+        for thread in self._threads:
+            thread.stop()
+        self._threads = []
+
+    def trigger(self, eventName, info=None, callback=None):
+        """
+        Adds a new event on the queue to trigger asynchronously. If the queue is
+        bounded and full, this blocks until a worker makes room.
+
+        :param eventName: The event name to pass to the girder.events.trigger
+        :param info: The info object to pass to girder.events.trigger
+        :param callback: Optional callable to be called upon completion of
+            all bound event handlers. It takes one argument, which is the
+            event object itself.
+        """
+        item = (eventName, info, callback, time.time())
+        current = threading.current_thread()
+        if isinstance(current, AsyncEventsThread) and current.pool is self:
+            # A handler triggering another event must not wait for room in the
+            # queue, since that room may only be made by this very thread.
+            try:
+                self.eventQueue.put(item, block=False)
+            except queue.Full:
+                while item is not None:
+                    item = self._process(item)
+        else:
+            self.eventQueue.put(item)
+
+    def _process(self, item):
+        """
+        Handle one queued event on the calling worker thread, respecting the
+        per-event concurrency limits. Returns the next event that this worker
+        should handle immediately, if one was waiting on the same limit.
+        """
+        eventName, info, callback, queuedTime = item
+        limit = self.concurrency.get(eventName)
+        with self._lock:
+            if limit and self._running[eventName] >= limit:
+                self._deferred[eventName].append(item)
+                return None
+            self._running[eventName] += 1
+
+        startTime = time.time()
+        failed = False
+        try:
+            event = trigger(eventName, info, async=True, daemon=True)
+            if callable(callback):
+                callback(event)
+        except Exception:
+            # Must continue the event loop even if handler failed
+            failed = True
+            girder.logger.exception('In handler for event "%s":' % eventName)
+        endTime = time.time()
+
+        with self._lock:
+            stats = self._stats.setdefault(eventName, {
+                'count': 0, 'failures': 0, 'waitTime': 0.0, 'maxWaitTime': 0.0,
+                'handlerTime': 0.0, 'maxHandlerTime': 0.0})
+            stats['count'] += 1
+            stats['failures'] += int(failed)
+            stats['waitTime'] += startTime - queuedTime
+            stats['maxWaitTime'] = max(stats['maxWaitTime'], startTime - queuedTime)
+            stats['handlerTime'] += endTime - startTime
+            stats['maxHandlerTime'] = max(stats['maxHandlerTime'], endTime - startTime)
+
+            self._running[eventName] -= 1
+            if self._deferred[eventName]:
+                return self._deferred[eventName].popleft()
+        return None
+
+    def getStats(self):
+        """
+        Return monitoring information about the daemon: the number of workers,
+        the number of events waiting to be handled, and, per event name, the
+        number of events handled and failed, the number currently running and
+        waiting on a concurrency limit, and the total and maximum times (in
+        seconds) spent waiting in the queue and in the handlers.
+        """
+        with self._lock:
+            events = {name: dict(stats) for name, stats in six.viewitems(self._stats)}
+            for name in set(self._running) | set(self._deferred):
+                stats = events.setdefault(name, {})
+                stats['running'] = self._running[name]
+                stats['deferred'] = len(self._deferred[name])
+            deferred = sum(len(items) for items in six.viewvalues(self._deferred))
+        return {
+            'workers': len([thread for thread in self._threads if thread.is_alive()]),
+            'queueSize': self.eventQueue.qsize(),
+            'maxQueueSize': self.eventQueue.maxsize,
+            'deferred': deferred,
+            'events': events
+        }
+
+
 def bind(eventName, handlerName, handler):
     """
     Bind a listener (handler) to the event identified by eventName. It is
@@ -243,6 +394,19 @@ def unbindAll():
     _mapping.clear()
 
 
+def handlerNames(eventName):
+    """
+    Return the names of the handlers bound to an event, in the order in which
+    they are called. Code that performs an operation in bulk may use this to
+    check whether anything listens to the per-document events it would skip.
+
+    :param eventName: The name that identifies the event.
+    :type eventName: str
+    :returns: list of handler names.
+    """
+    return [handler['name'] for handler in _mapping.get(eventName, ())]
+
+
 @contextlib.contextmanager
 def bound(eventName, handlerName, handler):
     """
@@ -299,7 +463,11 @@ def trigger(eventName, info=None, pre=None, async=False, daemon=False):
 _deprecated = {}
 _mapping = {}
 
-if config.getConfig()['server'].get('disable_event_daemon', False):
+_serverConfig = config.getConfig()['server']
+if _serverConfig.get('disable_event_daemon', False):
     daemon = ForegroundEventsDaemon()
 else:
-    daemon = AsyncEventsThread()
+    daemon = AsyncEventsDaemon(
+        workers=int(_serverConfig.get('event_daemon_workers', 1)),
+        maxQueueSize=int(_serverConfig.get('event_daemon_queue_size', 0)),
+        concurrency=_serverConfig.get('event_daemon_concurrency'))
@@ -20,7 +20,7 @@
 import datetime
 
 from .model_base import Model, ValidationException, GirderException
-from girder.utility import assetstore_utilities
+from girder.utility import assetstore_utilities, invalidation
 from girder.constants import AssetstoreType, SortDir
 
 
@@ -61,8 +61,34 @@ class Assetstore(Model):
         if doc['current'] is True:
             self.update({'current': True}, {'$set': {'current': False}})
 
+        # Cached adapters are keyed on this, so it must change on every save.
+        # Truncate it to the precision MongoDB stores, so that the document
+        # we return compares equal to the one that is loaded later.
+        now = datetime.datetime.utcnow()
+        doc['updated'] = now.replace(microsecond=now.microsecond // 1000 * 1000)
+
         return doc
 
+    def reconnect(self):
+        super(Assetstore, self).reconnect()
+        assetstore_utilities.invalidateAdapterCache()
+
+    def save(self, doc, *args, **kwargs):
+        """
+        Override of Model.save that discards the cached adapter for this
+        assetstore in this process before the write, and in every server
+        process after it, so that no process can cache an adapter built from
+        the old document again.
+        """
+        if '_id' in doc:
+            assetstore_utilities.invalidateAdapterCache(doc['_id'])
+        try:
+            return super(Assetstore, self).save(doc, *args, **kwargs)
+        finally:
+            if '_id' in doc:
+                invalidation.publish(
+                    assetstore_utilities.INVALIDATION_NAMESPACE, str(doc['_id']))
+
     def remove(self, assetstore, **kwargs):
         """
         Delete an assetstore. If there are any files within this assetstore,
@@ -84,6 +110,8 @@ class Assetstore(Model):
             pass
         # now remove the assetstore
         Model.remove(self, assetstore)
+        invalidation.publish(
+            assetstore_utilities.INVALIDATION_NAMESPACE, str(assetstore['_id']))
         # If after removal there is no current assetstore, then pick a
         # different assetstore to be the current one.
         current = self.findOne({'current': True})
@@ -33,7 +33,8 @@ class Collection(AccessControlledModel):
 
     def initialize(self):
         self.name = 'collection'
-        self.ensureIndices(['name'])
+        self._identityMapped = True
+        self.ensureIndices(['name', 'access.users.id', 'access.groups.id', 'public'])
         self.ensureTextIndex({
             'name': 10,
             'description': 1
@@ -193,16 +194,24 @@ class Collection(AccessControlledModel):
         :param level: If filtering by permission, the required permission level.
         :type level: AccessLevel
         """
+        folderModel = self.model('folder')
+        if level is None and folderModel._ancestorsComplete():
+            query, topIds = folderModel._rootSubtreeQuery(doc, 'collection')
+            count = 1 + folderModel.find(query, fields=()).count()
+            if includeItems:
+                count += self.model('item').find(
+                    {'ancestors': {'$in': topIds}}, fields=()).count()
+            return count
+
         count = 1
-        folders = self.model('folder').find({
+        query = {
             'parentId': doc['_id'],
             'parentCollection': 'collection'
-        }, fields=('access',))
-
+        }
         if level is not None:
-            folders = self.filterResultsByPermission(
-                cursor=folders, user=user, level=level)
-        count += sum(self.model('folder').subtreeCount(
+            query = folderModel._permissionQuery(query, user, level)
+        folders = folderModel.find(query, fields=('_id', ))
+        count += sum(folderModel.subtreeCount(
             folder, includeItems=includeItems, user=user, level=level)
             for folder in folders)
         return count
@@ -249,13 +258,10 @@ class Collection(AccessControlledModel):
             self, doc, access, user=user, save=save, force=force)
 
         if recurse:
-            cursor = self.model('folder').find({
+            folders = self.model('folder').findWithPermissions({
                 'parentId': doc['_id'],
                 'parentCollection': 'collection'
-            })
-
-            folders = self.filterResultsByPermission(
-                cursor=cursor, user=user, level=AccessType.ADMIN)
+            }, user=user, level=AccessType.ADMIN)
 
             for folder in folders:
                 self.model('folder').setAccessList(
@@ -301,19 +307,15 @@ class Collection(AccessControlledModel):
         :param level: The required access level, or None to return the raw
             top-level folder count.
         """
-        fields = () if level is None else ('access', 'public')
-
         folderModel = self.model('folder')
-        folders = folderModel.find({
+        query = {
             'parentId': collection['_id'],
             'parentCollection': 'collection'
-        }, fields=fields)
+        }
+        if level is not None:
+            query = folderModel._permissionQuery(query, user, level)
 
-        if level is None:
-            return folders.count()
-        else:
-            return sum(1 for _ in folderModel.filterResultsByPermission(
-                cursor=folders, user=user, level=level))
+        return folderModel.find(query, fields=()).count()
 
     def updateSize(self, doc):
         """
@@ -323,6 +325,10 @@ class Collection(AccessControlledModel):
         :param doc: The collection.
         :type doc: dict
         """
+        folderModel = self.model('folder')
+        if folderModel._ancestorsComplete():
+            return folderModel.updateRootSize(doc, 'collection')
+
         size = 0
         fixes = 0
         folders = self.model('folder').find({
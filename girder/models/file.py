@@ -18,6 +18,7 @@
 ###############################################################################
 
 import cherrypy
+import collections
 import datetime
 import six
 
@@ -72,6 +73,30 @@ class File(acl_mixin.AccessControlMixin, Model):
 
         Model.remove(self, file)
 
+    def removeInBulk(self, files):
+        """
+        Delete many files at once. The stored data is deleted with one call to
+        the ``deleteFiles`` method of each assetstore's adapter, then the
+        ``model.file.remove.bulk`` event is triggered with the list of files,
+        and the documents are deleted with a single query. Unlike
+        :py:meth:`remove`, this neither triggers the per-file removal events
+        nor propagates size changes to the parent items, folders and roots.
+
+        :param files: The file documents to remove.
+        :type files: list of dict
+        """
+        if not files:
+            return
+        byAssetstore = collections.defaultdict(list)
+        for file in files:
+            if file.get('assetstoreId'):
+                byAssetstore[file['assetstoreId']].append(file)
+        for assetstoreFiles in six.viewvalues(byAssetstore):
+            self.getAssetstoreAdapter(assetstoreFiles[0]).deleteFiles(assetstoreFiles)
+
+        events.trigger('model.file.remove.bulk', files)
+        self.removeWithQuery({'_id': {'$in': [file['_id'] for file in files]}})
+
     def download(self, file, offset=0, headers=True, endByte=None,
                  contentDisposition=None, extraParameters=None):
         """
@@ -343,8 +368,7 @@ class File(acl_mixin.AccessControlMixin, Model):
         """
         Return the assetstore adapter for the given file.
         """
-        assetstore = self.model('assetstore').load(file['assetstoreId'])
-        return assetstore_utilities.getAssetstoreAdapter(assetstore)
+        return assetstore_utilities.getAssetstoreAdapterById(file['assetstoreId'])
 
     def copyFile(self, srcFile, creator, item=None):
         """
@@ -17,18 +17,21 @@
 #  limitations under the License.
 ###############################################################################
 
+import collections
 import copy
 import datetime
+import itertools
 import json
 import os
 import six
 
 from bson.objectid import ObjectId
+from pymongo import UpdateMany, UpdateOne
 from .model_base import AccessControlledModel, ValidationException, \
     GirderException
 from girder import events
-from girder.constants import AccessType
-from girder.utility.progress import noProgress, setResponseTimeLimit
+from girder.constants import AccessType, CoreEventHandler
+from girder.utility.progress import noProgress, setResponseTimeLimit, ProgressContext
 
 
 class Folder(AccessControlledModel):
@@ -42,7 +45,9 @@ class Folder(AccessControlledModel):
 
     def initialize(self):
         self.name = 'folder'
-        self.ensureIndices(('parentId', 'name', 'lowerName',
+        self._identityMapped = True
+        self.ensureIndices(('parentId', 'name', 'lowerName', 'ancestors',
+                            'access.users.id', 'access.groups.id', 'public',
                             ([('parentId', 1), ('name', 1)], {})))
         self.ensureTextIndex({
             'name': 10,
@@ -54,6 +59,17 @@ class Folder(AccessControlledModel):
             'size', 'meta', 'parentId', 'parentCollection', 'creatorId',
             'baseParentType', 'baseParentId'))
 
+        events.bind('_remove_in_background', CoreEventHandler.REMOVE_IN_BACKGROUND,
+                    self._onRemoveInBackground)
+
+    def reconnect(self):
+        """
+        Override of Model.reconnect that also forgets whether the ancestor
+        paths in the database are known to be complete.
+        """
+        self._ancestorsMigrated = False
+        super(Folder, self).reconnect()
+
     def validate(self, doc, allowRename=False):
         """
         Validate the name and description of the folder, ensure that it is
@@ -76,6 +92,8 @@ class Folder(AccessControlledModel):
             raise GirderException('Invalid folder parent type: %s.' %
                                   doc['parentCollection'],
                                   'girder.models.folder.invalid-parent-type')
+        if 'ancestors' not in doc:
+            self.getAncestors(doc)
         name = doc['name']
         n = 0
         while True:
@@ -126,7 +144,7 @@ class Folder(AccessControlledModel):
         """
         # Ensure we include extra fields to do the migration below
         extraFields = {'baseParentId', 'baseParentType', 'parentId', 'parentCollection',
-                       'name', 'lowerName'}
+                       'name', 'lowerName', 'ancestors'}
         loadFields = self._supplementFields(fields, extraFields)
 
         doc = super(Folder, self).load(
@@ -134,6 +152,8 @@ class Folder(AccessControlledModel):
             exc=exc)
 
         if doc is not None:
+            if 'ancestors' not in doc:
+                self.getAncestors(doc)
             if 'baseParentType' not in doc:
                 pathFromRoot = self.parentsToRoot(doc, user=user, force=True)
                 baseParent = pathFromRoot[0]
@@ -153,11 +173,113 @@ class Folder(AccessControlledModel):
 
         return doc
 
+    def getAncestors(self, folder):
+        """
+        Return the list of ids of the folders above this folder, ordered from
+        the top-level folder down to this folder's parent. Folders directly
+        under a user or collection have no ancestors. The list is stored on the
+        folder in the indexed "ancestors" field; if it is missing (e.g. for a
+        folder created by an older version of Girder), it is computed from the
+        parent folder and saved.
+
+        :param folder: The folder whose ancestors to return.
+        :type folder: dict
+        :returns: list of folder ObjectIds.
+        """
+        if 'ancestors' in folder:
+            return folder['ancestors']
+
+        if folder['parentCollection'] == 'folder':
+            parent = self.load(folder['parentId'], force=True, exc=True, fields=[
+                'ancestors', 'parentId', 'parentCollection'])
+            ancestors = parent['ancestors'] + [parent['_id']]
+        else:
+            ancestors = []
+
+        folder['ancestors'] = ancestors
+        if '_id' in folder:
+            self.update({'_id': folder['_id']}, {'$set': {'ancestors': ancestors}})
+        return ancestors
+
+    def _ancestorsComplete(self):
+        """
+        Whether every folder and item in the database has its ancestor path
+        recorded, so that subtree queries may rely on the "ancestors" index.
+        Once this is true, it remains true since all writes maintain the path.
+        """
+        if not self._ancestorsMigrated:
+            self._ancestorsMigrated = (
+                self.findOne({'ancestors': None}, fields=['_id']) is None and
+                self.model('item').findOne({'ancestors': None}, fields=['_id']) is None)
+        return self._ancestorsMigrated
+
+    def migrateAncestors(self, progress=noProgress):
+        """
+        Compute the ancestor path of every folder and item in the database,
+        correcting any that are missing or wrong. This walks the hierarchy one
+        level at a time from the top-level folders, using one bulk write per
+        batch of parent folders.
+
+        :param progress: A progress context to record progress on.
+        :type progress: girder.utility.progress.ProgressContext or None.
+        :returns: the number of folders and items that were changed.
+        """
+        itemModel = self.model('item')
+        progress.update(total=self.find({}, fields=()).count(), current=0)
+
+        fixes = self.update({
+            'parentCollection': {'$ne': 'folder'},
+            'ancestors': {'$ne': []}
+        }, {'$set': {'ancestors': []}}).modified_count
+
+        frontier = {doc['_id']: [] for doc in self.find(
+            {'parentCollection': {'$ne': 'folder'}}, fields=['_id'])}
+        while frontier:
+            parentIds = list(frontier)
+            nextFrontier = {}
+            for start in six.moves.range(0, len(parentIds), 1000):
+                batch = parentIds[start:start + 1000]
+                folderOps, itemOps = [], []
+                for parentId in batch:
+                    ancestors = frontier[parentId] + [parentId]
+                    folderOps.append(UpdateMany({
+                        'parentId': parentId,
+                        'parentCollection': 'folder',
+                        'ancestors': {'$ne': ancestors}
+                    }, {'$set': {'ancestors': ancestors}}))
+                    itemOps.append(UpdateMany({
+                        'folderId': parentId,
+                        'ancestors': {'$ne': ancestors}
+                    }, {'$set': {'ancestors': ancestors}}))
+                fixes += self.collection.bulk_write(folderOps, ordered=False).modified_count
+                fixes += itemModel.collection.bulk_write(itemOps, ordered=False).modified_count
+                self._forgetLoaded()
+                itemModel._forgetLoaded()
+                progress.update(increment=len(batch))
+
+                for child in self.find({
+                    'parentId': {'$in': batch},
+                    'parentCollection': 'folder'
+                }, fields=['parentId']):
+                    nextFrontier[child['_id']] = frontier[child['parentId']] + [
+                        child['parentId']]
+            frontier = nextFrontier
+
+        self._ancestorsMigrated = False
+        return fixes
+
     def getSizeRecursive(self, folder):
         """
-        Calculate the total size of the folder by recursing into all of its
-        descendant folders.
+        Calculate the total size of the folder by summing the sizes of all of
+        its descendant folders.
         """
+        if self._ancestorsComplete():
+            result = list(self.collection.aggregate([
+                {'$match': {'ancestors': folder['_id']}},
+                {'$group': {'_id': None, 'size': {'$sum': '$size'}}}
+            ]))
+            return folder['size'] + (result[0]['size'] if result else 0)
+
         size = folder['size']
 
         q = {
@@ -170,6 +292,120 @@ class Folder(AccessControlledModel):
 
         return size
 
+    def _rootSubtreeQuery(self, root, rootType):
+        """
+        Build a query matching every folder below a user or collection. This
+        must only be used once the ancestor paths have been fully migrated.
+
+        :param root: The user or collection.
+        :param rootType: 'user' or 'collection'.
+        :returns: the query, and the ids of the top-level folders.
+        """
+        topIds = [doc['_id'] for doc in self.find({
+            'parentId': root['_id'],
+            'parentCollection': rootType
+        }, fields=('_id', ))]
+        return {'$or': [
+            {'_id': {'$in': topIds}},
+            {'ancestors': {'$in': topIds}}
+        ]}, topIds
+
+    def updateSizes(self, query=None, progress=noProgress, batchSize=1000):
+        """
+        Recompute the size of every folder matching a query, and of the items
+        directly within them, fixing those that are wrong. Each batch of
+        folders takes a few aggregations and bulk writes, rather than a query
+        per folder and item as :py:meth:`updateSize` does.
+
+        :param query: The folders to check, or None for all folders.
+        :type query: dict or None
+        :param progress: A progress context to record progress on.
+        :type progress: girder.utility.progress.ProgressContext or None.
+        :param batchSize: The number of folders to check at a time.
+        :type batchSize: int
+        :returns: the number of folders and items that were changed.
+        """
+        itemModel = self.model('item')
+        fixes = 0
+        folders = self.find(query, fields=('size', ))
+        while True:
+            batch = list(itertools.islice(folders, batchSize))
+            if not batch:
+                return fixes
+            itemQuery = {'folderId': {'$in': [folder['_id'] for folder in batch]}}
+            fixes += itemModel.updateSizes(itemQuery, batchSize=batchSize)
+            sizes = {entry['_id']: entry['size'] for entry in itemModel.collection.aggregate([
+                {'$match': itemQuery},
+                {'$group': {'_id': '$folderId', 'size': {'$sum': '$size'}}}
+            ])}
+            fixes += self._fixSizes(batch, sizes)
+            progress.update(increment=len(batch))
+
+    def updateRootSize(self, root, rootType):
+        """
+        Recompute the size of a user or collection and of every folder and
+        item beneath it, fixing those that are wrong. This must only be used
+        once the ancestor paths have been fully migrated.
+
+        :param root: The user or collection.
+        :param rootType: 'user' or 'collection'.
+        :returns: the size of the root, and the number of documents that were
+            changed.
+        """
+        query, _ = self._rootSubtreeQuery(root, rootType)
+        fixes = self.updateSizes(query)
+        result = list(self.collection.aggregate([
+            {'$match': query},
+            {'$group': {'_id': None, 'size': {'$sum': '$size'}}}
+        ]))
+        size = result[0]['size'] if result else 0
+        fixes += self.model(rootType)._fixSizes([root], {root['_id']: size})
+        return size, fixes
+
+    def updateAllSizes(self, progress=noProgress):
+        """
+        Recompute the size of every item, folder, user, and collection in the
+        database, fixing those that are wrong. The size of each top-level
+        folder's subtree is summed in a single aggregation over the ancestor
+        paths, so this must only be used once they have been fully migrated.
+
+        :param progress: A progress context to record progress on.
+        :type progress: girder.utility.progress.ProgressContext or None.
+        :returns: the number of documents that were changed.
+        """
+        rootModels = [self.model('collection'), self.model('user')]
+        progress.update(total=sum(
+            model.find({}, fields=()).count() for model in [self] + rootModels), current=0)
+
+        fixes = self.updateSizes(progress=progress)
+
+        # Every folder belongs to the subtree of the first of its ancestors,
+        # or of itself if it is a top-level folder.
+        subtreeSizes = {entry['_id']: entry['size'] for entry in self.collection.aggregate([
+            {'$project': {'size': 1, 'top': {'$cond': [
+                {'$eq': [{'$size': '$ancestors'}, 0]},
+                '$_id',
+                {'$arrayElemAt': ['$ancestors', 0]}
+            ]}}},
+            {'$group': {'_id': '$top', 'size': {'$sum': '$size'}}}
+        ], allowDiskUse=True)}
+        rootSizes = collections.defaultdict(int)
+        for folder in self.find({
+            'ancestors': [],
+            'parentCollection': {'$in': ['collection', 'user']}
+        }, fields=('parentId', )):
+            rootSizes[folder['parentId']] += subtreeSizes.get(folder['_id'], 0)
+
+        for model in rootModels:
+            roots = model.find({}, fields=('size', ))
+            while True:
+                batch = list(itertools.islice(roots, 1000))
+                if not batch:
+                    break
+                fixes += model._fixSizes(batch, rootSizes)
+                progress.update(increment=len(batch))
+        return fixes
+
     def setMetadata(self, folder, metadata, allowNull=False):
         """
         Set metadata on a folder.  A `ValidationException` is thrown in the
@@ -240,6 +476,11 @@ class Folder(AccessControlledModel):
         the folder.
         :type updateQuery: dict
         """
+        if self._ancestorsComplete():
+            self.update(query={'ancestors': folderId}, update=updateQuery)
+            self.model('item').update(query={'ancestors': folderId}, update=updateQuery)
+            return
+
         self.update(query={
             'parentId': folderId,
             'parentCollection': 'folder'
@@ -269,15 +510,28 @@ class Folder(AccessControlledModel):
         if ancestor['_id'] == descendant['_id']:
             return True
 
-        if descendant['parentCollection'] != 'folder':
-            return False
-
-        descendant = self.load(descendant['parentId'], force=True)
-
-        if descendant is None:
-            return False
+        return ancestor['_id'] in self.getAncestors(descendant)
 
-        return self._isAncestor(ancestor, descendant)
+    def _updateDescendantAncestors(self, folderId, oldAncestors, newAncestors):
+        """
+        When a folder is moved, replace the ancestor path prefix above it in
+        all of its descendant folders and items.
+
+        :param folderId: The _id of the folder that was moved.
+        :param oldAncestors: The folder's ancestors before the move.
+        :type oldAncestors: list
+        :param newAncestors: The folder's ancestors after the move.
+        :type newAncestors: list
+        """
+        for model in (self, self.model('item')):
+            if oldAncestors:
+                model.update({'ancestors': folderId}, {
+                    '$pullAll': {'ancestors': oldAncestors}
+                })
+            if newAncestors:
+                model.update({'ancestors': folderId}, {
+                    '$push': {'ancestors': {'$each': newAncestors, '$position': 0}}
+                })
 
     def move(self, folder, parent, parentType):
         """
@@ -296,8 +550,17 @@ class Folder(AccessControlledModel):
             raise ValidationException(
                 'You may not move a folder underneath itself.')
 
+        oldAncestors = self.getAncestors(folder)
+        if parentType == 'folder':
+            newAncestors = self.getAncestors(parent) + [parent['_id']]
+        else:
+            newAncestors = []
+
         folder['parentId'] = parent['_id']
         folder['parentCollection'] = parentType
+        folder['ancestors'] = newAncestors
+        if oldAncestors != newAncestors:
+            self._updateDescendantAncestors(folder['_id'], oldAncestors, newAncestors)
 
         if parentType == 'folder':
             rootType, rootId = parent['baseParentType'], parent['baseParentId']
@@ -336,6 +599,13 @@ class Folder(AccessControlledModel):
         :type progress: girder.utility.progress.ProgressContext or None.
         """
         setResponseTimeLimit()
+        if self._canRemoveInBulk():
+            progress = progress or noProgress
+            itemSize = self.model('item')._removeInBulk({'folderId': folder['_id']}, progress)
+            size = itemSize + self._removeSubtree({'ancestors': folder['_id']}, progress)
+            self._propagateRemovedSize(folder, itemSize, size)
+            return
+
         # Delete all child items
         items = self.model('item').find({
             'folderId': folder['_id']
@@ -367,6 +637,13 @@ class Folder(AccessControlledModel):
         :param progress: A progress context to record progress on.
         :type progress: girder.utility.progress.ProgressContext or None.
         """
+        if self._canRemoveInBulk():
+            size = self._removeSubtree({
+                '$or': [{'_id': folder['_id']}, {'ancestors': folder['_id']}]
+            }, progress or noProgress)
+            self._propagateRemovedSize(folder, 0, size)
+            return
+
         # Remove the contents underneath this folder recursively.
         self.clean(folder, progress, **kwargs)
 
@@ -385,6 +662,122 @@ class Folder(AccessControlledModel):
             progress.update(increment=1, message='Deleted folder %s' %
                             folder['name'])
 
+    def _canRemoveInBulk(self):
+        """
+        Whether subtrees can be deleted by :py:meth:`_removeSubtree`. Instead
+        of the per-document removal events of the folders, items and files it
+        deletes, it triggers ``model.folder.remove.bulk``,
+        ``model.item.remove.bulk`` and ``model.file.remove.bulk`` with each
+        batch of documents. It is only used if every handler of the
+        per-document events is also bound, under the same handler name, to the
+        corresponding bulk event. It also relies on the "ancestors" index.
+        """
+        if not self._ancestorsComplete():
+            return False
+        for model in ('folder', 'item', 'file'):
+            bulkNames = set(events.handlerNames('model.%s.remove.bulk' % model))
+            for event in ('remove', 'remove_with_kwargs'):
+                if not set(events.handlerNames('model.%s.%s' % (model, event))) <= bulkNames:
+                    return False
+        return True
+
+    def _removeSubtree(self, query, progress=noProgress, batchSize=1000):
+        """
+        Delete the folders matching a query, along with their items and
+        pending uploads, a batch at a time. The query must match every
+        descendant of the folders it matches. Size changes are not propagated;
+        the caller is responsible for that.
+
+        :param query: The search query for the folders to delete.
+        :type query: dict
+        :param progress: A progress context to record progress on.
+        :type progress: girder.utility.progress.ProgressContext
+        :param batchSize: The number of documents to delete at a time.
+        :type batchSize: int
+        :returns: the total size of the deleted files.
+        """
+        itemModel = self.model('item')
+        uploadModel = self.model('upload')
+        size = 0
+        while True:
+            # Each batch is deleted before the next query, so no offset is needed
+            folders = list(self.find(query, limit=batchSize))
+            if not folders:
+                return size
+            ids = [folder['_id'] for folder in folders]
+            size += itemModel._removeInBulk({'folderId': {'$in': ids}}, progress, batchSize)
+
+            for upload in uploadModel.find({'parentId': {'$in': ids}, 'parentType': 'folder'}):
+                uploadModel.remove(upload)
+
+            events.trigger('model.folder.remove.bulk', folders)
+            self.removeWithQuery({'_id': {'$in': ids}})
+            progress.update(increment=len(folders), message='Deleted %d folders' % len(folders))
+
+    def _propagateRemovedSize(self, folder, folderSize, rootSize):
+        """
+        Subtract the size of deleted files from a folder and its root, as
+        removing the files one at a time would have.
+
+        :param folder: The folder whose contents were deleted.
+        :param folderSize: The size of the files in items directly within the
+            folder.
+        :param rootSize: The size of all of the deleted files.
+        """
+        if folderSize:
+            self.increment(query={'_id': folder['_id']}, field='size',
+                           amount=-folderSize, multi=False)
+        if rootSize:
+            self.model(folder['baseParentType']).increment(
+                query={'_id': folder['baseParentId']}, field='size',
+                amount=-rootSize, multi=False)
+
+    def removeInBackground(self, doc, modelName='folder', contentsOnly=False, user=None,
+                           progress=False):
+        """
+        Delete a folder or a collection, or the contents of a folder, in the
+        events daemon rather than in the calling thread.
+
+        :param doc: The folder or collection to delete.
+        :type doc: dict
+        :param modelName: 'folder' or 'collection'.
+        :type modelName: str
+        :param contentsOnly: If True, clean the folder rather than delete it.
+        :type contentsOnly: bool
+        :param user: The user deleting the document, who will be notified of
+            the progress.
+        :type user: dict
+        :param progress: Whether to record progress.
+        :type progress: bool
+        """
+        events.daemon.trigger('_remove_in_background', {
+            'id': doc['_id'],
+            'model': modelName,
+            'contentsOnly': contentsOnly,
+            'user': user,
+            'progress': progress,
+            'title': '%s %s %s' % (
+                'Clearing' if contentsOnly else 'Deleting', modelName, doc['name'])
+        })
+
+    def _onRemoveInBackground(self, event):
+        """
+        Perform a deletion requested by :py:meth:`removeInBackground`.
+        """
+        info = event.info
+        model = self.model(info['model'])
+        doc = model.load(info['id'], force=True)
+        if doc is None:
+            return
+        with ProgressContext(info['progress'], user=info['user'], title=info['title'],
+                             message='Calculating size...') as ctx:
+            if info['progress']:
+                ctx.update(total=model.subtreeCount(doc) - (1 if info['contentsOnly'] else 0))
+            if info['contentsOnly']:
+                self.clean(doc, progress=ctx)
+            else:
+                model.remove(doc, progress=ctx)
+
     def childItems(self, folder, limit=0, offset=0, sort=None, filters=None,
                    **kwargs):
         """
@@ -408,7 +801,7 @@ class Folder(AccessControlledModel):
     def childFolders(self, parent, parentType, user=None, limit=0, offset=0,
                      sort=None, filters=None, **kwargs):
         """
-        This generator will yield child folders of a user, collection, or
+        Return a cursor over the child folders of a user, collection, or
         folder, with access policy filtering.  Passes any kwargs to the find
         function.
 
@@ -437,13 +830,9 @@ class Folder(AccessControlledModel):
         }
         q.update(filters)
 
-        # Perform the find; we'll do access-based filtering of the result set
-        # afterward.
-        cursor = self.find(q, sort=sort, **kwargs)
-
-        return self.filterResultsByPermission(
-            cursor=cursor, user=user, level=AccessType.READ, limit=limit,
-            offset=offset)
+        return self.findWithPermissions(
+            q, sort=sort, user=user, level=AccessType.READ, limit=limit, offset=offset,
+            **kwargs)
 
     def createFolder(self, parent, name, description='', parentType='folder',
                      public=None, creator=None, allowRename=False,
@@ -495,9 +884,11 @@ class Folder(AccessControlledModel):
                     parent, user=creator, force=True)
                 parent['baseParentId'] = pathFromRoot[0]['object']['_id']
                 parent['baseParentType'] = pathFromRoot[0]['type']
+            ancestors = self.getAncestors(parent) + [ObjectId(parent['_id'])]
         else:
             parent['baseParentId'] = parent['_id']
             parent['baseParentType'] = parentType
+            ancestors = []
 
         now = datetime.datetime.utcnow()
 
@@ -513,6 +904,7 @@ class Folder(AccessControlledModel):
             'baseParentId': parent['baseParentId'],
             'baseParentType': parent['baseParentType'],
             'parentId': ObjectId(parent['_id']),
+            'ancestors': ancestors,
             'creatorId': creatorId,
             'created': now,
             'updated': now,
@@ -558,30 +950,60 @@ class Folder(AccessControlledModel):
         :returns: an ordered list of dictionaries from root to the current folder
         """
         curPath = curPath or []
-        curParentId = folder['parentId']
-        curParentType = folder['parentCollection']
-
-        if curParentType in ('user', 'collection'):
-            curParentObject = self.model(curParentType).load(
-                curParentId, user=user, level=level, force=force)
+        return self.ancestorPath(
+            self.getAncestors(folder), (folder['parentCollection'], folder['parentId']),
+            user=user, force=force, level=level) + curPath
 
-            if force:
-                parentFiltered = curParentObject
-            else:
-                parentFiltered = self.model(curParentType).filter(curParentObject, user)
-
-            return [{
-                'type': curParentType,
-                'object': parentFiltered
-            }] + curPath
-        else:
-            curParentObject = self.load(curParentId, user=user, level=level, force=force)
-            curPath = [{
-                'type': curParentType,
-                'object': curParentObject if force else self.filter(curParentObject, user)
-            }] + curPath
+    def ancestorPath(self, ancestorIds, root, user=None, force=False, level=AccessType.READ):
+        """
+        Load a list of ancestor folders, along with the user or collection at
+        the root of the hierarchy, in a single query per collection.
+
+        :param ancestorIds: The folder ids, ordered from the top-level folder
+            downward, as stored in the "ancestors" field.
+        :type ancestorIds: list
+        :param root: The (type, id) of the parent of the top-level folder. This
+            is only used if ancestorIds is empty; otherwise it is read from the
+            top-level folder.
+        :type root: tuple
+        :param user: The user to check access against.
+        :type user: dict or None
+        :param force: Set to True to skip permission checking. If False, the
+            returned documents will be filtered.
+        :type force: bool
+        :param level: The access level required on each document.
+        :type level: AccessType
+        :returns: an ordered list of dictionaries from the root downward.
+        """
+        folders = {}
+        if ancestorIds:
+            folders = {doc['_id']: doc for doc in self.find({'_id': {'$in': ancestorIds}})}
+            missing = [id for id in ancestorIds if id not in folders]
+            if missing:
+                raise ValidationException('No such folder: %s' % missing[0], field='id')
+            top = folders[ancestorIds[0]]
+            root = (top['parentCollection'], top['parentId'])
+
+        rootType, rootId = root
+        rootObject = self.model(rootType).load(rootId, user=user, level=level, force=force)
+        if not force:
+            rootObject = self.model(rootType).filter(rootObject, user)
+        path = [{
+            'type': rootType,
+            'object': rootObject
+        }]
+
+        for ancestorId in ancestorIds:
+            ancestor = folders[ancestorId]
+            if not force:
+                self.requireAccess(ancestor, user, level)
+                ancestor = self.filter(ancestor, user)
+            path.append({
+                'type': 'folder',
+                'object': ancestor
+            })
 
-            return self.parentsToRoot(curParentObject, curPath, user=user, force=force)
+        return path
 
     def countItems(self, folder):
         """
@@ -601,18 +1023,14 @@ class Folder(AccessControlledModel):
         :param level: The required access level, or None to return the raw
             subfolder count.
         """
-        fields = () if level is None else ('access', 'public')
-
-        folders = self.find({
+        query = {
             'parentId': folder['_id'],
             'parentCollection': 'folder'
-        }, fields=fields)
+        }
+        if level is not None:
+            query = self._permissionQuery(query, user, level)
 
-        if level is None:
-            return folders.count()
-        else:
-            return sum(1 for _ in self.filterResultsByPermission(
-                cursor=folders, user=user, level=level))
+        return self.find(query, fields=()).count()
 
     def subtreeCount(self, folder, includeItems=True, user=None, level=None):
         """
@@ -628,19 +1046,70 @@ class Folder(AccessControlledModel):
         :param level: If filtering by permission, the required permission level.
         :type level: AccessLevel
         """
+        if not self._ancestorsComplete():
+            return self._subtreeCountRecursive(folder, includeItems, user, level)
+
+        query = {'ancestors': folder['_id']}
+        if level is None:
+            count = 1 + self.find(query, fields=()).count()
+            if includeItems:
+                count += self.model('item').find(query, fields=()).count()
+            return count
+
+        visible = {folder['_id']}
+        visible.update(doc['_id'] for doc in self._visibleSubfolders(folder, user, level))
+
+        count = len(visible)
+        if includeItems:
+            itemCounts = self.model('item').collection.aggregate([
+                {'$match': query},
+                {'$group': {'_id': '$folderId', 'count': {'$sum': 1}}}
+            ])
+            count += sum(entry['count'] for entry in itemCounts if entry['_id'] in visible)
+        return count
+
+    def _visibleSubfolders(self, folder, user, level, fields=()):
+        """
+        Return every folder below the given folder that the user can see at
+        the given level, ordered from the top of the subtree down. This must
+        only be used once the ancestor paths have been fully migrated.
+
+        :param folder: The root of the subtree, which is not included.
+        :param fields: Additional fields to load for each folder.
+        :returns: A list of folder documents.
+        """
+        # A folder is only visible if all of its ancestors within the subtree
+        # are visible, so check them from the top down.
+        subfolders = sorted(
+            self.findWithPermissions(
+                {'ancestors': folder['_id']}, fields=('ancestors', ) + tuple(fields),
+                user=user, level=level),
+            key=lambda doc: len(doc['ancestors']))
+        visible = {folder['_id']}
+        results = []
+        for subfolder in subfolders:
+            if subfolder['ancestors'][-1] in visible:
+                visible.add(subfolder['_id'])
+                results.append(subfolder)
+        return results
+
+    def _subtreeCountRecursive(self, folder, includeItems=True, user=None, level=None):
+        """
+        Implementation of subtreeCount for databases in which the ancestor
+        paths have not been fully migrated.
+        """
         count = 1
 
         if includeItems:
             count += self.countItems(folder)
 
-        folders = self.find({
+        query = {
             'parentId': folder['_id'],
             'parentCollection': 'folder'
-        }, fields=('access',))
-
+        }
         if level is not None:
-            folders = self.filterResultsByPermission(
-                cursor=folders, user=user, level=level)
+            query = self._permissionQuery(query, user, level)
+        folders = self.find(query, fields=('_id', ))
 
         count += sum(self.subtreeCount(subfolder, includeItems=includeItems,
                                        user=user, level=level)
@@ -683,14 +1152,71 @@ class Folder(AccessControlledModel):
         """
         if subpath:
             path = os.path.join(path, doc['name'])
+        if not self._ancestorsComplete():
+            return self._fileListRecursive(
+                doc, user, path, includeMetadata, mimeFilter, data)
+
+        return self._fileListTree(
+            doc, user, path, includeMetadata, mimeFilter, data)
+
+    def _fileListTree(self, doc, user, path, includeMetadata, mimeFilter,
+                      data):
+        """
+        Implementation of fileList that fetches the visible folders of the
+        subtree in one query and all of its items in another, so files are
+        listed grouped by item rather than walking the tree folder by folder.
+        Folder metadata files are listed last.
+        """
+        metadataFile = 'girder-folder-metadata.json'
+        fields = ('name', 'meta') if includeMetadata else ('name',)
+        folders = {doc['_id']: doc}
+        paths = {doc['_id']: path}
+        # Folders that already contain something named like the metadata file
+        taken = set()
+        for sub in self._visibleSubfolders(doc, user, AccessType.READ, fields):
+            parentId = sub['ancestors'][-1]
+            folders[sub['_id']] = sub
+            paths[sub['_id']] = os.path.join(paths[parentId], sub['name'])
+            if sub['name'] == metadataFile:
+                taken.add(parentId)
+
+        itemModel = self.model('item')
+        # Items of the subtree whose folders the user cannot see are skipped
+        items = (item for item in itemModel.find({'ancestors': doc['_id']})
+                 if item['folderId'] in paths)
+        for item, files in itemModel.withChildFiles(items):
+            if item['name'] == metadataFile:
+                taken.add(item['folderId'])
+            for (filepath, file) in itemModel._fileListFromFiles(
+                    item, files, paths[item['folderId']], includeMetadata,
+                    True, mimeFilter, data):
+                yield (filepath, file)
+
+        if includeMetadata:
+            for folderId, folder in six.viewitems(folders):
+                if folderId not in taken and folder.get('meta', {}):
+                    yield (os.path.join(paths[folderId], metadataFile),
+                           self._metadataStream(folder['meta']))
+
+    def _metadataStream(self, meta):
+        def stream():
+            yield json.dumps(meta, default=str)
+        return stream
+
+    def _fileListRecursive(self, doc, user, path, includeMetadata, mimeFilter,
+                           data):
+        """
+        Implementation of fileList for databases in which the ancestor paths
+        have not been fully migrated.
+        """
         metadataFile = 'girder-folder-metadata.json'
         for sub in self.childFolders(parentType='folder', parent=doc,
                                      user=user):
             if sub['name'] == metadataFile:
                 metadataFile = None
-            for (filepath, file) in self.fileList(
-                    sub, user, path, includeMetadata, subpath=True,
-                    mimeFilter=mimeFilter, data=data):
+            for (filepath, file) in self._fileListRecursive(
+                    sub, user, os.path.join(path, sub['name']),
+                    includeMetadata, mimeFilter, data):
                 yield (filepath, file)
         for item in self.childItems(folder=doc):
             if item['name'] == metadataFile:
@@ -704,6 +1230,102 @@ class Folder(AccessControlledModel):
                 yield json.dumps(doc['meta'], default=str)
             yield (os.path.join(path, metadataFile), stream)
 
+    def manifest(self, folder, user=None):
+        """
+        Generate a compact listing of every folder, item, and file below a
+        folder that the user can read, such as for clients that synchronize
+        the subtree with a local copy. Folders are listed before their
+        contents and items directly before their files.
+
+        Every record has a ``type`` of ``folder``, ``item``, or ``file``, with
+        its ``_id``, ``name``, ``updated`` time, and ``path`` relative to the
+        given folder, whose parts are separated by ``/``. The ``updated`` time
+        of a file is also that of the last change of its contents. Folders also have
+        their ``parentId``, items their ``folderId`` and ``size``, and files
+        their ``itemId``, ``size``, and ``sha512`` when it is known.
+
+        :param folder: The root of the subtree, which is not listed.
+        :type folder: dict
+        :param user: The user used for access.
+        :type user: dict or None
+        :returns: A generator of records.
+        """
+        if not self._ancestorsComplete():
+            return self._manifestRecursive(folder, user, '')
+        return self._manifestTree(folder, user)
+
+    def _manifestTree(self, folder, user):
+        """
+        Implementation of manifest that fetches the visible folders of the
+        subtree in one query and all of its items in another.
+        """
+        paths = {folder['_id']: ''}
+        for sub in self._visibleSubfolders(
+                folder, user, AccessType.READ, ('name', 'parentId', 'updated')):
+            path = paths[sub['ancestors'][-1]] + sub['name']
+            paths[sub['_id']] = path + '/'
+            yield self._manifestFolder(sub, path)
+
+        itemModel = self.model('item')
+        # Items of the subtree whose folders the user cannot see are skipped
+        items = (item for item in itemModel.find(
+            {'ancestors': folder['_id']}, fields=('name', 'folderId', 'updated', 'size'))
+            if item['folderId'] in paths)
+        for item, files in itemModel.withChildFiles(items):
+            for record in self._manifestItem(item, files, paths[item['folderId']]):
+                yield record
+
+    def _manifestRecursive(self, folder, user, path):
+        """
+        Implementation of manifest for databases in which the ancestor paths
+        have not been fully migrated.
+        """
+        for sub in self.childFolders(
+                parentType='folder', parent=folder, user=user,
+                fields=('name', 'parentId', 'updated')):
+            yield self._manifestFolder(sub, path + sub['name'])
+            for record in self._manifestRecursive(sub, user, path + sub['name'] + '/'):
+                yield record
+        itemModel = self.model('item')
+        for item, files in itemModel.withChildFiles(self.childItems(
+                folder=folder, fields=('name', 'folderId', 'updated', 'size'))):
+            for record in self._manifestItem(item, files, path):
+                yield record
+
+    def _manifestFolder(self, folder, path):
+        return {
+            'type': 'folder',
+            '_id': folder['_id'],
+            'parentId': folder['parentId'],
+            'name': folder['name'],
+            'path': path,
+            'updated': folder['updated']
+        }
+
+    def _manifestItem(self, item, files, path):
+        path += item['name']
+        yield {
+            'type': 'item',
+            '_id': item['_id'],
+            'folderId': item['folderId'],
+            'name': item['name'],
+            'path': path,
+            'size': item.get('size', 0),
+            'updated': item['updated']
+        }
+        for file in files:
+            yield {
+                'type': 'file',
+                '_id': file['_id'],
+                'itemId': item['_id'],
+                'name': file['name'],
+                'path': path + '/' + file['name'],
+                'size': file.get('size', 0),
+                # Replacing the contents of a file resets its creation time
+                'updated': max(file['created'], file.get('updated', file['created'])),
+                'sha512': file.get('sha512')
+            }
+
     def copyFolder(self, srcFolder, parent=None, name=None, description=None,
                    parentType=None, public=None, creator=None, progress=None,
                    firstFolder=None):
@@ -792,20 +1414,23 @@ class Folder(AccessControlledModel):
             newFolder = self.save(newFolder, triggerEvents=False)
         # Give listeners a chance to change things
         events.trigger('model.folder.copy.prepare', (srcFolder, newFolder))
-        # copy items
-        for item in self.childItems(folder=srcFolder):
-            setResponseTimeLimit()
-            self.model('item').copyItem(item, creator, folder=newFolder)
-            if progress:
-                progress.update(increment=1, message='Copied item ' +
-                                item['name'])
-        # copy subfolders
-        for sub in self.childFolders(parentType='folder', parent=srcFolder,
-                                     user=creator):
-            if firstFolder and firstFolder['_id'] == sub['_id']:
-                continue
-            self.copyFolder(sub, parent=newFolder, parentType='folder',
-                            creator=creator, progress=progress)
+        if self._canCopyInBulk():
+            self._copySubtree(srcFolder, newFolder, creator, progress, firstFolder)
+        else:
+            # copy items
+            for item in self.childItems(folder=srcFolder):
+                setResponseTimeLimit()
+                self.model('item').copyItem(item, creator, folder=newFolder)
+                if progress:
+                    progress.update(increment=1, message='Copied item ' +
+                                    item['name'])
+            # copy subfolders
+            for sub in self.childFolders(parentType='folder', parent=srcFolder,
+                                         user=creator):
+                if firstFolder and firstFolder['_id'] == sub['_id']:
+                    continue
+                self.copyFolder(sub, parent=newFolder, parentType='folder',
+                                creator=creator, progress=progress)
         events.trigger('model.folder.copy.after', newFolder)
         if progress:
             progress.update(increment=1, message='Copied folder ' +
@@ -814,6 +1439,162 @@ class Folder(AccessControlledModel):
         # Reload to get updated size value
         return self.load(newFolder['_id'], force=True)
 
+    def _canCopyInBulk(self):
+        """
+        Whether subtrees can be copied by :py:meth:`_copySubtree`. It skips the
+        per-document validate, save, and copy events of the folders, items and
+        files it creates, so it is only used when no handlers other than core
+        ones listen to those events. It also relies on the "ancestors" index.
+        """
+        if not self._ancestorsComplete():
+            return False
+        eventNames = ['model.%s.%s' % (model, event)
+                      for model in ('folder', 'item', 'file')
+                      for event in ('validate', 'save', 'save.created', 'save.after')]
+        eventNames += ['model.%s.%s' % (model, event)
+                       for model in ('folder', 'item')
+                       for event in ('copy.prepare', 'copy.after')]
+        return not any(
+            name != CoreEventHandler.FILE_PROPAGATE_SIZE
+            for eventName in eventNames for name in events.handlerNames(eventName))
+
+    def _copySubtree(self, srcFolder, newFolder, creator, progress, firstFolder=None):
+        """
+        Copy the subfolders and items below a folder into a new folder, as
+        repeated calls to :py:meth:`copyFolder` and the item model's
+        ``copyItem`` would. The source subtree is read with a query per
+        collection and batch, and the copies are inserted with bulk writes.
+        Copied files share their stored data with the originals, just like
+        ``copyFile`` does.
+
+        :param srcFolder: the original folder.
+        :type srcFolder: dict
+        :param newFolder: the new folder, which must be empty.
+        :type newFolder: dict
+        :param creator: user representing the creator of the new documents.
+        :type creator: dict
+        :param progress: a progress context to record process on.
+        :type progress: girder.utility.progress.ProgressContext or None.
+        :param firstFolder: if not None, a folder that is not copied.
+        """
+        now = datetime.datetime.utcnow()
+        names = collections.defaultdict(set)
+
+        # Parents are sorted before their children, so that a subfolder is
+        # skipped if its parent was, as when it is not readable by the creator.
+        newFolders = {srcFolder['_id']: newFolder}
+        folderDocs = []
+        for src in sorted(self.find({'ancestors': srcFolder['_id']}),
+                          key=lambda doc: len(doc['ancestors'])):
+            parent = newFolders.get(src['parentId'])
+            if (parent is None or src['_id'] == newFolder['_id'] or
+                    (firstFolder and firstFolder['_id'] == src['_id']) or
+                    not self.hasAccess(src, creator, AccessType.READ)):
+                continue
+            name = _uniqueName(src['name'], names[parent['_id']])
+            doc = {
+                '_id': ObjectId(),
+                'name': name,
+                'lowerName': name.lower(),
+                'description': src['description'],
+                'parentCollection': 'folder',
+                'baseParentId': newFolder['baseParentId'],
+                'baseParentType': newFolder['baseParentType'],
+                'parentId': parent['_id'],
+                'ancestors': parent['ancestors'] + [parent['_id']],
+                'creatorId': creator.get('_id') if creator else None,
+                'created': now,
+                'updated': now,
+                'size': 0
+            }
+            self.copyAccessPolicies(src=parent, dest=doc, save=False)
+            if creator is not None:
+                self.setUserAccess(doc, user=creator, level=AccessType.ADMIN, save=False)
+            _copyExtraFields(self, src, doc, creator)
+            newFolders[src['_id']] = doc
+            folderDocs.append(doc)
+
+        for start in six.moves.range(0, len(folderDocs), 1000):
+            setResponseTimeLimit()
+            self.collection.insert_many(folderDocs[start:start + 1000])
+
+        folderIds = list(newFolders)
+        folderSizes = collections.defaultdict(int)
+        for start in six.moves.range(0, len(folderIds), 1000):
+            self._copyItemsInBulk(
+                folderIds[start:start + 1000], newFolders, creator, now, names,
+                folderSizes, progress)
+
+        updates = [UpdateOne({'_id': id}, {'$inc': {'size': size}})
+                   for id, size in six.viewitems(folderSizes) if size]
+        if updates:
+            self.collection.bulk_write(updates, ordered=False)
+            self._forgetLoaded()
+            self.model(newFolder['baseParentType']).increment(query={
+                '_id': newFolder['baseParentId']
+            }, field='size', amount=sum(six.viewvalues(folderSizes)), multi=False)
+        if progress and folderDocs:
+            progress.update(increment=len(folderDocs),
+                            message='Copied folder ' + folderDocs[-1]['name'])
+
+    def _copyItemsInBulk(self, srcFolderIds, newFolders, creator, now, names, folderSizes,
+                         progress):
+        """
+        Helper for :py:meth:`_copySubtree` that copies the items, and their
+        files, of a batch of source folders.
+        """
+        itemModel = self.model('item')
+        fileModel = self.model('file')
+        newItems = {}
+        for srcItem in itemModel.find({'folderId': {'$in': srcFolderIds}}):
+            parent = newFolders[srcItem['folderId']]
+            name = _uniqueName(srcItem['name'], names[parent['_id']])
+            item = {
+                '_id': ObjectId(),
+                'name': name,
+                'lowerName': name.lower(),
+                'description': srcItem['description'],
+                'folderId': parent['_id'],
+                'ancestors': parent['ancestors'] + [parent['_id']],
+                'creatorId': creator['_id'],
+                'baseParentType': parent['baseParentType'],
+                'baseParentId': parent['baseParentId'],
+                'created': now,
+                'updated': now,
+                'size': 0
+            }
+            _copyExtraFields(itemModel, srcItem, item, creator)
+            # add a reference to the original item
+            item['copyOfItem'] = srcItem['_id']
+            newItems[srcItem['_id']] = item
+        if not newItems:
+            return
+
+        setResponseTimeLimit()
+        files = []
+        adapters = {}
+        for srcFile in fileModel.find({'itemId': {'$in': list(newItems)}}):
+            item = newItems[srcFile['itemId']]
+            file = srcFile.copy()
+            file['_id'] = ObjectId()
+            file['copied'] = now
+            file['copierId'] = creator['_id']
+            file['itemId'] = item['_id']
+            if file.get('assetstoreId'):
+                if file['assetstoreId'] not in adapters:
+                    adapters[file['assetstoreId']] = fileModel.getAssetstoreAdapter(file)
+                adapters[file['assetstoreId']].copyFile(srcFile, file)
+            item['size'] += file.get('size') or 0
+            files.append(file)
+
+        for item in six.viewvalues(newItems):
+            folderSizes[item['folderId']] += item['size']
+        itemModel.collection.insert_many(list(six.viewvalues(newItems)))
+        if files:
+            fileModel.collection.insert_many(files)
+        if progress:
+            progress.update(increment=len(newItems), message='Copied item ' + item['name'])
+
     def setAccessList(self, doc, access, save=False, recurse=False, user=None,
                       progress=noProgress, setPublic=None, publicFlags=None, force=False):
         """
@@ -856,13 +1637,10 @@ class Folder(AccessControlledModel):
             self, doc, access, user=user, save=save, force=force)
 
         if recurse:
-            cursor = self.find({
+            subfolders = self.findWithPermissions({
                 'parentId': doc['_id'],
                 'parentCollection': 'folder'
-            })
-
-            subfolders = self.filterResultsByPermission(
-                cursor=cursor, user=user, level=AccessType.ADMIN)
+            }, user=user, level=AccessType.ADMIN)
 
             for folder in subfolders:
                 self.setAccessList(
@@ -889,6 +1667,13 @@ class Folder(AccessControlledModel):
         :param doc: The folder.
         :type doc: dict
         """
+        if self._ancestorsComplete():
+            fixes = self.updateSizes({'$or': [
+                {'_id': doc['_id']},
+                {'ancestors': doc['_id']}
+            ]})
+            return self.findOne({'_id': doc['_id']}, fields=('size', ))['size'], fixes
+
         size = 0
         fixes = 0
         # recursively fix child folders but don't include their size
@@ -909,3 +1694,27 @@ class Folder(AccessControlledModel):
             self.update({'_id': doc['_id']}, update={'$set': {'size': size}})
             fixes += 1
         return size, fixes
+
+
+def _uniqueName(name, used):
+    """
+    Return the name, or the name with a " (n)" suffix as added by validation,
+    that is not among the names already used in a folder, and record it.
+    """
+    unique = name
+    n = 0
+    while unique in used:
+        n += 1
+        unique = '%s (%d)' % (name, n)
+    used.add(unique)
+    return unique
+
+
+def _copyExtraFields(model, src, doc, creator):
+    """
+    Copy metadata and other extension values of a document onto its copy.
+    """
+    filtered = model.filter(doc, creator)
+    for key in src:
+        if key not in filtered and key not in doc:
+            doc[key] = copy.deepcopy(src[key])
@@ -56,6 +56,7 @@ class Group(AccessControlledModel):
 
     def initialize(self):
         self.name = 'group'
+        self._identityMapped = True
         self.ensureIndices(['lowerName'])
         self.ensureTextIndex({
             'name': 10,
@@ -363,6 +364,24 @@ class Group(AccessControlledModel):
             return self._hasUserAccess(doc.get('access', {}).get('users', []),
                                        user['_id'], level)
 
+    def permissionClauses(self, user=None, level=AccessType.READ, flags=None):
+        """
+        This overrides the default AccessControlledModel behavior so that
+        queries match the same groups as :py:meth:`hasAccess`, which grants
+        read access to the members of a group and to the users invited to it.
+        """
+        clauses = super(Group, self).permissionClauses(user=user, level=level, flags=flags)
+        if user is None or user['admin'] or level != AccessType.READ:
+            return clauses
+
+        groupIds = user.get('groups', []) + [
+            invite['groupId'] for invite in user.get('groupInvites', [])]
+        readable = {'$or': [{'public': True}, {'_id': {'$in': groupIds}}]}
+        if '$and' in clauses:
+            # Keep the access flag clauses that follow the access clause
+            return {'$and': [readable] + clauses['$and'][1:]}
+        return readable
+
     def getAccessLevel(self, doc, user):
         """
         Return the maximum access level for a given user on the group.
@@ -17,18 +17,22 @@
 #  limitations under the License.
 ###############################################################################
 
+import collections
 import copy
 import datetime
+import itertools
 import json
 import os
 import six
 
 from bson.objectid import ObjectId
+from pymongo import UpdateOne
 from .model_base import Model, ValidationException, GirderException
 from girder import events
 from girder import logger
 from girder.constants import AccessType
 from girder.utility import acl_mixin
+from girder.utility.progress import noProgress
 
 
 class Item(acl_mixin.AccessControlMixin, Model):
@@ -39,7 +43,8 @@ class Item(acl_mixin.AccessControlMixin, Model):
 
     def initialize(self):
         self.name = 'item'
-        self.ensureIndices(('folderId', 'name', 'lowerName',
+        self._identityMapped = True
+        self.ensureIndices(('folderId', 'name', 'lowerName', 'ancestors',
                             ([('folderId', 1), ('name', 1)], {})))
         self.ensureTextIndex({
             'name': 10,
@@ -73,6 +78,9 @@ class Item(acl_mixin.AccessControlMixin, Model):
         if not doc['name']:
             raise ValidationException('Item name must not be empty.', 'name')
 
+        if 'ancestors' not in doc:
+            self.getAncestors(doc)
+
         # Ensure unique name among sibling items and folders. If the desired
         # name collides with an existing item or folder, we will append (n)
         # onto the end of the name, incrementing n until the name is unique.
@@ -113,7 +121,7 @@ class Item(acl_mixin.AccessControlMixin, Model):
         """
         # Ensure we include extra fields to do the migration below
         extraFields = {'baseParentId', 'baseParentType', 'parentId', 'parentCollection',
-                       'name', 'lowerName'}
+                       'name', 'lowerName', 'folderId', 'ancestors'}
         loadFields = self._supplementFields(fields, extraFields)
 
         doc = super(Item, self).load(
@@ -121,6 +129,8 @@ class Item(acl_mixin.AccessControlMixin, Model):
             exc=exc)
 
         if doc is not None:
+            if 'ancestors' not in doc:
+                self.getAncestors(doc)
             if 'baseParentType' not in doc:
                 pathFromRoot = self.parentsToRoot(doc, user=user, force=True)
                 baseParent = pathFromRoot[0]
@@ -140,6 +150,29 @@ class Item(acl_mixin.AccessControlMixin, Model):
 
         return doc
 
+    def getAncestors(self, item):
+        """
+        Return the list of ids of the folders above this item, ordered from
+        the top-level folder down to the item's own folder. This is stored on
+        the item in the indexed "ancestors" field; if it is missing, it is
+        computed from the parent folder and saved.
+
+        :param item: The item whose ancestors to return.
+        :type item: dict
+        :returns: list of folder ObjectIds.
+        """
+        if 'ancestors' in item:
+            return item['ancestors']
+
+        folder = self.model('folder').load(item['folderId'], force=True, exc=True, fields=[
+            'ancestors', 'parentId', 'parentCollection'])
+        ancestors = folder['ancestors'] + [folder['_id']]
+
+        item['ancestors'] = ancestors
+        if '_id' in item:
+            self.update({'_id': item['_id']}, {'$set': {'ancestors': ancestors}})
+        return ancestors
+
     def move(self, item, folder):
         """
         Move the given item from its current folder into another folder.
@@ -152,6 +185,7 @@ class Item(acl_mixin.AccessControlMixin, Model):
         self.propagateSizeChange(item, -item['size'])
 
         item['folderId'] = folder['_id']
+        item['ancestors'] = self.model('folder').getAncestors(folder) + [folder['_id']]
         item['baseParentType'] = folder['baseParentType']
         item['baseParentId'] = folder['baseParentId']
 
@@ -235,6 +269,45 @@ class Item(acl_mixin.AccessControlMixin, Model):
         # Delete the item itself
         Model.remove(self, item)
 
+    def _removeInBulk(self, query, progress=noProgress, batchSize=1000):
+        """
+        Delete the items matching a query, along with their files and pending
+        uploads, a batch at a time. Instead of the per-document removal events,
+        ``model.item.remove.bulk`` is triggered with each batch of items, and
+        ``model.file.remove.bulk`` with each batch of their files. Size changes
+        are not propagated; the caller is responsible for that.
+
+        :param query: The search query for the items to delete.
+        :type query: dict
+        :param progress: A progress context to record progress on.
+        :type progress: girder.utility.progress.ProgressContext
+        :param batchSize: The number of documents to delete at a time.
+        :type batchSize: int
+        :returns: the total size of the deleted files.
+        """
+        fileModel = self.model('file')
+        uploadModel = self.model('upload')
+        size = 0
+        while True:
+            # Each batch is deleted before the next query, so no offset is needed
+            items = list(self.find(query, limit=batchSize))
+            if not items:
+                return size
+            ids = [item['_id'] for item in items]
+            while True:
+                files = list(fileModel.find({'itemId': {'$in': ids}}, limit=batchSize))
+                if not files:
+                    break
+                size += sum(file.get('size', 0) for file in files)
+                fileModel.removeInBulk(files)
+
+            for upload in uploadModel.find({'parentId': {'$in': ids}, 'parentType': 'item'}):
+                uploadModel.remove(upload)
+
+            events.trigger('model.item.remove.bulk', items)
+            self.removeWithQuery({'_id': {'$in': ids}})
+            progress.update(increment=len(items), message='Deleted %d items' % len(items))
+
     def createItem(self, name, creator, folder, description='',
                    reuseExisting=False):
         """
@@ -278,6 +351,7 @@ class Item(acl_mixin.AccessControlMixin, Model):
             'name': self._validateString(name),
             'description': self._validateString(description),
             'folderId': ObjectId(folder['_id']),
+            'ancestors': self.model('folder').getAncestors(folder) + [ObjectId(folder['_id'])],
             'creatorId': creator['_id'],
             'baseParentType': folder['baseParentType'],
             'baseParentId': folder['baseParentId'],
@@ -286,6 +360,151 @@ class Item(acl_mixin.AccessControlMixin, Model):
             'size': 0
         })
 
+    def importFiles(self, folder, creator, assetstore, files, skipUnchanged=False):
+        """
+        Create many files at once, each in an item of the same name within a
+        folder, as when importing existing data into an assetstore. This is
+        equivalent to calling :py:meth:`createItem` and ``createFile`` with
+        ``reuseExisting=True`` for each file, but the lookups, inserts, and
+        size updates are each done once for the whole batch. Per-document save
+        events are not triggered.
+
+        :param folder: The folder to import the files into.
+        :type folder: dict
+        :param creator: The user importing the files.
+        :type creator: dict
+        :param assetstore: The assetstore the files are stored in.
+        :type assetstore: dict
+        :param files: The file documents to create, which must include at
+            least "name" and "size", plus any assetstore-specific fields. If a
+            file with the same name already exists, any of those fields that
+            differ are set on it instead.
+        :type files: list of dict
+        :param skipUnchanged: If True, existing files whose fields all match
+            are left out of the returned list.
+        :type skipUnchanged: bool
+        :returns: The created or updated file documents.
+        """
+        fileModel = self.model('file')
+        folderModel = self.model('folder')
+        names = [self._validateString(file['name']) for file in files]
+
+        existingItems = {item['name']: item for item in self.find({
+            'folderId': folder['_id'],
+            'name': {'$in': names}
+        }, fields=('name', ))}
+        existingFiles = {}
+        if existingItems:
+            for file in fileModel.find({
+                'itemId': {'$in': [item['_id'] for item in six.viewvalues(existingItems)]},
+                'name': {'$in': names}
+            }):
+                existingFiles.setdefault((file['itemId'], file['name']), file)
+        # New items must not take the name of a sibling folder, so let
+        # createItem rename those
+        folderNames = {doc['name'] for doc in folderModel.find({
+            'parentId': folder['_id'],
+            'parentCollection': 'folder',
+            'name': {'$in': names}
+        }, fields=('name', ))}
+
+        if 'baseParentType' not in folder:
+            pathFromRoot = self.parentsToRoot({'folderId': folder['_id']}, creator, force=True)
+            folder['baseParentType'] = pathFromRoot[0]['type']
+            folder['baseParentId'] = pathFromRoot[0]['object']['_id']
+        ancestors = folderModel.getAncestors(folder) + [ObjectId(folder['_id'])]
+        now = datetime.datetime.utcnow()
+
+        results, newItems, newFiles, fileUpdates = [], [], [], []
+        itemIncrements = collections.defaultdict(int)
+        sizeIncrement = 0
+        for name, file in zip(names, files):
+            item = existingItems.get(name)
+            existing = existingFiles.get((item['_id'], name)) if item else None
+            if existing is not None:
+                fields = {k: v for k, v in six.viewitems(file)
+                          if k != 'name' and existing.get(k) != v}
+                if 'size' in fields:
+                    delta = fields['size'] - existing.get('size', 0)
+                    itemIncrements[item['_id']] += delta
+                    sizeIncrement += delta
+                if fields:
+                    existing.update(fields)
+                    fileUpdates.append(UpdateOne({'_id': existing['_id']}, {'$set': fields}))
+                elif skipUnchanged:
+                    continue
+                results.append(existing)
+                continue
+
+            doc = {
+                'created': now,
+                'creatorId': creator['_id'],
+                'assetstoreId': assetstore['_id'],
+                'mimeType': None
+            }
+            doc.update(file)
+            doc['name'] = name
+            doc['exts'] = [ext.lower() for ext in name.split('.')[1:]]
+            if item is None and name in folderNames:
+                item = self.createItem(name=name, creator=creator, folder=folder)
+            if item is None:
+                item = {
+                    'name': name,
+                    'lowerName': name.lower(),
+                    'description': '',
+                    'folderId': ObjectId(folder['_id']),
+                    'ancestors': ancestors,
+                    'creatorId': creator['_id'],
+                    'baseParentType': folder['baseParentType'],
+                    'baseParentId': folder['baseParentId'],
+                    'created': now,
+                    'updated': now,
+                    'size': doc['size']
+                }
+                existingItems[name] = item
+                newItems.append(item)
+            else:
+                itemIncrements[item['_id']] += doc['size']
+            sizeIncrement += doc['size']
+            newFiles.append((item, doc))
+            results.append(doc)
+
+        self._writeImportedFiles(
+            folder, newItems, newFiles, fileUpdates, itemIncrements, sizeIncrement)
+        return results
+
+    def _writeImportedFiles(self, folder, newItems, newFiles, fileUpdates, itemIncrements,
+                            sizeIncrement):
+        """
+        Helper for :py:meth:`importFiles` that writes a batch of changes and
+        propagates the change in size to the folder and its root.
+        """
+        fileModel = self.model('file')
+        if newItems:
+            self.collection.insert_many(newItems)
+        if newFiles:
+            for item, doc in newFiles:
+                doc['itemId'] = item['_id']
+            fileModel.collection.insert_many([doc for _, doc in newFiles])
+        if fileUpdates:
+            fileModel.collection.bulk_write(fileUpdates, ordered=False)
+            fileModel._forgetLoaded()
+        itemIncrements = {k: v for k, v in six.viewitems(itemIncrements) if v}
+        if itemIncrements:
+            self.collection.bulk_write([
+                UpdateOne({'_id': itemId}, {'$inc': {'size': amount}})
+                for itemId, amount in six.viewitems(itemIncrements)
+            ], ordered=False)
+            self._forgetLoaded()
+
+        if sizeIncrement:
+            self.model('folder').increment(query={
+                '_id': folder['_id']
+            }, field='size', amount=sizeIncrement, multi=False)
+            self.model(folder['baseParentType']).increment(query={
+                '_id': folder['baseParentId']
+            }, field='size', amount=sizeIncrement, multi=False)
+
     def updateItem(self, item):
         """
         Updates an item.
@@ -372,18 +591,8 @@ class Item(acl_mixin.AccessControlMixin, Model):
         :type force: bool
         :returns: an ordered list of dictionaries from root to the current item
         """
-        curFolder = self.model('folder').load(
-            item['folderId'], user=user, level=AccessType.READ, force=force)
-        folderIdsToRoot = self.model('folder').parentsToRoot(
-            curFolder, user=user, level=AccessType.READ, force=force)
-
-        if force:
-            folderIdsToRoot.append({'type': 'folder', 'object': curFolder})
-        else:
-            filteredFolder = self.model('folder').filter(curFolder, user)
-            folderIdsToRoot.append({'type': 'folder', 'object': filteredFolder})
-
-        return folderIdsToRoot
+        return self.model('folder').ancestorPath(
+            self.getAncestors(item), None, user=user, force=force, level=AccessType.READ)
 
     def copyItem(self, srcItem, creator, name=None, folder=None,
                  description=None):
@@ -467,14 +676,28 @@ class Item(acl_mixin.AccessControlMixin, Model):
                   data or file object).
         :rtype: generator(str, func)
         """
+        return self._fileListFromFiles(
+            doc, list(self.childFiles(item=doc)), path, includeMetadata,
+            subpath, mimeFilter, data)
+
+    def _fileListFromFiles(self, doc, files, path, includeMetadata, subpath,
+                           mimeFilter, data):
+        """
+        Implementation of fileList for an item whose files have already been
+        fetched, so that callers listing many items can query their files in
+        batches.
+
+        :param files: All of the files in the item, in the order they should
+            be listed.
+        :type files: list
+        """
         if subpath:
-            files = list(self.childFiles(item=doc, limit=2))
             if (len(files) != 1 or files[0]['name'] != doc['name'] or
                     (includeMetadata and doc.get('meta', {}))):
                 path = os.path.join(path, doc['name'])
         metadataFile = 'girder-item-metadata.json'
 
-        for file in self.childFiles(item=doc):
+        for file in files:
             if not self._mimeFilter(file, mimeFilter):
                 continue
             if file['name'] == metadataFile:
@@ -489,6 +712,32 @@ class Item(acl_mixin.AccessControlMixin, Model):
                 yield json.dumps(doc['meta'], default=str)
             yield (os.path.join(path, metadataFile), stream)
 
+    def withChildFiles(self, cursor, batchSize=1000):
+        """
+        Pair each item in a cursor with the list of its files, querying the
+        files of up to ``batchSize`` items at a time rather than once per item.
+
+        :param cursor: An iterable of item documents.
+        :param batchSize: The number of items whose files are fetched together.
+        :type batchSize: int
+        :returns: A generator of (item, list of files) tuples.
+        """
+        batch = []
+        for item in itertools.chain(cursor, [None]):
+            if item is not None:
+                batch.append(item)
+                if len(batch) < batchSize:
+                    continue
+            if not batch:
+                break
+            files = {}
+            for file in self.model('file').find({
+                    'itemId': {'$in': [doc['_id'] for doc in batch]}}):
+                files.setdefault(file['itemId'], []).append(file)
+            for doc in batch:
+                yield doc, files.get(doc['_id'], [])
+            batch = []
+
     def _mimeFilter(self, file, mimeFilter):
         """
         Returns whether or not the given file should be passed through the given
@@ -528,3 +777,32 @@ class Item(acl_mixin.AccessControlMixin, Model):
             self.update({'_id': doc['_id']}, update={'$set': {'size': size}})
             fixes += 1
         return size, fixes
+
+    def updateSizes(self, query=None, progress=noProgress, batchSize=1000):
+        """
+        Recompute the size of every item matching a query from its files and
+        fix those that are wrong. Unlike calling :py:meth:`updateSize` on each
+        item, this sums the file sizes with one aggregation and corrects them
+        with one bulk write per batch of items.
+
+        :param query: The items to check, or None for all items.
+        :type query: dict or None
+        :param progress: A progress context to record progress on.
+        :type progress: girder.utility.progress.ProgressContext or None.
+        :param batchSize: The number of items to check at a time.
+        :type batchSize: int
+        :returns: the number of items that were changed.
+        """
+        fixes = 0
+        items = self.find(query, fields=('size', ))
+        while True:
+            batch = list(itertools.islice(items, batchSize))
+            if not batch:
+                return fixes
+            totals = self.model('file').collection.aggregate([
+                {'$match': {'itemId': {'$in': [item['_id'] for item in batch]}}},
+                {'$group': {'_id': '$itemId', 'size': {'$sum': '$size'}}}
+            ])
+            sizes = {entry['_id']: entry['size'] for entry in totals}
+            fixes += self._fixSizes(batch, sizes)
+            progress.update(increment=len(batch))
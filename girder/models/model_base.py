@@ -17,12 +17,14 @@
 #  limitations under the License.
 ###############################################################################
 
+import contextlib
 import copy
 import functools
 import itertools
 import pymongo
 import re
 import six
+import threading
 
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
@@ -37,6 +39,33 @@ from girder.utility.model_importer import ModelImporter
 _allowedFindArgs = ('cursor_type', 'allow_partial_results', 'oplog_replay',
                     'modifiers', 'manipulate')
 
+# Documents loaded during the current request, keyed by (collection, _id).
+_identityMap = threading.local()
+IDENTITY_MAP_MAX_SIZE = 1000
+
+
+@contextlib.contextmanager
+def identityMapScope():
+    """
+    Within this context, full-document loads by models that enable the identity
+    map are remembered for the current thread, so that loading the same user,
+    group, or parent resource again (as access checks do repeatedly) does not
+    go back to the database. Documents are copied on the way in and out, and
+    entries are discarded whenever the model saves, updates, or removes them.
+    Nested scopes share the outermost scope's map.
+
+    The REST endpoint decorator opens one of these around each handler.
+    """
+    if getattr(_identityMap, 'docs', None) is not None:
+        yield
+        return
+
+    _identityMap.docs = {}
+    try:
+        yield
+    finally:
+        _identityMap.docs = None
+
 
 class Model(ModelImporter):
     """
@@ -53,6 +82,7 @@ class Model(ModelImporter):
         self._textIndex = None
         self._textLanguage = None
         self.prefixSearchFields = ('lowerName', 'name')
+        self._identityMapped = False
 
         self._filterKeys = {
             AccessType.READ: set(),
@@ -408,6 +438,7 @@ class Model(ModelImporter):
                 document['_id'] = \
                     self.collection.insert_one(document).inserted_id
             else:
+                self._forgetLoaded(document['_id'])
                 self.collection.replace_one(
                     {'_id': document['_id']}, document, True)
         except WriteError as e:
@@ -439,6 +470,7 @@ class Model(ModelImporter):
         :type multi: bool
         :returns: A pymongo UpdateResult object.
         """
+        self._forgetLoaded()
         if multi:
             return self.collection.update_many(query, update)
         else:
@@ -479,6 +511,7 @@ class Model(ModelImporter):
             })
 
         if not event.defaultPrevented and not kwargsEvent.defaultPrevented:
+            self._forgetLoaded(document['_id'])
             return self.collection.delete_one({'_id': document['_id']})
 
     def removeWithQuery(self, query):
@@ -492,6 +525,7 @@ class Model(ModelImporter):
         """
         assert query
 
+        self._forgetLoaded()
         return self.collection.delete_many(query)
 
     def load(self, id, objectId=True, fields=None, exc=False):
@@ -520,7 +554,11 @@ class Model(ModelImporter):
             except InvalidId:
                 raise ValidationException('Invalid ObjectId: %s' % id,
                                           field='id')
-        doc = self.findOne({'_id': id}, fields=fields)
+        doc = self._loadFromIdentityMap(id, fields)
+        if doc is None:
+            doc = self.findOne({'_id': id}, fields=fields)
+            if doc is not None and fields is None:
+                self._rememberLoaded(doc)
 
         if doc is None and exc is True:
             raise ValidationException('No such %s: %s' % (self.name, id),
@@ -528,6 +566,75 @@ class Model(ModelImporter):
 
         return doc
 
+    def _loadFromIdentityMap(self, id, fields):
+        """
+        Return a copy of a document remembered by the current identity map
+        scope, or None if it is not available. Inclusion projections of
+        top-level fields are served from the remembered full document.
+        """
+        docs = getattr(_identityMap, 'docs', None)
+        if not self._identityMapped or not docs:
+            return None
+
+        cached = docs.get((self.name, id))
+        if cached is None:
+            return None
+        if fields is None:
+            return copy.deepcopy(cached)
+
+        if isinstance(fields, six.string_types):
+            fields = (fields, )
+        if not isinstance(fields, (list, tuple)) or any('.' in f for f in fields):
+            return None
+        doc = {k: copy.deepcopy(cached[k]) for k in fields if k in cached}
+        doc['_id'] = cached['_id']
+        return doc
+
+    def _rememberLoaded(self, doc):
+        docs = getattr(_identityMap, 'docs', None)
+        if self._identityMapped and docs is not None and len(docs) < IDENTITY_MAP_MAX_SIZE:
+            docs[(self.name, doc['_id'])] = copy.deepcopy(doc)
+
+    def _forgetLoaded(self, id=None):
+        """
+        Discard documents of this model from the current identity map scope.
+        Code that writes to ``self.collection`` directly rather than through
+        :py:meth:`save`, :py:meth:`update`, or :py:meth:`remove` must call
+        this.
+
+        :param id: The _id of the changed document, or None if any document in
+            the collection may have changed.
+        """
+        docs = getattr(_identityMap, 'docs', None)
+        if not docs:
+            return
+        if id is None:
+            for key in [key for key in docs if key[0] == self.name]:
+                del docs[key]
+        else:
+            docs.pop((self.name, id), None)
+
+    def _fixSizes(self, docs, sizes):
+        """
+        Correct the recorded size of a batch of documents with a single bulk
+        write.
+
+        :param docs: The documents to check, with at least their ``_id`` and
+            ``size`` fields.
+        :param sizes: The correct sizes, keyed by ``_id``. Documents that are
+            not present have a size of 0.
+        :type sizes: dict
+        :returns: the number of documents that were changed.
+        """
+        ops = [
+            pymongo.UpdateOne({'_id': doc['_id']}, {'$set': {'size': sizes.get(doc['_id'], 0)}})
+            for doc in docs if doc.get('size') != sizes.get(doc['_id'], 0)
+        ]
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+            self._forgetLoaded()
+        return len(ops)
+
     def filterDocument(self, doc, allow=None):
         """
         This method will filter the given document to make it suitable to
@@ -870,6 +977,7 @@ class AccessControlledModel(Model):
 
         event = events.trigger('model.%s.save' % self.name, doc)
         if not event.defaultPrevented:
+            self._forgetLoaded(ObjectId(doc['_id']))
             doc = self.collection.find_one_and_update(
                 {'_id': ObjectId(doc['_id'])}, update,
                 return_document=pymongo.ReturnDocument.AFTER)
@@ -1358,10 +1466,8 @@ class AccessControlledModel(Model):
         :param sort: The sort order
         :type sort: List of (key, order) tuples
         """
-        cursor = self.find({}, sort=sort)
-        return self.filterResultsByPermission(
-            cursor=cursor, user=user, level=AccessType.READ, limit=limit,
-            offset=offset)
+        return self.findWithPermissions(
+            sort=sort, user=user, level=AccessType.READ, limit=limit, offset=offset)
 
     def copyAccessPolicies(self, src, dest, save=False):
         """
@@ -1420,6 +1526,97 @@ class AccessControlledModel(Model):
                     del result[key]
             yield result
 
+    def permissionClauses(self, user=None, level=AccessType.READ, flags=None):
+        """
+        Build a MongoDB query that matches exactly the documents on which a
+        user has the given access level and access flags, i.e. those for which
+        both :py:meth:`hasAccess` and :py:meth:`hasAccessFlags` return True.
+        Filtering in the database rather than with
+        :py:meth:`filterResultsByPermission` lets offsets, limits, and counts
+        be applied there too.
+
+        :param user: The user to check policies against.
+        :type user: dict or None
+        :param level: The access level.
+        :type level: AccessType
+        :param flags: A flag or set of flags to test.
+        :type flags: flag identifier, or a list/set/tuple of them
+        :returns: A query dict, which is empty if no restriction applies.
+        """
+        if user is not None and user['admin']:
+            return {}
+
+        groups = user.get('groups') if user is not None else None
+
+        access = []
+        if level <= AccessType.READ:
+            access.append({'public': True})
+        if user is not None:
+            access.append({'access.users': {'$elemMatch': {
+                'id': user['_id'],
+                'level': {'$gte': level}
+            }}})
+            if groups:
+                access.append({'access.groups': {'$elemMatch': {
+                    'id': {'$in': groups},
+                    'level': {'$gte': level}
+                }}})
+        if not access:
+            # Nothing can match, e.g. an anonymous user asking for write access
+            return {'_id': {'$in': []}}
+        clauses = [{'$or': access}]
+
+        if flags and not isinstance(flags, (list, tuple, set)):
+            flags = {flags}
+        for flag in sorted(flags or ()):
+            flagAccess = [{'publicFlags': flag}]
+            if user is not None:
+                flagAccess.append({'access.users': {'$elemMatch': {
+                    'id': user['_id'],
+                    'flags': flag
+                }}})
+                if groups:
+                    flagAccess.append({'access.groups': {'$elemMatch': {
+                        'id': {'$in': groups},
+                        'flags': flag
+                    }}})
+            clauses.append({'$or': flagAccess})
+
+        return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+    def _permissionQuery(self, query, user, level, flags=None):
+        """
+        Add the :py:meth:`permissionClauses` for a user to a query. The query is
+        not modified; its top-level operators are left in place so that callers
+        may continue to add to them.
+        """
+        query = dict(query or {})
+        clauses = self.permissionClauses(user=user, level=level, flags=flags)
+        if clauses:
+            query['$and'] = query.get('$and', []) + [clauses]
+        return query
+
+    def findWithPermissions(self, query=None, offset=0, limit=0, timeout=None, fields=None,
+                            sort=None, user=None, level=AccessType.READ, flags=None, **kwargs):
+        """
+        Search the collection like :py:meth:`find`, returning only documents on
+        which the user has the given access level and flags. Unlike
+        :py:meth:`filterResultsByPermission`, the access check is part of the
+        query, so the offset and limit are applied by the database and the
+        returned cursor can be counted.
+
+        :param user: The user to check policies against.
+        :type user: dict or None
+        :param level: The access level.
+        :type level: AccessType
+        :param flags: A flag or set of flags to test.
+        :type flags: flag identifier, or a list/set/tuple of them
+        :returns: A pymongo database cursor.
+        """
+        return self.find(
+            self._permissionQuery(query, user, level, flags), offset=offset, limit=limit,
+            timeout=timeout, fields=fields, sort=sort, **kwargs)
+
     def textSearch(self, query, user=None, filters=None, limit=0, offset=0,
                    sort=None, fields=None, level=AccessType.READ):
         """
@@ -1445,12 +1642,9 @@ class AccessControlledModel(Model):
         :param level: The access level to require.
         :type level: girder.constants.AccessType
         """
-        filters = filters or {}
-
-        cursor = Model.textSearch(
-            self, query=query, filters=filters, sort=sort, fields=fields)
-        return self.filterResultsByPermission(
-            cursor, user=user, level=level, limit=limit, offset=offset)
+        return Model.textSearch(
+            self, query=query, filters=self._permissionQuery(filters, user, level),
+            limit=limit, offset=offset, sort=sort, fields=fields)
 
     def prefixSearch(self, query, user=None, filters=None, limit=0, offset=0,
                      sort=None, fields=None, level=AccessType.READ, prefixSearchFields=None):
@@ -1481,13 +1675,10 @@ class AccessControlledModel(Model):
         :returns: A pymongo cursor. It is left to the caller to build the
             results from the cursor.
         """
-        filters = filters or {}
-
-        cursor = Model.prefixSearch(
-            self, query, filters=filters, sort=sort, fields=fields,
+        return Model.prefixSearch(
+            self, query, filters=self._permissionQuery(filters, user, level),
+            limit=limit, offset=offset, sort=sort, fields=fields,
             prefixSearchFields=prefixSearchFields)
-        return self.filterResultsByPermission(
-            cursor, user=user, level=level, limit=limit, offset=offset)
 
 
 class AccessException(Exception):
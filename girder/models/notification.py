@@ -19,9 +19,11 @@
 
 import datetime
 import six
+import threading
 import time
 
 from .model_base import Model
+from girder.utility import invalidation
 
 
 class ProgressState(object):
@@ -38,6 +40,44 @@ class ProgressState(object):
         return state == cls.SUCCESS or state == cls.ERROR
 
 
+class NotificationSubscription(object):
+    """
+    A handle that is woken whenever a notification is saved for a particular
+    user or token by any server process. Obtain one with
+    :py:meth:`Notification.subscribe`.
+    """
+    def __init__(self, key):
+        self.key = key
+        self.event = threading.Event()
+
+    def clear(self):
+        """
+        Reset the subscription. This should be done before querying for
+        notifications, so that any notification written after the query wakes
+        the next call to wait.
+        """
+        self.event.clear()
+
+    def wait(self, timeout):
+        """
+        Block until a notification may have been written, or until the timeout
+        expires.
+
+        :param timeout: The maximum number of seconds to wait.
+        :type timeout: float
+        :returns: True if woken by a notification.
+        """
+        return self.event.wait(timeout)
+
+    @property
+    def active(self):
+        """
+        Whether notifications from other server processes currently wake this
+        subscription. If not, callers should poll instead.
+        """
+        return invalidation.isActive()
+
+
 class Notification(Model):
     """
     This model is used to represent a notification that should be streamed
@@ -53,9 +93,64 @@ class Notification(Model):
         self.ensureIndices(('userId', 'time', 'updated', 'tokenId'))
         self.ensureIndex(('expires', {'expireAfterSeconds': 0}))
 
+        # Notifications are announced through the invalidation channel, whose
+        # watcher thread wakes every stream waiting on the same user or token.
+        self._subscriptions = {}
+        self._subscriptionLock = threading.Lock()
+        invalidation.subscribe(self.name, self._wake)
+
     def validate(self, doc):
         return doc
 
+    def _wake(self, key):
+        with self._subscriptionLock:
+            if key is None:
+                subscriptions = [sub for subs in six.viewvalues(self._subscriptions)
+                                 for sub in subs]
+            else:
+                subscriptions = list(self._subscriptions.get(key, ()))
+        for subscription in subscriptions:
+            subscription.event.set()
+
+    def subscribe(self, user, token=None):
+        """
+        Subscribe to the notifications for a user or token. The subscription
+        must be passed to :py:meth:`unsubscribe` when it is no longer needed.
+
+        :param user: The user to receive notifications for. None to use the
+            token instead.
+        :param token: If the user is None, the token to receive notifications
+            for.
+        :returns: A :py:class:`NotificationSubscription`.
+        """
+        subscription = NotificationSubscription(
+            str(user['_id'] if user else token['_id']))
+        with self._subscriptionLock:
+            self._subscriptions.setdefault(subscription.key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Discard a subscription created with :py:meth:`subscribe`.
+        """
+        with self._subscriptionLock:
+            subscriptions = self._subscriptions.get(subscription.key)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.key]
+
+    def save(self, doc, *args, **kwargs):
+        """
+        Override of Model.save that wakes the subscribers of the notification's
+        user or token in every server process.
+        """
+        doc = super(Notification, self).save(doc, *args, **kwargs)
+        key = doc.get('userId') or doc.get('tokenId')
+        if key is not None:
+            invalidation.publish(self.name, str(key))
+        return doc
+
     def createNotification(self, type, data, user, expires=None, token=None):
         """
         Create a generic notification.
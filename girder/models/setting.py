@@ -19,14 +19,16 @@
 
 from collections import OrderedDict
 import cherrypy
+import copy
 import pymongo
 import six
 import re
+import threading
 
 from ..constants import GIRDER_ROUTE_ID, GIRDER_STATIC_ROUTE_ID, SettingDefault, SettingKey
 from .model_base import Model, ValidationException
 from girder import logprint
-from girder.utility import config, plugin_utilities, setting_utilities
+from girder.utility import config, invalidation, plugin_utilities, setting_utilities
 from girder.utility.model_importer import ModelImporter
 from bson.objectid import ObjectId
 
@@ -44,6 +46,66 @@ class Setting(Model):
         # We can't do it here, as we have to update and correct older installs,
         # so this is handled in the reconnect method.
 
+        # Process-local cache of setting documents keyed by setting key. A
+        # value of None records that no such setting exists.
+        self._cache = {}
+        self._cacheLock = threading.Lock()
+        self._cacheGeneration = 0
+        self.cacheStats = {'hits': 0, 'misses': 0}
+        self._cacheEnabled = config.getConfig().get('cache', {}).get('settings', True)
+        if self._cacheEnabled:
+            invalidation.subscribe(self.name, self._invalidateCache)
+
+    def _invalidateCache(self, key=None):
+        """
+        Discard a cached setting, or the entire cache if key is None. This is
+        called both for local writes and for invalidation messages broadcast by
+        other server processes.
+        """
+        with self._cacheLock:
+            self._cacheGeneration += 1
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    def getCacheStats(self):
+        """
+        Return the hit and miss counters for the setting cache, as well as the
+        number of keys currently cached and whether the cache is in use.
+        """
+        with self._cacheLock:
+            stats = dict(self.cacheStats)
+            stats['size'] = len(self._cache)
+        stats['enabled'] = self._cacheEnabled
+        stats['active'] = self._cacheEnabled and invalidation.isActive()
+        return stats
+
+    def _findSetting(self, key):
+        """
+        Look up the stored document for a setting key, consulting the process
+        cache first. The cache is only used while invalidation messages from
+        other processes are being received.
+        """
+        if not self._cacheEnabled or not invalidation.isActive():
+            return self.findOne({'key': key})
+
+        with self._cacheLock:
+            if key in self._cache:
+                self.cacheStats['hits'] += 1
+                return self._cache[key]
+            self.cacheStats['misses'] += 1
+            generation = self._cacheGeneration
+
+        setting = self.findOne({'key': key})
+
+        with self._cacheLock:
+            # If anything was invalidated while we were querying, what we read
+            # may already be stale, so don't cache it.
+            if generation == self._cacheGeneration:
+                self._cache[key] = setting
+        return setting
+
     def reconnect(self):
         """
         Reconnect to the database and rebuild indices if necessary.  If a
@@ -51,6 +113,7 @@ class Setting(Model):
         extant index on key and removing duplicate keys if necessary.
         """
         super(Setting, self).reconnect()
+        self._invalidateCache()
         try:
             indices = self.collection.index_information()
         except pymongo.errors.OperationFailure:
@@ -107,13 +170,15 @@ class Setting(Model):
         :param default: If no such setting exists, returns this value instead.
         :returns: The value, or the default value if the key is not found.
         """
-        setting = self.findOne({'key': key})
+        setting = self._findSetting(key)
         if setting is None:
             if default is '__default__':
                 default = self.getDefault(key)
             return default
         else:
-            return setting['value']
+            # Callers are free to modify the returned value, so they must not
+            # receive the cached object itself.
+            return copy.deepcopy(setting['value'])
 
     def set(self, key, value):
         """
@@ -136,6 +201,31 @@ class Setting(Model):
 
         return self.save(setting)
 
+    def save(self, doc, *args, **kwargs):
+        """
+        Override of Model.save that invalidates the cached value of this setting
+        in every server process. The key is invalidated in this process before
+        the write, so that handlers of the save events do not see the old value
+        through the cache, and in every process after the write, so that no
+        process can cache the old value again.
+        """
+        self._invalidateCache(doc['key'])
+        try:
+            return super(Setting, self).save(doc, *args, **kwargs)
+        finally:
+            invalidation.publish(self.name, doc['key'])
+
+    def remove(self, doc, **kwargs):
+        """
+        Override of Model.remove that invalidates the cached value of this
+        setting in every server process once it is removed.
+        """
+        self._invalidateCache(doc['key'])
+        try:
+            return super(Setting, self).remove(doc, **kwargs)
+        finally:
+            invalidation.publish(self.name, doc['key'])
+
     def unset(self, key):
         """
         Remove the setting for this key. If no such setting exists, this is
@@ -17,14 +17,23 @@
 #  limitations under the License.
 ###############################################################################
 
+import collections
+import copy
 import datetime
 import six
+import threading
+import time
 
 from girder.constants import AccessType, SettingKey, TokenScope
 from girder.models.model_base import AccessException
-from girder.utility import genToken
+from girder.utility import config, genToken, invalidation
 from .model_base import AccessControlledModel
 
+# Seconds that a token and its user may be served from the authentication cache
+AUTH_CACHE_TTL = 30
+# Maximum number of tokens kept in the authentication cache of each process
+AUTH_CACHE_SIZE = 1000
+
 
 class Token(AccessControlledModel):
     """
@@ -35,6 +44,132 @@ class Token(AccessControlledModel):
         self.ensureIndex(('expires', {'expireAfterSeconds': 0}))
         self.ensureIndex('apiKeyId')
 
+        self._authCache = collections.OrderedDict()
+        self._authCacheLock = threading.Lock()
+        self._authCacheGeneration = 0
+        self.authCacheStats = {'hits': 0, 'misses': 0}
+        self._authCacheEnabled = config.getConfig().get('cache', {}).get('tokens', True)
+        if self._authCacheEnabled:
+            invalidation.subscribe(self.name, self._invalidateAuthCache)
+            invalidation.subscribe('%s.user' % self.name, self._invalidateAuthCacheForUser)
+
+    def _invalidateAuthCache(self, key=None):
+        """
+        Discard a cached token, or the entire authentication cache if key is
+        None. This is called both for local writes and for invalidation
+        messages broadcast by other server processes.
+        """
+        with self._authCacheLock:
+            self._authCacheGeneration += 1
+            if key is None:
+                self._authCache.clear()
+            else:
+                self._authCache.pop(key, None)
+
+    def _invalidateAuthCacheForUser(self, key=None):
+        """
+        Discard the cached tokens of a user, given the string form of its _id,
+        or the entire authentication cache if key is None.
+        """
+        if key is None:
+            return self._invalidateAuthCache()
+        with self._authCacheLock:
+            self._authCacheGeneration += 1
+            for tokenStr in [tokenStr for tokenStr, entry in six.viewitems(self._authCache)
+                             if str(entry['token'].get('userId')) == key]:
+                del self._authCache[tokenStr]
+
+    def _getAuthCached(self, tokenStr, field, loader):
+        """
+        Return a field of the cached authentication entry for a token, calling
+        loader to compute it on a miss. The cache is only used while
+        invalidation messages from other processes are being received, and
+        entries are dropped after AUTH_CACHE_TTL seconds regardless, since
+        some writes (such as size updates) are not announced.
+        """
+        if not self._authCacheEnabled or not invalidation.isActive():
+            return loader()
+
+        now = time.time()
+        with self._authCacheLock:
+            entry = self._authCache.pop(tokenStr, None)
+            if entry is not None and now - entry['time'] < AUTH_CACHE_TTL:
+                # Reinsert to mark this entry as the most recently used
+                self._authCache[tokenStr] = entry
+                if field in entry:
+                    self.authCacheStats['hits'] += 1
+                    return copy.deepcopy(entry[field])
+            self.authCacheStats['misses'] += 1
+            generation = self._authCacheGeneration
+
+        value = loader()
+
+        with self._authCacheLock:
+            # If anything was invalidated while we were querying, what we read
+            # may already be stale, so don't cache it. Unknown tokens are not
+            # cached either, so that guessing cannot flush the cache.
+            if generation == self._authCacheGeneration and value is not None:
+                entry = self._authCache.get(tokenStr)
+                if entry is None:
+                    if field != 'token':
+                        return value
+                    entry = self._authCache[tokenStr] = {'time': now}
+                entry[field] = copy.deepcopy(value)
+                while len(self._authCache) > AUTH_CACHE_SIZE:
+                    self._authCache.popitem(last=False)
+        return value
+
+    def getAuthCacheStats(self):
+        """
+        Return the hit and miss counters for the authentication cache, as well
+        as the number of tokens currently cached and whether the cache is in
+        use.
+        """
+        with self._authCacheLock:
+            stats = dict(self.authCacheStats)
+            stats['size'] = len(self._authCache)
+        stats['enabled'] = self._authCacheEnabled
+        stats['active'] = self._authCacheEnabled and invalidation.isActive()
+        return stats
+
+    def loadForAuth(self, tokenStr):
+        """
+        Load a token by its value in order to authenticate a request. Recently
+        used tokens are served from a short-lived in-memory cache. Callers are
+        still responsible for checking the expiration and scope of the token.
+
+        :param tokenStr: The token value.
+        :type tokenStr: str
+        :returns: The token document, or None if there is no such token.
+        """
+        return self._getAuthCached(
+            tokenStr, 'token', lambda: self.load(tokenStr, force=True, objectId=False))
+
+    def getAuthUser(self, token):
+        """
+        Load the user that a token authenticates. Like :py:meth:`loadForAuth`,
+        this is served from the authentication cache when possible.
+
+        :param token: The token document, which must have a userId.
+        :type token: dict
+        :returns: The user document, or None if the user no longer exists.
+        """
+        return self._getAuthCached(
+            token['_id'], 'user', lambda: self.model('user').load(token['userId'], force=True))
+
+    def invalidateAuthCache(self, user=None):
+        """
+        Discard the cached authentication of a user's tokens in every server
+        process. This must be called whenever a user document changes other
+        than through the user model.
+
+        :param user: The user document or _id, or None to discard the cached
+            authentication of every user.
+        """
+        if isinstance(user, dict):
+            user = user['_id']
+        invalidation.publish('%s.user' % self.name, None if user is None else str(user))
+
     def validate(self, doc):
         # Remove any duplicate scopes
         doc['scope'] = list(set(doc['scope']))
@@ -90,6 +225,38 @@ class Token(AccessControlledModel):
 
         return self.save(token)
 
+    def save(self, doc, *args, **kwargs):
+        """
+        Override of Model.save that invalidates the cached value of this token
+        in every server process.
+        """
+        self._invalidateAuthCache(doc['_id'])
+        try:
+            return super(Token, self).save(doc, *args, **kwargs)
+        finally:
+            invalidation.publish(self.name, doc['_id'])
+
+    def remove(self, doc, **kwargs):
+        """
+        Override of Model.remove that invalidates the cached value of this
+        token in every server process.
+        """
+        self._invalidateAuthCache(doc['_id'])
+        try:
+            return super(Token, self).remove(doc, **kwargs)
+        finally:
+            invalidation.publish(self.name, doc['_id'])
+
+    def removeWithQuery(self, query):
+        """
+        Override of Model.removeWithQuery that discards the whole
+        authentication cache in every server process.
+        """
+        try:
+            return super(Token, self).removeWithQuery(query)
+        finally:
+            invalidation.publish(self.name)
+
     def addScope(self, token, scope):
         """
         Add a scope to this token. If the token already has the scope, this is
@@ -20,6 +20,7 @@
 import datetime
 import six
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
 
 from girder import events
 from girder.api import rest
@@ -34,7 +35,9 @@ class Upload(Model):
     """
     This model stores temporary records for uploads that have been approved
     but are not yet complete, so that they can be uploaded in chunks of
-    arbitrary size. The chunks must be uploaded in order.
+    arbitrary size. The chunks must be uploaded in order, unless the upload
+    was created with a part size, in which case numbered parts of that size
+    may be uploaded in any order and concurrently.
     """
     def initialize(self):
         self.name = 'upload'
@@ -139,8 +142,11 @@ class Upload(Model):
         :param user: The current user. Only affects behavior if filter=True.
         :type user: dict or None
         """
-        assetstore = self.model('assetstore').load(upload['assetstoreId'])
-        adapter = assetstore_utilities.getAssetstoreAdapter(assetstore)
+        if upload.get('partSize'):
+            raise ValidationException(
+                'This upload must be sent as numbered parts.', 'partNumber')
+        adapter = assetstore_utilities.getAssetstoreAdapterById(upload['assetstoreId'])
+        assetstore = adapter.assetstore
 
         upload = adapter.uploadChunk(upload, chunk)
         if '_id' in upload or upload['received'] != upload['size']:
@@ -156,13 +162,75 @@ class Upload(Model):
         else:
             return upload
 
+    def handlePart(self, upload, partNumber, chunk, filter=False, user=None):
+        """
+        Process one numbered part of an upload that was created with a part
+        size. Parts may be sent in any order, concurrently, and more than once.
+        The part that completes the upload finalizes it.
+
+        This method will return EITHER an upload or a file document, as with
+        :py:meth:`handleChunk`.
+
+        :param upload: The upload document to update.
+        :type upload: dict
+        :param partNumber: The zero-based index of the part. Part N holds the
+            bytes starting at N times the part size.
+        :type partNumber: int
+        :param chunk: The file object representing the part that was uploaded.
+        :type chunk: file
+        :param filter: Whether the model should be filtered. Only affects
+            behavior when returning a file model, not the upload model.
+        :type filter: bool
+        :param user: The current user. Only affects behavior if filter=True.
+        :type user: dict or None
+        """
+        if not upload.get('partSize'):
+            raise ValidationException(
+                'This upload was not created with a part size.', 'partNumber')
+        if not 0 <= partNumber < self.partCount(upload):
+            raise ValidationException('Invalid part number.', 'partNumber')
+
+        adapter = assetstore_utilities.getAssetstoreAdapterById(upload['assetstoreId'])
+        assetstore = adapter.assetstore
+        size = adapter.uploadPart(upload, partNumber, chunk)
+
+        # Count each part only once, so that resent parts are harmless and
+        # exactly one request sees the upload become complete.
+        updated = self.collection.find_one_and_update({
+            '_id': upload['_id'],
+            'parts': {'$ne': partNumber}
+        }, {
+            '$push': {'parts': partNumber},
+            '$inc': {'received': size},
+            '$set': {'updated': datetime.datetime.utcnow()}
+        }, return_document=ReturnDocument.AFTER)
+        if updated is None:
+            return self.load(upload['_id'], exc=True)
+
+        if updated['received'] == updated['size']:
+            file = self.finalizeUpload(updated, assetstore)
+            if filter:
+                return self.model('file').filter(file, user=user)
+            else:
+                return file
+        else:
+            return updated
+
+    def partCount(self, upload):
+        """
+        Return the number of parts in an upload created with a part size.
+        """
+        return max(1, -(-upload['size'] // upload['partSize']))
+
     def requestOffset(self, upload):
         """
         Requests the offset that should be used to resume uploading. This
         makes the request from the assetstore adapter.
         """
-        assetstore = self.model('assetstore').load(upload['assetstoreId'])
-        adapter = assetstore_utilities.getAssetstoreAdapter(assetstore)
+        if upload.get('partSize'):
+            # The temporary data has holes, so only the record is meaningful
+            return upload['received']
+        adapter = assetstore_utilities.getAssetstoreAdapterById(upload['assetstoreId'])
         return adapter.requestOffset(upload)
 
     def finalizeUpload(self, upload, assetstore=None):
@@ -184,9 +252,8 @@ class Upload(Model):
             file = self.model('file').load(upload['fileId'], force=True)
 
             # Delete the previous file contents from the containing assetstore
-            assetstore_utilities.getAssetstoreAdapter(
-                self.model('assetstore').load(
-                    file['assetstoreId'])).deleteFile(file)
+            assetstore_utilities.getAssetstoreAdapterById(
+                file['assetstoreId']).deleteFile(file)
 
             item = self.model('item').load(file['itemId'], force=True)
             self.model('file').propagateSizeChange(
@@ -271,7 +338,7 @@ class Upload(Model):
         return assetstore
 
     def createUploadToFile(self, file, user, size, reference=None,
-                           assetstore=None):
+                           assetstore=None, partSize=None):
         """
         Creates a new upload record into a file that already exists. This
         should be used when updating the contents of a file. Deletes any
@@ -287,6 +354,9 @@ class Upload(Model):
         :type reference: str
         :param assetstore: An optional assetstore to use to store the file.  If
             unspecified, the current assetstore is used.
+        :param partSize: If set, the data will be sent as numbered parts of
+            this many bytes using :py:meth:`handlePart`.
+        :type partSize: int or None
         """
         assetstore = self.getTargetAssetstore('file', file, assetstore)
         adapter = assetstore_utilities.getAssetstoreAdapter(assetstore)
@@ -305,12 +375,22 @@ class Upload(Model):
         }
         if reference is not None:
             upload['reference'] = reference
+        self._setPartSize(upload, adapter, partSize)
         upload = adapter.initUpload(upload)
         return self.save(upload)
 
+    def _setPartSize(self, upload, adapter, partSize):
+        """
+        Validate and record the part size of a new upload, if it has one.
+        """
+        if partSize is not None:
+            adapter.checkPartSize(upload, partSize)
+            upload['partSize'] = partSize
+            upload['parts'] = []
+
     def createUpload(self, user, name, parentType, parent, size, mimeType=None,
                      reference=None, assetstore=None, attachParent=False,
-                     save=True):
+                     save=True, partSize=None):
         """
         Creates a new upload record, and creates its temporary file
         that the chunks will be written into. Chunks should then be sent
@@ -342,6 +422,10 @@ class Upload(Model):
         :type attachParent: boolean
         :param save: if True, save the document after it is created.
         :type save: boolean
+        :param partSize: If set, the data will be sent as numbered parts of
+            this many bytes using :py:meth:`handlePart`, rather than as
+            ordered chunks. The assetstore must support this.
+        :type partSize: int or None
         :returns: The upload document that was created.
         """
         assetstore = self.getTargetAssetstore(parentType, parent, assetstore)
@@ -376,6 +460,7 @@ class Upload(Model):
         else:
             upload['userId'] = None
 
+        self._setPartSize(upload, adapter, partSize)
         upload = adapter.initUpload(upload)
         if save:
             upload = self.save(upload)
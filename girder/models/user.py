@@ -20,12 +20,18 @@
 import datetime
 import os
 import re
+import six
 
+from bson.objectid import ObjectId
 from .model_base import AccessControlledModel, AccessException, ValidationException
 from girder import events
 from girder.constants import AccessType, CoreEventHandler, SettingKey, TokenScope
 from girder.utility import config, mail_utils
 
+# Fields of user documents that authentication does not depend on, so that
+# updating only these does not discard the cached authentication of the user
+_AUTH_IRRELEVANT_FIELDS = frozenset(('size', ))
+
 
 class User(AccessControlledModel):
     """
@@ -34,6 +40,7 @@ class User(AccessControlledModel):
 
     def initialize(self):
         self.name = 'user'
+        self._identityMapped = True
         self.ensureIndices(['login', 'email', 'groupInvites.groupId', 'size',
                             'created'])
         self.prefixSearchFields = (
@@ -170,6 +177,38 @@ class User(AccessControlledModel):
 
         return user
 
+    def save(self, user, *args, **kwargs):
+        """
+        Override of Model.save that discards the cached authentication of this
+        user's tokens in every server process, so that changes such as
+        disabling the account or changing group membership apply immediately.
+        """
+        isNew = '_id' not in user
+        try:
+            return super(User, self).save(user, *args, **kwargs)
+        finally:
+            if not isNew:
+                self.model('token').invalidateAuthCache(user)
+
+    def update(self, query, update, multi=True):
+        """
+        Override of Model.update that discards the cached authentication of the
+        affected users in every server process, unless the update only touches
+        fields that authentication does not depend on, such as the size
+        propagated by Model.increment.
+        """
+        fields = {key.split('.')[0] for op in six.viewvalues(update)
+                  if isinstance(op, dict) for key in op}
+        if fields and fields <= _AUTH_IRRELEVANT_FIELDS:
+            return super(User, self).update(query, update, multi)
+
+        try:
+            return super(User, self).update(query, update, multi)
+        finally:
+            userId = query.get('_id')
+            self.model('token').invalidateAuthCache(
+                userId if isinstance(userId, ObjectId) else None)
+
     def remove(self, user, progress=None, **kwargs):
         """
         Delete a user, and all references to it in the database.
@@ -198,6 +237,7 @@ class User(AccessControlledModel):
 
         # Finally, delete the user document itself
         AccessControlledModel.remove(self, user)
+        self.model('token').invalidateAuthCache(user)
         if progress:
             progress.update(increment=1, message='Deleted user ' +
                             user['login'])
@@ -223,16 +263,11 @@ class User(AccessControlledModel):
         :param sort: The sort structure to pass to pymongo.
         :returns: Iterable of users.
         """
-        # Perform the find; we'll do access-based filtering of the result set
-        # afterward.
         if text is not None:
-            cursor = self.textSearch(text, sort=sort)
+            return self.textSearch(text, user=user, limit=limit, offset=offset, sort=sort)
         else:
-            cursor = self.find({}, sort=sort)
-
-        return self.filterResultsByPermission(
-            cursor=cursor, user=user, level=AccessType.READ, limit=limit,
-            offset=offset)
+            return self.findWithPermissions(
+                sort=sort, user=user, level=AccessType.READ, limit=limit, offset=offset)
 
     def setPassword(self, user, password, save=True):
         """
@@ -443,17 +478,25 @@ class User(AccessControlledModel):
         :param level: If filtering by permission, the required permission level.
         :type level: AccessLevel
         """
+        folderModel = self.model('folder')
+        if level is None and folderModel._ancestorsComplete():
+            query, topIds = folderModel._rootSubtreeQuery(doc, 'user')
+            count = 1 + folderModel.find(query, fields=()).count()
+            if includeItems:
+                count += self.model('item').find(
+                    {'ancestors': {'$in': topIds}}, fields=()).count()
+            return count
+
         count = 1
-        folders = self.model('folder').find({
+        query = {
             'parentId': doc['_id'],
             'parentCollection': 'user'
-        }, fields=('access',))
-
+        }
         if level is not None:
-            folders = self.filterResultsByPermission(
-                cursor=folders, user=user, level=level)
+            query = folderModel._permissionQuery(query, user, level)
+        folders = folderModel.find(query, fields=('_id', ))
 
-        count += sum(self.model('folder').subtreeCount(
+        count += sum(folderModel.subtreeCount(
             folder, includeItems=includeItems, user=user, level=level)
             for folder in folders)
         return count
@@ -471,19 +514,15 @@ class User(AccessControlledModel):
         :param level: The required access level, or None to return the raw
             top-level folder count.
         """
-        fields = () if level is None else ('access', 'public')
-
         folderModel = self.model('folder')
-        folders = folderModel.find({
+        query = {
             'parentId': user['_id'],
             'parentCollection': 'user'
-        }, fields=fields)
+        }
+        if level is not None:
+            query = folderModel._permissionQuery(query, filterUser, level)
 
-        if level is None:
-            return folders.count()
-        else:
-            return sum(1 for _ in folderModel.filterResultsByPermission(
-                cursor=folders, user=filterUser, level=level))
+        return folderModel.find(query, fields=()).count()
 
     def updateSize(self, doc):
         """
@@ -493,6 +532,10 @@ class User(AccessControlledModel):
         :param doc: The user.
         :type doc: dict
         """
+        folderModel = self.model('folder')
+        if folderModel._ancestorsComplete():
+            return folderModel.updateRootSize(doc, 'user')
+
         size = 0
         fixes = 0
         folders = self.model('folder').find({
@@ -14,6 +14,7 @@
 #  limitations under the License.
 ###############################################################################
 
+import collections
 import itertools
 import os
 import re
@@ -103,15 +104,18 @@ class FileHandle(object):
     def tell(self):
         return self._pos
 
-    def seek(self, offset, whence=os.SEEK_SET):
-        oldPos = self._pos
-
+    def _seekPosition(self, offset, whence):
         if whence == os.SEEK_SET:
-            self._pos = offset
+            return offset
         elif whence == os.SEEK_CUR:
-            self._pos += offset
+            return self._pos + offset
         elif whence == os.SEEK_END:
-            self._pos = max(self._file['size'] + offset, 0)
+            return max(self._file['size'] + offset, 0)
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        oldPos = self._pos
+        self._pos = self._seekPosition(offset, whence)
 
         if self._pos != oldPos:
             self._prev = []
@@ -121,10 +125,53 @@ class FileHandle(object):
         pass
 
 
+class RandomAccessFileHandle(FileHandle):
+    """
+    Base class for the file handles of assetstores that can read any range of
+    a file directly, e.g. with ``pread`` or a ranged request. Seeking only
+    moves the position, rather than restarting a download stream, and each
+    read fetches just the bytes requested. Subclasses must implement
+    ``_readRange``.
+    """
+    def read(self, size=None):
+        if size is None or size < 0:
+            size = self._file['size'] - self._pos
+        if size > self._maximumReadSize:
+            raise GirderException('Read exceeds maximum allowed size.')
+
+        size = min(size, self._file['size'] - self._pos)
+        if size <= 0:
+            return b''
+        data = self._readRange(self._pos, size)
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._pos = self._seekPosition(offset, whence)
+
+    def _readRange(self, offset, length):
+        """
+        Read bytes from the file.
+
+        :param offset: The position of the first byte to read.
+        :type offset: int
+        :param length: The number of bytes to read. This never extends past
+            the end of the file.
+        :type length: int
+        :rtype: bytes
+        """
+        raise NotImplementedError('Must override _readRange in %s.' % self.__class__.__name__)
+
+
 class AbstractAssetstoreAdapter(ModelImporter):
     """
     This defines the interface to be used by all assetstore adapters.
     """
+    # Subclasses whose instances may be shared between threads and reused for
+    # many requests should set this to True. Such adapters are cached by
+    # getAssetstoreAdapter until their assetstore document changes.
+    cacheable = False
+
     def __init__(self, assetstore):
         self.assetstore = assetstore
 
@@ -185,6 +232,97 @@ class AbstractAssetstoreAdapter(ModelImporter):
         raise NotImplementedError('Must override processChunk in %s.' %
                                   self.__class__.__name__)  # pragma: no cover
 
+    def checkPartSize(self, upload, partSize):
+        """
+        Called when an upload is created whose data will be sent as numbered
+        parts of ``partSize`` bytes, which may arrive in any order and
+        concurrently. Assetstores that support this must override this method
+        and ``uploadPart``. The default raises a ValidationException.
+
+        :param upload: The upload document.
+        :type upload: dict
+        :param partSize: The size of every part except the last.
+        :type partSize: int
+        """
+        raise ValidationException(
+            'This assetstore does not support uploading parts in parallel.',
+            'partSize')
+
+    def _checkPartSize(self, upload, partSize, multiple=1):
+        """
+        Common validation of a part size for assetstores that support parallel
+        part uploads.
+
+        :param multiple: The part size must be a multiple of this value.
+        :type multiple: int
+        """
+        if partSize <= 0 or partSize % multiple:
+            raise ValidationException(
+                'The part size must be a positive multiple of %d.' % multiple, 'partSize')
+        if partSize < upload['size'] and partSize < self.model('setting').get(
+                SettingKey.UPLOAD_MINIMUM_CHUNK_SIZE):
+            raise ValidationException('Chunk is smaller than the minimum size.', 'partSize')
+
+    def uploadPart(self, upload, partNumber, chunk):
+        """
+        Store one numbered part of an upload created with a ``partSize``. The
+        part covers the bytes starting at ``partNumber * partSize``. This may
+        be called concurrently for different parts of the same upload, and
+        may be called again for a part that was already stored.
+
+        :param upload: The upload document.
+        :type upload: dict
+        :param partNumber: The zero-based index of the part.
+        :type partNumber: int
+        :param chunk: The file object representing the part.
+        :type chunk: file
+        :returns: The number of bytes stored.
+        """
+        raise NotImplementedError('Must override uploadPart in %s.' %
+                                  self.__class__.__name__)  # pragma: no cover
+
+    def _partLength(self, upload, partNumber):
+        """
+        Return the offset and length of a part of an upload.
+        """
+        offset = partNumber * upload['partSize']
+        return offset, min(upload['partSize'], upload['size'] - offset)
+
+    def _readPart(self, upload, partNumber, chunk, bufSize):
+        """
+        Generate the data of a part from a chunk in pieces of ``bufSize``
+        bytes (except for the last piece), raising a ValidationException if
+        the chunk is not exactly the length of the part.
+        """
+        offset, length = self._partLength(upload, partNumber)
+        if isinstance(chunk, six.text_type):
+            chunk = chunk.encode('utf8')
+        if isinstance(chunk, six.binary_type):
+            chunk = six.BytesIO(chunk)
+
+        received = 0
+        try:
+            while received < length:
+                data = b''
+                wanted = min(bufSize, length - received)
+                while len(data) < wanted:
+                    buf = chunk.read(wanted - len(data))
+                    if not buf:
+                        break
+                    data += buf
+                if not data:
+                    break
+                received += len(data)
+                yield data
+            if chunk.read(1):
+                raise ValidationException('Received too many bytes.')
+        finally:
+            chunk.close()
+        if received != length:
+            raise ValidationException(
+                'Part %d must be %d bytes, but only %d were received.' % (
+                    partNumber, length, received))
+
     def finalizeUpload(self, upload, file):
         """
         Call this once the last chunk has been processed. This method does not
@@ -222,6 +360,49 @@ class AbstractAssetstoreAdapter(ModelImporter):
         raise NotImplementedError('Must override deleteFile in %s.' %
                                   self.__class__.__name__)  # pragma: no cover
 
+    def deleteFiles(self, files):
+        """
+        This is called when many Files of this assetstore are deleted at once.
+        As with deleteFile, the file documents still exist and will be deleted
+        by the caller afterward. The default behavior calls deleteFile for each
+        file; adapters may override this to delete the data in batches.
+
+        :param files: The File documents about to be deleted.
+        :type files: list of dict
+        """
+        for file in files:
+            self.deleteFile(file)
+
+    def _unreferencedFiles(self, files, field):
+        """
+        Helper for deleteFiles implementations. Of a batch of files that are
+        about to be deleted, return one file for each value of a field that
+        identifies stored data (such as a hash or key) which no other file in
+        this assetstore refers to. The references are counted with a single
+        aggregation.
+
+        :param files: The File documents about to be deleted.
+        :type files: list of dict
+        :param field: The field identifying the stored data of a file.
+        :type field: str
+        :returns: A list of file documents whose data may be deleted.
+        """
+        counts = collections.Counter(file[field] for file in files)
+        refs = ModelImporter.model('file').collection.aggregate([
+            {'$match': {
+                field: {'$in': list(counts)},
+                'assetstoreId': self.assetstore['_id']
+            }},
+            {'$group': {'_id': '$' + field, 'count': {'$sum': 1}}}
+        ])
+        shared = {ref['_id'] for ref in refs if ref['count'] > counts[ref['_id']]}
+        result = []
+        for file in files:
+            if file[field] not in shared:
+                shared.add(file[field])
+                result.append(file)
+        return result
+
     def shouldImportFile(self, path, params):
         """
         This is a helper used during the import process to determine if a file located at
@@ -434,6 +615,10 @@ class AbstractAssetstoreAdapter(ModelImporter):
         moment, this is a read-only interface, the equivalent of opening a
         system file with 'rb' mode.
 
+        Adapters that can read arbitrary ranges of a file should override this
+        to return a subclass of :py:class:`RandomAccessFileHandle`, so that
+        seeking does not restart the download.
+
         :param file: A Girder file document.
         :type file: dict
         :return: A file-like object containing the bytes of the file.
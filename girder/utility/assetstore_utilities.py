@@ -17,10 +17,18 @@
 #  limitations under the License.
 ###############################################################################
 
+import datetime
+import six
+import threading
+
+from bson.objectid import ObjectId
+
 from .filesystem_assetstore_adapter import FilesystemAssetstoreAdapter
 from .gridfs_assetstore_adapter import GridFsAssetstoreAdapter
 from .s3_assetstore_adapter import S3AssetstoreAdapter
 from girder.constants import AssetstoreType
+from girder.utility import invalidation
+from girder.utility.model_importer import ModelImporter
 
 
 _assetstoreTable = {
@@ -29,6 +37,14 @@ _assetstoreTable = {
     AssetstoreType.S3: S3AssetstoreAdapter
 }
 
+# Process-wide cache of adapter instances keyed by assetstore id. Adapters are
+# only cached if their class sets ``cacheable``, and the cache is only used
+# while invalidation messages from other server processes are being received.
+INVALIDATION_NAMESPACE = 'assetstore'
+_adapterCache = {}
+_adapterCacheLock = threading.Lock()
+_adapterCacheState = {'generation': 0, 'subscribed': False}
+
 
 def getAssetstoreAdapter(assetstore, instance=True):
     """
@@ -50,10 +66,84 @@ def getAssetstoreAdapter(assetstore, instance=True):
     if cls is None:
         raise Exception('No AssetstoreAdapter for type: %s.' % storeType)
 
-    if instance:
-        return cls(assetstore)
-    else:
+    if not instance:
         return cls
+    if not cls.cacheable or '_id' not in assetstore or not _cacheActive():
+        return cls(assetstore)
+
+    updated = assetstore.get('updated') or datetime.datetime.min
+    with _adapterCacheLock:
+        adapter = _adapterCache.get(assetstore['_id'])
+        generation = _adapterCacheState['generation']
+    if adapter is not None and type(adapter) is cls:
+        cachedUpdated = adapter.assetstore.get('updated') or datetime.datetime.min
+        if cachedUpdated == updated:
+            return adapter
+        if cachedUpdated > updated:
+            # The caller has an older copy of the document than the cache, so
+            # don't let it replace the cached adapter.
+            return cls(assetstore)
+
+    adapter = cls(assetstore)
+    _cacheAdapter(adapter, generation)
+    return adapter
+
+
+def getAssetstoreAdapterById(assetstoreId):
+    """
+    Return the adapter for the assetstore with the given id. If a cached
+    adapter exists it is returned without loading the assetstore document,
+    which is available as the ``assetstore`` attribute of the adapter.
+
+    :param assetstoreId: The id of the assetstore.
+    :type assetstoreId: ObjectId
+    :returns: An adapter descending from AbstractAssetstoreAdapter
+    """
+    if _cacheActive():
+        with _adapterCacheLock:
+            adapter = _adapterCache.get(assetstoreId)
+        if adapter is not None:
+            return adapter
+    return getAssetstoreAdapter(ModelImporter.model('assetstore').load(assetstoreId))
+
+
+def _cacheActive():
+    if not _adapterCacheState['subscribed']:
+        with _adapterCacheLock:
+            if not _adapterCacheState['subscribed']:
+                _adapterCacheState['subscribed'] = True
+                invalidation.subscribe(INVALIDATION_NAMESPACE, invalidateAdapterCache)
+    return invalidation.isActive()
+
+
+def _cacheAdapter(adapter, generation):
+    """
+    Store an adapter unless it could not reach its storage, or the cache was
+    invalidated since the caller started looking the adapter up.
+    """
+    if getattr(adapter, 'unavailable', False):
+        return
+    with _adapterCacheLock:
+        if generation == _adapterCacheState['generation']:
+            _adapterCache[adapter.assetstore['_id']] = adapter
+
+
+def invalidateAdapterCache(assetstoreId=None):
+    """
+    Discard the cached adapter for an assetstore in this process, or all
+    cached adapters if no id is given. To invalidate the adapter in every
+    server process, publish to the invalidation namespace instead.
+
+    :param assetstoreId: The id of the assetstore, as an ObjectId or string.
+    """
+    if isinstance(assetstoreId, six.string_types):
+        assetstoreId = ObjectId(assetstoreId)
+    with _adapterCacheLock:
+        _adapterCacheState['generation'] += 1
+        if assetstoreId is None:
+            _adapterCache.clear()
+        else:
+            _adapterCache.pop(assetstoreId, None)
 
 
 def setAssetstoreAdapter(storeType, cls):
@@ -71,6 +161,7 @@ def setAssetstoreAdapter(storeType, cls):
     :type cls: AbstractAssetstoreAdapter
     """
     _assetstoreTable[storeType] = cls
+    invalidateAdapterCache()
 
 
 def fileIndexFields():
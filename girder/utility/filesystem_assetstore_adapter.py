@@ -25,20 +25,72 @@ import shutil
 import six
 from six import BytesIO
 import stat
+import sys
 import tempfile
+import threading
 
 from girder import events, logger
 from girder.api.rest import setResponseHeader
 from girder.models.model_base import ValidationException, GirderException
 from girder.utility import mkdir, progress
 from . import hash_state
-from .abstract_assetstore_adapter import AbstractAssetstoreAdapter
+from .abstract_assetstore_adapter import AbstractAssetstoreAdapter, RandomAccessFileHandle
+
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
 
 BUF_SIZE = 65536
 
 # Default permissions for the files written to the filesystem
 DEFAULT_PERMS = stat.S_IRUSR | stat.S_IWUSR
 
+# Number of files created with each bulk write when importing a directory
+IMPORT_BATCH_SIZE = 1000
+# Number of threads walking directories during an import
+IMPORT_WORKERS = 4
+
+
+class FilesystemFileHandle(RandomAccessFileHandle):
+    """
+    File handle that reads directly from the file on disk with ``pread``, or
+    with a seek and read where that is unavailable.
+    """
+    def __init__(self, file, adapter):
+        self._fd = None
+        super(FilesystemFileHandle, self).__init__(file, adapter)
+
+    def _readRange(self, offset, length):
+        if self._fd is None:
+            path = self._adapter.fullPath(self._file)
+            try:
+                self._fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            except OSError:
+                raise GirderException(
+                    'File %s does not exist.' % path,
+                    'girder.utility.filesystem_assetstore_adapter.'
+                    'file-does-not-exist')
+
+        chunks = []
+        while length > 0:
+            if hasattr(os, 'pread'):
+                data = os.pread(self._fd, length, offset)
+            else:
+                os.lseek(self._fd, offset, os.SEEK_SET)
+                data = os.read(self._fd, length)
+            if not data:
+                break
+            chunks.append(data)
+            offset += len(data)
+            length -= len(data)
+        return b''.join(chunks)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
 
 class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
     """
@@ -50,6 +102,8 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
     :type assetstore: dict
     """
 
+    cacheable = True
+
     @staticmethod
     def validateInfo(doc):
         """
@@ -141,6 +195,9 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
         Generates a temporary file and sets its location in the upload document
         as tempFile. This is the file that the chunks will be appended to.
         """
+        # This adapter may be cached for a long time, so don't rely on the
+        # temp directory that was created when it was constructed.
+        mkdir(self.tempDir)
         fd, path = tempfile.mkstemp(dir=self.tempDir)
         os.close(fd)  # Must close this file descriptor or it will leak
         upload['tempFile'] = path
@@ -198,6 +255,21 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
         upload['received'] += size
         return upload
 
+    def checkPartSize(self, upload, partSize):
+        self._checkPartSize(upload, partSize)
+
+    def uploadPart(self, upload, partNumber, chunk):
+        """
+        Writes the part into the temporary file at its offset. Each call uses
+        its own file descriptor, so parts may be written concurrently.
+        """
+        offset, length = self._partLength(upload, partNumber)
+        with open(upload['tempFile'], 'r+b') as tempFile:
+            tempFile.seek(offset)
+            for data in self._readPart(upload, partNumber, chunk, BUF_SIZE):
+                tempFile.write(data)
+        return length
+
     def requestOffset(self, upload):
         """
         Returns the size of the temp file.
@@ -209,8 +281,16 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
         Moves the file into its permanent content-addressed location within the
         assetstore. Directory hierarchy yields 256^2 buckets.
         """
-        hash = hash_state.restoreHex(upload['sha512state'],
-                                     'sha512').hexdigest()
+        if upload.get('partSize'):
+            # Parts arrive out of order, so hash the whole file once instead
+            checksum = sha512()
+            with open(upload['tempFile'], 'rb') as tempFile:
+                for data in iter(lambda: tempFile.read(BUF_SIZE), b''):
+                    checksum.update(data)
+            hash = checksum.hexdigest()
+        else:
+            hash = hash_state.restoreHex(upload['sha512state'],
+                                         'sha512').hexdigest()
         dir = os.path.join(hash[0:2], hash[2:4])
         absdir = os.path.join(self.assetstore['root'], dir)
 
@@ -299,6 +379,9 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
 
         return stream
 
+    def open(self, file):
+        return FilesystemFileHandle(file, self)
+
     def deleteFile(self, file):
         """
         Deletes the file from disk if it is the only File in this assetstore
@@ -322,6 +405,27 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
                     except Exception:
                         logger.exception('Failed to delete file %s' % path)
 
+    def deleteFiles(self, files):
+        """
+        Deletes the data of many files at once. References from other files are
+        counted with one query for the whole batch, but pending uploads are
+        still checked for each path while holding its lock, as in deleteFile.
+        """
+        files = [file for file in files if not file.get('imported') and 'path' in file]
+        for file in self._unreferencedFiles(files, 'sha512'):
+            path = os.path.join(self.assetstore['root'], file['path'])
+            if not os.path.isfile(path):
+                continue
+            with filelock.FileLock(path + '.deleteLock'):
+                if self.model('upload').findOne({
+                    'sha512': file['sha512'],
+                    'assetstoreId': self.assetstore['_id']
+                }, fields=[]) is None:
+                    try:
+                        os.unlink(path)
+                    except Exception:
+                        logger.exception('Failed to delete file %s' % path)
+
     def cancelUpload(self, upload):
         """
         Delete the temporary files associated with a given upload.
@@ -352,6 +456,10 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
             name=name, creator=user, item=item, reuseExisting=True,
             assetstore=self.assetstore, mimeType=mimeType, size=stat.st_size,
             saveFile=False)
+        if '_id' in file and file['size'] != stat.st_size:
+            # The file was imported before and has changed since
+            self.model('file').propagateSizeChange(item, stat.st_size - file['size'])
+            file['size'] = stat.st_size
         file['path'] = os.path.abspath(os.path.expanduser(path))
         file['mtime'] = stat.st_mtime
         file['imported'] = True
@@ -364,11 +472,22 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
         events.trigger('filesystem_assetstore_imported',
                        {'id': item['_id'], 'type': 'item',
                         'importPath': path})
+        existing = {}
+        if params.get('incremental'):
+            existing = {file['name']: file for file in self.model('item').childFiles(
+                item, fields=('name', 'size', 'mtime', 'path'))}
         for fname in files:
             fpath = os.path.join(path, fname)
             if self.shouldImportFile(fpath, params):
+                if fname in existing and not self._fileChanged(existing[fname], fpath):
+                    continue
                 self.importFile(item, fpath, user, name=fname)
 
+    def _fileChanged(self, file, path):
+        stat = os.stat(path)
+        return (file.get('path') != os.path.abspath(path) or
+                file.get('size') != stat.st_size or file.get('mtime') != stat.st_mtime)
+
     def _hasOnlyFiles(self, path, files):
         return all(os.path.isfile(os.path.join(path, name)) for name in files)
 
@@ -387,6 +506,17 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
         self.importFile(item, path, user, name=name)
 
     def importData(self, parent, parentType, params, progress, user, leafFoldersAsItems):
+        """
+        Import a file or directory tree from the local filesystem. Directories
+        are walked by a pool of threads, and the files of each directory are
+        created with a few bulk writes per batch through
+        :py:meth:`girder.models.item.Item.importFiles`.
+
+        If ``params['incremental']`` is set, files that were imported before
+        and whose path, size, and modification time are unchanged are skipped,
+        and no ``filesystem_assetstore_imported`` events are triggered for
+        them.
+        """
         importPath = params['importPath']
 
         if not os.path.exists(importPath):
@@ -404,31 +534,9 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
                 listDir, params=params)
             return
 
-        for name in listDir:
-            progress.update(message=name)
-            path = os.path.join(importPath, name)
-
-            if os.path.isdir(path):
-                localListDir = os.listdir(path)
-                if leafFoldersAsItems and self._hasOnlyFiles(path, localListDir):
-                    self._importDataAsItem(name, user, parent, path, localListDir, params=params)
-                else:
-                    folder = self.model('folder').createFolder(
-                        parent=parent, name=name, parentType=parentType,
-                        creator=user, reuseExisting=True)
-                    events.trigger(
-                        'filesystem_assetstore_imported', {
-                            'id': folder['_id'],
-                            'type': 'folder',
-                            'importPath': path
-                        })
-                    nextPath = os.path.join(importPath, name)
-                    self.importData(
-                        folder, 'folder', params=dict(params, importPath=nextPath),
-                        progress=progress, user=user, leafFoldersAsItems=leafFoldersAsItems)
-            else:
-                if self.shouldImportFile(path, params):
-                    self._importFileToFolder(name, user, parent, parentType, path)
+        _DirectoryImport(
+            self, parent, parentType, importPath, params, progress, user,
+            leafFoldersAsItems).run()
 
     def findInvalidFiles(self, progress=progress.noProgress, filters=None,
                          checkSize=True, **kwargs):
@@ -473,3 +581,123 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
                     'file': file,
                     'path': path
                 }
+
+
+class _DirectoryImport(object):
+    """
+    Imports a directory tree. Directories are listed with ``scandir`` by a
+    pool of threads, one directory at a time, and the files of each directory
+    are created in batches through ``Item.importFiles``.
+    """
+    def __init__(self, adapter, parent, parentType, importPath, params, progress, user,
+                 leafFoldersAsItems):
+        self.adapter = adapter
+        self.parent = parent
+        self.parentType = parentType
+        self.importPath = importPath
+        self.params = params
+        self.progress = progress
+        self.user = user
+        self.leafFoldersAsItems = leafFoldersAsItems
+        self.incremental = bool(params.get('incremental'))
+        self.queue = six.moves.queue.Queue()
+        self.lock = threading.Lock()
+        self.error = None
+        self.current = None
+
+    def run(self):
+        self.queue.put((self.importPath, self.parent, self.parentType))
+        threads = [threading.Thread(target=self._work) for _ in range(IMPORT_WORKERS)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        # Progress contexts aren't thread safe, so report from this thread
+        # while the workers run.
+        joiner = threading.Thread(target=self.queue.join)
+        joiner.daemon = True
+        joiner.start()
+        while joiner.is_alive():
+            joiner.join(1)
+            if self.progress and self.current:
+                self.progress.update(message=self.current)
+
+        for thread in threads:
+            self.queue.put(None)
+        for thread in threads:
+            thread.join()
+
+        if self.error is not None:
+            six.reraise(*self.error)
+
+    def _work(self):
+        while True:
+            task = self.queue.get()
+            try:
+                if task is None:
+                    return
+                if self.error is None:
+                    self._importDirectory(*task)
+            except Exception:
+                with self.lock:
+                    if self.error is None:
+                        self.error = sys.exc_info()
+            finally:
+                self.queue.task_done()
+
+    def _importDirectory(self, path, parent, parentType):
+        files = []
+        for entry in scandir(path):
+            self.current = entry.name
+            if entry.is_dir():
+                self._importSubdirectory(entry, parent, parentType)
+            elif self.adapter.shouldImportFile(entry.path, self.params):
+                files.append(entry)
+                if len(files) >= IMPORT_BATCH_SIZE:
+                    self._importFiles(files, parent, parentType)
+                    files = []
+        if files:
+            self._importFiles(files, parent, parentType)
+
+    def _importSubdirectory(self, entry, parent, parentType):
+        if self.leafFoldersAsItems:
+            children = list(scandir(entry.path))
+            if all(child.is_file() for child in children):
+                self.adapter._importDataAsItem(
+                    entry.name, self.user, parent, entry.path,
+                    [child.name for child in children], params=self.params)
+                return
+
+        folder = self.adapter.model('folder').createFolder(
+            parent=parent, name=entry.name, parentType=parentType, creator=self.user,
+            reuseExisting=True)
+        events.trigger('filesystem_assetstore_imported', {
+            'id': folder['_id'],
+            'type': 'folder',
+            'importPath': entry.path
+        })
+        self.queue.put((entry.path, folder, 'folder'))
+
+    def _importFiles(self, entries, parent, parentType):
+        if parentType != 'folder':
+            raise ValidationException(
+                'Files cannot be imported directly underneath a %s.' % parentType)
+
+        files = []
+        for entry in entries:
+            stat = entry.stat()
+            files.append({
+                'name': entry.name,
+                'size': stat.st_size,
+                'path': os.path.abspath(entry.path),
+                'mtime': stat.st_mtime,
+                'imported': True
+            })
+        docs = self.adapter.model('item').importFiles(
+            parent, self.user, self.adapter.assetstore, files, skipUnchanged=self.incremental)
+        for doc in docs:
+            events.trigger('filesystem_assetstore_imported', {
+                'id': doc['itemId'],
+                'type': 'item',
+                'importPath': doc['path']
+            })
@@ -31,7 +31,7 @@ from girder.external.mongodb_proxy import MongoProxy
 from girder.models import getDbConnection
 from girder.models.model_base import ValidationException
 from . import hash_state
-from .abstract_assetstore_adapter import AbstractAssetstoreAdapter
+from .abstract_assetstore_adapter import AbstractAssetstoreAdapter, RandomAccessFileHandle
 
 
 # 2MB chunks. Clients must not send any chunks that are smaller than this
@@ -90,12 +90,45 @@ def _setupSharding(collection, keyname='uuid'):
     return False
 
 
+class GridFsFileHandle(RandomAccessFileHandle):
+    """
+    File handle that looks up just the chunks covering each read by their
+    index. The last chunk read is kept, so that small sequential reads only
+    query the database once per chunk.
+    """
+    def __init__(self, file, adapter):
+        self._chunk = (None, None)
+        super(GridFsFileHandle, self).__init__(file, adapter)
+
+    def _readRange(self, offset, length):
+        chunkSize = self._file['chunkSize']
+        first = offset // chunkSize
+        last = (offset + length - 1) // chunkSize
+
+        if first == last and self._chunk[0] == first:
+            data = self._chunk[1]
+        else:
+            chunks = list(self._adapter.chunkColl.find({
+                'uuid': self._file['chunkUuid'],
+                'n': {'$gte': first, '$lte': last}
+            }, projection=['n', 'data']).sort('n', pymongo.ASCENDING))
+            if not chunks:
+                return b''
+            self._chunk = (chunks[-1]['n'], chunks[-1]['data'])
+            data = b''.join(chunk['data'] for chunk in chunks)
+
+        start = offset - first * chunkSize
+        return data[start:start + length]
+
+
 class GridFsAssetstoreAdapter(AbstractAssetstoreAdapter):
     """
     This assetstore type stores files within MongoDB using the GridFS data
     model.
     """
 
+    cacheable = True
+
     @staticmethod
     def validateInfo(doc):
         """
@@ -259,6 +292,37 @@ class GridFsAssetstoreAdapter(AbstractAssetstoreAdapter):
         upload['received'] += size
         return upload
 
+    def checkPartSize(self, upload, partSize):
+        """
+        Parts must be made of whole chunks so that each part can be stored
+        without reference to its neighbors.
+        """
+        self._checkPartSize(upload, partSize, CHUNK_SIZE)
+
+    def uploadPart(self, upload, partNumber, chunk):
+        """
+        Stores the part as the chunks that cover its offset. A part that is
+        sent again replaces its previous chunks.
+        """
+        offset, length = self._partLength(upload, partNumber)
+        n = offset // CHUNK_SIZE
+        for data in self._readPart(upload, partNumber, chunk, CHUNK_SIZE):
+            try:
+                self.chunkColl.replace_one({
+                    'uuid': upload['chunkUuid'],
+                    'n': n
+                }, {
+                    'n': n,
+                    'uuid': upload['chunkUuid'],
+                    'data': bson.binary.Binary(data)
+                }, upsert=True)
+            except pymongo.errors.DuplicateKeyError:
+                logger.info('Received a DuplicateKeyError while uploading, '
+                            'probably because we reconnected to the database '
+                            '(chunk uuid %s part %d)', upload['chunkUuid'], n)
+            n += 1
+        return length
+
     def requestOffset(self, upload):
         """
         The offset will be the CHUNK_SIZE * total number of chunks in the
@@ -281,8 +345,18 @@ class GridFsAssetstoreAdapter(AbstractAssetstoreAdapter):
         Grab the final state of the checksum and set it on the file object,
         and write the generated UUID into the file itself.
         """
-        hash = hash_state.restoreHex(upload['sha512state'],
-                                     'sha512').hexdigest()
+        if upload.get('partSize'):
+            # Parts arrive out of order, so hash the chunks once instead
+            checksum = sha512()
+            cursor = self.chunkColl.find({
+                'uuid': upload['chunkUuid']
+            }, projection=['data']).sort('n', pymongo.ASCENDING)
+            for chunk in cursor:
+                checksum.update(chunk['data'])
+            hash = checksum.hexdigest()
+        else:
+            hash = hash_state.restoreHex(upload['sha512state'],
+                                         'sha512').hexdigest()
 
         file['sha512'] = hash
         file['chunkUuid'] = upload['chunkUuid']
@@ -344,6 +418,9 @@ class GridFsAssetstoreAdapter(AbstractAssetstoreAdapter):
 
         return stream
 
+    def open(self, file):
+        return GridFsFileHandle(file, self)
+
     def deleteFile(self, file):
         """
         Delete all of the chunks in the collection that correspond to the
@@ -367,6 +444,20 @@ class GridFsAssetstoreAdapter(AbstractAssetstoreAdapter):
             except pymongo.errors.AutoReconnect:
                 pass
 
+    def deleteFiles(self, files):
+        """
+        Delete the chunks of many files with a single query, skipping those
+        that are shared with files outside of the batch.
+        """
+        uuids = [file['chunkUuid'] for file in self._unreferencedFiles(files, 'chunkUuid')]
+        if uuids:
+            try:
+                self.chunkColl.with_options(
+                    write_concern=pymongo.WriteConcern(w=0)).delete_many(
+                        {'uuid': {'$in': uuids}})
+            except pymongo.errors.AutoReconnect:
+                pass
+
     def cancelUpload(self, upload):
         """
         Delete all of the chunks associated with a given upload.
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+"""
+This module broadcasts cache invalidation messages between all Girder server
+processes that share a database. Messages are written to a small capped
+collection, which every process tails from a background thread.
+
+Callers that keep process-local caches should register a callback with:
+
+    ``girder.utility.invalidation.subscribe('namespace', callback)``
+
+and announce changes with:
+
+    ``girder.utility.invalidation.publish('namespace', key)``
+
+The callback receives the invalidated key, or None if the whole cache for that
+namespace must be discarded (e.g. after the watcher lost its cursor and may
+have missed messages). Callers should only trust their caches while
+``isActive()`` returns True.
+"""
+
+import datetime
+import pymongo
+import threading
+import time
+
+from girder import logger, logprint
+from girder.models import getDbConnection
+
+COLLECTION_NAME = 'cache_invalidation'
+COLLECTION_SIZE = 1024 * 1024
+
+
+class InvalidationWatcher(threading.Thread):
+    """
+    Background thread that tails the invalidation collection and dispatches
+    each message to the callbacks subscribed to its namespace. This should not
+    be used directly; use the module-level functions instead.
+    """
+    def __init__(self, retryInterval=1.0):
+        threading.Thread.__init__(self)
+
+        self.daemon = True
+        self.terminate = False
+        self.active = False
+        self.retryInterval = retryInterval
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        # The collection once it is known to be capped, for publishing
+        self._collection = None
+
+    def _getCollection(self):
+        db = getDbConnection().get_default_database()
+        coll = db[COLLECTION_NAME]
+        if not coll.options().get('capped'):
+            # Either missing, or implicitly recreated as a regular collection
+            # by an insert after the database was dropped.
+            coll.drop()
+            try:
+                db.create_collection(COLLECTION_NAME, capped=True, size=COLLECTION_SIZE)
+            except pymongo.errors.CollectionInvalid:
+                pass  # Another process just created it
+        # A tailable cursor on an empty capped collection dies immediately, so
+        # make sure there is always at least one document to tail from.
+        if coll.find_one() is None:
+            coll.insert_one(self._message('_init', None))
+        self._collection = coll
+        return coll
+
+    def _message(self, namespace, key):
+        return {
+            'ns': namespace,
+            'key': key,
+            'time': datetime.datetime.utcnow()
+        }
+
+    def subscribe(self, namespace, callback):
+        with self._lock:
+            self._subscribers.setdefault(namespace, []).append(callback)
+
+    def unsubscribe(self, namespace, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(namespace, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def dispatch(self, namespace, key):
+        """
+        Call each callback subscribed to a namespace. If namespace is None,
+        all subscribers are told to discard their entire cache.
+        """
+        with self._lock:
+            if namespace is None:
+                targets = [(cb, None) for cbs in self._subscribers.values() for cb in cbs]
+            else:
+                targets = [(cb, key) for cb in self._subscribers.get(namespace, ())]
+
+        for callback, cbKey in targets:
+            try:
+                callback(cbKey)
+            except Exception:
+                logger.exception('In cache invalidation callback for "%s":' % namespace)
+
+    def publish(self, namespace, key=None):
+        # Invalidate our own caches immediately rather than waiting for the
+        # message to make the round trip through the database.
+        self.dispatch(namespace, key)
+        message = self._message(namespace, key)
+        try:
+            try:
+                (self._collection or self._getCollection()).insert_one(message)
+            except Exception:
+                # The verified collection may be stale, e.g. after reconnecting
+                # to the database, so check it again. Sending a message twice
+                # is harmless.
+                self._getCollection().insert_one(message)
+        except Exception:
+            # If we can't tell the other processes, they will fall back to
+            # discarding everything once their own cursors are reestablished.
+            logger.exception('Could not publish cache invalidation for "%s":' % namespace)
+
+    def run(self):
+        logprint.info('Started cache invalidation thread.')
+
+        while not self.terminate:
+            try:
+                coll = self._getCollection()
+                last = next(coll.find(sort=[('$natural', pymongo.DESCENDING)], limit=1))
+                cursor = coll.find(
+                    {'_id': {'$gt': last['_id']}},
+                    cursor_type=pymongo.CursorType.TAILABLE_AWAIT)
+                # We may have missed messages while we were not tailing, so
+                # every cache must start over.
+                self.dispatch(None, None)
+                self.active = True
+
+                while cursor.alive and not self.terminate:
+                    for doc in cursor:
+                        # Our own messages were already dispatched locally by
+                        # publish(), but invalidating twice is harmless.
+                        if doc['ns'] != '_init':
+                            self.dispatch(doc['ns'], doc.get('key'))
+            except Exception:
+                logger.exception('Cache invalidation cursor failed:')
+            finally:
+                if self.active:
+                    self.active = False
+                    self.dispatch(None, None)
+
+            if not self.terminate:
+                time.sleep(self.retryInterval)
+
+        logprint.info('Stopped cache invalidation thread.')
+
+    def stop(self):
+        self.terminate = True
+
+
+_watcher = InvalidationWatcher()
+_startLock = threading.Lock()
+
+
+def _ensureStarted():
+    with _startLock:
+        if not _watcher.is_alive() and not _watcher.terminate:
+            _watcher.start()
+
+
+def subscribe(namespace, callback):
+    """
+    Register a callback to be invoked whenever a key in the given namespace is
+    invalidated by any server process. This starts the watcher thread if it is
+    not already running.
+
+    :param namespace: Identifies the cache, e.g. "setting".
+    :type namespace: str
+    :param callback: Function taking one argument, the invalidated key, or
+        None if the whole cache should be discarded.
+    """
+    _watcher.subscribe(namespace, callback)
+    _ensureStarted()
+
+
+def unsubscribe(namespace, callback):
+    """
+    Remove a callback registered with :py:func:`subscribe`.
+    """
+    _watcher.unsubscribe(namespace, callback)
+
+
+def publish(namespace, key=None):
+    """
+    Invalidate a key in this process and announce it to all other processes.
+
+    :param namespace: Identifies the cache, e.g. "setting".
+    :type namespace: str
+    :param key: The key to invalidate, or None to invalidate the namespace.
+    """
+    _watcher.publish(namespace, key)
+
+
+def isActive():
+    """
+    Whether invalidation messages from other processes are currently being
+    received. Process-local caches must not be trusted while this is False.
+    """
+    return _watcher.active
@@ -20,19 +20,74 @@
 import boto3
 import botocore
 import cherrypy
+import collections
 import json
 import re
+import pymongo
 import requests
 import six
+import sys
+import threading
 import uuid
 
 from girder import logger, events
 from girder.api.rest import setContentDisposition
+from girder.models import getDbConnection
 from girder.models.model_base import GirderException, ValidationException
-from .abstract_assetstore_adapter import AbstractAssetstoreAdapter
+from .abstract_assetstore_adapter import AbstractAssetstoreAdapter, RandomAccessFileHandle
 
 BUF_LEN = 65536  # Buffer size for download stream
 DEFAULT_REGION = 'us-east-1'
+MAX_DELETE_KEYS = 1000  # Keys per multi-object delete request
+
+# Clients are thread safe and each keeps its own connection pool, so share
+# them between all adapters that connect with the same parameters.
+_clientPool = {}
+_clientPoolLock = threading.Lock()
+
+IMPORT_CHECKPOINT_COLLECTION = 's3_import_checkpoint'
+IMPORT_PAGE_SIZE = 1000  # Keys listed per request when importing
+IMPORT_WORKERS = 4  # Prefixes listed concurrently when importing
+
+
+class S3FileHandle(RandomAccessFileHandle):
+    """
+    File handle that fetches byte ranges of the object with ranged GET
+    requests. Reads are rounded out to whole blocks, and the most recently
+    used blocks are kept so that small sequential reads share requests.
+    """
+    BLOCK_SIZE = 1024 * 1024
+    CACHED_BLOCKS = 4
+
+    def __init__(self, file, adapter):
+        self._blocks = collections.OrderedDict()
+        super(S3FileHandle, self).__init__(file, adapter)
+
+    def _get(self, start, end):
+        return self._adapter.client.get_object(
+            Bucket=self._adapter.assetstore['bucket'], Key=self._file['s3Key'],
+            Range='bytes=%d-%d' % (start, end - 1))['Body'].read()
+
+    def _block(self, n):
+        data = self._blocks.pop(n, None)
+        if data is None:
+            data = self._get(n * self.BLOCK_SIZE,
+                             min((n + 1) * self.BLOCK_SIZE, self._file['size']))
+            while len(self._blocks) >= self.CACHED_BLOCKS:
+                self._blocks.popitem(last=False)
+        self._blocks[n] = data
+        return data
+
+    def _readRange(self, offset, length):
+        first = offset // self.BLOCK_SIZE
+        last = (offset + length - 1) // self.BLOCK_SIZE
+        if last - first >= self.CACHED_BLOCKS:
+            # Too large to be worth caching; fetch it in one request
+            return self._get(offset, offset + length)
+
+        data = b''.join(self._block(n) for n in range(first, last + 1))
+        start = offset - first * self.BLOCK_SIZE
+        return data[start:start + length]
 
 
 class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
@@ -42,6 +97,8 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
     the S3 server where the files are stored.
     """
 
+    cacheable = True
+
     CHUNK_LEN = 1024 * 1024 * 32  # Chunk size for uploading
     HMAC_TTL = 120  # Number of seconds each signed message is valid
 
@@ -103,7 +160,14 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
                 self.assetstore['accessKeyId'], self.assetstore['secret'],
                 self.assetstore['service'], self.assetstore.get('region'),
                 self.assetstore.get('inferCredentials'))
-            self.client = S3AssetstoreAdapter._s3Client(self.connectParams)
+            key = tuple(self.assetstore.get(k) for k in (
+                'accessKeyId', 'secret', 'service', 'region', 'inferCredentials'))
+            # Creating clients from the default boto3 session is not thread
+            # safe, so do it while holding the lock.
+            with _clientPoolLock:
+                if key not in _clientPool:
+                    _clientPool[key] = S3AssetstoreAdapter._s3Client(self.connectParams)
+                self.client = _clientPool[key]
 
     def _getRequestHeaders(self, upload):
         return {
@@ -375,51 +439,23 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
                         yield chunk
             return stream
 
+    def open(self, file):
+        return S3FileHandle(file, self)
+
     def importData(self, parent, parentType, params, progress, user, **kwargs):
+        """
+        Import the keys below a prefix of the bucket, creating a folder for
+        each prefix and an item and file for each key. Prefixes are listed
+        concurrently, and each page of keys is written in bulk. If an import
+        of the same prefix into the same destination was interrupted, this
+        resumes it.
+        """
         importPath = params.get('importPath', '').strip().lstrip('/')
 
         if importPath and not importPath.endswith('/'):
             importPath += '/'
 
-        bucket = self.assetstore['bucket']
-        resp = self.client.list_objects(Bucket=bucket, Prefix=importPath, Delimiter='/')
-
-        # Start with objects
-        for obj in resp.get('Contents', []):
-            if progress:
-                progress.update(message=obj['Key'])
-
-            name = obj['Key'].rsplit('/', 1)[-1]
-            if not name:
-                continue
-
-            if parentType != 'folder':
-                raise ValidationException(
-                    'Keys cannot be imported directly underneath a %s.' % parentType)
-
-            if self.shouldImportFile(obj['Key'], params):
-                item = self.model('item').createItem(
-                    name=name, creator=user, folder=parent, reuseExisting=True)
-                file = self.model('file').createFile(
-                    name=name, creator=user, item=item, reuseExisting=True,
-                    assetstore=self.assetstore, mimeType=None, size=obj['Size'])
-                file['s3Key'] = obj['Key']
-                file['imported'] = True
-                self.model('file').save(file)
-
-        # Now recurse into subdirectories
-        for obj in resp.get('CommonPrefixes', []):
-            if progress:
-                progress.update(message=obj['Prefix'])
-
-            name = obj['Prefix'].rstrip('/').rsplit('/', 1)[-1]
-
-            folder = self.model('folder').createFolder(
-                parent=parent, name=name, parentType=parentType, creator=user,
-                reuseExisting=True)
-            self.importData(parent=folder, parentType='folder', params={
-                'importPath': obj['Prefix']
-            }, progress=progress, user=user, **kwargs)
+        _BucketImport(self, parent, parentType, importPath, params, progress, user).run()
 
     def deleteFile(self, file):
         """
@@ -443,6 +479,20 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
                     'key': file['s3Key']
                 })
 
+    def deleteFiles(self, files):
+        """
+        Queue the keys of many files for deletion with multi-object delete
+        requests, rather than one request per file.
+        """
+        files = [file for file in files if file['size'] > 0 and 'relpath' in file]
+        keys = [file['s3Key'] for file in self._unreferencedFiles(files, 'relpath')]
+        if keys:
+            events.daemon.trigger('_s3_assetstore_delete_files', {
+                'client': self.client,
+                'bucket': self.assetstore['bucket'],
+                'keys': keys
+            })
+
     def fileUpdated(self, file):
         """
         On file update, if the name or the MIME type changed, we must update
@@ -556,6 +606,156 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
         return False
 
 
+class _BucketImport(object):
+    """
+    Imports the keys below a prefix of a bucket. Prefixes are walked by a pool
+    of threads, with one paginated ``list_objects_v2`` listing each. The keys
+    of each page are created with a handful of bulk writes through
+    ``Item.importFiles``.
+
+    Every prefix has a checkpoint document recording its destination folder
+    and the last key imported from it, updated after each page. Rerunning an
+    import with the same prefix and destination continues every unfinished
+    prefix from its checkpoint. The checkpoints are removed once the import
+    completes.
+    """
+    def __init__(self, adapter, parent, parentType, importPath, params, progress, user):
+        self.adapter = adapter
+        self.parent = parent
+        self.parentType = parentType
+        self.importPath = importPath
+        self.params = params
+        self.progress = progress
+        self.user = user
+        self.importId = '%s:%s:%s' % (adapter.assetstore['_id'], parent['_id'], importPath)
+        self.checkpoints = getDbConnection().get_default_database()[
+            IMPORT_CHECKPOINT_COLLECTION]
+        self.queue = six.moves.queue.Queue()
+        self.lock = threading.Lock()
+        self.error = None
+        self.current = None
+
+    def run(self):
+        self.checkpoints.create_index(
+            [('importId', pymongo.ASCENDING), ('prefix', pymongo.ASCENDING)], unique=True)
+        if self.checkpoints.find_one({'importId': self.importId}) is None:
+            self._addPrefix(self.importPath, self.parent, self.parentType)
+        else:
+            for checkpoint in self.checkpoints.find({'importId': self.importId, 'done': False}):
+                self.queue.put(checkpoint)
+
+        threads = [threading.Thread(target=self._work) for _ in range(IMPORT_WORKERS)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        # Progress contexts aren't thread safe, so report from this thread
+        # while the workers run.
+        joiner = threading.Thread(target=self.queue.join)
+        joiner.daemon = True
+        joiner.start()
+        while joiner.is_alive():
+            joiner.join(1)
+            if self.progress and self.current:
+                self.progress.update(message=self.current)
+
+        for thread in threads:
+            self.queue.put(None)
+        for thread in threads:
+            thread.join()
+
+        if self.error is not None:
+            six.reraise(*self.error)
+        self.checkpoints.delete_many({'importId': self.importId})
+
+    def _addPrefix(self, prefix, parent, parentType):
+        """
+        Queue a prefix to be imported into the given parent, unless it
+        already has a checkpoint.
+        """
+        checkpoint = {
+            'importId': self.importId,
+            'prefix': prefix,
+            'parentId': parent['_id'],
+            'parentType': parentType,
+            'after': None,
+            'done': False
+        }
+        try:
+            self.checkpoints.insert_one(checkpoint)
+        except pymongo.errors.DuplicateKeyError:
+            return
+        self.queue.put(checkpoint)
+
+    def _work(self):
+        while True:
+            checkpoint = self.queue.get()
+            try:
+                if checkpoint is None:
+                    return
+                if self.error is None:
+                    self._importPrefix(checkpoint)
+            except Exception:
+                with self.lock:
+                    if self.error is None:
+                        self.error = sys.exc_info()
+            finally:
+                self.queue.task_done()
+
+    def _importPrefix(self, checkpoint):
+        adapter = self.adapter
+        parentType = checkpoint['parentType']
+        parent = adapter.model(parentType).load(checkpoint['parentId'], force=True)
+        listParams = {
+            'Bucket': adapter.assetstore['bucket'],
+            'Prefix': checkpoint['prefix'],
+            'Delimiter': '/',
+            'MaxKeys': IMPORT_PAGE_SIZE
+        }
+        if checkpoint['after']:
+            listParams['StartAfter'] = checkpoint['after']
+
+        while True:
+            resp = adapter.client.list_objects_v2(**listParams)
+            self.current = checkpoint['prefix']
+
+            files = []
+            for obj in resp.get('Contents', []):
+                name = obj['Key'].rsplit('/', 1)[-1]
+                if not name:
+                    continue
+                if parentType != 'folder':
+                    raise ValidationException(
+                        'Keys cannot be imported directly underneath a %s.' % parentType)
+                if adapter.shouldImportFile(obj['Key'], self.params):
+                    files.append({
+                        'name': name,
+                        'size': obj['Size'],
+                        's3Key': obj['Key'],
+                        'imported': True
+                    })
+            if files:
+                adapter.model('item').importFiles(parent, self.user, adapter.assetstore, files)
+
+            for obj in resp.get('CommonPrefixes', []):
+                name = obj['Prefix'].rstrip('/').rsplit('/', 1)[-1]
+                folder = adapter.model('folder').createFolder(
+                    parent=parent, name=name, parentType=parentType, creator=self.user,
+                    reuseExisting=True)
+                self._addPrefix(obj['Prefix'], folder, 'folder')
+
+            listed = [obj['Key'] for obj in resp.get('Contents', [])] + [
+                obj['Prefix'] for obj in resp.get('CommonPrefixes', [])]
+            update = {'after': max(listed)} if listed else {}
+            if not resp.get('IsTruncated'):
+                update['done'] = True
+            if update:
+                self.checkpoints.update_one({'_id': checkpoint['_id']}, {'$set': update})
+            if update.get('done'):
+                return
+            listParams['ContinuationToken'] = resp['NextContinuationToken']
+
+
 def makeBotoConnectParams(accessKeyId, secret, service=None, region=None, inferCredentials=False):
     """
     Create a dictionary of values to pass to the boto connect_s3 function.
@@ -601,4 +801,16 @@ def _deleteFileImpl(event):
     event.info['client'].delete_object(Bucket=event.info['bucket'], Key=event.info['key'])
 
 
+def _deleteFilesImpl(event):
+    keys = event.info['keys']
+    for i in six.moves.range(0, len(keys), MAX_DELETE_KEYS):
+        resp = event.info['client'].delete_objects(Bucket=event.info['bucket'], Delete={
+            'Objects': [{'Key': key} for key in keys[i:i + MAX_DELETE_KEYS]],
+            'Quiet': True
+        })
+        for error in resp.get('Errors', ()):
+            logger.error('Failed to delete S3 key %s: %s' % (error['Key'], error['Message']))
+
+
 events.bind('_s3_assetstore_delete_file', '_s3_assetstore_delete_file', _deleteFileImpl)
+events.bind('_s3_assetstore_delete_files', '_s3_assetstore_delete_files', _deleteFilesImpl)
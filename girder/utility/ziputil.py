@@ -30,27 +30,46 @@ Example of creating and consuming a streaming zip:
         yield data
 
     yield zip.footer()
+
+When adding many files, wrap the list of files in ``readAhead`` so that the
+start of each file is read in the background while earlier files are written:
+
+    for (path, stream) in ziputil.readAhead(folderModel.fileList(folder)):
+        for data in zip.addFile(stream, path):
+            yield data
 """
 
 import binascii
+import collections
 import os
 import six
 import struct
 import sys
+import threading
 import time
 
+from multiprocessing.pool import ThreadPool
+
 try:
     import zlib
 except ImportError:  # pragma: no cover
     zlib = None
 
-__all__ = ('STORE', 'DEFLATE', 'ZipGenerator')
+__all__ = ('STORE', 'DEFLATE', 'ZipGenerator', 'readAhead')
 
 
 Z64_LIMIT = (1 << 31) - 1
 Z_FILECOUNT_LIMIT = 1 << 16
 STORE = 0
 DEFLATE = 8
+# Number of threads reading ahead, shared by all concurrent downloads
+READ_AHEAD_WORKERS = 8
+# Number of upcoming files that each download reads ahead
+READ_AHEAD_FILES = 8
+READ_AHEAD_BYTES = 1024 * 1024
+
+_readAheadPool = None
+_readAheadPoolLock = threading.Lock()
 
 
 class ZipInfo(object):
@@ -263,3 +282,84 @@ class ZipGenerator(object):
         data.append(self._advanceOffset(endrec))
 
         return b''.join(data)
+
+
+def _readHead(stream, maxBytes):
+    """
+    Start a stream function and buffer up to ``maxBytes`` of its output.
+
+    :returns: A stream function that yields the buffered data followed by the
+        remainder of the original stream.
+    """
+    iterator = iter(stream())
+    head = []
+    size = 0
+    for buf in iterator:
+        head.append(buf)
+        size += len(buf)
+        if size >= maxBytes:
+            break
+    else:
+        iterator = ()
+
+    def generator():
+        for buf in head:
+            yield buf
+        for buf in iterator:
+            yield buf
+    return generator
+
+
+def _getReadAheadPool():
+    """
+    Return the thread pool shared by all read ahead operations, creating it
+    the first time it is needed.
+    """
+    global _readAheadPool
+
+    with _readAheadPoolLock:
+        if _readAheadPool is None:
+            _readAheadPool = ThreadPool(READ_AHEAD_WORKERS)
+        return _readAheadPool
+
+
+def readAhead(files, ahead=READ_AHEAD_FILES, maxBytes=READ_AHEAD_BYTES):
+    """
+    Wrap an iterable of (path, stream function) tuples, such as the result of
+    a model's ``fileList`` method, so that the first ``maxBytes`` of upcoming
+    files are read in the background while earlier files are still being
+    consumed. Small files are read completely in the background, which hides
+    the per-file latency of the assetstore when archiving many of them.
+
+    The reads are done by a pool of READ_AHEAD_WORKERS threads shared by
+    every caller, so the number of background threads does not grow with the
+    number of concurrent downloads.
+
+    :param files: An iterable of (path, stream function) tuples.
+    :param ahead: The number of upcoming files to read at once. If 0, the
+        files are passed through unchanged.
+    :type ahead: int
+    :param maxBytes: The maximum number of bytes to buffer for each file.
+    :type maxBytes: int
+    :returns: A generator of (path, stream function) tuples in the same order.
+    """
+    if ahead <= 0:
+        for entry in files:
+            yield entry
+        return
+
+    pool = _getReadAheadPool()
+    pending = collections.deque()
+    files = iter(files)
+    while True:
+        # Bounding the queued files also bounds the buffered data.
+        while len(pending) < ahead:
+            entry = next(files, None)
+            if entry is None:
+                break
+            path, stream = entry
+            pending.append((path, pool.apply_async(_readHead, (stream, maxBytes))))
+        if not pending:
+            break
+        path, result = pending.popleft()
+        yield (path, result.get())
@@ -18,8 +18,11 @@
 ###############################################################################
 
 
+import datetime
+import mock
 import os
 import json
+import six
 
 from tests import base
 from girder.constants import ROOT_DIR
@@ -82,7 +85,10 @@ class DownloadStatisticsTestCase(base.TestCase):
             data
 
     def _checkDownloadsCount(self, fileId, started, requested, completed):
-        # Downloads file info and asserts download statistics are accurate
+        from girder.plugins.download_statistics import buffer
+
+        # Write the buffered counters, then assert download statistics are accurate
+        buffer.flush()
         path = '/file/%s' % str(fileId)
         resp = self.request(path, isJson=True)
         self.assertStatusOk(resp)
@@ -196,3 +202,82 @@ class DownloadStatisticsTestCase(base.TestCase):
 
         self._checkDownloadsCount(file1['_id'], 14, 18, 13)
         self._checkDownloadsCount(file2['_id'], 15, 19, 14)
+
+    def testDailyDownloads(self):
+        from girder.plugins.download_statistics.constants import PluginSettings
+
+        self.model('setting').set(PluginSettings.DAILY_COUNTS, True)
+        folder = six.next(self.model('folder').childFolders(
+            parent=self.admin, parentType='user', user=self.admin, filters={'public': True}))
+        item = self.model('item').createItem('item1', self.admin, folder)
+        path = os.path.join(self.filesDir, 'txt1.txt')
+        with open(path, 'rb') as fp:
+            file = self.model('upload').uploadFromFile(
+                fp, os.path.getsize(path), 'txt1.txt', parentType='item', parent=item,
+                user=self.admin)
+
+        self._downloadPartialFile(file['_id'])
+        self._downloadFile(file['_id'])
+
+        self._checkDownloadsCount(file['_id'], 2, 5, 1)
+
+        today = datetime.datetime.utcnow().date().isoformat()
+        resp = self.request('/file/%s/download_statistics/daily' % file['_id'], user=self.admin)
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json, [{
+            'date': today,
+            'started': 2,
+            'requested': 5,
+            'completed': 1
+        }])
+
+        resp = self.request('/file/%s/download_statistics/daily' % file['_id'],
+                            user=self.admin, params={'end': '2000-01-01'})
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json, [])
+
+        self.model('file').remove(file)
+        self.assertEqual(self.model('daily_download', 'download_statistics').find().count(), 0)
+
+    def testBufferedCounts(self):
+        from girder.plugins.download_statistics import buffer
+        from girder.plugins.download_statistics.constants import PluginSettings
+
+        self.model('setting').set(PluginSettings.DAILY_COUNTS, True)
+        folder = six.next(self.model('folder').childFolders(
+            parent=self.admin, parentType='user', user=self.admin, filters={'public': True}))
+        item = self.model('item').createItem('item1', self.admin, folder)
+        path = os.path.join(self.filesDir, 'txt1.txt')
+        with open(path, 'rb') as fp:
+            file = self.model('upload').uploadFromFile(
+                fp, os.path.getsize(path), 'txt1.txt', parentType='item', parent=item,
+                user=self.admin)
+        dailyModel = self.model('daily_download', 'download_statistics')
+
+        # Counters that fail to be written are kept for the next flush
+        buffer.flush()
+        self._downloadFile(file['_id'])
+        with mock.patch.object(buffer, '_writeFileCounts', side_effect=Exception('down')):
+            buffer.flush()
+        self.assertEqual(dailyModel.find({'fileId': file['_id']}).count(), 1)
+        self._checkDownloadsCount(file['_id'], 1, 1, 1)
+
+        # Removing a file discards its buffered counters, so they are not
+        # written again afterwards
+        self._downloadFile(file['_id'])
+        self.model('file').remove(file)
+        buffer.flush()
+        self.assertEqual(dailyModel.find({'fileId': file['_id']}).count(), 0)
+
+        # With a flush interval of 0, counters are written immediately
+        self.model('setting').set(PluginSettings.FLUSH_INTERVAL, 0)
+        with open(path, 'rb') as fp:
+            file = self.model('upload').uploadFromFile(
+                fp, os.path.getsize(path), 'txt1.txt', parentType='item', parent=item,
+                user=self.admin)
+        self._downloadFile(file['_id'])
+        self.assertEqual(self.model('file').load(file['_id'], force=True)['downloadStatistics'], {
+            'started': 1,
+            'requested': 1,
+            'completed': 1
+        })
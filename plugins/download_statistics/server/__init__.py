@@ -18,34 +18,73 @@
 ###############################################################################
 
 
+import cherrypy
+
 from girder import events
 from girder.constants import AccessType
+from girder.models.model_base import ValidationException
+from girder.utility import setting_utilities
 from girder.utility.model_importer import ModelImporter
+from . import buffer
+from .constants import PluginSettings
+from .rest import getDailyDownloads
+
+
+@setting_utilities.default(PluginSettings.FLUSH_INTERVAL)
+def _defaultFlushInterval():
+    return 5
+
+
+@setting_utilities.default(PluginSettings.DAILY_COUNTS)
+def _defaultDailyCounts():
+    return False
+
+
+@setting_utilities.validator(PluginSettings.FLUSH_INTERVAL)
+def _validateFlushInterval(doc):
+    try:
+        doc['value'] = float(doc['value'])
+        if doc['value'] >= 0:
+            return
+    except ValueError:
+        pass  # We want to raise the ValidationException
+    raise ValidationException('Flush interval must be a number >= 0.', 'value')
+
+
+@setting_utilities.validator(PluginSettings.DAILY_COUNTS)
+def _validateDailyCounts(doc):
+    if not isinstance(doc['value'], bool):
+        raise ValidationException('Daily counts setting must be a boolean.', 'value')
 
 
 def _onDownloadFileRequest(event):
     if event.info['startByte'] == 0:
-        ModelImporter.model('file').increment(
-            query={'_id': event.info['file']['_id']},
-            field='downloadStatistics.started',
-            amount=1)
-    ModelImporter.model('file').increment(
-        query={'_id': event.info['file']['_id']},
-        field='downloadStatistics.requested',
-        amount=1)
+        buffer.add(event.info['file']['_id'], 'started')
+    buffer.add(event.info['file']['_id'], 'requested')
 
 
 def _onDownloadFileComplete(event):
-    ModelImporter.model('file').increment(
-        query={'_id': event.info['file']['_id']},
-        field='downloadStatistics.completed',
-        amount=1)
+    buffer.add(event.info['file']['_id'], 'completed')
+
+
+def _onFileRemove(event):
+    files = [event.info] if isinstance(event.info, dict) else event.info
+    # Otherwise the next flush would create the daily counts of the file again
+    buffer.discard(file['_id'] for file in files)
+    ModelImporter.model('daily_download', 'download_statistics').removeCounts(files)
 
 
 def load(info):
     # Bind REST events
     events.bind('model.file.download.request', 'download_statistics', _onDownloadFileRequest)
     events.bind('model.file.download.complete', 'download_statistics', _onDownloadFileComplete)
+    events.bind('model.file.remove', 'download_statistics', _onFileRemove)
+    events.bind('model.file.remove.bulk', 'download_statistics', _onFileRemove)
+
+    # Write the buffered counters before the server exits
+    cherrypy.engine.subscribe('stop', buffer.flush)
+
+    info['apiRoot'].file.route('GET', (':id', 'download_statistics', 'daily'), getDailyDownloads)
 
     # Add download count fields to file model
     ModelImporter.model('file').exposeFields(level=AccessType.READ, fields='downloadStatistics')
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+"""
+This module aggregates download statistics in memory, so that downloads, and
+especially the many range requests of streaming clients, do not each write to
+the file collection. The counters of each file are written with a single bulk
+write every ``download_statistics.flush_interval`` seconds and when the server
+stops. If the interval is 0, the counters are written as soon as they change.
+"""
+
+import collections
+import datetime
+import six
+import threading
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from girder import logger
+from girder.utility.model_importer import ModelImporter
+from .constants import PluginSettings
+
+_counts = collections.defaultdict(collections.Counter)
+_dailyCounts = collections.defaultdict(collections.Counter)
+_lock = threading.Lock()
+# Held while writing, so that discarded counters cannot be written afterwards
+_flushLock = threading.Lock()
+_flushThread = None
+
+
+def add(fileId, field, amount=1):
+    """
+    Add to a download counter of a file.
+
+    :param fileId: The _id of the file.
+    :type fileId: ObjectId
+    :param field: The counter, one of "started", "requested" or "completed".
+    :type field: str
+    :param amount: The amount to add.
+    :type amount: int
+    """
+    settingModel = ModelImporter.model('setting')
+    daily = settingModel.get(PluginSettings.DAILY_COUNTS)
+    with _lock:
+        _counts[fileId][field] += amount
+        if daily:
+            day = datetime.datetime.combine(datetime.datetime.utcnow().date(), datetime.time())
+            _dailyCounts[(fileId, day)][field] += amount
+    if settingModel.get(PluginSettings.FLUSH_INTERVAL) > 0:
+        _startFlushThread()
+    else:
+        flush()
+
+
+def discard(fileIds):
+    """
+    Drop the buffered counters of files, such as when they are removed. Once
+    this returns, no counters of these files will be written until new ones
+    are added.
+
+    :param fileIds: The _id of each file.
+    :type fileIds: iterable of ObjectId
+    """
+    fileIds = set(fileIds)
+    with _flushLock, _lock:
+        for fileId in fileIds:
+            _counts.pop(fileId, None)
+        for key in [key for key in _dailyCounts if key[0] in fileIds]:
+            del _dailyCounts[key]
+
+
+def flush():
+    """
+    Write the buffered counters to the database. Counters that could not be
+    written because of a database error are put back in the buffer to be
+    written by the next flush, while those rejected by the database are
+    dropped; both are logged.
+    """
+    with _flushLock:
+        with _lock:
+            counts = dict(_counts)
+            _counts.clear()
+            dailyCounts = dict(_dailyCounts)
+            _dailyCounts.clear()
+
+        if counts:
+            _write(counts, _counts, _writeFileCounts)
+        if dailyCounts:
+            _write(dailyCounts, _dailyCounts,
+                   ModelImporter.model('daily_download', 'download_statistics').addCounts)
+
+
+def _write(counts, buffer, writer):
+    """
+    Write some counters, putting them back in the buffer on failure.
+
+    :param counts: The counters to write.
+    :type counts: dict
+    :param buffer: The buffer that the counters were taken from.
+    :type buffer: dict
+    :param writer: A function writing the counters with a single bulk write.
+    """
+    try:
+        writer(counts)
+    except BulkWriteError as e:
+        # The other writes were done, so retrying them would count twice
+        logger.error('Failed to write %d download statistics: %s' % (
+            len(e.details.get('writeErrors', ())), e.details.get('writeErrors')))
+    except Exception:
+        logger.exception('Failed to write download statistics, will retry:')
+        with _lock:
+            for key, fields in six.viewitems(counts):
+                buffer[key].update(fields)
+
+
+def _writeFileCounts(counts):
+    fileModel = ModelImporter.model('file')
+    fileModel.collection.bulk_write([
+        UpdateOne({'_id': fileId}, {'$inc': {
+            'downloadStatistics.%s' % field: amount
+            for field, amount in six.viewitems(fields)
+        }})
+        for fileId, fields in six.viewitems(counts)
+    ], ordered=False)
+    fileModel._forgetLoaded()
+
+
+def _startFlushThread():
+    global _flushThread
+    with _lock:
+        if _flushThread is None or not _flushThread.is_alive():
+            _flushThread = threading.Thread(target=_flushLoop)
+            _flushThread.daemon = True
+            _flushThread.start()
+
+
+def _flushLoop():
+    while True:
+        # If the interval was set to 0 since the thread started, counters are
+        # written as they are added, but write any left in the buffer.
+        time.sleep(ModelImporter.model('setting').get(PluginSettings.FLUSH_INTERVAL) or 1)
+        try:
+            flush()
+        except Exception:
+            logger.exception('Failed to write download statistics:')
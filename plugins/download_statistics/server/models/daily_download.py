@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+import six
+
+from pymongo import UpdateOne
+
+from girder.constants import SortDir
+from girder.models.model_base import Model
+
+
+class DailyDownload(Model):
+    """
+    Stores the download counters of files per day, for reporting. Each
+    document holds the "started", "requested" and "completed" counters of one
+    file on one day (UTC).
+    """
+    def initialize(self):
+        self.name = 'download_statistics_daily'
+        self.ensureIndices([((
+            ('fileId', SortDir.ASCENDING),
+            ('date', SortDir.ASCENDING)
+        ), {'unique': True})])
+
+    def validate(self, doc):
+        return doc
+
+    def addCounts(self, counts):
+        """
+        Add to the daily counters of files.
+
+        :param counts: The amounts to add to each counter, keyed by a tuple of
+            the file _id and the datetime of the start of the day.
+        :type counts: dict
+        """
+        self.collection.bulk_write([
+            UpdateOne({'fileId': fileId, 'date': date}, {'$inc': dict(fields)}, upsert=True)
+            for (fileId, date), fields in six.viewitems(counts)
+        ], ordered=False)
+        self._forgetLoaded()
+
+    def removeCounts(self, files):
+        """
+        Delete the daily counters of one or more files.
+
+        :param files: The file document, or a list of file documents.
+        :type files: dict or list of dict
+        """
+        if isinstance(files, dict):
+            files = [files]
+        if files:
+            self.removeWithQuery({'fileId': {'$in': [file['_id'] for file in files]}})
+
+    def findCounts(self, file, start=None, end=None):
+        """
+        List the daily counters of a file, oldest first.
+
+        :param file: The file document.
+        :type file: dict
+        :param start: If set, the first day to list.
+        :type start: datetime.datetime
+        :param end: If set, the last day to list.
+        :type end: datetime.datetime
+        :returns: A cursor of the daily counter documents.
+        """
+        query = {'fileId': file['_id']}
+        if start is not None or end is not None:
+            query['date'] = {}
+            if start is not None:
+                query['date']['$gte'] = start
+            if end is not None:
+                query['date']['$lte'] = end
+        return self.find(query, sort=[('date', SortDir.ASCENDING)])
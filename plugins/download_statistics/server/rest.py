@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+import datetime
+
+from girder.api import access
+from girder.api.describe import Description, autoDescribeRoute
+from girder.api.rest import boundHandler
+from girder.constants import AccessType
+
+
+@access.public
+@boundHandler
+@autoDescribeRoute(
+    Description('Get the daily download statistics of a file.')
+    .notes('Only days with downloads are listed, and only while the '
+           '"download_statistics.daily_counts" setting is enabled.')
+    .modelParam('id', model='file', level=AccessType.READ)
+    .param('start', 'The first day to list.', required=False, dataType='date')
+    .param('end', 'The last day to list.', required=False, dataType='date')
+    .errorResponse()
+    .errorResponse('Read access was denied on the file.', 403)
+)
+def getDailyDownloads(self, file, start, end):
+    if start is not None:
+        start = datetime.datetime.combine(start, datetime.time())
+    if end is not None:
+        end = datetime.datetime.combine(end, datetime.time())
+    return [{
+        'date': doc['date'].date().isoformat(),
+        'started': doc.get('started', 0),
+        'requested': doc.get('requested', 0),
+        'completed': doc.get('completed', 0)
+    } for doc in self.model('daily_download', 'download_statistics').findCounts(
+        file, start, end)]
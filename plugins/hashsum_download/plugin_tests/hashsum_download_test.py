@@ -18,6 +18,7 @@
 ###############################################################################
 
 import hashlib
+import json
 import six
 import time
 
@@ -324,3 +325,45 @@ class HashsumDownloadTest(base.TestCase):
         self.assertEqual(file['sha256'], expected.hexdigest())
 
         hashsum_download.SUPPORTED_ALGORITHMS = old
+
+    def testFindExistingHashes(self):
+        privateOnlyData = b'private only'
+        privateOnlyFile = self.model('upload').uploadFromFile(
+            obj=six.BytesIO(privateOnlyData), size=len(privateOnlyData), name='Private only',
+            parentType='folder', parent=self.privateFolder, user=self.user)
+        missing = hashlib.sha512(b'missing').hexdigest()
+        hashes = [self.publicFile['sha512'].upper(), privateOnlyFile['sha512'], missing]
+        path = '/file/hashsum/sha512/exists'
+
+        resp = self.request(path, method='POST', body=json.dumps(hashes), type='application/json')
+        self.assertStatusOk(resp)
+        self.assertEqual(list(resp.json), [self.publicFile['sha512']])
+        self.assertIn(resp.json[self.publicFile['sha512']], (
+            str(self.publicFile['_id']), str(self.duplicatePublicFile['_id'])))
+
+        resp = self.request(path, method='POST', user=self.user, body=json.dumps(hashes),
+                            type='application/json')
+        self.assertStatusOk(resp)
+        self.assertEqual(set(resp.json), {self.publicFile['sha512'], privateOnlyFile['sha512']})
+        self.assertEqual(resp.json[privateOnlyFile['sha512']], str(privateOnlyFile['_id']))
+
+        resp = self.request(path, method='POST', body=json.dumps({'a': 'b'}),
+                            type='application/json')
+        self.assertStatus(resp, 400)
+
+    def testAttachedFiles(self):
+        # Files attached to other resources than items are never matched
+        attachedData = b'attached'
+        attachedFile = self.model('upload').uploadFromFile(
+            obj=six.BytesIO(attachedData), size=len(attachedData), name='Attached',
+            parentType='user', parent=self.user, user=self.user, attachParent=True)
+        self.assertIsNone(attachedFile['itemId'])
+
+        resp = self._download(attachedFile['sha512'], 'sha512', user=self.user)
+        self.assertStatus(resp, 404)
+
+        hashes = [attachedFile['sha512'], self.publicFile['sha512']]
+        resp = self.request('/file/hashsum/sha512/exists', method='POST', user=self.user,
+                            body=json.dumps(hashes), type='application/json')
+        self.assertStatusOk(resp)
+        self.assertEqual(list(resp.json), [self.publicFile['sha512']])
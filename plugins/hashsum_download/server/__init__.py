@@ -34,6 +34,8 @@ from girder.utility.progress import ProgressContext, noProgress
 
 SUPPORTED_ALGORITHMS = {'sha512'}
 _CHUNK_LEN = 65536
+# Number of hashes to look up per query
+_LOOKUP_BATCH_LEN = 1000
 
 
 class PluginSettings(object):
@@ -53,6 +55,7 @@ class HashedFile(File):
 
         node.route('GET', ('hashsum', ':algo', ':hash', 'download'), self.downloadWithHash)
         node.route('GET', (':id', 'hashsum_file', ':algo'), self.downloadKeyFile)
+        node.route('POST', ('hashsum', ':algo', 'exists'), self.findExistingHashes)
         node.route('POST', (':id', 'hashsum'), self.computeHashes)
 
     @access.cookie
@@ -99,6 +102,35 @@ class HashedFile(File):
 
         return self.download(id=file['_id'], params=params)
 
+    @access.public(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Find which of a list of hash sums match files the user can read.')
+        .notes('Clients can use this to skip uploading files that already exist. The '
+               'response maps each matched hash sum to the ID of a readable file with it.')
+        .param('algo', 'The type of the given hash sums (case insensitive).',
+               paramType='path', lower=True, enum=SUPPORTED_ALGORITHMS)
+        .jsonParam('hashes', 'A JSON list of hexadecimal hash sums (case insensitive).',
+                   paramType='body', requireArray=True)
+        .errorResponse()
+    )
+    def findExistingHashes(self, algo, hashes):
+        self._validateAlgo(algo)
+        if not all(isinstance(hash, six.string_types) for hash in hashes):
+            raise RestException('Hash sums must be strings.')
+
+        hashes = list({hash.lower() for hash in hashes})
+        fileModel = self.model('file')
+        user = self.getCurrentUser()
+        found = {}
+        for start in six.moves.range(0, len(hashes), _LOOKUP_BATCH_LEN):
+            cursor = fileModel.find({
+                algo: {'$in': hashes[start:start + _LOOKUP_BATCH_LEN]},
+                'itemId': {'$ne': None}
+            }, fields=['_id', 'itemId', algo])
+            for file in fileModel.filterResultsByPermission(cursor, user, AccessType.READ):
+                found.setdefault(file[algo], file['_id'])
+        return found
+
     @access.user(scope=TokenScope.DATA_WRITE)
     @autoDescribeRoute(
         Description('Manually compute the checksum values for a given file.')
@@ -136,16 +168,16 @@ class HashedFile(File):
         """
         self._validateAlgo(algo)
 
-        query = {algo: hash}  # Always convert to lower case
+        # Files attached to other resources than items have no access control of their own
+        query = {algo: hash, 'itemId': {'$ne': None}}
         fileModel = self.model('file')
         cursor = fileModel.find(query)
 
         if not user:
             user = self.getCurrentUser()
 
-        for file in cursor:
-            if fileModel.hasAccess(file, user, AccessType.READ):
-                return file
+        for file in fileModel.filterResultsByPermission(cursor, user, AccessType.READ, limit=1):
+            return file
 
         return None
 
@@ -201,7 +233,9 @@ def _validateAutoCompute(doc):
 
 def load(info):
     HashedFile(info['apiRoot'].file)
-    ModelImporter.model('file').exposeFields(
-        level=AccessType.READ, fields=SUPPORTED_ALGORITHMS)
+    fileModel = ModelImporter.model('file')
+    fileModel.exposeFields(level=AccessType.READ, fields=SUPPORTED_ALGORITHMS)
+    for algo in SUPPORTED_ALGORITHMS:
+        fileModel.ensureIndex(algo)
 
     events.bind('data.process', info['name'], _computeHashHook)
@@ -17,6 +17,8 @@
 #  limitations under the License.
 ###############################################################################
 
+import datetime
+import mock
 import time
 
 from tests import base
@@ -402,6 +404,165 @@ class JobsTestCase(base.TestCase):
                                              includeLog=True)
         self.assertEqual(job['log'], ['job failed'])
 
+    def _waitForJob(self, job, status):
+        start = time.time()
+        while time.time() - start < 15:
+            job = self.model('job', 'jobs').load(job['_id'], force=True, includeLog=True)
+            if job['status'] == status:
+                break
+            time.sleep(0.1)
+        return job
+
+    def testLocalAsyncJob(self):
+        jobModel = self.model('job', 'jobs')
+        job = jobModel.createLocalJob(
+            title='local', type='local', user=self.users[0], async=True,
+            module='plugin_tests.local_job_impl')
+        jobModel.scheduleJob(job)
+
+        # The job runs in a worker thread and succeeds once the function returns
+        job = self._waitForJob(job, JobStatus.SUCCESS)
+        self.assertEqual(job['status'], JobStatus.SUCCESS)
+        self.assertEqual(job['log'], ['job ran!'])
+        self.assertEqual([ts['status'] for ts in job['timestamps']], [
+            JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.SUCCESS])
+
+        job = jobModel.createLocalJob(
+            title='local', type='local', user=self.users[0], async=True,
+            module='plugin_tests.local_job_impl', function='missing')
+        jobModel.scheduleJob(job)
+        job = self._waitForJob(job, JobStatus.ERROR)
+        self.assertEqual(job['status'], JobStatus.ERROR)
+        self.assertIn('AttributeError', job['log'][-1])
+
+    def testClaimLocalJob(self):
+        from girder.plugins.jobs import local_executor
+
+        # Keep this process's executor from claiming the jobs itself
+        local_executor.stop()
+        self.addCleanup(local_executor.start)
+
+        jobModel = self.model('job', 'jobs')
+        jobs = {}
+        for type, delay in (('a', -10), ('b', -5), ('c', 3600)):
+            jobs[type] = jobModel.createLocalJob(
+                title=type, type=type, module='plugin_tests.local_job_impl', async=True,
+                when=datetime.datetime.utcnow() + datetime.timedelta(seconds=delay))
+            jobModel.updateJob(jobs[type], status=JobStatus.QUEUED)
+
+        # Jobs are claimed in order of when they are due, skipping excluded types
+        job = jobModel.claimLocalJob('exec1', excludeTypes=['a'])
+        self.assertEqual(job['_id'], jobs['b']['_id'])
+        self.assertEqual(job['status'], JobStatus.RUNNING)
+        self.assertEqual(job['localExecutor']['id'], 'exec1')
+        job = jobModel.claimLocalJob('exec2')
+        self.assertEqual(job['_id'], jobs['a']['_id'])
+        # Job c is not due yet
+        self.assertIsNone(jobModel.claimLocalJob('exec2'))
+
+        # Jobs of an executor that stops sending heartbeats are queued again
+        jobModel.collection.update_one({'_id': jobs['a']['_id']}, {'$set': {
+            'localExecutor.heartbeat': datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        }})
+        jobModel.heartbeatLocalJobs('exec1', staleTimeout=60)
+        self.assertEqual(
+            jobModel.load(jobs['a']['_id'], force=True)['status'], JobStatus.QUEUED)
+        self.assertEqual(
+            jobModel.load(jobs['b']['_id'], force=True)['status'], JobStatus.RUNNING)
+
+        # Recurring jobs are queued for their next run when they finish
+        jobModel.updateJob(jobs['b'], otherFields={'interval': 60})
+        jobModel.finishLocalJob(jobs['b'])
+        job = jobModel.load(jobs['b']['_id'], force=True)
+        self.assertEqual(job['status'], JobStatus.QUEUED)
+        self.assertGreater(job['when'], datetime.datetime.utcnow())
+        self.assertEqual([ts['status'] for ts in job['timestamps']], [
+            JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.SUCCESS, JobStatus.QUEUED])
+
+    def testBufferedUpdates(self):
+        jobModel = self.model('job', 'jobs')
+        job = jobModel.createJob(title='buffered', type='x', user=self.users[0])
+
+        # Keep the background thread from writing the updates while we look
+        with mock.patch.object(jobModel, '_startFlushThread'):
+            for i in range(5):
+                job = jobModel.updateJob(
+                    job, log='line %d\n' % i, progressTotal=5, progressCurrent=i + 1)
+            self.assertEqual(job['progress']['current'], 5)
+            doc = jobModel.collection.find_one({'_id': job['_id']})
+            self.assertEqual(doc['log'], [])
+            self.assertIsNone(doc['progress'])
+
+            # Loading the log writes the buffered updates
+            job = jobModel.load(job['_id'], force=True, includeLog=True)
+            self.assertEqual(job['log'], ['line %d\n' % i for i in range(5)])
+            self.assertEqual(job['progress']['current'], 5)
+            self.assertEqual(job['progress']['total'], 5)
+
+            # Notifications are coalesced into one per kind
+            notifications = {n['type']: n for n in self.model('notification').find({
+                'userId': self.users[0]['_id']
+            })}
+            self.assertEqual(
+                sorted(notifications), ['job_created', 'job_log', 'progress'])
+            self.assertEqual(notifications['job_log']['data']['text'],
+                             ''.join('line %d\n' % i for i in range(5)))
+            self.assertEqual(notifications['progress']['data']['current'], 5)
+            self.assertEqual(notifications['progress']['_id'], job['progress']['notificationId'])
+
+            # Status changes write the buffered updates first
+            job = jobModel.updateJob(job, log='last\n', progressCurrent=0)
+            job = jobModel.updateJob(job, status=JobStatus.QUEUED)
+            doc = jobModel.collection.find_one({'_id': job['_id']})
+            self.assertEqual(doc['log'][-1], 'last\n')
+            self.assertEqual(doc['progress']['current'], 0)
+            self.assertEqual(doc['status'], JobStatus.QUEUED)
+
+            # Flushing one job leaves the updates of others buffered
+            other = jobModel.createJob(title='other', type='x', user=self.users[0])
+            jobModel.updateJob(job, log='mine\n')
+            jobModel.updateJob(other, log='theirs\n')
+            self.assertEqual(len(jobModel.flushUpdates(job['_id'])), 1)
+            self.assertEqual(
+                jobModel.collection.find_one({'_id': job['_id']})['log'][-1], 'mine\n')
+            self.assertEqual(jobModel.collection.find_one({'_id': other['_id']})['log'], [])
+            self.assertEqual(len(jobModel.flushUpdates()), 1)
+            self.assertEqual(
+                jobModel.collection.find_one({'_id': other['_id']})['log'], ['theirs\n'])
+
+        # Updates are written right away without a flush interval
+        self.model('setting').set('jobs.update_flush_interval', 0)
+        jobModel.updateJob(job, log='unbuffered\n')
+        doc = jobModel.collection.find_one({'_id': job['_id']})
+        self.assertEqual(doc['log'][-1], 'unbuffered\n')
+
+    def testChunkedLog(self):
+        self.model('setting').set('jobs.chunked_logs', True)
+        jobModel = self.model('job', 'jobs')
+        job = jobModel.createJob(title='chunked', type='x', user=self.users[0])
+        self.assertTrue(job['chunkedLog'])
+
+        for i in range(3):
+            jobModel.updateJob(job, log='line %d\n' % i)
+        job = jobModel.load(job['_id'], force=True, includeLog=True)
+        self.assertEqual(job['log'], ['line 0\n', 'line 1\n', 'line 2\n'])
+        # The log is kept out of the job document
+        self.assertEqual(jobModel.collection.find_one({'_id': job['_id']})['log'], [])
+
+        resp = self.request('/job/%s/log' % job['_id'], user=self.users[0], isJson=False,
+                            params={'offset': 1})
+        self.assertStatusOk(resp)
+        self.assertEqual(self.getBody(resp), 'line 1\nline 2\n')
+        resp = self.request('/job/%s/log' % job['_id'], user=self.users[1], isJson=False)
+        self.assertStatus(resp, 403)
+
+        job = jobModel.updateJob(job, log='overwritten\n', overwrite=True)
+        job = jobModel.load(job['_id'], force=True, includeLog=True)
+        self.assertEqual(job['log'], ['overwritten\n'])
+
+        jobModel.remove(job)
+        self.assertEqual(self.model('job_log', 'jobs').find({'jobId': job['_id']}).count(), 0)
+
     def testValidateCustomStatus(self):
         jobModel = self.model('job', 'jobs')
         job = jobModel.createJob(title='test', type='x', user=self.users[0])
@@ -17,10 +17,77 @@
 #  limitations under the License.
 ###############################################################################
 
+import cherrypy
 import importlib
+import multiprocessing
+import six
 
 from girder import events
-from . import constants, job_rest
+from girder.models.model_base import ValidationException
+from girder.utility import setting_utilities
+from girder.utility.model_importer import ModelImporter
+from . import constants, job_rest, local_executor
+from .constants import JobStatus, PluginSettings
+
+
+@setting_utilities.default(PluginSettings.LOCAL_WORKERS)
+def _defaultLocalWorkers():
+    return multiprocessing.cpu_count()
+
+
+@setting_utilities.default(PluginSettings.LOCAL_TYPE_CONCURRENCY)
+def _defaultLocalTypeConcurrency():
+    return {}
+
+
+@setting_utilities.default(PluginSettings.UPDATE_FLUSH_INTERVAL)
+def _defaultUpdateFlushInterval():
+    # Updates are buffered per server process, so deployments running several
+    # processes should set this to 0 to keep the order of log, progress and
+    # status updates of a job.
+    return 0.5
+
+
+@setting_utilities.default(PluginSettings.CHUNKED_LOGS)
+def _defaultChunkedLogs():
+    return False
+
+
+@setting_utilities.validator(PluginSettings.UPDATE_FLUSH_INTERVAL)
+def _validateUpdateFlushInterval(doc):
+    try:
+        doc['value'] = float(doc['value'])
+        if doc['value'] >= 0:
+            return
+    except ValueError:
+        pass  # We want to raise the ValidationException
+    raise ValidationException('Update flush interval must be a number >= 0.', 'value')
+
+
+@setting_utilities.validator(PluginSettings.CHUNKED_LOGS)
+def _validateChunkedLogs(doc):
+    if not isinstance(doc['value'], bool):
+        raise ValidationException('Chunked logs setting must be boolean.', 'value')
+
+
+@setting_utilities.validator(PluginSettings.LOCAL_WORKERS)
+def _validateLocalWorkers(doc):
+    try:
+        doc['value'] = int(doc['value'])
+        if doc['value'] > 0:
+            return
+    except ValueError:
+        pass  # We want to raise the ValidationException
+    raise ValidationException('Local workers must be an integer > 0.', 'value')
+
+
+@setting_utilities.validator(PluginSettings.LOCAL_TYPE_CONCURRENCY)
+def _validateLocalTypeConcurrency(doc):
+    if not isinstance(doc['value'], dict) or not all(
+            isinstance(limit, six.integer_types) and limit > 0
+            for limit in six.viewvalues(doc['value'])):
+        raise ValidationException(
+            'Local type concurrency must map job types to integers > 0.', 'value')
 
 
 def scheduleLocal(event):
@@ -31,6 +98,10 @@ def scheduleLocal(event):
     within that module should be executed. If no "function" field is specified,
     the function is assumed to be named "run". The function will be passed the
     args and kwargs of the job.
+
+    Jobs that are not async are run immediately in the scheduling thread.
+    Async jobs are queued, and run by a pool of worker threads once their
+    "when" time has come; see :py:mod:`.local_executor`.
     """
     job = event.info
 
@@ -38,6 +109,11 @@ def scheduleLocal(event):
         if 'module' not in job:
             raise Exception('Locally scheduled jobs must have a module field.')
 
+        if job.get('async') is True:
+            ModelImporter.model('job', 'jobs').updateJob(job, status=JobStatus.QUEUED)
+            local_executor.wake()
+            return
+
         module = importlib.import_module(job['module'])
         fn = getattr(module, job.get('function', 'run'))
         fn(job)
@@ -46,3 +122,7 @@ def scheduleLocal(event):
 def load(info):
     info['apiRoot'].job = job_rest.Job()
     events.bind('jobs.schedule', 'jobs', scheduleLocal)
+
+    local_executor.start()
+    cherrypy.engine.subscribe('stop', local_executor.stop)
+    cherrypy.engine.subscribe('stop', ModelImporter.model('job', 'jobs').flushUpdates)
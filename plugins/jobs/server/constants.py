@@ -27,6 +27,13 @@ JOB_HANDLER_LOCAL = 'jobs._local'
 REST_CREATE_JOB_TOKEN_SCOPE = 'jobs.rest.create_job'
 
 
+class PluginSettings(object):
+    LOCAL_WORKERS = 'jobs.local_workers'
+    LOCAL_TYPE_CONCURRENCY = 'jobs.local_type_concurrency'
+    UPDATE_FLUSH_INTERVAL = 'jobs.update_flush_interval'
+    CHUNKED_LOGS = 'jobs.chunked_logs'
+
+
 # integer enum describing job states. Note, no order is implied.
 class JobStatus(object):
     INACTIVE = 0
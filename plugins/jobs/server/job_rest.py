@@ -19,7 +19,7 @@
 
 from girder.api import access
 from girder.api.describe import Description, autoDescribeRoute
-from girder.api.rest import Resource, filtermodel
+from girder.api.rest import Resource, filtermodel, setResponseHeader
 from girder.constants import AccessType, SortDir
 from girder.utility.model_importer import ModelImporter
 from . import constants
@@ -35,6 +35,7 @@ class Job(Resource):
         self.route('POST', (), self.createJob)
         self.route('GET', ('all',), self.listAllJobs)
         self.route('GET', (':id',), self.getJob)
+        self.route('GET', (':id', 'log'), self.getJobLog)
         self.route('PUT', (':id',), self.updateJob)
         self.route('PUT', (':id', 'cancel'), self.cancelJob)
         self.route('DELETE', (':id',), self.deleteJob)
@@ -133,6 +134,29 @@ class Job(Resource):
         .errorResponse('Read access was denied for the job.', 403)
     )
     def getJob(self, job):
+        self._requireReadAccess(job)
+        return job
+
+    @access.public
+    @autoDescribeRoute(
+        Description('Stream the log of a job as plain text.')
+        .modelParam('id', 'The ID of the job.', model='job', plugin='jobs', force=True)
+        .param('offset', 'The number of log entries to skip.', dataType='integer',
+               required=False, default=0)
+        .errorResponse('ID was invalid.')
+        .errorResponse('Read access was denied for the job.', 403)
+    )
+    def getJobLog(self, job, offset):
+        self._requireReadAccess(job)
+        entries = self.model('job', 'jobs').iterLog(job, offset=offset)
+        setResponseHeader('Content-Type', 'text/plain')
+
+        def stream():
+            for entry in entries:
+                yield entry
+        return stream
+
+    def _requireReadAccess(self, job):
         user = self.getCurrentUser()
 
         # If the job is not public check access
@@ -143,8 +167,6 @@ class Job(Resource):
             else:
                 self.ensureTokenScopes('jobs.job_' + str(job['_id']))
 
-        return job
-
     @access.token
     @filtermodel(model='job', plugin='jobs')
     @autoDescribeRoute(
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+"""
+This module runs asynchronous local jobs outside of the server's request and
+event threads. Jobs wait in the QUEUED state in the job collection until they
+are due, and are then claimed by the executor of one of the server processes
+and run in its pool of worker threads. Because the queue lives in the
+database, queued jobs survive server restarts, and jobs that were running in a
+server that stopped are queued again once their heartbeat goes stale.
+"""
+
+import collections
+import importlib
+import multiprocessing.pool
+import six
+import threading
+import time
+import traceback
+import uuid
+
+from girder import logger
+from girder.utility.model_importer import ModelImporter
+from .constants import JobStatus, PluginSettings
+
+# Seconds between checks for jobs that have become due
+POLL_INTERVAL = 1
+# Seconds between heartbeats recorded on running jobs
+HEARTBEAT_INTERVAL = 30
+# Running jobs without a heartbeat for this many seconds are queued again
+STALE_TIMEOUT = 120
+
+
+def _runJob(job):
+    """
+    Run a local job in a worker. Returns the formatted exception if the job
+    function raised one.
+    """
+    try:
+        module = importlib.import_module(job['module'])
+        getattr(module, job.get('function', 'run'))(job)
+    except Exception:
+        return traceback.format_exc()
+    finally:
+        # Buffered log and progress updates must not outlive the job
+        ModelImporter.model('job', 'jobs').flushUpdates(job['_id'])
+
+
+class LocalJobExecutor(threading.Thread):
+    """
+    Background thread that claims due local jobs and hands them to a pool of
+    worker threads. The size of the pool and a limit on the number of jobs of
+    each type that may run at once are read from settings.
+    """
+    def __init__(self):
+        threading.Thread.__init__(self)
+
+        self.daemon = True
+        self.terminate = False
+        self.executorId = uuid.uuid4().hex
+        self.running = collections.Counter()
+        self.finished = six.moves.queue.Queue()
+        self._wake = threading.Event()
+        self._pool = None
+        self._poolSize = None
+        self._lastHeartbeat = 0
+
+    def wake(self):
+        """Check for due jobs right away."""
+        self._wake.set()
+
+    def run(self):
+        while not self.terminate:
+            try:
+                self._step()
+            except Exception:
+                logger.exception('In local job executor:')
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def stop(self):
+        """
+        Stop claiming jobs and terminate the workers. Jobs that were still
+        running are queued again.
+        """
+        self.terminate = True
+        self.wake()
+        if self.is_alive():
+            self.join()
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+        if sum(six.viewvalues(self.running)):
+            ModelImporter.model('job', 'jobs').requeueLocalJobs({
+                'localExecutor.id': self.executorId,
+                'status': JobStatus.RUNNING
+            })
+
+    def _step(self):
+        jobModel = ModelImporter.model('job', 'jobs')
+        settingModel = ModelImporter.model('setting')
+
+        while not self.finished.empty():
+            job, error = self.finished.get()
+            self.running[job['type']] -= 1
+            jobModel.finishLocalJob(job, error)
+
+        if time.time() - self._lastHeartbeat > HEARTBEAT_INTERVAL:
+            jobModel.heartbeatLocalJobs(self.executorId, STALE_TIMEOUT)
+            self._lastHeartbeat = time.time()
+
+        workers = settingModel.get(PluginSettings.LOCAL_WORKERS)
+        limits = settingModel.get(PluginSettings.LOCAL_TYPE_CONCURRENCY)
+        while sum(six.viewvalues(self.running)) < workers and not self.terminate:
+            full = [type for type, limit in six.viewitems(limits) if self.running[type] >= limit]
+            job = jobModel.claimLocalJob(self.executorId, excludeTypes=full)
+            if job is None:
+                break
+            self.running[job['type']] += 1
+            self._getPool(workers).apply_async(
+                _runJob, (job, ), callback=lambda error, job=job: self._done(job, error))
+
+    def _done(self, job, error):
+        # Called from the pool's result thread, so defer to the executor thread
+        self.finished.put((job, error))
+        self.wake()
+
+    def _getPool(self, workers):
+        if self._pool is not None and workers != self._poolSize:
+            # Let the jobs already in the old pool finish on their own
+            self._pool.close()
+            self._pool = None
+        if self._pool is None:
+            self._pool = multiprocessing.pool.ThreadPool(workers)
+            self._poolSize = workers
+        return self._pool
+
+
+_executor = None
+_lock = threading.Lock()
+
+
+def start():
+    """
+    Start the local job executor of this process, if it is not running.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = LocalJobExecutor()
+            _executor.start()
+
+
+def stop():
+    """
+    Stop the local job executor of this process.
+    """
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.stop()
+            _executor = None
+
+
+def wake():
+    """
+    Tell the local job executor that a job was queued.
+    """
+    if _executor is not None:
+        _executor.wake()
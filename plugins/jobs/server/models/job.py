@@ -17,14 +17,24 @@
 #  limitations under the License.
 ###############################################################################
 
+import copy
 import datetime
 import six
+import threading
+import time
 from bson import json_util
+from pymongo import ReturnDocument
 
-from girder import events
+from girder import events, logger
 from girder.constants import AccessType, SortDir
 from girder.models.model_base import AccessControlledModel, ValidationException
-from girder.plugins.jobs.constants import JobStatus, JOB_HANDLER_LOCAL
+from girder.plugins.jobs.constants import JobStatus, JOB_HANDLER_LOCAL, PluginSettings
+
+# Buffered log entries of a single job that cause it to be written right away
+MAX_BUFFERED_LOG_ENTRIES = 1000
+# Number of locks that serialize the writes of buffered updates, shared by jobs
+# whose ids hash alike
+_WRITE_LOCKS = 64
 
 
 class Job(AccessControlledModel):
@@ -37,8 +47,13 @@ class Job(AccessControlledModel):
             ('type', SortDir.ASCENDING),
             ('status', SortDir.ASCENDING)
         )
-        self.ensureIndices([(compoundSearchIndex, {}),
-                            'created', 'parentId', 'celeryTaskId'])
+        localQueueIndex = (
+            ('handler', SortDir.ASCENDING),
+            ('status', SortDir.ASCENDING),
+            ('when', SortDir.ASCENDING)
+        )
+        self.ensureIndices([(compoundSearchIndex, {}), (localQueueIndex, {}),
+                            'created', 'parentId', 'celeryTaskId', 'localExecutor.id'])
 
         self.exposeFields(level=AccessType.READ, fields={
             'title', 'type', 'created', 'interval', 'when', 'status',
@@ -47,6 +62,12 @@ class Job(AccessControlledModel):
 
         self.exposeFields(level=AccessType.SITE_ADMIN, fields={'args', 'kwargs'})
 
+        # Log and progress updates waiting to be written, by job id
+        self._pendingUpdates = {}
+        self._pendingLock = threading.Lock()
+        self._writeLocks = [threading.Lock() for _ in range(_WRITE_LOCKS)]
+        self._flushThread = None
+
     def validate(self, job):
         self._validateStatus(job['status'])
 
@@ -160,6 +181,118 @@ class Job(AccessControlledModel):
 
         return self.save(job)
 
+    def claimLocalJob(self, executorId, excludeTypes=()):
+        """
+        Atomically claim the queued local job that is due soonest, moving it
+        from the QUEUED to the RUNNING state. Each job can only be claimed by
+        one caller.
+
+        :param executorId: Identifies the claiming executor, which must record
+            heartbeats on its jobs with :py:func:`heartbeatLocalJobs`.
+        :type executorId: str
+        :param excludeTypes: Job types that should not be claimed.
+        :type excludeTypes: list of str
+        :returns: The claimed job, or None if no job is due.
+        """
+        now = datetime.datetime.utcnow()
+        query = {
+            'handler': JOB_HANDLER_LOCAL,
+            'status': JobStatus.QUEUED,
+            'when': {'$lte': now}
+        }
+        if excludeTypes:
+            query['type'] = {'$nin': list(excludeTypes)}
+
+        job = self.collection.find_one_and_update(query, {
+            '$set': {
+                'status': JobStatus.RUNNING,
+                'updated': now,
+                'localExecutor': {'id': executorId, 'heartbeat': now}
+            },
+            '$push': {'timestamps': {'status': JobStatus.RUNNING, 'time': now}}
+        }, sort=[('when', SortDir.ASCENDING)], projection={'log': False},
+            return_document=ReturnDocument.AFTER)
+        if job is None:
+            return None
+        self._forgetLoaded(job['_id'])
+
+        if isinstance(job.get('kwargs'), six.string_types):
+            job['kwargs'] = json_util.loads(job['kwargs'])
+        events.trigger('jobs.job.update.after', {'job': job})
+        if job['userId']:
+            user = self.model('user').load(job['userId'], force=True)
+            if user is not None:
+                self._createUpdateStatusNotification(now, user, job)
+        return job
+
+    def heartbeatLocalJobs(self, executorId, staleTimeout):
+        """
+        Record that an executor's running local jobs are still alive, and
+        queue again any local job whose executor has not recorded a heartbeat
+        in a while, e.g. because its server was stopped.
+
+        :param executorId: The executor whose jobs are alive.
+        :type executorId: str
+        :param staleTimeout: Seconds after which a job without a heartbeat is
+            queued again.
+        :type staleTimeout: int
+        """
+        now = datetime.datetime.utcnow()
+        self.collection.update_many({
+            'localExecutor.id': executorId,
+            'status': JobStatus.RUNNING
+        }, {'$set': {'localExecutor.heartbeat': now}})
+        self._forgetLoaded()
+        self.requeueLocalJobs({
+            'status': JobStatus.RUNNING,
+            'localExecutor.heartbeat': {'$lt': now - datetime.timedelta(seconds=staleTimeout)}
+        })
+
+    def requeueLocalJobs(self, query, when=None):
+        """
+        Move local jobs back to the QUEUED state so that they are run again.
+        This bypasses the usual state transition rules.
+
+        :param query: Selects the jobs to queue.
+        :type query: dict
+        :param when: If set, the new minimum start time of the jobs.
+        :type when: datetime
+        """
+        now = datetime.datetime.utcnow()
+        update = {
+            '$set': {'status': JobStatus.QUEUED, 'updated': now},
+            '$unset': {'localExecutor': True},
+            '$push': {'timestamps': {'status': JobStatus.QUEUED, 'time': now}}
+        }
+        if when is not None:
+            update['$set']['when'] = when
+        self.collection.update_many(dict(query, handler=JOB_HANDLER_LOCAL), update)
+        self._forgetLoaded()
+
+    def finishLocalJob(self, job, error=None):
+        """
+        Record the outcome of a local job run by an executor. If the job
+        function left the job running, it is marked as succeeded, or as
+        failed if an error is passed. Recurring jobs are then queued for their
+        next run.
+
+        :param job: The job that was run.
+        :type job: dict
+        :param error: The formatted exception, if the job function raised one.
+        :type error: str or None
+        """
+        job = self.load(job['_id'], force=True)
+        if job is None:
+            return
+        if job['status'] == JobStatus.RUNNING:
+            job = self.updateJob(
+                job, log=error, status=JobStatus.ERROR if error else JobStatus.SUCCESS)
+
+        if job.get('interval', 0) > 0 and job['status'] in (JobStatus.SUCCESS, JobStatus.ERROR):
+            when = max(job['when'] + datetime.timedelta(seconds=job['interval']),
+                       datetime.datetime.utcnow())
+            self.requeueLocalJobs({'_id': job['_id'], 'status': job['status']}, when=when)
+
     def createJob(self, title, type, args=(), kwargs=None, user=None, when=None,
                   interval=0, public=False, handler=None, async=False,
                   save=True, parentJob=None, otherFields=None):
@@ -230,6 +363,9 @@ class Job(AccessControlledModel):
             'parentId': parentId
         }
 
+        if self.model('setting').get(PluginSettings.CHUNKED_LOGS):
+            job['chunkedLog'] = True
+
         job.update(otherFields)
 
         self.setPublic(job, public=public)
@@ -282,8 +418,12 @@ class Job(AccessControlledModel):
         serialized them on the way into the database.
 
         :param includeLog: Whether to include the log field in the document.
+            Buffered updates of the job are written first.
         :type includeLog: bool
         """
+        includeLog = kwargs.get('includeLog', False)
+        if includeLog:
+            self.flushUpdates(kwargs['id'] if 'id' in kwargs else args[0])
         kwargs['fields'] = self._computeFields(kwargs)
         job = super(Job, self).load(*args, **kwargs)
 
@@ -293,9 +433,38 @@ class Job(AccessControlledModel):
             # Legacy support: log used to be just a string, but we want to
             # consistently return a list of strings now.
             job['log'] = [job['log']]
+        if job and includeLog and job.get('chunkedLog'):
+            job['log'] = list(self.model('job_log', 'jobs').iterLog(job))
 
         return job
 
+    def remove(self, job, *args, **kwargs):
+        """
+        Extends remove to discard buffered updates and the chunked log of the
+        job.
+        """
+        with self._pendingLock:
+            self._pendingUpdates.pop(str(job['_id']), None)
+        if job.get('chunkedLog'):
+            self.model('job_log', 'jobs').removeLog(job)
+        return super(Job, self).remove(job, *args, **kwargs)
+
+    def iterLog(self, job, offset=0):
+        """
+        Iterate over the log entries of a job, after writing its buffered
+        updates.
+
+        :param job: The job document.
+        :type job: dict
+        :param offset: The number of entries to skip.
+        :type offset: int
+        """
+        self.flushUpdates(job['_id'])
+        if job.get('chunkedLog'):
+            return self.model('job_log', 'jobs').iterLog(job, offset)
+        job = self.load(job['_id'], force=True, includeLog=True)
+        return iter(job.get('log', [])[offset:])
+
     def scheduleJob(self, job):
         """
         Trigger the event to schedule this job. Other plugins are in charge of
@@ -325,6 +494,20 @@ class Job(AccessControlledModel):
         If notify=True, job status changes will also create a notification with type="job_status",
         and log changes will create a notification with type="job_log".
 
+        Updates that only append to the log or change progress are buffered
+        for up to the ``jobs.update_flush_interval`` setting (in seconds), and
+        written together. Their log entries are appended in a single write,
+        and their notifications are coalesced into one log notification and
+        one progress notification with the latest state. Any other update
+        writes the buffered updates of the job first. Set the interval to 0
+        to write every update right away.
+
+        Each server process buffers updates separately, so the buffered
+        updates of a job in one process are not written before a status change
+        of the job in another, such as when a remote worker's requests are
+        spread over several processes. Deployments with several processes
+        that rely on the order of these updates should set the interval to 0.
+
         :param job: The job document to update.
         :param log: Message to append to the job log. If you wish to overwrite
             instead of append, pass overwrite=True.
@@ -352,6 +535,12 @@ class Job(AccessControlledModel):
         if event.defaultPrevented:
             return job
 
+        if status is None and not overwrite and not otherFields and self.model('setting').get(
+                PluginSettings.UPDATE_FLUSH_INTERVAL) > 0:
+            return self._bufferUpdate(
+                job, log, progressTotal, progressCurrent, progressMessage, notify)
+        self._flushUpdatesBefore(job)
+
         now = datetime.datetime.utcnow()
         user = None
         otherFields = otherFields or {}
@@ -413,7 +602,12 @@ class Job(AccessControlledModel):
 
     def _updateLog(self, job, log, overwrite, now, notify, user, updates):
         """Helper for updating a job's log."""
-        if overwrite:
+        if job.get('chunkedLog'):
+            jobLog = self.model('job_log', 'jobs')
+            if overwrite:
+                jobLog.removeLog(job)
+            jobLog.appendLog(job, [log])
+        elif overwrite:
             updates['$set']['log'] = [log]
         else:
             updates['$push']['log'] = log
@@ -426,6 +620,141 @@ class Job(AccessControlledModel):
                     'text': log
                 }, user=user, expires=expires)
 
+    def _bufferUpdate(self, job, log, total, current, message, notify):
+        """Helper for buffering a job's log and progress updates."""
+        with self._pendingLock:
+            pending = self._pendingUpdates.setdefault(str(job['_id']), {
+                'log': [],
+                'notifyLog': [],
+                'progress': None,
+                'notifyProgress': False
+            })
+            pending['job'] = job
+            if log is not None:
+                pending['log'].append(log)
+                if notify:
+                    pending['notifyLog'].append(log)
+            if message is not None or current is not None or total is not None:
+                # Jobs loaded since the last write may have stale progress
+                progress = pending['progress'] or copy.deepcopy(job.get('progress')) or {
+                    'message': None,
+                    'total': None,
+                    'current': None,
+                    'notificationId': None
+                }
+                if total is not None:
+                    progress['total'] = float(total)
+                if current is not None:
+                    progress['current'] = float(current)
+                if message is not None:
+                    progress['message'] = message
+                pending['progress'] = progress
+                pending['notifyProgress'] = pending['notifyProgress'] or notify
+                job['progress'] = copy.deepcopy(progress)
+            flushNow = len(pending['log']) >= MAX_BUFFERED_LOG_ENTRIES
+
+        job['updated'] = datetime.datetime.utcnow()
+        if flushNow:
+            self.flushUpdates(job['_id'])
+        else:
+            self._startFlushThread()
+        return job
+
+    def _flushUpdatesBefore(self, job):
+        """
+        Helper for writing the buffered updates of a job before other updates
+        to it, and bringing its progress up to date.
+        """
+        for pending in self.flushUpdates(job['_id']):
+            if pending['progress'] is not None:
+                job['progress'] = copy.deepcopy(pending['progress'])
+
+    def flushUpdates(self, id=None):
+        """
+        Write buffered log and progress updates to the database.
+
+        :param id: If set, only write the updates of the job with this id.
+        :returns: The buffered updates that were written.
+        """
+        if id is None:
+            with self._pendingLock:
+                ids = list(self._pendingUpdates)
+        else:
+            ids = [str(id)]
+
+        written = []
+        for jobId in ids:
+            # Taking the updates and writing them is done under one lock per
+            # job, so that once this returns, no earlier updates of the job
+            # are still being written by another thread.
+            with self._writeLocks[hash(jobId) % _WRITE_LOCKS]:
+                with self._pendingLock:
+                    pending = self._pendingUpdates.pop(jobId, None)
+                if pending is not None:
+                    self._writeUpdate(pending)
+                    written.append(pending)
+        return written
+
+    def _writeUpdate(self, pending):
+        """Helper for writing the buffered updates of a job."""
+        job = pending['job']
+        now = datetime.datetime.utcnow()
+        user = None
+        if job['userId'] and (pending['notifyLog'] or pending['notifyProgress']):
+            user = self.model('user').load(job['userId'], force=True)
+
+        updates = {'$set': {'updated': now}}
+        if pending['log']:
+            if job.get('chunkedLog'):
+                self.model('job_log', 'jobs').appendLog(job, pending['log'])
+            else:
+                updates['$push'] = {'log': {'$each': pending['log']}}
+            if user and pending['notifyLog']:
+                self.model('notification').createNotification(
+                    type='job_log', data={
+                        '_id': job['_id'],
+                        'overwrite': False,
+                        'text': ''.join(pending['notifyLog'])
+                    }, user=user, expires=now + datetime.timedelta(seconds=30))
+
+        progress = pending['progress']
+        if progress is not None:
+            if user and pending['notifyProgress']:
+                state = JobStatus.toNotificationStatus(job['status'])
+                notification = None
+                if progress['notificationId'] is not None:
+                    notification = self.model('notification').load(progress['notificationId'])
+                if notification is None:
+                    notification = self._createProgressNotification(
+                        job, progress['total'], progress['current'], state,
+                        progress['message'], user)
+                    progress['notificationId'] = notification['_id']
+                else:
+                    self.model('notification').updateProgress(
+                        notification, state=state, message=progress['message'],
+                        current=progress['current'], total=progress['total'])
+            updates['$set']['progress'] = progress
+
+        self.update({'_id': job['_id']}, update=updates, multi=False)
+        events.trigger('jobs.job.update.after', {
+            'job': job
+        })
+
+    def _startFlushThread(self):
+        with self._pendingLock:
+            if self._flushThread is None or not self._flushThread.is_alive():
+                self._flushThread = threading.Thread(target=self._flushLoop)
+                self._flushThread.daemon = True
+                self._flushThread.start()
+
+    def _flushLoop(self):
+        while True:
+            time.sleep(self.model('setting').get(PluginSettings.UPDATE_FLUSH_INTERVAL) or 1)
+            try:
+                self.flushUpdates()
+            except Exception:
+                logger.exception('Failed to write buffered job updates:')
+
     def _createUpdateStatusNotification(self, now, user, job):
         expires = now + datetime.timedelta(seconds=30)
         filtered = self.filter(job, user)
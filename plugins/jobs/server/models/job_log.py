@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+from girder.constants import SortDir
+from girder.models.model_base import Model
+
+
+class JobLog(Model):
+    """
+    Stores the logs of jobs created with chunked logging, so that their log
+    does not grow inside the job document. Each document is one chunk, holding
+    the log entries appended to a job in a single write.
+    """
+    def initialize(self):
+        self.name = 'job_log'
+        self.ensureIndices([((
+            ('jobId', SortDir.ASCENDING),
+            ('_id', SortDir.ASCENDING)
+        ), {})])
+
+    def validate(self, doc):
+        return doc
+
+    def appendLog(self, job, entries):
+        """
+        Append entries to the log of a job.
+
+        :param job: The job document.
+        :type job: dict
+        :param entries: The log entries to append.
+        :type entries: list of str
+        """
+        if entries:
+            self.collection.insert_one({
+                'jobId': job['_id'],
+                'entries': list(entries)
+            })
+
+    def removeLog(self, job):
+        """
+        Delete the whole log of a job.
+
+        :param job: The job document.
+        :type job: dict
+        """
+        self.removeWithQuery({'jobId': job['_id']})
+
+    def iterLog(self, job, offset=0):
+        """
+        Iterate over the log entries of a job, in order.
+
+        :param job: The job document.
+        :type job: dict
+        :param offset: The number of entries to skip.
+        :type offset: int
+        """
+        for chunk in self.find({'jobId': job['_id']}, sort=[('_id', SortDir.ASCENDING)]):
+            entries = chunk['entries']
+            if offset >= len(entries):
+                offset -= len(entries)
+                continue
+            for entry in entries[offset:]:
+                yield entry
+            offset = 0
@@ -21,6 +21,7 @@ import bson.json_util
 
 from girder import events
 from girder.constants import AccessType
+from girder.models.model_base import AccessControlledModel
 from girder.utility.model_importer import ModelImporter
 from girder.api.describe import Description, describeRoute
 from girder.api.rest import Resource, RestException
@@ -62,7 +63,11 @@ class ResourceExt(Resource):
             raise RestException('The query parameter must be a JSON object.')
 
         model = ModelImporter().model(coll)
-        if hasattr(model, 'filterResultsByPermission'):
+        if isinstance(model, AccessControlledModel):
+            return list(model.findWithPermissions(
+                query, fields=allowed[coll], user=self.getCurrentUser(),
+                level=AccessType.READ, limit=limit, offset=offset))
+        elif hasattr(model, 'filterResultsByPermission'):
             cursor = model.find(
                 query, fields=allowed[coll] + ['public', 'access'])
             return list(model.filterResultsByPermission(
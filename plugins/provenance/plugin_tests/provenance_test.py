@@ -403,3 +403,39 @@ class ProvenanceTestCase(base.TestCase):
         file['name'] = 'test2'
         file = self.model('file').save(file)
         self.model('file').remove(file)
+
+    def testProvenanceHistory(self):
+        item = self.item1
+        admin = self.admin
+        for value in range(4):
+            self._getProvenanceAfterMetadata(item, {'x': value}, admin)
+        # The history is not stored in the item itself
+        self.assertNotIn('provenance', self.model('item').load(item['_id'], force=True))
+        self.assertEqual(self.model('provenance', 'provenance').find({
+            'resourceId': item['_id']}).count(), 5)
+
+        resp = self.request(path='/item/%s/provenance/history' % item['_id'],
+                            user=admin, params={'limit': 2, 'offset': 1})
+        self.assertStatusOk(resp)
+        self.assertEqual([event['version'] for event in resp.json], [2, 3])
+        self.assertEqual(resp.json[1]['new'], {'meta': {'x': 1}})
+        resp = self.request(path='/item/%s/provenance/history' % item['_id'],
+                            user=admin, params={'sortdir': -1, 'limit': 1})
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json[0]['version'], 5)
+        self.assertEqual(resp.json[0]['old'], {'meta': {'x': 2}})
+
+        # Provenance stored in the item by earlier versions is moved to the
+        # provenance collection when it is read
+        self.model('provenance', 'provenance').removeHistory([item['_id']])
+        self.model('item').update({'_id': item['_id']}, {'$set': {'provenance': [{
+            'eventType': 'creation', 'eventUser': admin['_id'], 'version': 1}]}})
+        self._checkProvenance(None, item, 1, admin, 'creation')
+        self.assertNotIn('provenance', self.model('item').load(item['_id'], force=True))
+        self._getProvenanceAfterMetadata(item, {'x': 'y'}, admin)
+        self._checkProvenance(None, item, 2, admin, 'update', {'new': {'meta': {'x': 'y'}}})
+
+        # Deleting the item deletes its history
+        self.model('item').remove(item)
+        self.assertEqual(self.model('provenance', 'provenance').find({
+            'resourceId': item['_id']}).count(), 0)
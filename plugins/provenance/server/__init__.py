@@ -46,4 +46,5 @@ def load(info):
     events.trigger('provenance.initialize', info={})
     events.bind('model.file.save', 'provenanceMain', ext.fileSaveHandler)
     events.bind('model.file.save.created', 'provenanceMain', ext.fileSaveCreatedHandler)
-    events.bind('model.file.remove', 'provenance', ext.fileRemoveHandler)
+    events.bind('model.file.remove', 'provenanceMain', ext.fileRemoveHandler)
+    events.bind('model.file.remove.bulk', 'provenanceMain', ext.fileRemoveBulkHandler)
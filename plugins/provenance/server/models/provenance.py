@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+import itertools
+import pymongo
+
+from girder.constants import SortDir
+from girder.models.model_base import Model
+
+# Fields that locate an event, which are not part of the event itself
+_locationFields = {'_id': False, 'resourceId': False, 'resourceType': False}
+
+
+class Provenance(Model):
+    """
+    Stores the provenance history of resources, with one document per event,
+    keyed by the ID of the resource and the version of the event. The versions
+    of each resource are numbered from 1.
+    """
+    def initialize(self):
+        self.name = 'provenance'
+        self.ensureIndices([((
+            ('resourceId', SortDir.ASCENDING),
+            ('version', SortDir.ASCENDING)
+        ), {'unique': True})])
+
+    def validate(self, doc):
+        return doc
+
+    def getEvent(self, resourceId, version=-1):
+        """
+        Get one event from the history of a resource.
+
+        :param resourceId: The _id of the resource.
+        :type resourceId: ObjectId
+        :param version: The version of the event. Negative values count from
+            the end of the history, so -1 is the latest event.
+        :type version: int
+        :returns: The event, or None if there is no such version.
+        """
+        if version < 0:
+            events = list(self.find(
+                {'resourceId': resourceId}, offset=-version - 1, limit=1,
+                sort=[('version', SortDir.DESCENDING)], fields=_locationFields))
+            return events[0] if events else None
+        return self.findOne({'resourceId': resourceId, 'version': version},
+                            fields=_locationFields)
+
+    def findEvents(self, resourceId, offset=0, limit=0, sort=None):
+        """
+        List the history of a resource.
+
+        :param resourceId: The _id of the resource.
+        :type resourceId: ObjectId
+        :param offset: The number of events to skip.
+        :type offset: int
+        :param limit: The maximum number of events to return, or 0 for all.
+        :type limit: int
+        :param sort: The sort order, oldest first by default.
+        :type sort: list of (key, order) tuples
+        :returns: A cursor of the events.
+        """
+        return self.find(
+            {'resourceId': resourceId}, offset=offset, limit=limit,
+            sort=sort or [('version', SortDir.ASCENDING)], fields=_locationFields)
+
+    def addEvent(self, resourceType, resourceId, event):
+        """
+        Append an event to the history of a resource, numbering it after the
+        latest one. The version is also set in the event passed in.
+
+        :param resourceType: The model name of the resource.
+        :type resourceType: str
+        :param resourceId: The _id of the resource.
+        :type resourceId: ObjectId
+        :param event: The event to record.
+        :type event: dict
+        :returns: The event.
+        """
+        while True:
+            latest = self.getEvent(resourceId)
+            event['version'] = latest['version'] + 1 if latest else 1
+            try:
+                self.collection.insert_one(
+                    dict(event, resourceType=resourceType, resourceId=resourceId))
+            except pymongo.errors.DuplicateKeyError:
+                # Another event was recorded concurrently; number ours after it
+                continue
+            self._forgetLoaded()
+            return event
+
+    def addHistory(self, resourceType, resourceId, events, batchSize=1000):
+        """
+        Record events that already have their versions, such as a history
+        copied from another resource. Versions that are already recorded are
+        left alone.
+
+        :param resourceType: The model name of the resource.
+        :type resourceType: str
+        :param resourceId: The _id of the resource.
+        :type resourceId: ObjectId
+        :param events: The events to record.
+        :type events: iterable of dict
+        :param batchSize: The number of events to insert at a time.
+        :type batchSize: int
+        """
+        events = iter(events)
+        while True:
+            batch = [dict(event, resourceType=resourceType, resourceId=resourceId)
+                     for event in itertools.islice(events, batchSize)]
+            if not batch:
+                break
+            try:
+                self.collection.insert_many(batch, ordered=False)
+            except pymongo.errors.BulkWriteError as e:
+                # Versions that were already recorded are duplicate keys
+                if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                    raise
+        self._forgetLoaded()
+
+    def copyHistory(self, resourceType, srcId, dstId):
+        """
+        Replace the history of a resource with a copy of the history of
+        another one.
+
+        :param resourceType: The model name of the resources.
+        :type resourceType: str
+        :param srcId: The _id of the resource to copy the history of.
+        :type srcId: ObjectId
+        :param dstId: The _id of the resource to copy the history to.
+        :type dstId: ObjectId
+        """
+        self.removeHistory([dstId])
+        self.addHistory(resourceType, dstId, self.findEvents(srcId))
+
+    def removeHistory(self, resourceIds):
+        """
+        Delete the history of resources.
+
+        :param resourceIds: The _ids of the resources.
+        :type resourceIds: list of ObjectId
+        """
+        if resourceIds:
+            self.removeWithQuery({'resourceId': {'$in': list(resourceIds)}})
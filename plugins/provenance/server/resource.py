@@ -17,7 +17,6 @@
 #  limitations under the License.
 ###############################################################################
 
-import copy
 import datetime
 import six
 
@@ -74,7 +73,7 @@ class ResourceExt(Resource):
         resources['item'] = None
         # Exclude resources that should never have provenance
         for disallowedResource in ('model_base', 'notification', 'password',
-                                   'token'):
+                                   'provenance', 'token'):
             if disallowedResource in resources:
                 del resources[disallowedResource]
         self.unbindModels(resources)
@@ -82,12 +81,21 @@ class ResourceExt(Resource):
             if resource not in self.boundResources:
                 events.bind('model.%s.save' % resource, 'provenance',
                             self.resourceSaveHandler)
+                events.bind('model.%s.save.created' % resource, 'provenance',
+                            self.resourceSaveCreatedHandler)
                 events.bind('model.%s.copy.prepare' % resource,
                             'provenance', self.resourceCopyHandler)
+                events.bind('model.%s.remove' % resource, 'provenance',
+                            self.resourceRemoveHandler)
+                events.bind('model.%s.remove.bulk' % resource, 'provenance',
+                            self.resourceRemoveHandler)
                 if hasattr(self.loadInfo['apiRoot'], resource):
                     getattr(self.loadInfo['apiRoot'], resource).route(
                         'GET', (':id', 'provenance'),
                         self.getGetHandler(resource))
+                    getattr(self.loadInfo['apiRoot'], resource).route(
+                        'GET', (':id', 'provenance', 'history'),
+                        self.getGetHandler(resource, 'provenanceHistoryHandler'))
                 self.boundResources[resource] = True
 
     def unbindModels(self, resources={}):
@@ -99,35 +107,57 @@ class ResourceExt(Resource):
         for oldresource in list(six.viewkeys(self.boundResources)):
             if oldresource not in resources:
                 # Unbind this and remove it from the api
-                events.unbind('model.%s.save' % oldresource, 'provenance')
-                events.unbind('model.%s.copy.prepare' % oldresource,
-                              'provenance')
+                for event in ('save', 'save.created', 'copy.prepare', 'remove',
+                              'remove.bulk'):
+                    events.unbind('model.%s.%s' % (oldresource, event),
+                                  'provenance')
                 if hasattr(self.loadInfo['apiRoot'], oldresource):
                     getattr(self.loadInfo['apiRoot'], oldresource).removeRoute(
                         'GET', (':id', 'provenance'))
+                    getattr(self.loadInfo['apiRoot'], oldresource).removeRoute(
+                        'GET', (':id', 'provenance', 'history'))
                 del self.boundResources[oldresource]
 
-    def getGetHandler(self, resource):
+    def getGetHandler(self, resource, handlerName='provenanceGetHandler'):
         """
         Return a function that will get the provenance for a particular
         resource type.  This creates such a function if necessary, copying the
         main function and setting an internal value so that the function is
         coupled to the resource.
         :param resource: the name of the resource to get.
+        :param handlerName: the name of the main function.
         :returns: getHandler function.
         """
-        key = 'provenanceGetHandler_%s' % resource
+        key = '%s_%s' % (handlerName, resource)
         if not hasattr(self, key):
+            handler = getattr(self, handlerName)
+
             def resourceGetHandler(id, params):
-                return self.provenanceGetHandler(id, params, resource)
+                return handler(id, params, resource)
             # We inherit the description and access decorator details from the
-            # general provenanceGetHandler
+            # general handler
             for attr in ('description', 'accessLevel'):
-                setattr(resourceGetHandler, attr,
-                        getattr(self.provenanceGetHandler, attr))
+                setattr(resourceGetHandler, attr, getattr(handler, attr))
             setattr(self, key, resourceGetHandler)
         return getattr(self, key)
 
+    def _loadResource(self, id, resource):
+        """
+        Load a resource that the current user can read, and make sure that its
+        provenance is stored in the provenance collection.
+        """
+        user = self.getCurrentUser()
+        model = self.model(resource)
+        if isinstance(model, (acl_mixin.AccessControlMixin,
+                              AccessControlledModel)):
+            obj = model.load(id, level=AccessType.READ, user=user)
+        else:
+            obj = model.load(id)
+        if obj is None:
+            raise RestException('Invalid %s id (%s).' % (resource, id))
+        self.migrateProvenance(obj, resource)
+        return obj
+
     @access.public
     @describeRoute(
         Description('Get the provenance for a given resource.')
@@ -140,13 +170,6 @@ class ResourceExt(Resource):
         .errorResponse()
     )
     def provenanceGetHandler(self, id, params, resource=None):
-        user = self.getCurrentUser()
-        model = self.model(resource)
-        if isinstance(model, (acl_mixin.AccessControlMixin,
-                              AccessControlledModel)):
-            obj = model.load(id, level=AccessType.READ, user=user)
-        else:
-            obj = model.load(id)
         version = -1
         if 'version' in params:
             if params['version'] == 'all':
@@ -156,42 +179,82 @@ class ResourceExt(Resource):
                     version = int(params['version'])
                 except ValueError:
                     raise RestException('Invalid version.')
-        provenance = obj.get('provenance', [])
-        result = None
+        obj = self._loadResource(id, resource)
+        provenanceModel = self.model('provenance', 'provenance')
         if version is None or version == 0:
-            result = provenance
-        elif version < 0:
-            if len(provenance) >= -version:
-                result = provenance[version]
+            result = list(provenanceModel.findEvents(obj['_id']))
         else:
-            for prov in provenance:
-                if prov.get('version', None) == version:
-                    result = prov
-                    break
+            result = provenanceModel.getEvent(obj['_id'], version)
         return {
             'resourceId': id,
             'provenance': result
         }
 
+    @access.public
+    @describeRoute(
+        Description('List the provenance history of a given resource.')
+        .param('id', 'The resource ID', paramType='path')
+        .pagingParams(defaultSort='version')
+        .errorResponse()
+    )
+    def provenanceHistoryHandler(self, id, params, resource=None):
+        limit, offset, sort = self.getPagingParameters(params, 'version')
+        obj = self._loadResource(id, resource)
+        return list(self.model('provenance', 'provenance').findEvents(
+            obj['_id'], offset=offset, limit=limit, sort=sort))
+
     # These methods maintain the provenance
 
     def resourceSaveHandler(self, event):
         # get the resource name from the event
         resource = event.name.split('.')[1]
         obj = event.info
-        if ('_id' not in obj or ('provenance' not in obj and
-                                 obj.get('updated', None) ==
-                                 obj.get('created', 'unknown'))):
-            self.createNewProvenance(obj, resource)
-        else:
-            if 'provenance' not in obj:
+        if '_id' not in obj:
+            # New resources are recorded once they have an _id, in
+            # resourceSaveCreatedHandler
+            return
+        self.migrateProvenance(obj, resource)
+        latest = self.model('provenance', 'provenance').getEvent(obj['_id'])
+        if latest is None:
+            if obj.get('updated', None) == obj.get('created', 'unknown'):
+                self.createNewProvenance(obj, resource)
+            else:
                 self.createExistingProvenance(obj, resource)
-            elif (obj.get('updated', None) !=
-                    obj['provenance'][-1].get('eventTime', False)):
-                self.updateProvenance(obj, resource)
+        elif obj.get('updated', None) != latest.get('eventTime', False):
+            self.updateProvenance(obj, resource)
+
+    def resourceSaveCreatedHandler(self, event):
+        resource = event.name.split('.')[1]
+        self.createNewProvenance(event.info, resource)
+
+    def resourceRemoveHandler(self, event):
+        """
+        When resources are removed, remove their provenance history.
+        :param event: the event with the removed resource, or with the list of
+                      removed resources for bulk removal.
+        """
+        docs = event.info if isinstance(event.info, list) else [event.info]
+        self.model('provenance', 'provenance').removeHistory(
+            [doc['_id'] for doc in docs if '_id' in doc])
 
-    def createNewProvenance(self, obj, resource):
-        provenance = []
+    def migrateProvenance(self, obj, resource):
+        """
+        Move provenance that is stored in a resource document, as it was by
+        earlier versions of this plugin, to the provenance collection.
+        :param obj: a model object.  Its provenance field is removed.
+        :param resource: the type of resource (model name).
+        """
+        if obj is None or 'provenance' not in obj:
+            return
+        provenance = obj.pop('provenance')
+        if '_id' not in obj:
+            return
+        self.model('provenance', 'provenance').addHistory(
+            resource, obj['_id'], provenance)
+        self.model(resource).update({'_id': obj['_id']},
+                                    {'$unset': {'provenance': True}})
+
+    def createNewProvenance(self, obj, resource, eventType='creation'):
         created = obj.get('created', datetime.datetime.utcnow())
         creatorId = obj.get('creatorId', None)
         if creatorId is None:
@@ -199,13 +262,13 @@ class ResourceExt(Resource):
             if user is not None:
                 creatorId = user['_id']
         creationEvent = {
-            'eventType': 'creation',
+            'eventType': eventType,
             'eventUser': creatorId,
             'eventTime': obj.get('updated', created),
             'created': created
         }
-        obj['provenance'] = provenance
-        self.addProvenanceEvent(obj, creationEvent, resource)
+        return self.model('provenance', 'provenance').addEvent(
+            resource, obj['_id'], creationEvent)
 
     def getProvenanceUser(self, obj):
         """
@@ -225,42 +288,44 @@ class ResourceExt(Resource):
         return user
 
     def createExistingProvenance(self, obj, resource):
-        self.createNewProvenance(obj, resource)
         # we don't know what happened between creation and now
-        provenance = obj['provenance']
-        provenance[0]['eventType'] = 'unknownHistory'
+        self.createNewProvenance(obj, resource, 'unknownHistory')
         # but we can track starting now
         self.updateProvenance(obj, resource)
 
     def addProvenanceEvent(self, obj, provenanceEvent, resource):
-        if 'provenance' not in obj:
+        """
+        Append an event to the provenance history of an object.
+        :param obj: the model object.
+        :param provenanceEvent: the event to add.  Its version is set.
+        :param resource: the type of resource (model name).
+        """
+        provenanceModel = self.model('provenance', 'provenance')
+        self.migrateProvenance(obj, resource)
+        if provenanceModel.getEvent(obj['_id']) is None:
             self.createExistingProvenance(obj, resource)
-        provenance = obj['provenance']
-        self.incrementVersion(provenance, provenanceEvent)
-        provenance.append(provenanceEvent)
-
-    def incrementVersion(self, provenance, provenanceEvent):
-        if len(provenance) == 0:
-            # counting from 1, since people do that
-            provenanceEvent['version'] = 1
-        else:
-            provenanceEvent['version'] = int(provenance[-1]['version']) + 1
+        provenanceModel.addEvent(resource, obj['_id'], provenanceEvent)
 
-    def updateProvenance(self, curObj, resource):
+    def updateProvenance(self, curObj, resource, prevObj=None):
         """
         Update the provenance record of an object.
         :param curObj: the object to potentially update.
         :param resource: the type of resource (model name).
+        :param prevObj: the stored state of the object, if the caller already
+                        has it.  Otherwise it is loaded, which is served from
+                        the identity map when the object was loaded during the
+                        current request.
         :returns: True if the provenance was updated, False if it stayed the
                   same.
         """
         user = self.getProvenanceUser(curObj)
-        model = self.model(resource)
-        if isinstance(model, (acl_mixin.AccessControlMixin,
-                              AccessControlledModel)):
-            prevObj = model.load(curObj['_id'], force=True)
-        else:
-            prevObj = model.load(curObj['_id'])
+        if prevObj is None:
+            model = self.model(resource)
+            if isinstance(model, (acl_mixin.AccessControlMixin,
+                                  AccessControlledModel)):
+                prevObj = model.load(curObj['_id'], force=True)
+            else:
+                prevObj = model.load(curObj['_id'])
         if prevObj is None:
             return False
         oldData, newData = self.resourceDifference(prevObj, curObj)
@@ -288,27 +353,25 @@ class ResourceExt(Resource):
         :returns: newData: a dictionary of values that are different or new in
                            the object.
         """
-        curSnapshot = self.snapshotResource(curObj)
-        prevSnapshot = self.snapshotResource(prevObj)
         oldData = {}
         newData = {}
-        for key in curSnapshot:
-            if key in prevSnapshot:
+        for key in self.snapshotKeys(curObj):
+            if key in prevObj:
                 try:
-                    if curSnapshot[key] != prevSnapshot[key]:
-                        newData[key] = curSnapshot[key]
-                        oldData[key] = prevSnapshot[key]
+                    if curObj[key] != prevObj[key]:
+                        newData[key] = curObj[key]
+                        oldData[key] = prevObj[key]
                 except TypeError:
                     # If the data types of the old and new keys are not
                     # comparable, an error is thrown.  In this case, always
                     # treat them as different.
-                    newData[key] = curSnapshot[key]
-                    oldData[key] = prevSnapshot[key]
+                    newData[key] = curObj[key]
+                    oldData[key] = prevObj[key]
             else:
-                newData[key] = curSnapshot[key]
-        for key in prevSnapshot:
-            if key not in curSnapshot:
-                oldData[key] = prevSnapshot[key]
+                newData[key] = curObj[key]
+        for key in self.snapshotKeys(prevObj):
+            if key not in curObj:
+                oldData[key] = prevObj[key]
         return oldData, newData
 
     def snapshotResource(self, obj):
@@ -319,10 +382,17 @@ class ResourceExt(Resource):
         :param includeItemFiles: if True and this is an item, include files.
         :returns: a snapshot dictionary.
         """
+        return {key: obj[key] for key in self.snapshotKeys(obj)}
+
+    def snapshotKeys(self, obj):
+        """
+        List the keys of an arbitrary resource that are tracked by provenance.
+        :param obj: a model object.
+        :returns: a list of keys.
+        """
         ignoredKeys = ('provenance', 'updated')
-        snap = {key: obj[key] for key in obj
-                if not key.startswith('_') and key not in ignoredKeys}
-        return snap
+        return [key for key in obj
+                if not key.startswith('_') and key not in ignoredKeys]
 
     def fileSaveHandler(self, event):
         """
@@ -357,7 +427,6 @@ class ResourceExt(Resource):
         if user is not None:
             updateEvent['eventUser'] = user['_id']
         self.addProvenanceEvent(item, updateEvent, 'item')
-        self.model('item').save(item, triggerEvents=False)
 
     def fileSaveCreatedHandler(self, event):
         """
@@ -383,7 +452,6 @@ class ResourceExt(Resource):
         if user is not None:
             updateEvent['eventUser'] = user['_id']
         self.addProvenanceEvent(item, updateEvent, 'item')
-        self.model('item').save(item, triggerEvents=False)
 
     def fileRemoveHandler(self, event):
         """
@@ -412,23 +480,57 @@ class ResourceExt(Resource):
         if user is not None:
             updateEvent['eventUser'] = user['_id']
         self.addProvenanceEvent(item, updateEvent, 'item')
-        self.model('item').save(item, triggerEvents=False)
+
+    def fileRemoveBulkHandler(self, event):
+        """
+        When files are removed in bulk, update the provenance of their parent
+        items, with one event per item listing all of its removed files.
+        :param event: the event with the list of removed files.
+        """
+        filesByItem = {}
+        for file in event.info:
+            if file.get('itemId'):
+                filesByItem.setdefault(file['itemId'], []).append(file)
+        user = self.getProvenanceUser(None)
+        eventTime = datetime.datetime.utcnow()
+        for itemId, files in six.viewitems(filesByItem):
+            item = self.model('item').load(id=itemId, force=True)
+            if not item:
+                continue
+            updateEvent = {
+                'eventType': 'fileRemoved',
+                'eventTime': eventTime,
+                'file': [{
+                    'fileId': file['_id'],
+                    'old': self.snapshotResource(file)
+                } for file in files]
+            }
+            if user is not None:
+                updateEvent['eventUser'] = user['_id']
+            self.addProvenanceEvent(item, updateEvent, 'item')
 
     def resourceCopyHandler(self, event):
         # Use the old item's provenance, but add a copy record.
         resource = event.name.split('.')[1]
         srcObj, newObj = event.info
-        # We should have marked the new object already when it was first
-        # created.  If not, exit
-        if 'provenance' not in newObj:
-            pass  # pragma: no cover
-        if 'provenance' in srcObj:
-            newProv = newObj['provenance'][-1]
-            newObj['provenance'] = copy.deepcopy(srcObj['provenance'])
-            newProv['version'] = newObj['provenance'][-1]['version'] + 1
-            newObj['provenance'].append(newProv)
-        # Convert the creation record to a copied record
-        newObj['provenance'][-1]['eventType'] = 'copy'
+        provenanceModel = self.model('provenance', 'provenance')
+        self.migrateProvenance(srcObj, resource)
+        # Provenance embedded in the source was copied along with it, but the
+        # new object gets the source's history below
+        if newObj.pop('provenance', None) is not None:
+            self.model(resource).update({'_id': newObj['_id']},
+                                        {'$unset': {'provenance': True}})
+        # We should have recorded the creation of the new object already.  If
+        # not, record it now.
+        copyEvent = provenanceModel.getEvent(newObj['_id'])
+        if copyEvent is None:
+            copyEvent = self.createNewProvenance(newObj, resource)  # pragma: no cover
+        copyEvent.pop('version', None)
         if '_id' in srcObj:
-            newObj['provenance'][-1]['originalId'] = srcObj['_id']
-        self.model(resource).save(newObj, triggerEvents=False)
+            provenanceModel.copyHistory(resource, srcObj['_id'], newObj['_id'])
+            # Convert the creation record to a copied record
+            copyEvent['originalId'] = srcObj['_id']
+        else:
+            provenanceModel.removeHistory([newObj['_id']])  # pragma: no cover
+        copyEvent['eventType'] = 'copy'
+        provenanceModel.addEvent(resource, newObj['_id'], copyEvent)
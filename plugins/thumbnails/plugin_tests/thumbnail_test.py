@@ -368,3 +368,57 @@ class ThumbnailsTestCase(base.TestCase):
         file = self.model('file').load(item['_thumbnails'][0], force=True)
         with self.model('file').open(file) as fh:
             self.assertEqual(fh.read(2), b'\xff\xd8')  # jpeg magic number
+
+        # Thumbnails requested on upload are created by the local job executor
+        job = self.model('job', 'jobs').findOne({'type': 'thumbnails.create'})
+        self.assertTrue(job['async'])
+
+    def testMultipleSizesOnUpload(self):
+        # A large JPEG is decoded once, at a reduced scale, for all sizes
+        out = six.BytesIO()
+        Image.new('RGB', (2000, 1000), (255, 0, 0)).save(out, 'JPEG')
+        image = out.getvalue()
+
+        resp = self.request(
+            path='/file', method='POST', user=self.admin, params={
+                'parentType': 'folder',
+                'parentId': self.publicFolder['_id'],
+                'name': 'test.jpg',
+                'size': len(image),
+                'reference': json.dumps({
+                    'thumbnail': [
+                        {'width': 100},
+                        {'width': 50, 'height': 50, 'crop': True},
+                        {'width': 300, 'height': 100, 'crop': False}
+                    ]
+                })
+            })
+        self.assertStatusOk(resp)
+
+        resp = self.request(
+            path='/file/chunk', method='POST', user=self.admin, body=image, params={
+                'offset': 0,
+                'uploadId': resp.json['_id']
+            }, type='image/jpeg')
+        self.assertStatusOk(resp)
+        itemId = resp.json['itemId']
+
+        start = time.time()
+        while time.time() - start < 15:
+            item = self.model('item').load(itemId, force=True)
+            if len(item.get('_thumbnails', ())) == 3:
+                break
+            time.sleep(0.1)
+        self.assertEqual(len(item['_thumbnails']), 3)
+
+        sizes = {}
+        for thumbnailId in item['_thumbnails']:
+            file = self.model('file').load(thumbnailId, force=True)
+            with self.model('file').open(file) as fh:
+                thumbnail = Image.open(six.BytesIO(fh.read()))
+            sizes[(file['derivedFrom']['width'], file['derivedFrom']['height'])] = thumbnail.size
+        self.assertEqual(sizes, {
+            (100, 50): (100, 50),
+            (50, 50): (50, 50),
+            (300, 100): (200, 100)
+        })
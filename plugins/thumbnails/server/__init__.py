@@ -17,7 +17,9 @@
 #  limitations under the License.
 ###############################################################################
 
+import collections
 import json
+import six
 from girder import events
 from girder.constants import AccessType
 from girder.utility.model_importer import ModelImporter
@@ -54,6 +56,35 @@ def removeThumbnailLink(event):
             model.save(resource, validate=False)
 
 
+def removeThumbnailsInBulk(event):
+    """
+    When many resources are deleted at once, we delete all of the thumbnails
+    attached to them in bulk as well.
+    """
+    fileIds = [fileId for doc in event.info for fileId in doc.get('_thumbnails', ())]
+    if fileIds:
+        fileModel = ModelImporter.model('file')
+        fileModel.removeInBulk(list(fileModel.find({'_id': {'$in': fileIds}})))
+
+
+def removeThumbnailLinksInBulk(event):
+    """
+    When many files are deleted at once, we remove the references to those that
+    are thumbnails with one update per resource type.
+    """
+    thumbnails = collections.defaultdict(list)
+    for doc in event.info:
+        if doc.get('isThumbnail'):
+            thumbnails[doc['attachedToType']].append(doc)
+
+    for attachedToType, docs in six.viewitems(thumbnails):
+        ModelImporter.model(attachedToType).update({
+            '_id': {'$in': [doc['attachedToId'] for doc in docs]}
+        }, {
+            '$pull': {'_thumbnails': {'$in': [doc['_id'] for doc in docs]}}
+        })
+
+
 def _onUpload(event):
     """
     Thumbnail creation can be requested on file upload by passing a reference field
@@ -68,6 +99,8 @@ def _onUpload(event):
         }
 
     At least one of ``width`` or ``height`` must be passed. The ``crop`` parameter is optional.
+    The value of ``thumbnail`` may also be a list of such objects, in which case all of the
+    thumbnails are created by a single job that decodes the image only once.
     """
     file = event.info['file']
     if 'itemId' not in file:
@@ -78,22 +111,39 @@ def _onUpload(event):
     except (ValueError, TypeError):
         return
 
-    if not isinstance(ref, dict) or not isinstance(ref.get('thumbnail'), dict):
+    if not isinstance(ref, dict):
+        return
+    specs = ref.get('thumbnail')
+    if isinstance(specs, dict):
+        specs = [specs]
+    if not isinstance(specs, list):
         return
 
-    width = max(0, ref['thumbnail'].get('width', 0))
-    height = max(0, ref['thumbnail'].get('height', 0))
+    sizes = []
+    for spec in specs:
+        if not isinstance(spec, dict):
+            continue
+        width = max(0, spec.get('width', 0))
+        height = max(0, spec.get('height', 0))
 
-    if not width and not height:
-        return
-    if not isinstance(width, int) or not isinstance(height, int):
+        if not width and not height:
+            continue
+        if not isinstance(width, int) or not isinstance(height, int):
+            continue
+        sizes.append({'width': width, 'height': height, 'crop': bool(spec.get('crop', True))})
+
+    if not sizes:
         return
 
     item = ModelImporter.model('item').load(file['itemId'], force=True)
-    crop = bool(ref['thumbnail'].get('crop', True))
-    utils.scheduleThumbnailJob(
-        file=file, attachToType='item', attachToId=item['_id'], user=event.info['currentUser'],
-        width=width, height=height, crop=crop)
+    if len(sizes) == 1:
+        utils.scheduleThumbnailJob(
+            file=file, attachToType='item', attachToId=item['_id'],
+            user=event.info['currentUser'], async=True, **sizes[0])
+    else:
+        utils.scheduleThumbnailJob(
+            file=file, attachToType='item', attachToId=item['_id'],
+            user=event.info['currentUser'], sizes=sizes, async=True)
 
 
 def load(info):
@@ -103,5 +153,9 @@ def load(info):
         ModelImporter.model(model).exposeFields(level=AccessType.READ, fields='_thumbnails')
         events.bind('model.%s.remove' % model, info['name'], removeThumbnails)
 
+    for model in ('item', 'folder'):
+        events.bind('model.%s.remove.bulk' % model, info['name'], removeThumbnailsInBulk)
+
     events.bind('model.file.remove', info['name'], removeThumbnailLink)
+    events.bind('model.file.remove.bulk', info['name'], removeThumbnailLinksInBulk)
     events.bind('data.process', info['name'], _onUpload)
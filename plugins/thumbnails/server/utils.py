@@ -1,20 +1,33 @@
 from girder.utility.model_importer import ModelImporter
 
 
-def scheduleThumbnailJob(file, attachToType, attachToId, user, width=0, height=0, crop=True):
+def scheduleThumbnailJob(file, attachToType, attachToId, user, width=0, height=0, crop=True,
+                         sizes=None, async=False):
     """
     Schedule a local thumbnail creation job and return it.
+
+    :param sizes: To create several thumbnails of the file from a single decode
+        of it, a list of dicts with ``width``, ``height`` and ``crop`` keys.
+        When passed, the ``width``, ``height`` and ``crop`` parameters are ignored.
+    :type sizes: list of dict or None
+    :param async: If True, the thumbnails are created later by the local job
+        executor instead of before this returns.
+    :type async: bool
     """
+    kwargs = {
+        'fileId': str(file['_id']),
+        'attachToType': attachToType,
+        'attachToId': str(attachToId)
+    }
+    if sizes:
+        kwargs['sizes'] = sizes
+    else:
+        kwargs.update(width=width, height=height, crop=crop)
+
     jm = ModelImporter.model('job', 'jobs')
     job = jm.createLocalJob(
         title='Generate thumbnail for %s' % file['name'], user=user, type='thumbnails.create',
-        public=False, module='girder.plugins.thumbnails.worker', kwargs={
-            'fileId': str(file['_id']),
-            'width': width,
-            'height': height,
-            'crop': crop,
-            'attachToType': attachToType,
-            'attachToId': str(attachToId)
-        })
+        public=False, module='girder.plugins.thumbnails.worker', kwargs=kwargs,
+        async=async)
     jm.scheduleJob(job)
     return job
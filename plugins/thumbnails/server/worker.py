@@ -18,7 +18,9 @@
 ###############################################################################
 
 from bson.objectid import ObjectId
+import collections
 import functools
+import math
 import six
 import sys
 import traceback
@@ -36,8 +38,12 @@ def run(job):
     jobModel.updateJob(job, status=JobStatus.RUNNING)
 
     try:
-        newFile = createThumbnail(**job['kwargs'])
-        log = 'Created thumbnail file %s.' % newFile['_id']
+        kwargs = job['kwargs']
+        if 'sizes' in kwargs:
+            newFiles = createThumbnails(**kwargs)
+        else:
+            newFiles = [createThumbnail(**kwargs)]
+        log = ''.join('Created thumbnail file %s.\n' % newFile['_id'] for newFile in newFiles)
         jobModel.updateJob(job, status=JobStatus.SUCCESS, log=log)
     except Exception:
         t, val, tb = sys.exc_info()
@@ -51,10 +57,57 @@ def createThumbnail(width, height, crop, fileId, attachToType, attachToId):
     Creates the thumbnail. Validation and access control must be done prior
     to the invocation of this method.
     """
+    return createThumbnails([{
+        'width': width,
+        'height': height,
+        'crop': crop
+    }], fileId, attachToType, attachToId)[0]
+
+
+def createThumbnails(sizes, fileId, attachToType, attachToId):
+    """
+    Creates several thumbnails of the same file, decoding the source image only
+    once for all of them. Validation and access control must be done prior to
+    the invocation of this method.
+
+    :param sizes: The thumbnails to create, each a dict with the ``width``,
+        ``height`` and ``crop`` arguments of :py:func:`createThumbnail`.
+    :type sizes: list of dict
+    :returns: The thumbnail file documents, in the order of ``sizes``.
+    """
     fileModel = ModelImporter.model('file')
     file = fileModel.load(fileId, force=True)
-    streamFn = functools.partial(fileModel.download, file, headers=False)
+    thumbnails = [None] * len(sizes)
+    sources = collections.OrderedDict()
+
+    for index, size in enumerate(sizes):
+        source, thumbnail = _triggerCreate(
+            file, size['width'], size['height'], size['crop'], attachToType, attachToId)
+        if thumbnail is not None:
+            thumbnails[index] = thumbnail
+        else:
+            sources.setdefault(source['_id'], (source, []))[1].append(index)
+
+    for source, indices in six.viewvalues(sources):
+        if 'assetstoreId' not in source:
+            # TODO we could thumbnail link files if we really wanted.
+            raise Exception('File %s has no assetstore.' % fileId)
+
+        images = _scaleImages(source, [sizes[index] for index in indices])
+        for index, (image, width, height) in zip(indices, images):
+            thumbnails[index] = _uploadThumbnail(
+                source, image, width, height, attachToType, attachToId)
 
+    return thumbnails
+
+
+def _triggerCreate(file, width, height, crop, attachToType, attachToId):
+    """
+    Let plugins create a thumbnail, or substitute the file it is created from.
+    Returns the file to create the thumbnail from and the thumbnail if a plugin
+    already created it.
+    """
+    fileModel = ModelImporter.model('file')
     event = events.trigger('thumbnails.create', info={
         'file': file,
         'width': width,
@@ -62,7 +115,7 @@ def createThumbnail(width, height, crop, fileId, attachToType, attachToId):
         'crop': crop,
         'attachToType': attachToType,
         'attachToId': attachToId,
-        'streamFn': streamFn
+        'streamFn': functools.partial(fileModel.download, file, headers=False)
     })
 
     if len(event.responses):
@@ -73,41 +126,134 @@ def createThumbnail(width, height, crop, fileId, attachToType, attachToId):
             if resp.get('attach', True):
                 newFile = attachThumbnail(
                     file, newFile, attachToType, attachToId, width, height)
-            return newFile
+            return file, newFile
+        else:
+            return newFile, None
+
+    return file, None
+
+
+def _scaleImages(file, sizes):
+    """
+    Decode an image file once and scale it to several thumbnail sizes. The file
+    is read through a seekable handle, or by path for files in a filesystem
+    assetstore, so that it is never buffered in memory as a whole. When the
+    image format allows it, only a reduced resolution that is still large
+    enough for every size is decoded.
+
+    :param file: The image file document.
+    :type file: dict
+    :param sizes: The thumbnail sizes, as passed to :py:func:`createThumbnails`.
+    :type sizes: list of dict
+    :returns: A list of (image, width, height) tuples, in the order of ``sizes``.
+    """
+    fileModel = ModelImporter.model('file')
+    adapter = fileModel.getAssetstoreAdapter(file)
+
+    if hasattr(adapter, 'fullPath'):
+        # Opening by path lets PIL map uncompressed images rather than read them
+        image, geometries = _decodeImage(file, adapter.fullPath(file), sizes)
+    else:
+        with fileModel.open(file) as handle:
+            image, geometries = _decodeImage(file, handle, sizes)
+
+    results = []
+    for width, height, _, crop in geometries:
+        if crop:
+            x1 = y1 = 0
+            x2, y2 = image.size
+            wr = float(image.size[0]) / width
+            hr = float(image.size[1]) / height
+
+            if hr > wr:
+                y1 = int(y2 / 2 - height * wr / 2)
+                y2 = int(y2 / 2 + height * wr / 2)
+            else:
+                x1 = int(x2 / 2 - width * hr / 2)
+                x2 = int(x2 / 2 + width * hr / 2)
+            thumbnail = image.crop((x1, y1, x2, y2))
         else:
-            file = newFile
-            streamFn = functools.partial(
-                fileModel.download, file, headers=False)
+            thumbnail = image.copy()
+
+        thumbnail.thumbnail((width, height), Image.ANTIALIAS)
+        results.append((thumbnail, width, height))
+    return results
+
+
+def _decodeImage(file, source, sizes):
+    """
+    Load an image at the smallest resolution needed for a set of thumbnails.
 
-    if 'assetstoreId' not in file:
-        # TODO we could thumbnail link files if we really wanted.
-        raise Exception('File %s has no assetstore.' % fileId)
+    :returns: The loaded image and the geometry of each thumbnail, as returned
+        by :py:func:`_thumbnailGeometry`.
+    """
+    image = _getImage(file['mimeType'], file['exts'], source)
+    geometries = [_thumbnailGeometry(image.size, size['width'], size['height'], size['crop'])
+                  for size in sizes]
+    _reduceDecoding(image, (max(g[2][0] for g in geometries),
+                            max(g[2][1] for g in geometries)))
+    image.load()
+    return image, geometries
 
-    stream = streamFn()
-    data = b''.join(stream())
 
-    image = _getImage(file['mimeType'], file['exts'], data)
+def _thumbnailGeometry(imageSize, width, height, crop):
+    """
+    Compute the dimensions of a thumbnail of an image.
 
+    :param imageSize: The full (width, height) of the source image.
+    :returns: A tuple of the thumbnail width and height, the smallest
+        (width, height) the source may be decoded at to produce the thumbnail
+        without loss of quality, and whether the source must be cropped.
+    """
     if not width:
-        width = int(height * image.size[0] / image.size[1])
+        width = int(height * imageSize[0] / imageSize[1])
+        scale = float(height) / imageSize[1]
+        crop = False
     elif not height:
-        height = int(width * image.size[1] / image.size[0])
+        height = int(width * imageSize[1] / imageSize[0])
+        scale = float(width) / imageSize[0]
+        crop = False
     elif crop:
-        x1 = y1 = 0
-        x2, y2 = image.size
-        wr = float(image.size[0]) / width
-        hr = float(image.size[1]) / height
-
-        if hr > wr:
-            y1 = int(y2 / 2 - height * wr / 2)
-            y2 = int(y2 / 2 + height * wr / 2)
-        else:
-            x1 = int(x2 / 2 - width * hr / 2)
-            x2 = int(x2 / 2 + width * hr / 2)
-        image = image.crop((x1, y1, x2, y2))
+        scale = max(float(width) / imageSize[0], float(height) / imageSize[1])
+    else:
+        scale = min(float(width) / imageSize[0], float(height) / imageSize[1])
 
-    image.thumbnail((width, height), Image.ANTIALIAS)
+    scale = min(scale, 1)
+    minSize = (int(math.ceil(imageSize[0] * scale)), int(math.ceil(imageSize[1] * scale)))
+    return width, height, minSize, crop
 
+
+def _reduceDecoding(image, minSize):
+    """
+    Configure an image that has not been loaded yet to decode at the smallest
+    resolution that is at least ``minSize``. Multi-frame images whose frames
+    are reduced resolution levels of the same image, like pyramidal TIFFs,
+    use the smallest sufficient level. JPEG images are decoded with DCT
+    scaling. Other formats are decoded at full resolution.
+
+    :param image: The unloaded PIL image.
+    :param minSize: The minimum (width, height) to decode.
+    """
+    fullSize = image.size
+    level = None
+    for frame in range(getattr(image, 'n_frames', 1)):
+        image.seek(frame)
+        width, height = image.size
+        sameAspect = abs(float(width) / height - float(fullSize[0]) / fullSize[1]) < \
+            0.01 * fullSize[0] / fullSize[1]
+        if (sameAspect and width >= minSize[0] and height >= minSize[1] and
+                (level is None or width < level[1])):
+            level = (frame, width)
+    if level is not None and level[0] != image.tell():
+        image.seek(level[0])
+
+    image.draft(image.mode, minSize)
+
+
+def _uploadThumbnail(file, image, width, height, attachToType, attachToId):
+    """
+    Save a scaled image as a thumbnail and attach it.
+    """
     uploadModel = ModelImporter.model('upload')
 
     out = six.BytesIO()
@@ -163,20 +309,20 @@ def attachThumbnail(file, thumbnail, attachToType, attachToId, width, height):
     return ModelImporter.model('file').save(thumbnail)
 
 
-def _getImage(mimeType, extension, data):
+def _getImage(mimeType, extension, source):
     """
     Check extension of image and opens it.
 
     :param extension: The extension of the image that needs to be opened.
-    :param data: The image file stream.
+    :param source: The path of the image file, or a seekable file-like object.
     """
     if (extension and extension[-1] == 'dcm') or mimeType == 'application/dicom':
         # Open the dicom image
-        dicomData = dicom.read_file(six.BytesIO(data))
+        dicomData = dicom.read_file(source)
         return scaleDicomLevels(dicomData)
     else:
         # Open other types of images
-        return Image.open(six.BytesIO(data))
+        return Image.open(source)
 
 
 def scaleDicomLevels(dicomData):
@@ -104,7 +104,7 @@ if sys.version_info[0] == 2:
         ]
     })
 if sys.version_info[0:2] < (3, 5):
-    install_reqs.append('funcsigs')
+    install_reqs.extend(['funcsigs', 'scandir'])
 
 extras_reqs['sftp'] = ['paramiko']
 
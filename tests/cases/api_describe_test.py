@@ -20,6 +20,7 @@
 import datetime
 import json
 import six
+import zlib
 from .. import base
 
 from girder.api import access, describe, docs
@@ -202,6 +203,17 @@ class ApiDescribeTestCase(base.TestCase):
         self.assertEqual(resp.json['basePath'], '/alternate/api/v1')
         self.assertEqual(resp.json['host'], 'somewhere.com')
 
+        # Only the descriptions of the most recently used hosts are kept
+        describer = describe.Describe()
+        for i in range(describe.SERIALIZED_CACHE_SIZE * 2):
+            describer._getSerialized('host%d.com' % i, '/api/v1')
+        self.assertEqual(len(describer._cache), describe.SERIALIZED_CACHE_SIZE)
+        describer._getSerialized('host%d.com' % describe.SERIALIZED_CACHE_SIZE, '/api/v1')
+        describer._getSerialized('new.com', '/api/v1')
+        self.assertIn(('host%d.com' % describe.SERIALIZED_CACHE_SIZE, '/api/v1'), describer._cache)
+        self.assertNotIn(
+            ('host%d.com' % (describe.SERIALIZED_CACHE_SIZE + 1), '/api/v1'), describer._cache)
+
     def testRoutesExist(self):
         # Check that the resources and operations exist
         resp = self.request(path='/describe', method='GET')
@@ -651,3 +663,38 @@ class ApiDescribeTestCase(base.TestCase):
                          ['image/jpeg'])
         self.assertEqual(resp.json['paths']['/produces_resource/produces2']['get']['produces'],
                          ['image/tiff', 'image/jpeg', 'image/png'])
+
+    def testApiDescribeCache(self):
+        resp = self.request(path='/describe', method='GET')
+        self.assertStatusOk(resp)
+        etag = resp.headers['ETag']
+        body = self.getBody(resp, text=False)
+
+        # A matching entity tag gets an empty response
+        resp = self.request(path='/describe', method='GET', isJson=False,
+                            additionalHeaders=[('If-None-Match', etag)])
+        self.assertStatus(resp, 304)
+        self.assertEqual(self.getBody(resp, text=False), b'')
+
+        resp = self.request(path='/describe', method='GET', isJson=False,
+                            additionalHeaders=[('Accept-Encoding', 'gzip')])
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(resp.headers['ETag'], etag)
+        self.assertEqual(
+            zlib.decompress(self.getBody(resp, text=False), 16 + zlib.MAX_WBITS), body)
+
+        # Adding and removing routes changes the document
+        resource = server.root.api.v1.accesstest
+        resource.route('GET', ('cache_test',), resource.handler)
+        resp = self.request(path='/describe', method='GET',
+                            additionalHeaders=[('If-None-Match', etag)])
+        self.assertStatusOk(resp)
+        self.assertIn('/foo/cache_test', resp.json['paths'])
+        self.assertNotEqual(resp.headers['ETag'], etag)
+
+        resource.removeRoute('GET', ('cache_test',))
+        resp = self.request(path='/describe', method='GET')
+        self.assertStatusOk(resp)
+        self.assertNotIn('/foo/cache_test', resp.json['paths'])
+        self.assertEqual(resp.headers['ETag'], etag)
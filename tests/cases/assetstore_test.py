@@ -25,14 +25,20 @@ import json
 import mock
 import moto
 import os
+import shutil
 import six
+import tempfile
 import time
 import zipfile
 
+from bson.objectid import ObjectId
+
 from .. import base, mock_s3
 from girder import events
 from girder.constants import AssetstoreType, ROOT_DIR
-from girder.utility import assetstore_utilities
+from girder.models import getDbConnection
+from girder.utility import assetstore_utilities, filesystem_assetstore_adapter, \
+    invalidation, s3_assetstore_adapter
 from girder.utility.progress import ProgressContext
 from girder.utility.s3_assetstore_adapter import makeBotoConnectParams
 from girder.utility import path as path_util
@@ -290,6 +296,77 @@ class AssetstoreTestCase(base.TestCase):
         self.assertIsNone(self.model('file').load(_file['_id'], force=True))
         self.assertTrue(os.path.isfile(_file['path']))
 
+    def testFilesystemAssetstoreIncrementalImport(self):
+        folder = self.model('folder').createFolder(
+            self.admin, 'import', parentType='user', creator=self.admin)
+        importDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, importDir)
+        for name, contents in (('top.txt', 'top'), ('a/one.txt', '1'), ('a/two.txt', '22'),
+                               ('a/b/three.txt', '333')):
+            path = os.path.join(importDir, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(contents)
+
+        imported = []
+
+        def recordImport(event):
+            if event.info['type'] == 'item':
+                imported.append(os.path.basename(event.info['importPath']))
+
+        def runImport(**kwargs):
+            del imported[:]
+            with events.bound('filesystem_assetstore_imported', 'test', recordImport):
+                resp = self.request(
+                    '/assetstore/%s/import' % self.assetstore['_id'], method='POST',
+                    user=self.admin, params=dict({
+                        'importPath': importDir,
+                        'destinationType': 'folder',
+                        'destinationId': folder['_id']
+                    }, **kwargs))
+            self.assertStatusOk(resp)
+            return sorted(imported)
+
+        def lookupFile(path):
+            resp = self.request('/resource/lookup', user=self.admin, params={
+                'path': '/user/admin/import/' + path
+            })
+            self.assertStatusOk(resp)
+            return self.model('file').load(resp.json['_id'], force=True)
+
+        # Use tiny batches so that a directory takes several bulk writes
+        with mock.patch.object(filesystem_assetstore_adapter, 'IMPORT_BATCH_SIZE', 1):
+            self.assertEqual(runImport(), ['one.txt', 'three.txt', 'top.txt', 'two.txt'])
+        self.assertEqual(lookupFile('a/two.txt/two.txt')['size'], 2)
+        self.assertEqual(lookupFile('a/b/three.txt/three.txt')['size'], 3)
+        self.assertEqual(self.model('folder').load(folder['_id'], force=True)['size'], 3)
+        self.assertEqual(self.model('user').load(self.admin['_id'], force=True)['size'], 9)
+
+        # Nothing has changed, so an incremental import doesn't touch anything
+        self.assertEqual(runImport(incremental='true'), [])
+
+        with open(os.path.join(importDir, 'a', 'one.txt'), 'w') as f:
+            f.write('11111')
+        os.utime(os.path.join(importDir, 'a', 'one.txt'), (1, 1))
+        with open(os.path.join(importDir, 'a', 'b', 'four.txt'), 'w') as f:
+            f.write('4444')
+        self.assertEqual(runImport(incremental='true'), ['four.txt', 'one.txt'])
+        file = lookupFile('a/one.txt/one.txt')
+        self.assertEqual(file['size'], 5)
+        self.assertEqual(file['mtime'], 1)
+        self.assertEqual(lookupFile('a/b/four.txt/four.txt')['size'], 4)
+        subfolder = self.model('folder').findOne({'parentId': folder['_id'], 'name': 'a'})
+        self.assertEqual(subfolder['size'], 7)
+        self.assertEqual(self.model('user').load(self.admin['_id'], force=True)['size'], 17)
+
+        # A full import reimports everything without duplicating it
+        self.assertEqual(
+            runImport(), ['four.txt', 'one.txt', 'three.txt', 'top.txt', 'two.txt'])
+        self.assertEqual(self.model('item').find({'name': 'one.txt'}).count(), 1)
+        self.assertEqual(self.model('file').find({'name': 'four.txt'}).count(), 1)
+        self.assertEqual(self.model('user').load(self.admin['_id'], force=True)['size'], 17)
+
     def testFilesystemAssetstoreFindInvalidFiles(self):
         # Create several files in the assetstore, some of which point to real
         # files on disk and some that don't
@@ -392,6 +469,55 @@ class AssetstoreTestCase(base.TestCase):
         current = self.model('assetstore').getCurrent()
         self.assertEqual(current['_id'], secondStore['_id'])
 
+    def testAdapterCache(self):
+        # Wait for the invalidation watcher to be tailing its collection
+        for _ in range(100):
+            if invalidation.isActive():
+                break
+            time.sleep(0.1)
+        self.assertTrue(invalidation.isActive())
+
+        assetstore = self.model('assetstore').getCurrent()
+        adapter = assetstore_utilities.getAssetstoreAdapter(assetstore)
+        self.assertIs(assetstore_utilities.getAssetstoreAdapter(assetstore), adapter)
+        self.assertIs(
+            assetstore_utilities.getAssetstoreAdapterById(assetstore['_id']), adapter)
+
+        # Saving the assetstore replaces its adapter
+        assetstore = self.model('assetstore').save(assetstore)
+        newAdapter = assetstore_utilities.getAssetstoreAdapterById(assetstore['_id'])
+        self.assertIsNot(newAdapter, adapter)
+        self.assertEqual(newAdapter.assetstore['updated'], assetstore['updated'])
+        self.assertIs(assetstore_utilities.getAssetstoreAdapter(assetstore), newAdapter)
+
+        # Other processes are told about the change once it has been written
+        def checkWritten(namespace, key=None):
+            self.assertEqual(self.model('assetstore').collection.find_one(
+                {'_id': assetstore['_id']})['updated'], assetstore['updated'])
+
+        with mock.patch.object(invalidation, 'publish', side_effect=checkWritten) as publish:
+            assetstore = self.model('assetstore').save(assetstore)
+        publish.assert_called_once_with(
+            assetstore_utilities.INVALIDATION_NAMESPACE, str(assetstore['_id']))
+        newAdapter = assetstore_utilities.getAssetstoreAdapterById(assetstore['_id'])
+
+        # An outdated copy of the document does not replace the cached adapter
+        self.assertIsNot(
+            assetstore_utilities.getAssetstoreAdapter(adapter.assetstore), newAdapter)
+        self.assertIs(
+            assetstore_utilities.getAssetstoreAdapterById(assetstore['_id']), newAdapter)
+
+        # A change announced by another process discards the adapter
+        invalidation._watcher._getCollection().insert_one({
+            'ns': assetstore_utilities.INVALIDATION_NAMESPACE, 'key': str(assetstore['_id'])})
+        for _ in range(100):
+            if assetstore_utilities.getAssetstoreAdapterById(
+                    assetstore['_id']) is not newAdapter:
+                break
+            time.sleep(0.1)
+        self.assertIsNot(
+            assetstore_utilities.getAssetstoreAdapterById(assetstore['_id']), newAdapter)
+
     def testGetAssetstoreFiles(self):
         resp = self.request(path='/assetstore', method='GET', user=self.admin)
         self.assertStatusOk(resp)
@@ -760,6 +886,63 @@ class AssetstoreTestCase(base.TestCase):
         self.assertEqual(file['assetstoreId'], assetstore['_id'])
         self.assertTrue(client.get_object(Bucket='bucketname', Key='foo/bar/test') is not None)
 
+        # Large prefixes are listed in pages, and an interrupted import
+        # resumes where it stopped
+        for i in range(5):
+            client.put_object(Bucket='bucketname', Key='many/key%d' % i, Body=b'x' * i)
+        client.put_object(Bucket='bucketname', Key='many/sub/key', Body=b'abc')
+        resp = self.request('/folder', method='POST', params={
+            'parentType': 'folder',
+            'parentId': parentFolder['_id'],
+            'name': 'paged import'
+        }, user=self.admin)
+        self.assertStatusOk(resp)
+        pagedFolder = resp.json
+        params = {
+            'importPath': 'many',
+            'destinationType': 'folder',
+            'destinationId': pagedFolder['_id']
+        }
+        importFiles = self.model('item').importFiles
+        calls = []
+
+        def failSecondPage(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise Exception('Interrupted')
+            return importFiles(*args, **kwargs)
+
+        with mock.patch.object(s3_assetstore_adapter, 'IMPORT_PAGE_SIZE', 2), \
+                mock.patch.object(s3_assetstore_adapter, 'IMPORT_WORKERS', 1), \
+                mock.patch.object(self.model('item'), 'importFiles', side_effect=failSecondPage):
+            resp = self.request(
+                '/assetstore/%s/import' % assetstore['_id'], method='POST', params=params,
+                user=self.admin)
+        self.assertStatus(resp, 500)
+        self.assertEqual(
+            self.model('item').find({'folderId': ObjectId(pagedFolder['_id'])}).count(), 2)
+
+        with mock.patch.object(s3_assetstore_adapter, 'IMPORT_PAGE_SIZE', 2):
+            resp = self.request(
+                '/assetstore/%s/import' % assetstore['_id'], method='POST', params=params,
+                user=self.admin)
+        self.assertStatusOk(resp)
+        items = list(self.model('item').find(
+            {'folderId': ObjectId(pagedFolder['_id'])}, sort=[('name', 1)]))
+        self.assertEqual([item['name'] for item in items], ['key%d' % i for i in range(5)])
+        self.assertEqual([item['size'] for item in items], list(range(5)))
+        self.assertEqual(
+            self.model('folder').load(pagedFolder['_id'], force=True)['size'], 10)
+        subfolder = self.model('folder').findOne({'parentId': ObjectId(pagedFolder['_id'])})
+        self.assertEqual(subfolder['name'], 'sub')
+        self.assertEqual(subfolder['size'], 3)
+        files = list(self.model('file').find({'itemId': {'$in': [i['_id'] for i in items]}}))
+        self.assertEqual(len(files), 5)
+        self.assertTrue(all(file['imported'] for file in files))
+        self.assertEqual(getDbConnection().get_default_database()[
+            s3_assetstore_adapter.IMPORT_CHECKPOINT_COLLECTION].find(
+                {'prefix': {'$regex': '^many/'}}).count(), 0)
+
         # Deleting an imported file should not delete it from S3
         with mock.patch('girder.events.daemon.trigger') as daemon:
             resp = self.request('/item/%s' % str(item['_id']), method='DELETE', user=self.admin)
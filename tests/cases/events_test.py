@@ -19,6 +19,7 @@
 
 import mock
 import six
+import threading
 import time
 import unittest
 
@@ -140,6 +141,52 @@ class EventsTestCase(unittest.TestCase):
             self.assertEqual(self.responses, ['foo'])
             events.daemon.stop()
 
+    def testDaemonPool(self):
+        name, limitedName = '_test.event', '_test.limited'
+        handlerName = '_test.handler'
+        lock = threading.Lock()
+        running = {name: 0, limitedName: 0}
+        maxRunning = {name: 0, limitedName: 0}
+
+        def handler(event):
+            with lock:
+                running[event.name] += 1
+                maxRunning[event.name] = max(maxRunning[event.name], running[event.name])
+            time.sleep(0.05)
+            with lock:
+                running[event.name] -= 1
+            event.addResponse('foo')
+
+        def callback(event):
+            with lock:
+                self.ctr += 1
+
+        daemon = events.AsyncEventsDaemon(workers=4, concurrency={limitedName: 1})
+        with events.bound(name, handlerName, handler), \
+                events.bound(limitedName, handlerName, handler):
+            for _ in range(8):
+                daemon.trigger(name, None, callback)
+                daemon.trigger(limitedName, None, callback)
+            self.assertEqual(daemon.getStats()['queueSize'], 16)
+
+            daemon.start()
+            startTime = time.time()
+            while self.ctr < 16 and time.time() - startTime < 15:
+                time.sleep(0.05)
+            daemon.stop()
+
+        self.assertEqual(self.ctr, 16)
+        self.assertGreater(maxRunning[name], 1)
+        self.assertEqual(maxRunning[limitedName], 1)
+
+        stats = daemon.getStats()
+        self.assertEqual(stats['queueSize'], 0)
+        self.assertEqual(stats['deferred'], 0)
+        self.assertEqual(stats['events'][name]['count'], 8)
+        self.assertEqual(stats['events'][limitedName]['count'], 8)
+        self.assertEqual(stats['events'][limitedName]['running'], 0)
+        self.assertGreater(stats['events'][name]['handlerTime'], 0)
+
     @mock.patch.object(events, 'daemon', new=events.ForegroundEventsDaemon())
     def testForegroundDaemon(self):
         self.assertIsInstance(events.daemon, events.ForegroundEventsDaemon)
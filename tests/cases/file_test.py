@@ -35,7 +35,8 @@ from girder.models import getDbConnection
 from girder.models.model_base import AccessException, GirderException
 from girder.utility import gridfs_assetstore_adapter
 from girder.utility.filesystem_assetstore_adapter import DEFAULT_PERMS
-from girder.utility.s3_assetstore_adapter import makeBotoConnectParams, S3AssetstoreAdapter
+from girder.utility.s3_assetstore_adapter import makeBotoConnectParams, S3AssetstoreAdapter, \
+    S3FileHandle
 from six.moves import urllib
 
 
@@ -237,6 +238,54 @@ class FileTestCase(base.TestCase):
 
         return file
 
+    def _testUploadParts(self, name):
+        """
+        Uploads a two-part file to the server, sending the parts out of order.
+        """
+        self.model('setting').set(SettingKey.UPLOAD_MINIMUM_CHUNK_SIZE, 0)
+        resp = self.request(
+            path='/file', method='POST', user=self.user, params={
+                'parentType': 'folder',
+                'parentId': self.privateFolder['_id'],
+                'name': name,
+                'size': len(chunkData),
+                'mimeType': 'text/plain',
+                'partSize': len(chunk1)
+            })
+        self.assertStatusOk(resp)
+        uploadId = resp.json['_id']
+
+        # Parts can't be sent as ordered chunks
+        resp = self.request(
+            path='/file/chunk', method='POST', user=self.user, body=chunk1, params={
+                'offset': 0, 'uploadId': uploadId}, type='text/plain')
+        self.assertStatus(resp, 400)
+
+        for partNumber, body, status in ((2, chunk2, 400), (1, chunk2 + 'x', 400),
+                                         (1, chunk2, 200), (1, chunk2, 200)):
+            resp = self.request(
+                path='/file/part', method='POST', user=self.user, body=body, params={
+                    'uploadId': uploadId, 'partNumber': partNumber}, type='text/plain')
+            self.assertStatus(resp, status)
+
+        # Sending a part again doesn't count it twice
+        resp = self.request(
+            path='/file/offset', user=self.user, params={'uploadId': uploadId})
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json, {'offset': len(chunk2), 'parts': [1]})
+
+        resp = self.request(
+            path='/file/part', method='POST', user=self.user, body=chunk1, params={
+                'uploadId': uploadId, 'partNumber': 0}, type='text/plain')
+        self.assertStatusOk(resp)
+        file = resp.json
+        self.assertEqual(file['name'], name)
+        self.assertEqual(file['size'], len(chunkData))
+
+        file = self.model('file').load(file['_id'], force=True)
+        self.assertEqual(file['sha512'], sha512(chunkData).hexdigest())
+        return file
+
     def _testDownloadFile(self, file, contents, contentDisposition=None):
         """
         Downloads the previously uploaded file from the server.
@@ -350,6 +399,11 @@ class FileTestCase(base.TestCase):
             buf = _readFile(handle)
             self.assertEqual(buf, b'')
 
+            # Read at positions out of order
+            for pos in (len(contents) // 2, min(1, len(contents)), max(len(contents) - 3, 0), 0):
+                handle.seek(pos)
+                self.assertEqual(handle.read(3), contents[pos:pos + 3])
+
             # Read without a length parameter
             handle.seek(0, os.SEEK_SET)
             buf = handle.read()
@@ -651,6 +705,10 @@ class FileTestCase(base.TestCase):
         # Upload the two-chunk file
         file = self._testUploadFile('helloWorld1.txt')
 
+        partsFile = self._testUploadParts('helloWorldParts.txt')
+        self._testDownloadFile(partsFile, chunk1 + chunk2)
+        self._testDeleteFile(partsFile)
+
         # Test editing of the file info
         resp = self.request(path='/file/%s' % file['_id'], method='PUT',
                             user=self.user, params={'name': ' newName.json'})
@@ -827,6 +885,10 @@ class FileTestCase(base.TestCase):
 
         self._testDownloadFile(file, chunk1 + chunk2)
 
+        partsFile = self._testUploadParts('helloWorldParts.txt')
+        self.assertEqual(chunkColl.find({'uuid': partsFile['chunkUuid']}).count(), 2)
+        self._testDownloadFile(partsFile, chunk1 + chunk2)
+
         # Reset chunk size so the large file testing isn't horribly slow
         gridfs_assetstore_adapter.CHUNK_SIZE = old
 
@@ -960,6 +1022,23 @@ class FileTestCase(base.TestCase):
         self.assertEqual(obj['ContentDisposition'], 'attachment; filename="new name"')
         self.assertEqual(obj['ContentType'], 'application/csv')
 
+        # Reading through a file handle uses ranged requests
+        contents = (chunk1 + chunk2).encode('utf8')
+        S3FileHandle.BLOCK_SIZE = 4
+        try:
+            with self.model('file').open(file) as handle:
+                self.assertIsInstance(handle, S3FileHandle)
+                handle.seek(5)
+                self.assertEqual(handle.read(3), contents[5:8])
+                self.assertEqual(handle.read(2), contents[8:10])
+                handle.seek(-3, os.SEEK_END)
+                self.assertEqual(handle.read(), contents[-3:])
+                # Larger than the block cache
+                handle.seek(0)
+                self.assertEqual(handle.read(), contents)
+        finally:
+            S3FileHandle.BLOCK_SIZE = 1024 * 1024
+
         # Enable testing of multi-chunk proxied upload
         S3AssetstoreAdapter.CHUNK_LEN = 5
 
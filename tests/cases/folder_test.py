@@ -19,8 +19,12 @@
 
 import datetime
 import json
+import mock
+import os
 import six
 
+from bson.objectid import ObjectId
+
 from .. import base
 
 from girder import events
@@ -585,6 +589,57 @@ class FolderTestCase(base.TestCase):
         for parent in parents:
             self.assertIn('_accessLevel', parent['object'])
 
+    def testAncestors(self):
+        folderModel = self.model('folder')
+        itemModel = self.model('item')
+        f1 = folderModel.createFolder(
+            parent=self.admin, parentType='user', creator=self.admin, name='f1')
+        f2 = folderModel.createFolder(
+            parent=f1, parentType='folder', creator=self.admin, name='f2')
+        f3 = folderModel.createFolder(
+            parent=f2, parentType='folder', creator=self.admin, name='f3')
+        f4 = folderModel.createFolder(
+            parent=self.admin, parentType='user', creator=self.admin, name='f4')
+        item = itemModel.createItem('item', creator=self.admin, folder=f3)
+
+        self.assertEqual(f1['ancestors'], [])
+        self.assertEqual(f3['ancestors'], [f1['_id'], f2['_id']])
+        self.assertEqual(item['ancestors'], [f1['_id'], f2['_id'], f3['_id']])
+        self.assertTrue(folderModel._isAncestor(f1, f3))
+        self.assertFalse(folderModel._isAncestor(f3, f1))
+        self.assertEqual(folderModel.subtreeCount(f1), 4)
+        self.assertEqual(folderModel.subtreeCount(f1, includeItems=False), 3)
+
+        path = itemModel.parentsToRoot(item, force=True)
+        self.assertEqual([entry['object']['_id'] for entry in path], [
+            self.admin['_id'], f1['_id'], f2['_id'], f3['_id']])
+
+        # Moving a folder rewrites the paths of everything beneath it
+        f2 = folderModel.move(f2, f4, 'folder')
+        self.assertEqual(f2['ancestors'], [f4['_id']])
+        f3 = folderModel.load(f3['_id'], force=True)
+        self.assertEqual(f3['ancestors'], [f4['_id'], f2['_id']])
+        item = itemModel.load(item['_id'], force=True)
+        self.assertEqual(item['ancestors'], [f4['_id'], f2['_id'], f3['_id']])
+        self.assertEqual(folderModel.subtreeCount(f1), 1)
+        self.assertEqual(folderModel.subtreeCount(f4), 4)
+
+        item = itemModel.move(item, f1)
+        self.assertEqual(item['ancestors'], [f1['_id']])
+
+        # Paths missing from older databases are computed lazily, and the
+        # system check recomputes all of them
+        folderModel.update({}, {'$unset': {'ancestors': True}})
+        itemModel.update({}, {'$unset': {'ancestors': True}})
+        folderModel.reconnect()
+        self.assertEqual(folderModel.subtreeCount(f4), 3)
+        f3 = folderModel.load(f3['_id'], force=True)
+        self.assertEqual(f3['ancestors'], [f4['_id'], f2['_id']])
+        self.assertGreater(folderModel.migrateAncestors(), 0)
+        self.assertEqual(folderModel.migrateAncestors(), 0)
+        self.assertEqual(itemModel.findOne({'_id': item['_id']})['ancestors'], [f1['_id']])
+        self.assertTrue(folderModel._ancestorsComplete())
+
     def testFolderAccessAndDetails(self):
         # create a folder to work with
         folder = self.model('folder').createFolder(
@@ -754,3 +809,213 @@ class FolderTestCase(base.TestCase):
             path='/folder/%s/copy' % subFolder['_id'], method='POST',
             user=self.admin, params={'public': 'false', 'progress': True})
         self.assertStatusOk(resp)
+
+    def testFolderCopyInBulk(self):
+        folderModel = self.model('folder')
+        itemModel = self.model('item')
+        fileModel = self.model('file')
+        publicFolder = six.next(folderModel.childFolders(
+            parent=self.user, parentType='user', user=self.user, filters={'public': True}))
+        top = folderModel.createFolder(publicFolder, 'top', creator=self.user)
+        sub = folderModel.createFolder(top, 'sub', creator=self.user)
+        deep = folderModel.createFolder(sub, 'deep', creator=self.user)
+        hidden = folderModel.createFolder(top, 'hidden', creator=self.user)
+        items = {}
+        for folder, name, contents in ((top, 'a', 'aaa'), (sub, 'b', 'bbbbb'),
+                                       (deep, 'c', 'c'), (hidden, 'd', 'dd')):
+            items[name] = itemModel.createItem(name, self.user, folder)
+            itemModel.setMetadata(items[name], {'name': name})
+            self.uploadFile(name + '.txt', contents, self.user, items[name], 'item')
+        hidden = folderModel.load(hidden['_id'], force=True)
+        folderModel.setPublic(hidden, False)
+        folderModel.setAccessList(hidden, {'users': [], 'groups': []}, save=True)
+        userSize = self.model('user').load(self.user['_id'], force=True)['size']
+
+        # Without listeners on the per-document events, nothing is copied one
+        # item at a time
+        with mock.patch.object(itemModel, 'copyItem', side_effect=AssertionError):
+            resp = self.request(
+                path='/folder/%s/copy' % top['_id'], method='POST', user=self.user,
+                params={'progress': True})
+        self.assertStatusOk(resp)
+        newTop = resp.json
+        self.assertEqual(newTop['name'], 'top (1)')
+        self.assertEqual(newTop['size'], 3)
+
+        newSub = folderModel.findOne({'parentId': ObjectId(newTop['_id'])})
+        self.assertEqual(newSub['name'], 'sub')
+        self.assertEqual(newSub['size'], 5)
+        self.assertEqual(newSub['ancestors'], top['ancestors'] + [ObjectId(newTop['_id'])])
+        self.assertTrue(folderModel.hasAccess(newSub, self.user, AccessType.ADMIN))
+        newDeep = folderModel.findOne({'parentId': newSub['_id']})
+        self.assertEqual(newDeep['name'], 'deep')
+        self.assertEqual(newDeep['ancestors'], newSub['ancestors'] + [newSub['_id']])
+        # The unreadable folder was skipped
+        self.assertEqual(folderModel.find({'name': 'hidden'}).count(), 1)
+        self.assertEqual(
+            self.model('user').load(self.user['_id'], force=True)['size'], userSize + 9)
+
+        newItem = itemModel.findOne({'folderId': newDeep['_id']})
+        self.assertEqual(newItem['name'], 'c')
+        self.assertEqual(newItem['meta'], {'name': 'c'})
+        self.assertEqual(newItem['copyOfItem'], items['c']['_id'])
+        self.assertEqual(newItem['ancestors'], newDeep['ancestors'] + [newDeep['_id']])
+        self.assertEqual(newItem['size'], 1)
+        newFile = six.next(itemModel.childFiles(newItem))
+        srcFile = six.next(itemModel.childFiles(items['c']))
+        self.assertNotEqual(newFile['_id'], srcFile['_id'])
+        self.assertEqual(newFile['path'], srcFile['path'])
+        self.assertEqual(newFile['copierId'], self.user['_id'])
+
+        # The copies share the stored data, which outlives either of them
+        folderModel.remove(folderModel.load(newTop['_id'], force=True))
+        with fileModel.open(srcFile) as fh:
+            self.assertEqual(fh.read(), b'c')
+
+        # With a listener, items are copied one by one and trigger their events
+        copied = []
+        with events.bound('model.item.copy.after', 'test', lambda e: copied.append(e.info)):
+            resp = self.request(
+                path='/folder/%s/copy' % sub['_id'], method='POST', user=self.user)
+        self.assertStatusOk(resp)
+        self.assertEqual({item['name'] for item in copied}, {'b', 'c'})
+
+    def testFolderDeleteInBulk(self):
+        folderModel = self.model('folder')
+        itemModel = self.model('item')
+        fileModel = self.model('file')
+        publicFolder = six.next(folderModel.childFolders(
+            parent=self.user, parentType='user', user=self.user, filters={'public': True}))
+        top = folderModel.createFolder(publicFolder, 'top', creator=self.user)
+        sub = folderModel.createFolder(top, 'sub', creator=self.user)
+        deep = folderModel.createFolder(sub, 'deep', creator=self.user)
+        files = {}
+        for folder, name, contents in ((top, 'a', 'aaa'), (sub, 'b', 'bbbbb'),
+                                       (deep, 'c', 'c'), (deep, 'd', 'dd')):
+            item = itemModel.createItem(name, self.user, folder)
+            files[name] = self.uploadFile(name + '.txt', contents, self.user, item, 'item')
+        # A copy outside of the deleted folder shares the data of "a"
+        copy = itemModel.copyItem(
+            itemModel.load(files['a']['itemId'], force=True), self.user, folder=publicFolder)
+        adapter = fileModel.getAssetstoreAdapter(files['b'])
+        userSize = self.model('user').load(self.user['_id'], force=True)['size']
+
+        removed = {'folder': [], 'item': [], 'file': []}
+
+        def recordRemoved(event):
+            removed[event.name.split('.')[1]].extend(doc['_id'] for doc in event.info)
+
+        # Clean a folder in the background, without any per-document removal
+        with mock.patch.object(events, 'daemon', new=events.ForegroundEventsDaemon()), \
+                mock.patch.object(fileModel, 'remove', side_effect=AssertionError), \
+                events.bound('model.folder.remove.bulk', 'test', recordRemoved), \
+                events.bound('model.item.remove.bulk', 'test', recordRemoved), \
+                events.bound('model.file.remove.bulk', 'test', recordRemoved):
+            resp = self.request(
+                path='/folder/%s/contents' % sub['_id'], method='DELETE', user=self.user,
+                params={'progress': True, 'background': True})
+            self.assertStatusOk(resp)
+
+        self.assertEqual(set(removed['folder']), {deep['_id']})
+        self.assertEqual(set(removed['item']), {files['b']['itemId'], files['c']['itemId'],
+                                                files['d']['itemId']})
+        self.assertEqual(set(removed['file']), {files['b']['_id'], files['c']['_id'],
+                                                files['d']['_id']})
+        self.assertIsNone(folderModel.load(deep['_id'], force=True))
+        self.assertEqual(folderModel.load(sub['_id'], force=True)['size'], 0)
+        self.assertEqual(
+            self.model('user').load(self.user['_id'], force=True)['size'], userSize - 8)
+        self.assertFalse(os.path.exists(adapter.fullPath(files['b'])))
+
+        notifs = list(self.model('notification').get(self.user))
+        self.assertEqual(len(notifs), 1)
+        self.assertEqual(notifs[0]['data']['title'], 'Clearing folder sub')
+        self.assertEqual(notifs[0]['data']['state'], ProgressState.SUCCESS)
+        self.assertEqual(notifs[0]['data']['current'], notifs[0]['data']['total'])
+
+        # Delete the rest; the data shared with the copy must survive
+        resp = self.request(path='/folder/%s' % top['_id'], method='DELETE', user=self.user)
+        self.assertStatusOk(resp)
+        self.assertIsNone(folderModel.load(sub['_id'], force=True))
+        self.assertIsNone(itemModel.load(files['a']['itemId'], force=True))
+        self.assertEqual(fileModel.find({'_id': files['a']['_id']}).count(), 0)
+        self.assertEqual(folderModel.load(publicFolder['_id'], force=True)['size'], 3)
+        self.assertEqual(
+            self.model('user').load(self.user['_id'], force=True)['size'], userSize - 11)
+        with fileModel.open(six.next(itemModel.childFiles(copy))) as fh:
+            self.assertEqual(fh.read(), b'aaa')
+
+        # With a listener that does not handle bulk removal, documents are
+        # deleted one at a time
+        folder = folderModel.createFolder(publicFolder, 'legacy', creator=self.user)
+        itemModel.createItem('e', self.user, folder)
+        itemRemoved = []
+        with events.bound('model.item.remove', 'test', lambda e: itemRemoved.append(e.info)):
+            folderModel.remove(folder)
+        self.assertEqual([item['name'] for item in itemRemoved], ['e'])
+
+    def testFolderManifest(self):
+        folderModel = self.model('folder')
+        itemModel = self.model('item')
+        publicFolder = six.next(folderModel.childFolders(
+            parent=self.user, parentType='user', user=self.user, filters={'public': True}))
+        top = folderModel.createFolder(publicFolder, 'top', creator=self.user)
+        sub = folderModel.createFolder(top, 'sub', creator=self.user)
+        hidden = folderModel.createFolder(top, 'hidden', creator=self.user)
+        a = itemModel.createItem('a', self.user, top)
+        fileA = self.uploadFile('a', 'aaa', self.user, a, 'item')
+        b = itemModel.createItem('b', self.user, sub)
+        fileB1 = self.uploadFile('b1.txt', 'b', self.user, b, 'item')
+        fileB2 = self.uploadFile('b2.txt', 'bb', self.user, b, 'item')
+        self.uploadFile('d.txt', 'dd', self.user, itemModel.createItem('d', self.user, hidden),
+                        'item')
+        hidden = folderModel.load(hidden['_id'], force=True)
+        folderModel.setPublic(hidden, False)
+        folderModel.setAccessList(hidden, {'users': [], 'groups': []}, save=True)
+
+        def getManifest():
+            resp = self.request(
+                path='/folder/%s/manifest' % top['_id'], user=self.user, isJson=False)
+            self.assertStatusOk(resp)
+            self.assertEqual(resp.headers['Content-Type'], 'application/x-ndjson')
+            # The content type is not text, so the server does not encode the chunks
+            chunks = list(resp.body)
+            for chunk in chunks:
+                self.assertIsInstance(chunk, six.binary_type)
+            return [json.loads(line) for line in b''.join(chunks).decode('utf8').splitlines()]
+
+        # The unreadable folder is left out, and items are followed by their files
+        manifest = getManifest()
+        self.assertEqual([(record['type'], record['path']) for record in manifest], [
+            ('folder', 'sub'), ('item', 'a'), ('file', 'a/a'),
+            ('item', 'sub/b'), ('file', 'sub/b/b1.txt'), ('file', 'sub/b/b2.txt')])
+        self.assertEqual(manifest[0]['_id'], str(sub['_id']))
+        self.assertEqual(manifest[0]['parentId'], str(top['_id']))
+        self.assertEqual(manifest[3]['folderId'], str(sub['_id']))
+        self.assertEqual(manifest[3]['size'], 3)
+        self.assertEqual(manifest[2]['_id'], str(fileA['_id']))
+        self.assertEqual(manifest[2]['itemId'], str(a['_id']))
+        self.assertEqual(manifest[2]['size'], 3)
+        self.assertEqual(manifest[2]['sha512'], fileA['sha512'])
+        self.assertEqual({manifest[4]['_id'], manifest[5]['_id']},
+                         {str(fileB1['_id']), str(fileB2['_id'])})
+
+        # Replacing the contents of a file changes its update time
+        updated = manifest[2]['updated']
+        resp = self.request(path='/file/%s/contents' % fileA['_id'], method='PUT',
+                            user=self.user, params={'size': 4})
+        self.assertStatusOk(resp)
+        resp = self.multipartRequest(
+            path='/file/chunk', user=self.user,
+            fields=[('offset', 0), ('uploadId', resp.json['_id'])], files=[('chunk', 'a', 'aaaa')])
+        self.assertStatusOk(resp)
+        manifest = getManifest()
+        self.assertGreater(manifest[2]['updated'], updated)
+        self.assertEqual(manifest[2]['size'], 4)
+
+        # Databases whose ancestor paths are not migrated list the same records
+        itemModel.update({}, {'$unset': {'ancestors': True}})
+        folderModel.reconnect()
+        self.assertFalse(folderModel._ancestorsComplete())
+        self.assertEqual(sorted(getManifest(), key=lambda record: record['path']),
+                         sorted(manifest, key=lambda record: record['path']))
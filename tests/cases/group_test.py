@@ -306,6 +306,15 @@ class GroupTestCase(base.TestCase):
         self.assertEqual(
             len(list(self.model('group').getMembers(privateGroup))), 1)
 
+        # The invitation also makes the group show up when listing groups
+        resp = self.request(path='/group', method='GET', user=self.users[1])
+        self.assertStatusOk(resp)
+        self.assertIn(str(privateGroup['_id']), [group['_id'] for group in resp.json])
+        resp = self.request(path='/group', method='GET', user=self.users[1],
+                            params={'text': privateGroup['name']})
+        self.assertStatusOk(resp)
+        self.assertIn(str(privateGroup['_id']), [group['_id'] for group in resp.json])
+
         # Removing user 1 from the group before they join it should remove the
         # invitation.
         resp = self.request(
@@ -17,8 +17,11 @@
 #  limitations under the License.
 ###############################################################################
 
+import mock
+
 from .. import base
-from girder.models.model_base import AccessControlledModel, Model, AccessType
+from girder.models.model_base import AccessControlledModel, Model, AccessType, \
+    identityMapScope
 from girder.utility.model_importer import ModelImporter
 
 
@@ -38,6 +41,7 @@ class FakeAcModel(AccessControlledModel):
 class FakeModel(Model):
     def initialize(self):
         self.name = 'fake'
+        self._identityMapped = True
 
         self.exposeFields(level=AccessType.READ, fields='read')
         self.exposeFields(level=AccessType.SITE_ADMIN, fields='sa')
@@ -311,3 +315,104 @@ class ModelTestCase(base.TestCase):
         self.assertEqual(len(doc1['access']['users']), 1)
         self.assertEqual(len(doc1['access']['groups']), 0)
         self.assertIsNone(doc1.get('creatorId'))
+
+    def testIdentityMap(self):
+        model = self.model('fake')
+        doc = model.save({'read': 'a', 'sa': {'nested': 1}})
+
+        # Outside of a scope, every load goes to the database
+        with mock.patch.object(model, 'findOne', wraps=model.findOne) as findOne:
+            model.load(doc['_id'])
+            model.load(doc['_id'])
+            self.assertEqual(findOne.call_count, 2)
+
+        with identityMapScope(), \
+                mock.patch.object(model, 'findOne', wraps=model.findOne) as findOne:
+            loaded = model.load(doc['_id'])
+            self.assertEqual(loaded['read'], 'a')
+            # Mutating a returned document must not affect later loads
+            loaded['sa']['nested'] = 2
+            self.assertEqual(model.load(doc['_id'])['sa'], {'nested': 1})
+            self.assertEqual(model.load(doc['_id'], fields=['read']),
+                             {'_id': doc['_id'], 'read': 'a'})
+            self.assertEqual(findOne.call_count, 1)
+
+            # Projections on subfields are not served from the map
+            model.load(doc['_id'], fields=['sa.nested'])
+            self.assertEqual(findOne.call_count, 2)
+
+            # Writes through the model discard the remembered document
+            model.update({'_id': doc['_id']}, {'$set': {'read': 'b'}})
+            self.assertEqual(model.load(doc['_id'])['read'], 'b')
+            loaded = model.load(doc['_id'])
+            loaded['read'] = 'c'
+            model.save(loaded)
+            self.assertEqual(model.load(doc['_id'])['read'], 'c')
+            self.assertEqual(findOne.call_count, 4)
+
+            # Nested scopes share the outer map
+            with identityMapScope():
+                model.load(doc['_id'])
+            self.assertEqual(findOne.call_count, 4)
+
+            model.remove(loaded)
+            self.assertIsNone(model.load(doc['_id']))
+
+        # Models that have not opted in are never memoized
+        acModel = self.model('fake_ac')
+        acDoc = acModel.save({'read': 'a'})
+        with identityMapScope(), \
+                mock.patch.object(acModel, 'findOne', wraps=acModel.findOne) as findOne:
+            acModel.load(acDoc['_id'], force=True)
+            acModel.load(acDoc['_id'], force=True)
+            self.assertEqual(findOne.call_count, 2)
+
+    def testPermissionClauses(self):
+        model = self.model('fake_ac')
+        admin = self.model('user').createUser(
+            email='admin@place.com', login='admin', firstName='Ad', lastName='Min',
+            password='adminpassword', admin=True)
+        user1 = self.model('user').createUser(
+            email='one@place.com', login='userone', firstName='User', lastName='One',
+            password='password1')
+        user2 = self.model('user').createUser(
+            email='two@place.com', login='usertwo', firstName='User', lastName='Two',
+            password='password2')
+        group = self.model('group').createGroup(name='agroup', creator=admin)
+        self.model('group').addUser(group, user2, level=AccessType.READ)
+        user2 = self.model('user').load(user2['_id'], force=True)
+
+        docs = []
+        for public in (True, False):
+            for level in (None, AccessType.READ, AccessType.WRITE, AccessType.ADMIN):
+                for entity in (user1, group):
+                    doc = {'public': public, 'access': {'users': [], 'groups': []}}
+                    if public:
+                        doc['publicFlags'] = ['pub']
+                    if level is not None:
+                        # Set the entries directly, since unregistered flags
+                        # would be discarded by setUserAccess
+                        key = 'groups' if entity is group else 'users'
+                        flags = ['f1'] if entity is group else ['f1', 'f2']
+                        doc['access'][key].append(
+                            {'id': entity['_id'], 'level': level, 'flags': flags})
+                    docs.append(model.save(doc))
+        ids = [doc['_id'] for doc in docs]
+
+        for user in (None, admin, user1, user2):
+            for level in (AccessType.READ, AccessType.WRITE, AccessType.ADMIN):
+                for flags in (None, 'pub', 'f1', ['f1', 'f2']):
+                    expected = [
+                        doc['_id'] for doc in model.filterResultsByPermission(
+                            model.find({'_id': {'$in': ids}}, sort=[('_id', 1)]),
+                            user=user, level=level, flags=flags)]
+                    cursor = model.findWithPermissions(
+                        {'_id': {'$in': ids}}, sort=[('_id', 1)], user=user, level=level,
+                        flags=flags)
+                    self.assertEqual([doc['_id'] for doc in cursor], expected)
+                    self.assertEqual(cursor.count(), len(expected))
+
+        # Paging happens in the database
+        cursor = model.findWithPermissions(
+            {'_id': {'$in': ids}}, sort=[('_id', 1)], user=None, offset=1, limit=2)
+        self.assertEqual([doc['_id'] for doc in cursor], ids[1:3])
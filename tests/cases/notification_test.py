@@ -23,6 +23,7 @@ from .. import base
 
 from girder.models.model_base import ValidationException
 from girder.models.notification import ProgressState
+from girder.utility import invalidation
 from girder.utility.progress import ProgressContext
 
 
@@ -146,3 +147,26 @@ class NotificationTestCase(base.TestCase):
         token = resp.json['token']
         tokenDoc = self.model('token').load(token, force=True, objectId=False)
         self._testStream(None, tokenDoc)
+
+    def testSubscription(self):
+        notificationModel = self.model('notification')
+        for _ in range(100):
+            if invalidation.isActive():
+                break
+            time.sleep(0.1)
+
+        subscription = notificationModel.subscribe(self.admin)
+        self.assertTrue(subscription.active)
+        self.assertFalse(subscription.wait(0))
+        notificationModel.createNotification('test', {}, self.admin)
+        self.assertTrue(subscription.wait(5))
+
+        # Notifications for other users and tokens don't wake the subscriber
+        subscription.clear()
+        notificationModel.createNotification('test', {}, None, token={'_id': 'token'})
+        self.assertFalse(subscription.wait(0.2))
+
+        # Neither do notifications after unsubscribing
+        notificationModel.unsubscribe(subscription)
+        notificationModel.createNotification('test', {}, self.admin)
+        self.assertFalse(subscription.wait(0.2))
@@ -19,6 +19,7 @@
 
 import contextlib
 import girder_client.cli
+import girder_client.sync
 import mock
 import os
 import requests
@@ -381,11 +382,45 @@ class PythonCliTestCase(base.TestCase):
         self.assertEqual(ret['exitVal'], 0)
 
         for fname in os.listdir(downloadDir):
-            if fname == '.girder_metadata':
+            if fname in ('.girder_metadata', girder_client.sync.INDEX_NAME):
                 continue
             filename = os.path.join(downloadDir, fname)
             self.assertEqual(os.path.getmtime(filename), old_mtimes[fname])
 
+        # Local changes are only uploaded when synchronizing in both directions
+        with open(os.path.join(downloadDir, 'hello.txt'), 'w') as fh:
+            fh.write('changed locally')
+        with open(os.path.join(downloadDir, 'new.txt'), 'w') as fh:
+            fh.write('new')
+        ret = invokeCli(('localsync', str(subfolder['_id']),
+                         downloadDir), username='mylogin', password='password')
+        self.assertEqual(ret['exitVal'], 0)
+        self.assertIsNone(self.model('item').findOne({
+            'folderId': subfolder['_id'], 'name': 'new.txt'}))
+
+        ret = invokeCli(('localsync', '--direction', 'both', str(subfolder['_id']),
+                         downloadDir), username='mylogin', password='password')
+        self.assertEqual(ret['exitVal'], 0)
+        self.assertIsNotNone(self.model('item').findOne({
+            'folderId': subfolder['_id'], 'name': 'new.txt'}))
+        item = self.model('item').findOne({'folderId': subfolder['_id'], 'name': 'hello.txt'})
+        file = self.model('file').findOne({'itemId': item['_id']})
+        self.assertEqual(file['size'], len('changed locally'))
+
+        # Without an index, a local copy that differs from the server is not
+        # overwritten in either direction when synchronizing both ways
+        os.remove(os.path.join(downloadDir, girder_client.sync.INDEX_NAME))
+        with open(os.path.join(downloadDir, 'hello.txt'), 'w') as fh:
+            fh.write('unrecorded change')
+        ret = invokeCli(('localsync', '--direction', 'both', str(subfolder['_id']),
+                         downloadDir), username='mylogin', password='password')
+        self.assertEqual(ret['exitVal'], 0)
+        self.assertIn('hello.txt differs locally and on the server', ret['stdout'])
+        with open(os.path.join(downloadDir, 'hello.txt')) as fh:
+            self.assertEqual(fh.read(), 'unrecorded change')
+        file = self.model('file').findOne({'itemId': item['_id']})
+        self.assertEqual(file['size'], len('changed locally'))
+
         # Check that localsync command do not show '--parent-type' option help
         ret = invokeCli(('localsync', '--help'))
         self.assertNotIn('--parent-type', ret['stdout'])
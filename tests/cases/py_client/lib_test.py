@@ -30,6 +30,7 @@ import hashlib
 import httmock
 
 from girder import config, events
+from girder.constants import SettingKey
 from tests import base
 
 os.environ['GIRDER_PORT'] = os.environ.get('GIRDER_TEST_PORT', '20200')
@@ -637,6 +638,53 @@ class PythonClientTestCase(base.TestCase):
             with self.assertRaises(requests.HTTPError):
                 self.client.downloadFile(file['_id'], obj)
 
+    def testParallelTransfers(self):
+        client = girder_client.GirderClient(port=os.environ['GIRDER_PORT'], parallel=4)
+        client.authenticate(self.user['login'], self.password)
+        self.model('setting').set(SettingKey.UPLOAD_MINIMUM_CHUNK_SIZE, 0)
+        # Fail the first request for each part, so that it is retried
+        failed = set()
+        originalPost = client.post
+
+        def flakyPost(path, *args, **kwargs):
+            if path.startswith('file/part') and path not in failed:
+                failed.add(path)
+                raise requests.ConnectionError('Connection reset')
+            return originalPost(path, *args, **kwargs)
+
+        # Use small parts so that the test files are uploaded in several parts
+        with mock.patch.object(client, 'MAX_CHUNK_SIZE', 8), \
+                mock.patch.object(client, 'PART_SIZE', 8), \
+                mock.patch.object(client, 'post', new=flakyPost), \
+                mock.patch.object(girder_client, 'RETRY_DELAY', 0):
+            client.upload(self.libTestDir, self.publicFolder['_id'])
+        self.assertTrue(failed)
+        self.assertIsNone(client._transfers)
+        self.assertIsNone(client._session)
+
+        folder = six.next(self.model('folder').childFolders(
+            parent=self.publicFolder, parentType='folder', user=None, limit=1))
+        self.assertEqual(folder['name'], '_libTestDir')
+
+        downloadDir = os.path.join(self.libTestDir, 'download')
+        client.downloadFolderRecursive(folder['_id'], downloadDir)
+        for subDir in ('', 'sub0', 'sub1', 'sub2'):
+            for name in ('f', 'f1'):
+                with open(os.path.join(self.libTestDir, subDir, name), 'rb') as f:
+                    expected = f.read()
+                with open(os.path.join(downloadDir, subDir, name), 'rb') as f:
+                    self.assertEqual(f.read(), expected)
+
+        # Errors in the transfers are raised when the transfers end
+        @httmock.urlmatch(path=r'.*/file/.+/download$')
+        def mockDownload(url, request):
+            return httmock.response(403, 'error', request=request)
+
+        with httmock.HTTMock(mockDownload):
+            with self.assertRaises(requests.HTTPError):
+                client.downloadFolderRecursive(folder['_id'], downloadDir)
+        self.assertIsNone(client._transfers)
+
     def testAddMetadataToItem(self):
         item = self.client.createItem(self.publicFolder['_id'],
                                       'Itemty McItemFace', '')
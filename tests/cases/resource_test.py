@@ -772,6 +772,21 @@ class ResourceTestCase(base.TestCase):
         footer = zip.footer()
         self.assertEqual(footer[-6:], b'\xFF\xFF\xFF\xFF\x00\x00')
 
+        # Reading ahead must preserve the order and content of every file,
+        # whether or not it fits in the read ahead buffer
+        files = [('file%d' % i, genEmptyFile(i * 1000, 1000)) for i in range(20)]
+        results = list(girder.utility.ziputil.readAhead(
+            iter(files), ahead=3, maxBytes=5000))
+        self.assertEqual([path for path, _ in results], [path for path, _ in files])
+        for i, (path, stream) in enumerate(results):
+            self.assertEqual(len(b''.join(
+                data.encode('utf8') for data in stream())), i * 1000)
+        # Every call shares one pool of threads
+        pool = girder.utility.ziputil._readAheadPool
+        self.assertIsNotNone(pool)
+        list(girder.utility.ziputil.readAhead(iter(files)))
+        self.assertIs(girder.utility.ziputil._readAheadPool, pool)
+
     def testResourceTimestamps(self):
         self._createFiles()
 
@@ -17,10 +17,13 @@
 #  limitations under the License.
 #############################################################################
 
+import mock
 import six
+import time
 from .. import base
+from girder.constants import SettingKey
 from girder.models.model_base import ValidationException
-from girder.utility import setting_utilities
+from girder.utility import invalidation, setting_utilities
 
 
 def setUpModule():
@@ -108,3 +111,57 @@ class SettingTestCase(base.TestCase):
             return 'default value'
 
         self.assertEqual(self.model('setting').get('test.key'), 'default value')
+
+    def testCache(self):
+        settingModel = self.model('setting')
+        # Wait for the invalidation watcher to be tailing its collection
+        for _ in range(100):
+            if invalidation.isActive():
+                break
+            time.sleep(0.1)
+        self.assertTrue(settingModel.getCacheStats()['active'])
+
+        settingModel.set(SettingKey.BRAND_NAME, 'Cached')
+        stats = settingModel.getCacheStats()
+        self.assertEqual(settingModel.get(SettingKey.BRAND_NAME), 'Cached')
+        self.assertEqual(settingModel.get(SettingKey.BRAND_NAME), 'Cached')
+        newStats = settingModel.getCacheStats()
+        self.assertEqual(newStats['misses'], stats['misses'] + 1)
+        self.assertEqual(newStats['hits'], stats['hits'] + 1)
+
+        # Modifying a returned value must not modify the cache
+        routeTable = settingModel.get(SettingKey.ROUTE_TABLE)
+        routeTable['modified'] = '/modified'
+        self.assertNotIn('modified', settingModel.get(SettingKey.ROUTE_TABLE))
+
+        # Writing through the model invalidates the cached value
+        settingModel.set(SettingKey.BRAND_NAME, 'Changed')
+        self.assertEqual(settingModel.get(SettingKey.BRAND_NAME), 'Changed')
+        settingModel.unset(SettingKey.BRAND_NAME)
+        self.assertEqual(settingModel.get(SettingKey.BRAND_NAME), 'Girder')
+
+        # A change made by another process is picked up once its invalidation
+        # message arrives.
+        settingModel.get(SettingKey.BRAND_NAME)
+        settingModel.collection.insert_one({'key': SettingKey.BRAND_NAME, 'value': 'Remote'})
+        self.assertEqual(settingModel.get(SettingKey.BRAND_NAME), 'Girder')
+        invalidation._watcher._getCollection().insert_one({
+            'ns': 'setting', 'key': SettingKey.BRAND_NAME})
+        for _ in range(100):
+            if settingModel.get(SettingKey.BRAND_NAME) == 'Remote':
+                break
+            time.sleep(0.1)
+        self.assertEqual(settingModel.get(SettingKey.BRAND_NAME), 'Remote')
+
+        # Other processes are told about a change once it has been written,
+        # through the collection that was already verified by the watcher
+        def checkWritten(namespace, key=None):
+            self.assertEqual(
+                settingModel.collection.find_one({'key': key})['value'], 'Published')
+
+        with mock.patch.object(invalidation, 'publish', side_effect=checkWritten) as publish:
+            settingModel.set(SettingKey.BRAND_NAME, 'Published')
+        publish.assert_called_once_with('setting', SettingKey.BRAND_NAME)
+        with mock.patch.object(invalidation._watcher, '_getCollection') as getCollection:
+            settingModel.set(SettingKey.BRAND_NAME, 'Again')
+        self.assertFalse(getCollection.called)
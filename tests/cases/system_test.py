@@ -391,9 +391,17 @@ class SystemTestCase(base.TestCase):
         resp = self.request(path='/system/check', user=user, method='PUT')
         self.assertStatusOk(resp)
         self.assertEqual(resp.json['baseParentsFixed'], 0)
+        self.assertEqual(resp.json['ancestorsFixed'], 0)
         self.assertEqual(resp.json['orphansRemoved'], 0)
         self.assertEqual(resp.json['sizesChanged'], 0)
 
+        self.model('item').update(
+            {'_id': i1['_id']}, update={'$set': {'ancestors': []}})
+
+        resp = self.request(path='/system/check', user=user, method='PUT')
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json['ancestorsFixed'], 1)
+
         self.model('item').update(
             {'_id': i1['_id']}, update={'$set': {'baseParentId': None}})
 
@@ -427,6 +435,34 @@ class SystemTestCase(base.TestCase):
         self.assertEqual(
             23, self.model('user').load(user['_id'], force=True)['size'])
 
+        # Nested folders are included in the size of their collection
+        f5 = self.model('folder').createFolder(f1, 'f5')
+        i7 = self.model('item').createItem('i7', user, f5)
+        self.model('file').createFile(user, i7, 'foo', 29, assetstore)
+        self.assertEqual(self.model('collection').subtreeCount(c1), 8)
+        self.assertEqual(self.model('collection').subtreeCount(c1, includeItems=False), 4)
+
+        self.model('collection').update(
+            {'_id': c1['_id']}, update={'$set': {'size': 1}})
+        self.model('folder').update(
+            {'_id': f5['_id']}, update={'$set': {'size': 2}})
+        self.model('item').update(
+            {'_id': i7['_id']}, update={'$set': {'size': 3}})
+        c1 = self.model('collection').load(c1['_id'], force=True)
+        self.assertEqual(self.model('collection').updateSize(c1), (68, 3))
+        self.assertEqual(
+            29, self.model('folder').load(f5['_id'], force=True)['size'])
+        self.assertEqual(
+            29, self.model('item').load(i7['_id'], force=True)['size'])
+
+        self.model('folder').update(
+            {'_id': f5['_id']}, update={'$set': {'size': 0}})
+        resp = self.request(path='/system/check', user=user, method='PUT')
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json['sizesChanged'], 1)
+        self.assertEqual(
+            68, self.model('collection').load(c1['_id'], force=True)['size'])
+
         self.model('folder').collection.delete_one({'_id': f3['_id']})
 
         resp = self.request(path='/system/check', user=user, method='PUT')
@@ -17,12 +17,15 @@
 #  limitations under the License.
 ###############################################################################
 
+import mock
 import random
+import time
 
 from .. import base
 from girder.constants import TokenScope
 from girder.models.token import genToken
 from girder.models.model_base import AccessException
+from girder.utility import invalidation
 
 
 def setUpModule():
@@ -98,3 +101,66 @@ class TokensTestCase(base.TestCase):
         # If specified scope does not exist raise an error
         with self.assertRaises(AccessException):
             tokenModel.requireScope(token, anotherScope)
+
+    def testAuthCache(self):
+        tokenModel = self.model('token')
+        # Wait for the invalidation watcher to be tailing its collection
+        for _ in range(100):
+            if invalidation.isActive():
+                break
+            time.sleep(0.1)
+        self.assertTrue(tokenModel.getAuthCacheStats()['active'])
+
+        user = self.model('user').createUser(
+            'tokenuser', 'password', 'Token', 'User', 'tokenuser@email.com')
+        group = self.model('group').createGroup('token group', user)
+        token = tokenModel.createToken(user)
+
+        stats = tokenModel.getAuthCacheStats()
+        for _ in range(3):
+            resp = self.request(path='/user/me', token=token)
+            self.assertStatusOk(resp)
+            self.assertEqual(resp.json['firstName'], 'Token')
+        newStats = tokenModel.getAuthCacheStats()
+        self.assertEqual(newStats['misses'], stats['misses'] + 2)
+        self.assertEqual(newStats['hits'], stats['hits'] + 4)
+
+        # Saving the user invalidates its cached authentication
+        user = self.model('user').load(user['_id'], force=True)
+        user['firstName'] = 'Changed'
+        self.model('user').save(user)
+        resp = self.request(path='/user/me', token=token)
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json['firstName'], 'Changed')
+
+        # Propagating size changes does not
+        with mock.patch.object(invalidation, 'publish') as publish:
+            self.model('user').increment({'_id': user['_id']}, 'size', 10)
+        publish.assert_not_called()
+
+        # Changing group membership does invalidate it
+        self.assertEqual(resp.json['groups'], [str(group['_id'])])
+        self.model('group').removeUser(group, user)
+        resp = self.request(path='/user/me', token=token)
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json['groups'], [])
+
+        # Token removals are announced once the token is gone, so that other
+        # processes cannot cache it again
+        otherToken = tokenModel.createToken(user)
+
+        def checkRemoved(name, key=None):
+            self.assertEqual(key, otherToken['_id'])
+            self.assertIsNone(tokenModel.load(otherToken['_id'], force=True, objectId=False))
+
+        with mock.patch.object(invalidation, 'publish', side_effect=checkRemoved) as publish:
+            tokenModel.remove(otherToken)
+        self.assertEqual(publish.call_count, 1)
+
+        # Logging out removes the token from the cache
+        resp = self.request(path='/user/authentication', method='DELETE', token=token)
+        self.assertStatusOk(resp)
+        resp = self.request(path='/user/me', token=token)
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json, None)
+        self.assertIsNone(tokenModel.loadForAuth(token['_id']))